@@ -1,6 +1,11 @@
 import datetime
+import logging
+
 import yaml
 
+logger = logging.getLogger(__name__)
+
+
 def validate_config(config):
     if not isinstance(config, dict):
         raise TypeError("Expected config object to be a dict")
@@ -49,6 +54,32 @@ def validate_config(config):
             raise TypeError("Expected luftdaten sensor config "
                             "location to have longitude (number)")
 
+    if 'spatial' in config:
+        validate_spatial_config(config['spatial'])
+
+def validate_spatial_config(spatial):
+    if not isinstance(spatial, dict):
+        raise TypeError("Expected spatial config object to be a dict")
+
+    cluster_distance_km = spatial.get('cluster_distance_km')
+    if cluster_distance_km is not None and \
+            not isinstance(cluster_distance_km, (int, float)):
+        raise TypeError("Expected spatial config cluster_distance_km "
+                        "to be a number")
+
+    points = spatial.get('points', {})
+    if not isinstance(points, dict):
+        raise TypeError("Expected spatial config points to be a dict")
+    for name, location in points.items():
+        if not isinstance(name, str):
+            raise TypeError("Expected spatial config point names "
+                            "to be strings")
+        if not isinstance(location, dict) or \
+                not isinstance(location.get('latitude'), float) or \
+                not isinstance(location.get('longitude'), float):
+            raise TypeError("Expected spatial config point {} to have "
+                            "latitude and longitude (numbers)".format(name))
+
 def get_config(file_path):
     """Loads the sensor config file."""
     with open(file_path, 'r') as stream:
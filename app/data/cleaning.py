@@ -0,0 +1,168 @@
+"""Checks for bad readings in raw sensor data, using NumPy.
+
+Each check gives a mask of the readings (or values) to reject, so the
+checks can be combined and counted before anything is dropped."""
+import numpy as np
+import pandas as pd
+
+from data.spatial import haversine_distances
+
+
+# MADs are scaled by this to estimate the standard deviation of normally
+# distributed values
+MAD_SCALE = 1.4826
+
+
+def find_duplicate_timestamps(timestamps):
+    """True for readings with the same timestamp as an earlier reading.
+
+    :param timestamps: Sorted timestamps, as int64 nanoseconds
+    :type timestamps: ndarray
+    :rtype: ndarray"""
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    return np.concatenate([[False], timestamps[1:] == timestamps[:-1]])
+
+
+def find_out_of_range(values, lower, upper):
+    """True for values below lower, or at or above upper (e.g. the value a
+    sensor gives when it's saturated). NaNs aren't out of range.
+
+    :rtype: ndarray"""
+    values = np.asarray(values)
+    with np.errstate(invalid='ignore'):
+        return (values < lower) | (values >= upper)
+
+
+def create_window_medians(windows, values):
+    """Median of the values in each window, given for each value.
+
+    :param windows: The window of each value, e.g. the start of the period
+        it's in, sorted
+    :type windows: ndarray
+    :param values: The values, NaNs are skipped
+    :type values: ndarray
+    :returns: The median of each value's window (NaN if the window has no
+        values) and the number of values in it
+    :rtype: tuple"""
+    windows = np.asarray(windows)
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) == 0:
+        return values.copy(), np.zeros(0, dtype=np.int64)
+    changes = np.diff(windows) != 0
+    starts = np.concatenate([[0], np.flatnonzero(changes) + 1])
+    window_numbers = np.concatenate([[0], np.cumsum(changes)])
+
+    # Sorted by value within each window, with NaNs last, in one sort by
+    # offsetting each window's values past the ones before (much quicker
+    # than a lexsort)
+    valid = ~np.isnan(values)
+    if valid.any():
+        lowest, highest = values[valid].min(), values[valid].max()
+    else:
+        lowest, highest = 0.0, 0.0
+    span = highest - lowest + 2
+    keys = window_numbers * span + np.where(valid, values - lowest, span - 1)
+    sorted_values = values[np.argsort(keys)]
+    counts = np.add.reduceat(valid, starts)
+
+    lower = starts + np.maximum(counts - 1, 0) // 2
+    upper = starts + counts // 2
+    medians = np.where(
+        counts > 0,
+        (sorted_values[lower] + sorted_values[upper]) / 2,
+        np.nan
+    )
+    return medians[window_numbers], counts[window_numbers]
+
+
+def find_mad_outliers(
+        timestamps,
+        values,
+        window,
+        threshold,
+        min_deviation=0.0,
+        min_count=1
+):
+    """True for values which are further from the median of their window
+    than threshold times its scaled median absolute deviation (MAD).
+
+    Windows are consecutive periods of a fixed length, aligned to the epoch
+    (so to midnight and the start of each month for lengths like '1H'),
+    which lets each month be checked on its own. NaNs are skipped, and are
+    never outliers.
+
+    :param timestamps: Sorted timestamps, as int64 nanoseconds
+    :type timestamps: ndarray
+    :param values: A value per timestamp
+    :type values: ndarray
+    :param window: Length of the windows, e.g. '1H'
+    :type window: str or timedelta
+    :param threshold: Number of scaled MADs from the median an outlier is
+    :type threshold: float
+    :param min_deviation: Values this close to the median are never
+        outliers, for windows of near constant values
+    :type min_deviation: float
+    :param min_count: Windows with fewer values than this have no outliers
+    :type min_count: int
+    :rtype: ndarray"""
+    windows = np.asarray(timestamps, dtype=np.int64) // \
+        pd.Timedelta(window).value
+    values = np.asarray(values, dtype=np.float64)
+    medians, counts = create_window_medians(windows, values)
+    deviations = np.abs(values - medians)
+    mads, _ = create_window_medians(windows, deviations)
+
+    limits = threshold * np.fmax(MAD_SCALE * mads, min_deviation)
+    with np.errstate(invalid='ignore'):
+        return (deviations > limits) & (counts >= min_count)
+
+
+def find_moved_readings(
+        latitudes,
+        longitudes,
+        latitude,
+        longitude,
+        max_distance_km
+):
+    """True for readings from further than max_distance_km from a location,
+    e.g. from before or after a sensor was moved. Readings without a
+    location aren't counted as moved.
+
+    :rtype: ndarray"""
+    distances = haversine_distances(
+        latitudes, longitudes, [latitude], [longitude]
+    )[:, 0]
+    with np.errstate(invalid='ignore'):
+        return distances > max_distance_km
+
+
+def find_location_changes(latitudes, longitudes):
+    """Indexes of the readings whose location differs from the previous
+    reading's with a location.
+
+    :rtype: ndarray"""
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+    indexes = np.flatnonzero(~(np.isnan(latitudes) | np.isnan(longitudes)))
+    changed = (np.diff(latitudes[indexes]) != 0) | \
+        (np.diff(longitudes[indexes]) != 0)
+    return indexes[1:][changed]
+
+
+def find_latest_location(latitudes, longitudes):
+    """Location of the latest segment of readings from one place, as split
+    by find_location_changes, e.g. where a sensor is now after being moved.
+
+    :returns: (latitude, longitude), None if no reading has a location
+    :rtype: tuple"""
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+    changes = find_location_changes(latitudes, longitudes)
+    if len(changes) > 0:
+        start = changes[-1]
+    else:
+        located = np.flatnonzero(~(np.isnan(latitudes) | np.isnan(longitudes)))
+        if len(located) == 0:
+            return None
+        start = located[0]
+    return float(latitudes[start]), float(longitudes[start])
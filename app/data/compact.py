@@ -0,0 +1,153 @@
+"""Compact binary files of time series, as a smaller alternative to CSV.
+
+Everything is little-endian, with arrays aligned to 4 bytes so they can be
+read directly into typed arrays:
+
+    magic        4 bytes, b'AQC1'
+    rows         uint32
+    fields       uint32, number of value fields
+    start        int64, first timestamp in seconds since the epoch
+    deltas       uint32 * rows, seconds since the previous timestamp (the
+                 first is 0)
+    for each field:
+        encoding uint8, ENCODING_FLOAT32 or ENCODING_SCALED_INT32
+        decimals uint8, values are int32 / 10 ** decimals if scaled
+        length   uint16, length of the UTF-8 name
+        name     bytes, padded with zeros to a multiple of 4
+    for each field:
+        values   float32 * rows (NaN if missing) or int32 * rows (MISSING_INT32
+                 if missing)
+"""
+import struct
+
+import numpy as np
+import pandas as pd
+
+
+MAGIC = b'AQC1'
+
+ENCODING_FLOAT32 = 0
+ENCODING_SCALED_INT32 = 1
+
+MISSING_INT32 = np.iinfo(np.int32).min
+
+_HEADER = struct.Struct('<4sIIq')
+_FIELD_HEADER = struct.Struct('<BBH')
+
+NANOSECONDS_PER_SECOND = 10 ** 9
+
+
+def _padded(name):
+    encoded = name.encode('utf-8')
+    return encoded + b'\0' * (-len(encoded) % 4)
+
+
+def _encode_values(values, decimals):
+    values = np.asarray(values, dtype=np.float64)
+    if decimals is None:
+        return ENCODING_FLOAT32, 0, values.astype('<f4')
+
+    scaled = np.round(values * 10 ** decimals)
+    missing = np.isnan(scaled)
+    if np.abs(scaled[~missing]).max(initial=0) > np.iinfo(np.int32).max:
+        raise ValueError(
+            "Values are too large to store with {} decimals".format(decimals)
+        )
+    encoded = np.where(missing, MISSING_INT32, scaled).astype('<i4')
+    return ENCODING_SCALED_INT32, decimals, encoded
+
+
+def write_compact_file(
+        filepath,
+        data,
+        datetime_field,
+        value_fields,
+        decimals=None
+):
+    """Writes a time series to a compact binary file.
+
+    :param filepath: File to write
+    :type filepath: str
+    :param data: The data, sorted by time
+    :type data: DataFrame
+    :param datetime_field: Name of the datetime column, stored to the second
+    :type datetime_field: str
+    :param value_fields: Names of the value columns to store
+    :type value_fields: list
+    :param decimals: If None values are stored as float32, otherwise as
+        integers after rounding to this many decimal places
+    :type decimals: int"""
+    seconds = data[datetime_field].values.astype('datetime64[ns]') \
+        .view(np.int64) // NANOSECONDS_PER_SECOND
+    deltas = np.diff(seconds, prepend=seconds[:1])
+    if (deltas < 0).any():
+        raise ValueError("Data must be sorted by time")
+
+    fields = [
+        (field,) + _encode_values(data[field].values, decimals)
+        for field in value_fields
+    ]
+
+    with open(filepath, 'wb') as file_:
+        file_.write(_HEADER.pack(
+            MAGIC,
+            len(seconds),
+            len(fields),
+            int(seconds[0]) if len(seconds) else 0
+        ))
+        file_.write(deltas.astype('<u4').tobytes())
+        for field, encoding, field_decimals, _ in fields:
+            name = _padded(field)
+            file_.write(_FIELD_HEADER.pack(encoding, field_decimals, len(name)))
+            file_.write(name)
+        for _, _, _, values in fields:
+            file_.write(values.tobytes())
+
+
+def read_compact_file(filepath, datetime_field='timestamp'):
+    """Reads a file written by write_compact_file.
+
+    :returns: The timestamps and values, with values as float64
+    :rtype: DataFrame"""
+    with open(filepath, 'rb') as file_:
+        content = file_.read()
+
+    magic, rows, field_count, start = _HEADER.unpack_from(content)
+    if magic != MAGIC:
+        raise ValueError("{} is not a compact data file".format(filepath))
+    offset = _HEADER.size
+
+    deltas = np.frombuffer(content, '<u4', rows, offset)
+    offset += deltas.nbytes
+    seconds = start + np.cumsum(deltas, dtype=np.int64)
+
+    field_headers = []
+    for _ in range(field_count):
+        encoding, decimals, length = _FIELD_HEADER.unpack_from(content, offset)
+        offset += _FIELD_HEADER.size
+        name = content[offset:offset + length].rstrip(b'\0').decode('utf-8')
+        offset += length
+        field_headers.append((name, encoding, decimals))
+
+    columns = {
+        datetime_field: pd.to_datetime(seconds, unit='s')
+    }
+    for name, encoding, decimals in field_headers:
+        if encoding == ENCODING_FLOAT32:
+            values = np.frombuffer(content, '<f4', rows, offset) \
+                .astype(np.float64)
+        elif encoding == ENCODING_SCALED_INT32:
+            encoded = np.frombuffer(content, '<i4', rows, offset)
+            values = np.where(
+                encoded == MISSING_INT32,
+                np.nan,
+                encoded / 10 ** decimals
+            )
+        else:
+            raise ValueError("Unknown encoding {} for {}".format(
+                encoding, name
+            ))
+        offset += rows * 4
+        columns[name] = values
+
+    return pd.DataFrame(columns)
@@ -1,6 +1,11 @@
 """Pandas DataFrame helpers"""
 import calendar
 
+import numpy as np
+import pandas as pd
+
+from data.rolling import rolling_window_means
+
 
 def _ensure_data_is_valid(data, date_column):
     """Checks whether there are any rows without a valid datetime."""
@@ -9,7 +14,66 @@ def _ensure_data_is_valid(data, date_column):
         raise ValueError("There are some non null time rows in the raw data")
 
 
-def create_24_hour_means(raw_data, value_column, date_column):
+def create_rolling_means(
+        raw_data,
+        value_column,
+        date_column,
+        window,
+        resolution=None,
+        min_count=1
+):
+    """Takes raw sensor data and produces rolling means over a trailing
+    time window.
+
+    :param raw_data: The raw sensor data to aggregate
+    :type raw_data: DataFrame
+    :param value_column: Name of the column (or list of columns) with values
+        to aggregate
+    :type value_column: str
+    :param date_column: Name of the datetime column
+    :type date_column: str
+    :param window: Length of the window, e.g. '24H'
+    :type window: str or timedelta
+    :param resolution: If None there is a mean for each data point,
+        otherwise a mean at the end of each period of this length (e.g.
+        '10min') that has data
+    :type resolution: str or timedelta
+    :param min_count: Minimum number of values for a window to have a mean
+    :type min_count: int
+    :returns: DataFrame containing the rolling means
+    :rtype: DataFrame"""
+    _ensure_data_is_valid(raw_data, date_column)
+
+    value_columns = [value_column] \
+        if isinstance(value_column, str) else list(value_column)
+    timestamps = raw_data[date_column].values.astype('datetime64[ns]') \
+        .view(np.int64)
+    values = raw_data[value_columns].values
+    if np.any(timestamps[1:] < timestamps[:-1]):
+        order = np.argsort(timestamps, kind='mergesort')
+        timestamps = timestamps[order]
+        values = values[order]
+
+    output_timestamps, means = rolling_window_means(
+        timestamps,
+        values,
+        window,
+        resolution=resolution,
+        min_count=min_count
+    )
+
+    rolling_means = pd.DataFrame({
+        date_column: output_timestamps.view('datetime64[ns]')
+    })
+    for i, column in enumerate(value_columns):
+        # Keep the precision of float input (e.g. float32 sensor readings)
+        # so the output doesn't gain noise digits
+        dtype = np.result_type(raw_data[column].dtype, np.float32)
+        rolling_means[column] = means[:, i].astype(dtype, copy=False)
+    return rolling_means
+
+
+def create_24_hour_means(raw_data, value_column, date_column, resolution=None):
     """Takes raw sensor data and produces 24 hour mean for each data point.
 
     :param raw_data: The raw sensor data to aggregate
@@ -18,13 +82,61 @@ def create_24_hour_means(raw_data, value_column, date_column):
     :type value_column: str
     :param date_column: Name of the datetime column
     :type date_column: str
+    :param resolution: If given, only produce a mean at the end of each
+        period of this length (e.g. '10min') rather than for each data point
+    :type resolution: str or timedelta
     :returns: DataFrame containing rolling 24 hour means
     :rtype: DataFrame"""
+    return create_rolling_means(
+        raw_data,
+        value_column,
+        date_column,
+        window='24H',
+        resolution=resolution
+    )
+
+
+# Weekday numbers (Monday is 0) ordered by their names, the order the
+# output rows have always been in
+_day_names = np.array(calendar.day_name)
+_day_name_order = np.argsort(np.argsort(_day_names))
+
+
+def _create_hourly_means_by_weekday_and_hour(
+        raw_data,
+        value_column,
+        date_column,
+        by_month
+):
+    """Groups on integer (year, month,) day of week and hour of day arrays,
+    day names are only added to the output."""
     _ensure_data_is_valid(raw_data, date_column)
 
-    df1 = raw_data.set_index(date_column).sort_index()
-    df_24_hour_means = df1[value_column].rolling('24H').mean()
-    return df_24_hour_means.reset_index()
+    timestamps = raw_data[date_column].dt
+    keys = [timestamps.dayofweek.values, timestamps.hour.values]
+    if by_month:
+        keys = [timestamps.year.values, timestamps.month.values] + keys
+    mean_by_weekday_and_hour = raw_data[value_column].groupby(keys).mean()
+
+    levels = [
+        mean_by_weekday_and_hour.index.get_level_values(i).values
+        for i in range(len(keys))
+    ]
+    day_of_week, hour_of_day = levels[-2], levels[-1]
+    # Within a month, rows are ordered by day name and then hour
+    order = np.lexsort(
+        [hour_of_day, _day_name_order[day_of_week]] + levels[-3::-1]
+    )
+
+    result = mean_by_weekday_and_hour.reset_index(drop=True).iloc[order]
+    if isinstance(result, pd.Series):
+        result = result.to_frame()
+    result.insert(0, 'dayOfWeek', _day_names[day_of_week[order]].astype(object))
+    result.insert(1, 'hourOfDay', hour_of_day[order].astype(np.int64))
+    if by_month:
+        result['year'] = levels[0][order].astype(np.int64)
+        result['month'] = levels[1][order].astype(np.int64)
+    return result.reset_index(drop=True)
 
 
 def create_hourly_means_by_weekday_and_hour(raw_data, value_column, date_column):
@@ -39,18 +151,58 @@ def create_hourly_means_by_weekday_and_hour(raw_data, value_column, date_column)
     :type date_column: str
     :returns: DataFrame containing data grouped by day of week and hour of day
     :rtype: DataFrame"""
-    _ensure_data_is_valid(raw_data, date_column)
-    data = raw_data.copy()
+    return _create_hourly_means_by_weekday_and_hour(
+        raw_data, value_column, date_column, by_month=False
+    )
 
-    # Add extra of columns for day of week and hour of day
-    data['dayOfWeek'] = data[date_column].map(lambda x: calendar.day_name[x.weekday()])
-    data['hourOfDay'] = data[date_column].map(lambda x: x.hour)
 
-    # Group the data by day of week and hour of day
-    grouped = data[value_column].groupby([data['dayOfWeek'], data['hourOfDay']])
-    mean_by_weekday_and_hour = grouped.mean()
+def create_monthly_hourly_means_by_weekday_and_hour(
+        raw_data,
+        value_column,
+        date_column
+):
+    """Takes raw sensor data and produces hourly mean for each weekday and
+    hour, separately for every month, in a single pass.
 
-    return mean_by_weekday_and_hour.reset_index()
+    Each month's rows are the same as create_hourly_means_by_weekday_and_hour
+    gives for that month's data, with year and month columns added.
+
+    :param raw_data: The raw sensor data to aggregate
+    :type raw_data: DataFrame
+    :param value_column: Name of the column with values to aggregate
+    :type value_column: str
+    :param date_column: Name of the datetime column
+    :type date_column: str
+    :returns: DataFrame containing data grouped by year, month, day of week
+        and hour of day, sorted by year and month
+    :rtype: DataFrame"""
+    return _create_hourly_means_by_weekday_and_hour(
+        raw_data, value_column, date_column, by_month=True
+    )
+
+
+def split_by_year_month(data, years, months):
+    """Splits a DataFrame sorted by year and month into a part per month,
+    without grouping.
+
+    :param data: The DataFrame, sorted by year and month
+    :type data: DataFrame
+    :param years: The year of each row
+    :type years: ndarray
+    :param months: The month of each row
+    :type months: ndarray
+    :returns: List of ((year, month), DataFrame) pairs
+    :rtype: list"""
+    if len(data) == 0:
+        return []
+    keys = np.asarray(years) * 12 + np.asarray(months)
+    boundaries = np.flatnonzero(np.diff(keys)) + 1
+    starts = np.concatenate([[0], boundaries])
+    ends = np.concatenate([boundaries, [len(data)]])
+    return [
+        ((int(years[start]), int(months[start])), data.iloc[start:end])
+        for start, end in zip(starts, ends)
+    ]
 
 
 def add_month_year_columns(data, datetime_field):
@@ -60,7 +212,8 @@ def add_month_year_columns(data, datetime_field):
     :type data: DataFrame
     :param datetime_field: The datetime fields name
     :type datetime_field: str
-    :returns: Altered DataFrame"""
-    data['year'] = data[datetime_field].dt.year
-    data['month'] = data[datetime_field].dt.month
-    return data
+    :returns: Copy of the DataFrame with the extra columns"""
+    return data.assign(
+        year=data[datetime_field].dt.year,
+        month=data[datetime_field].dt.month
+    )
@@ -0,0 +1,125 @@
+"""Exceedances of air quality limits and daily air quality index bands,
+found from rolling means with NumPy."""
+import numpy as np
+
+
+# Limits for 24 hour means in µg/m³, by value field (P1 is PM10 and P2 is
+# PM2.5): the WHO 2021 guidelines and the UK's PM10 limit value
+LIMITS = {
+    'P1': {'who_24h': 45.0, 'uk_24h': 50.0},
+    'P2': {'who_24h': 15.0},
+}
+
+# Lower bounds of the bands 1 to 10 of the UK Daily Air Quality Index, for
+# the 24 hour means of each value field
+DAQI_BANDS = {
+    'P1': [0, 17, 34, 51, 59, 67, 76, 84, 92, 101],
+    'P2': [0, 12, 24, 36, 42, 48, 54, 59, 65, 71],
+}
+DAQI_BAND_NAMES = [None, 'Low', 'Low', 'Low', 'Moderate', 'Moderate',
+                   'Moderate', 'High', 'High', 'High', 'Very High']
+
+NANOSECONDS_PER_DAY = 24 * 60 * 60 * 10 ** 9
+NANOSECONDS_PER_HOUR = 60 * 60 * 10 ** 9
+
+
+def find_runs(flags, breaks=None):
+    """Finds the runs of consecutive True flags.
+
+    :param flags: The flags, e.g. whether each reading is over a limit
+    :type flags: ndarray
+    :param breaks: Where runs are split even if the flags continue, True at
+        the first element of each new segment
+    :type breaks: ndarray
+    :returns: Start and (exclusive) end indexes of each run
+    :rtype: tuple"""
+    flags = np.asarray(flags, dtype=bool)
+    previous = np.concatenate([[False], flags[:-1]])
+    following = np.concatenate([flags[1:], [False]])
+    if breaks is not None:
+        breaks = np.asarray(breaks, dtype=bool)
+        previous &= ~breaks
+        following &= ~np.concatenate([breaks[1:], [False]])
+    starts = np.flatnonzero(flags & ~previous)
+    ends = np.flatnonzero(flags & ~following) + 1
+    return starts, ends
+
+
+def find_exceedance_episodes(
+        timestamps,
+        values,
+        threshold,
+        max_gap=None,
+        breaks=None
+):
+    """Finds the episodes where values were over a threshold.
+
+    :param timestamps: Sorted timestamps, as int64 nanoseconds
+    :type timestamps: ndarray
+    :param values: A value per timestamp, NaNs count as not over
+    :type values: ndarray
+    :param threshold: Values above this are exceedances
+    :type threshold: float
+    :param max_gap: Split episodes where readings are further apart than
+        this, in nanoseconds
+    :type max_gap: int
+    :param breaks: Also split episodes where these are True (at the first
+        reading of each new segment), e.g. at the start of each month
+    :type breaks: ndarray
+    :returns: Dict of arrays of the start and end (last reading over)
+        timestamps, peak value and number of readings of each episode
+    :rtype: dict"""
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    values = np.asarray(values)
+    with np.errstate(invalid='ignore'):
+        over = values > threshold
+
+    if max_gap is not None:
+        gaps = np.concatenate([[False], np.diff(timestamps) > max_gap])
+        breaks = gaps if breaks is None else gaps | breaks
+    starts, ends = find_runs(over, breaks)
+
+    if len(starts) == 0:
+        peaks = values[:0]
+    else:
+        # Each slice runs on to the next episode, but the values after an
+        # episode are all at most the threshold (or NaN, which fmax skips)
+        # so don't change its peak
+        peaks = np.fmax.reduceat(values, starts)
+    return {
+        'start': timestamps[starts],
+        'end': timestamps[ends - 1],
+        'peak': peaks,
+        'readings': ends - starts,
+    }
+
+
+def get_daqi_bands(values, lower_bounds):
+    """The index band (1 to 10) of each value, or 0 for NaN.
+
+    :rtype: ndarray"""
+    values = np.asarray(values)
+    bands = np.searchsorted(lower_bounds, values, side='right')
+    return np.where(np.isnan(values), 0, bands)
+
+
+def create_daily_maximums(timestamps, values):
+    """The maximum of the values on each day there are any.
+
+    :param timestamps: Sorted timestamps, as int64 nanoseconds
+    :type timestamps: ndarray
+    :param values: Values with a row per timestamp, 1D or 2D (one column
+        per value field). NaNs are skipped.
+    :type values: ndarray
+    :returns: The start of each day as int64 nanoseconds, and the maximums
+        with a row per day (NaN where a day has no values)
+    :rtype: tuple"""
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    values = np.asarray(values, dtype=np.float64)
+    days = timestamps // NANOSECONDS_PER_DAY
+    if len(days) == 0:
+        return timestamps[:0], values[:0]
+    starts = np.concatenate([[0], np.flatnonzero(np.diff(days)) + 1])
+    # fmax skips NaNs, leaving NaN only where every value is NaN
+    maximums = np.fmax.reduceat(values, starts, axis=0)
+    return days[starts] * NANOSECONDS_PER_DAY, maximums
@@ -0,0 +1,86 @@
+"""Rolling window means over irregularly spaced readings, using NumPy."""
+import numpy as np
+import pandas as pd
+
+
+def to_nanoseconds(duration):
+    """Converts a duration (e.g. '24H', timedelta or nanoseconds) to
+    integer nanoseconds."""
+    return int(pd.Timedelta(duration).value)
+
+
+def rolling_window_means(
+        timestamps,
+        values,
+        window,
+        resolution=None,
+        min_count=1
+):
+    """Mean of the values in a trailing time window, for all value columns
+    in one pass.
+
+    The window ending at time t covers readings in (t - window, t], the
+    same as pandas' time based rolling windows. Sums are taken from
+    cumulative sums of the values, with the window edges found by binary
+    search on the timestamps, so the cost doesn't depend on the window size.
+
+    :param timestamps: Sorted timestamps, as int64 nanoseconds
+    :type timestamps: ndarray
+    :param values: Values with a row per timestamp, 1D or 2D (one column
+        per value field). NaNs are skipped.
+    :type values: ndarray
+    :param window: Length of the window
+    :type window: str, timedelta or int nanoseconds
+    :param resolution: If None, a mean is given for every reading.
+        Otherwise means are given at the end of each bucket of this length
+        (aligned to the epoch) which contains a reading.
+    :type resolution: str, timedelta or int nanoseconds
+    :param min_count: Minimum number of non NaN values needed in a window,
+        windows with fewer give NaN
+    :type min_count: int
+    :returns: The output timestamps (int64 nanoseconds) and the means, with
+        the same number of dimensions as values
+    :rtype: tuple"""
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    values = np.asarray(values, dtype=np.float64)
+    one_dimensional = values.ndim == 1
+    if one_dimensional:
+        values = values[:, np.newaxis]
+    window = to_nanoseconds(window)
+
+    if resolution is None:
+        # Each reading's window ends at that reading, even if later readings
+        # share its timestamp
+        output_timestamps = timestamps
+        ends = slice(1, None)
+        end_positions = np.arange(1, len(timestamps) + 1)
+    else:
+        resolution = to_nanoseconds(resolution)
+        bucket_ends = np.unique(-(-timestamps // resolution))
+        output_timestamps = bucket_ends * resolution
+        ends = end_positions = np.searchsorted(
+            timestamps, output_timestamps, side='right'
+        )
+    starts = np.searchsorted(
+        timestamps, output_timestamps - window, side='right'
+    )
+
+    sums = np.zeros((len(values) + 1, values.shape[1]))
+    valid = ~np.isnan(values)
+    if valid.all():
+        np.cumsum(values, axis=0, out=sums[1:])
+        window_counts = (end_positions - starts)[:, np.newaxis]
+    else:
+        np.cumsum(np.where(valid, values, 0.0), axis=0, out=sums[1:])
+        counts = np.zeros((len(values) + 1, values.shape[1]), dtype=np.int64)
+        np.cumsum(valid, axis=0, out=counts[1:])
+        window_counts = counts[ends] - counts[starts]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means = (sums[ends] - sums[starts]) / window_counts
+    means[np.broadcast_to(window_counts < max(min_count, 1), means.shape)] = \
+        np.nan
+
+    if one_dimensional:
+        means = means[:, 0]
+    return output_timestamps, means
@@ -0,0 +1,161 @@
+"""Composite series across many sensors, using their locations.
+
+Each sensor's readings are reduced to means per time bucket, then aligned
+into a matrix with a row per bucket and a column per sensor. Composites
+(means and medians across sensors, or values interpolated at other points)
+are computed over the whole matrix at once."""
+import numpy as np
+import pandas as pd
+
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def create_bucket_means(raw_data, value_column, date_column, resolution='1H'):
+    """Means of the readings in each period of a given length.
+
+    :param raw_data: The raw sensor data
+    :type raw_data: DataFrame
+    :param value_column: Names of the columns with values to average
+    :type value_column: list
+    :param date_column: Name of the datetime column
+    :type date_column: str
+    :param resolution: Length of the periods, aligned to midnight
+    :type resolution: str or timedelta
+    :returns: DataFrame of means indexed by the start of each period with
+        any readings, sorted by time
+    :rtype: DataFrame"""
+    buckets = raw_data[date_column].dt.floor(resolution)
+    means = raw_data[value_column].groupby(buckets.values).mean()
+    means.index.name = date_column
+    return means
+
+
+def create_sensor_matrix(bucket_means_by_sensor, value_field):
+    """Aligns the bucket means of many sensors into one matrix.
+
+    :param bucket_means_by_sensor: Dict of sensor code to its bucket means,
+        as from create_bucket_means
+    :type bucket_means_by_sensor: dict
+    :param value_field: The value to take from each sensor
+    :type value_field: str
+    :returns: DataFrame with a row for every bucket any sensor has data
+        for, a column per sensor (in the order given) and NaN where a
+        sensor has no data
+    :rtype: DataFrame"""
+    if len(bucket_means_by_sensor) == 0:
+        return pd.DataFrame()
+    return pd.concat(
+        {
+            sensor_code: means[value_field]
+            for sensor_code, means in bucket_means_by_sensor.items()
+        },
+        axis=1,
+        sort=True
+    )
+
+
+def create_composite_means(matrix):
+    """Mean and median across the sensors in each row of a matrix,
+    skipping sensors without data.
+
+    :param matrix: As from create_sensor_matrix
+    :type matrix: DataFrame
+    :returns: DataFrame with mean, median and sensors (number of sensors
+        with data) columns, indexed as the matrix
+    :rtype: DataFrame"""
+    return pd.DataFrame({
+        'mean': matrix.mean(axis=1),
+        'median': matrix.median(axis=1),
+        'sensors': matrix.count(axis=1),
+    })
+
+
+def haversine_distances(latitudes1, longitudes1, latitudes2, longitudes2):
+    """Great circle distances between two sets of points.
+
+    :returns: Matrix of distances in km, with a row per point in the first
+        set and a column per point in the second
+    :rtype: ndarray"""
+    lat1 = np.radians(np.asarray(latitudes1, dtype=np.float64))[:, None]
+    lon1 = np.radians(np.asarray(longitudes1, dtype=np.float64))[:, None]
+    lat2 = np.radians(np.asarray(latitudes2, dtype=np.float64))[None, :]
+    lon2 = np.radians(np.asarray(longitudes2, dtype=np.float64))[None, :]
+    a = np.sin((lat2 - lat1) / 2) ** 2 + \
+        np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def cluster_locations(latitudes, longitudes, max_distance_km):
+    """Groups points into clusters, where points within max_distance_km of
+    each other are in the same cluster (directly or through other points).
+
+    :returns: Cluster number of each point, numbered in the order the
+        clusters first appear
+    :rtype: ndarray"""
+    count = len(latitudes)
+    if count == 0:
+        return np.array([], dtype=np.int64)
+    neighbours = haversine_distances(
+        latitudes, longitudes, latitudes, longitudes
+    ) <= max_distance_km
+
+    # Each point takes the lowest label of its neighbours until nothing
+    # changes, leaving each connected group with its lowest index
+    labels = np.arange(count)
+    while True:
+        new_labels = np.where(neighbours, labels[None, :], count).min(axis=1)
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+    # The lowest indexes are in the order the clusters first appear
+    _, clusters = np.unique(labels, return_inverse=True)
+    return clusters
+
+
+def create_idw_weights(
+        sensor_latitudes,
+        sensor_longitudes,
+        point_latitudes,
+        point_longitudes,
+        power=2
+):
+    """Inverse distance weights of sensors for interpolating at points.
+
+    A point at a sensor's location takes that sensor's value alone.
+
+    :returns: Matrix of weights with a row per point and a column per sensor
+    :rtype: ndarray"""
+    distances = haversine_distances(
+        point_latitudes, point_longitudes, sensor_latitudes, sensor_longitudes
+    )
+    at_sensor = distances < 1e-6
+    with np.errstate(divide='ignore'):
+        weights = 1.0 / distances ** power
+    return np.where(
+        at_sensor.any(axis=1)[:, None],
+        at_sensor.astype(np.float64),
+        weights
+    )
+
+
+def interpolate(matrix, weights):
+    """Weighted means of the sensors in each row of a matrix, with the
+    weights of sensors without data left out.
+
+    :param matrix: As from create_sensor_matrix
+    :type matrix: DataFrame
+    :param weights: Weights with a row per point and a column per sensor in
+        the matrix, as from create_idw_weights
+    :type weights: ndarray
+    :returns: Array with a row per row of the matrix and a column per point,
+        NaN where none of the weighted sensors have data
+    :rtype: ndarray"""
+    values = matrix.values.astype(np.float64)
+    has_value = ~np.isnan(values)
+    weighted_sums = np.where(has_value, values, 0.0) @ weights.T
+    total_weights = has_value.astype(np.float64) @ weights.T
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(
+            total_weights > 0, weighted_sums / total_weights, np.nan
+        )
@@ -0,0 +1,132 @@
+"""Timing and profiling of the download and processing pipelines.
+
+A RunReport records how long each stage of a run takes, along with counts
+of what it handled (e.g. rows or bytes), and is written out as JSON so runs
+can be compared."""
+from collections import defaultdict
+import cProfile
+from contextlib import contextmanager
+import datetime
+import json
+import os
+import resource
+import time
+
+
+def get_peak_memory_mb():
+    """Peak resident set size of this process and any finished child
+    processes, in megabytes."""
+    # ru_maxrss is in kilobytes on Linux
+    peak_kb = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    )
+    return round(peak_kb / 1024, 1)
+
+
+def get_report_filepath(reports_dir, name, started_at):
+    """Path of a run report, named after the run and when it started."""
+    return os.path.join(
+        reports_dir,
+        '{name}_{started_at:%Y%m%dT%H%M%S}.json'.format(
+            name=name,
+            started_at=started_at
+        )
+    )
+
+
+class RunReport(object):
+    """Timings of the stages of a run.
+
+    Each stage is recorded as a dict of its name, labels (e.g. the sensor
+    and month it was for), counts added while it ran and how long it took.
+
+    :param name: Name of the run, e.g. the script
+    :type name: str"""
+    def __init__(self, name):
+        self.name = name
+        self.started_at = datetime.datetime.utcnow()
+        self.stages = []
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name, **labels):
+        """Times a block as a stage.
+
+        :returns: Context manager giving the stage's record, which counts
+            can be added to
+        :rtype: dict"""
+        record = {'stage': name}
+        record.update(labels)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = round(time.perf_counter() - start, 6)
+            self.stages.append(record)
+
+    def add_stages(self, stages):
+        """Adds stages recorded elsewhere, e.g. in a worker process."""
+        self.stages.extend(stages)
+
+    def get_totals(self):
+        """Number of times each stage ran and its total seconds."""
+        totals = defaultdict(lambda: {'count': 0, 'seconds': 0.0})
+        for record in self.stages:
+            total = totals[record['stage']]
+            total['count'] += 1
+            total['seconds'] = round(total['seconds'] + record['seconds'], 6)
+        return dict(totals)
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'started_at': self.started_at.isoformat(),
+            'seconds': round(time.perf_counter() - self._start, 6),
+            'peak_memory_mb': get_peak_memory_mb(),
+            'totals': self.get_totals(),
+            'stages': self.stages,
+        }
+
+    def write(self, filepath):
+        """Writes the report as JSON."""
+        directory = os.path.dirname(filepath)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(filepath, 'w') as file_:
+            json.dump(self.to_dict(), file_, indent=2)
+
+
+@contextmanager
+def stage(report, name, **labels):
+    """Times a block as a stage of report, if there is one.
+
+    :param report: The report to add the stage to, or None
+    :type report: RunReport
+    :returns: Context manager giving the stage's record
+    :rtype: dict"""
+    if report is None:
+        yield {}
+    else:
+        with report.stage(name, **labels) as record:
+            yield record
+
+
+@contextmanager
+def profile(filepath):
+    """Runs a block under cProfile and dumps the stats to filepath, which
+    can be read with pstats. Does nothing if filepath is None."""
+    if filepath is None:
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        directory = os.path.dirname(filepath)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        profiler.dump_stats(filepath)
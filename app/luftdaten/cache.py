@@ -0,0 +1,172 @@
+"""Columnar cache of raw Luftdaten sensor data.
+
+Each sensor gets a directory holding one NumPy .npz partition per
+year/month (int64 timestamps plus a float32 array per value field) and a
+manifest of the raw archive files which have been ingested so far."""
+import json
+import os
+import re
+import shutil
+
+import numpy as np
+import pandas as pd
+
+
+MANIFEST_FILENAME = 'manifest.json'
+TIMESTAMP_KEY = 'timestamp'
+
+partition_filename_pattern = '{year}_{month:02d}.npz'
+partition_filename_regex = re.compile(r'^(\d{4})_(\d{2})\.npz$')
+
+
+def get_sensor_cache_dir(luftdaten_cache_dir, sensor_code):
+    return os.path.join(luftdaten_cache_dir, str(sensor_code))
+
+
+def _get_partition_filepath(sensor_cache_dir, year, month):
+    return os.path.join(
+        sensor_cache_dir,
+        partition_filename_pattern.format(year=year, month=month)
+    )
+
+
+def _replace_file(filepath, write):
+    """Writes a file via a temporary file so readers never see a partial
+    file."""
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    temp_filepath = filepath + '.tmp'
+    with open(temp_filepath, 'wb') as file_:
+        write(file_)
+    os.replace(temp_filepath, filepath)
+
+
+def create_cache_manifest(value_fields):
+    """An empty manifest for a sensor cache.
+
+    :param value_fields: The value fields stored in the cache
+    :type value_fields: list
+    :returns: The manifest
+    :rtype: dict"""
+    return {
+        'value_fields': list(value_fields),
+        'files': {}
+    }
+
+
+def read_cache_manifest(sensor_cache_dir):
+    """Reads a sensor cache's manifest, None if the cache doesn't exist."""
+    filepath = os.path.join(sensor_cache_dir, MANIFEST_FILENAME)
+    if not os.path.exists(filepath):
+        return None
+    with open(filepath, 'r') as file_:
+        return json.load(file_)
+
+
+def write_cache_manifest(sensor_cache_dir, manifest):
+    filepath = os.path.join(sensor_cache_dir, MANIFEST_FILENAME)
+    _replace_file(
+        filepath,
+        lambda file_: file_.write(json.dumps(manifest).encode('utf-8'))
+    )
+
+
+def clear_cache(sensor_cache_dir):
+    """Removes everything cached for a sensor."""
+    if os.path.exists(sensor_cache_dir):
+        shutil.rmtree(sensor_cache_dir)
+
+
+def get_cached_partitions(sensor_cache_dir):
+    """Gets a sorted list of (year, month) partitions in a sensor cache."""
+    if not os.path.exists(sensor_cache_dir):
+        return []
+    partitions = []
+    for filename in os.listdir(sensor_cache_dir):
+        match = partition_filename_regex.match(filename)
+        if match:
+            partitions.append((int(match.group(1)), int(match.group(2))))
+    return sorted(partitions)
+
+
+def _read_partition_arrays(sensor_cache_dir, year, month, value_fields):
+    filepath = _get_partition_filepath(sensor_cache_dir, year, month)
+    with np.load(filepath) as partition:
+        return {
+            key: partition[key]
+            for key in [TIMESTAMP_KEY] + list(value_fields)
+        }
+
+
+def _arrays_to_frame(arrays, datetime_field, value_fields):
+    data = pd.DataFrame({
+        datetime_field: pd.to_datetime(arrays[TIMESTAMP_KEY]),
+    })
+    for field in value_fields:
+        data[field] = arrays[field]
+    return data
+
+
+def read_cache_partition(
+        sensor_cache_dir,
+        year,
+        month,
+        datetime_field,
+        value_fields
+):
+    """Reads a single month from a sensor cache.
+
+    :returns: DataFrame of the month's data, None if it isn't cached
+    :rtype: DataFrame"""
+    if (year, month) not in get_cached_partitions(sensor_cache_dir):
+        return None
+    arrays = _read_partition_arrays(
+        sensor_cache_dir, year, month, value_fields
+    )
+    return _arrays_to_frame(arrays, datetime_field, value_fields)
+
+
+def write_cache_partition(
+        sensor_cache_dir,
+        year,
+        month,
+        data,
+        datetime_field,
+        value_fields
+):
+    """Writes (replaces) a single month of a sensor cache. The data is
+    stored sorted by time."""
+    data = data.sort_values(datetime_field, kind='mergesort')
+    arrays = {
+        TIMESTAMP_KEY: data[datetime_field].values.astype('datetime64[ns]')
+        .astype(np.int64)
+    }
+    for field in value_fields:
+        arrays[field] = data[field].values.astype(np.float32)
+
+    _replace_file(
+        _get_partition_filepath(sensor_cache_dir, year, month),
+        lambda file_: np.savez(file_, **arrays)
+    )
+
+
+def read_cache(sensor_cache_dir, datetime_field, value_fields):
+    """Reads all the data cached for a sensor, sorted by time.
+
+    :returns: DataFrame with the datetime and value columns
+    :rtype: DataFrame"""
+    value_fields = list(value_fields)
+    partitions = [
+        _read_partition_arrays(sensor_cache_dir, year, month, value_fields)
+        for year, month in get_cached_partitions(sensor_cache_dir)
+    ]
+
+    arrays = {TIMESTAMP_KEY: np.array([], dtype=np.int64)}
+    arrays.update({
+        field: np.array([], dtype=np.float32) for field in value_fields
+    })
+    if len(partitions) > 0:
+        arrays = {
+            key: np.concatenate([partition[key] for partition in partitions])
+            for key in arrays
+        }
+    return _arrays_to_frame(arrays, datetime_field, value_fields)
@@ -1,18 +1,75 @@
 import calendar
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 import datetime
 import glob
+import hashlib
+import json
 import logging
 import os
+import re
 
 import numpy as np
 import pandas as pd
-import requests
 
+from data.cleaning import (
+    find_duplicate_timestamps,
+    find_latest_location,
+    find_location_changes,
+    find_moved_readings,
+    find_out_of_range,
+    find_mad_outliers,
+)
+from data.compact import write_compact_file
 from data.dataframe import (
-    add_month_year_columns,
     create_24_hour_means,
-    create_hourly_means_by_weekday_and_hour,
+    create_monthly_hourly_means_by_weekday_and_hour,
+    split_by_year_month,
+)
+from data.events import (
+    create_daily_maximums,
+    DAQI_BAND_NAMES,
+    DAQI_BANDS,
+    find_exceedance_episodes,
+    get_daqi_bands,
+    LIMITS,
+)
+from data.spatial import (
+    cluster_locations,
+    create_bucket_means,
+    create_composite_means,
+    create_idw_weights,
+    create_sensor_matrix,
+    haversine_distances,
+    interpolate,
+)
+from instrumentation import stage
+from location import LatLongLocation
+from luftdaten.cache import (
+    clear_cache,
+    create_cache_manifest,
+    get_cached_partitions,
+    get_sensor_cache_dir,
+    read_cache,
+    read_cache_manifest,
+    read_cache_partition,
+    write_cache_manifest,
+    write_cache_partition,
+)
+from luftdaten.download import ArchiveDownloader
+from luftdaten.manifest import (
+    create_raw_manifest_entry,
+    get_raw_manifest_filepath,
+    get_raw_manifest_filepaths,
+    get_raw_manifest_signature,
+    read_raw_manifest,
+    write_raw_manifest,
+)
+from luftdaten.missing import (
+    read_missing_days,
+    record_attempts,
+    RetryPolicy,
+    write_missing_days,
 )
 
 
@@ -22,6 +79,53 @@ luftdaten_raw_filename_pattern = '{year}-{month}-{day}_sds011_sensor_{sensor_cod
 
 SENSOR_TYPE = 'sds011'
 
+RAW_DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
+RAW_VALUE_FIELDS = ('P1', 'P2')
+# Where each reading was taken, needed for cleaning
+RAW_LOCATION_FIELDS = ('lat', 'lon')
+
+LUFTDATEN_ARCHIVE_URL = 'http://archive.luftdaten.info'
+
+# Coarser versions of the 24 hour means that can be written for charts
+# which don't need every reading, finest first
+RESOLUTION_TIERS = {
+    '10min': '10min',
+    'hourly': '1H',
+    'daily': '1D',
+}
+
+# Suffix of the compact binary versions of the 24 hour means files
+COMPACT_SUFFIX = '.bin'
+
+# Exceedance episodes are split where readings are further apart than this
+EXCEEDANCE_MAX_GAP = '1H'
+
+# Sensors are combined by their means over periods of this length
+SPATIAL_RESOLUTION = '1H'
+
+# Values outside this range are errors, the upper bound being the value an
+# SDS011 gives when it's saturated
+SDS011_VALUE_RANGE = (0.0, 999.9)
+
+# Values are outliers if they're more than OUTLIER_THRESHOLD scaled MADs
+# (and OUTLIER_MIN_DEVIATION) from the median of their OUTLIER_WINDOW
+OUTLIER_WINDOW = datetime.timedelta(hours=1)
+OUTLIER_THRESHOLD = 5.0
+OUTLIER_MIN_DEVIATION = 10.0
+OUTLIER_MIN_COUNT = 5
+
+# Readings from further than this from where a sensor's latest readings were
+# taken are taken to be from before it was moved. The archive's locations
+# are rounded.
+MAX_LOCATION_DISTANCE_KM = 1.0
+
+# Cleaning that drops more than this share of a sensor's readings is more
+# likely to be a problem with its config than with its readings
+MAX_DROPPED_FRACTION = 0.5
+
+# Mirrored files can be stored gzip compressed, with this suffix added
+COMPRESSED_SUFFIX = '.gz'
+
 
 def get_luftdaten_raw_data_dir(data_dir):
     luftdaten_data_dir = os.path.join(data_dir, 'luftdaten')
@@ -33,6 +137,21 @@ def get_luftdaten_aggregated_data_dir(data_dir):
     return os.path.join(luftdaten_data_dir, 'aggregated')
 
 
+def get_luftdaten_cache_dir(data_dir):
+    luftdaten_data_dir = os.path.join(data_dir, 'luftdaten')
+    return os.path.join(luftdaten_data_dir, 'cache')
+
+
+def get_luftdaten_reports_dir(data_dir):
+    luftdaten_data_dir = os.path.join(data_dir, 'luftdaten')
+    return os.path.join(luftdaten_data_dir, 'reports')
+
+
+def get_luftdaten_sqlite_filepath(data_dir):
+    luftdaten_data_dir = os.path.join(data_dir, 'luftdaten')
+    return os.path.join(luftdaten_data_dir, 'luftdaten.sqlite3')
+
+
 def get_luftdaten_raw_filename(sensor_code, date_):
     """Get the filename of the sensor data file as used in the Luftdaten
     archive."""
@@ -44,45 +163,622 @@ def get_luftdaten_raw_filename(sensor_code, date_):
     )
 
 
-def get_luftdaten_data_url(sensor_code, date_):
+def get_luftdaten_data_url(sensor_code, date_, archive_url=LUFTDATEN_ARCHIVE_URL):
     """Get the url of the data in Luftdaten archive"""
     filename = get_luftdaten_raw_filename(sensor_code, date_)
     date_str = filename.split('_')[0]
-    return "http://archive.luftdaten.info/{date}/{filename}".format(
+    return "{archive_url}/{date}/{filename}".format(
+        archive_url=archive_url,
         date=date_str,
         filename=filename
     )
 
 
+def read_raw_luftdaten_files(filepaths, datetime_field, value_fields):
+    """Reads a set of raw Luftdaten archive files into a single DataFrame.
+
+    Only the datetime and value columns are parsed, values are read as
+    float32 and the frames are concatenated in one go.
+
+    :param filepaths: Paths of the raw archive files to read
+    :type filepaths: list
+    :param datetime_field: Name of the datetime column
+    :type datetime_field: str
+    :param value_fields: Names of the value columns to read
+    :type value_fields: list
+    :returns: DataFrame with the datetime and value columns
+    :rtype: DataFrame"""
+    value_fields = list(value_fields)
+    columns = [datetime_field] + value_fields
+    dtypes = {field: np.float32 for field in value_fields}
+    dtypes[datetime_field] = str
+
+    frames = [
+        pd.read_csv(
+            filepath,
+            delimiter=';',
+            usecols=columns,
+            dtype=dtypes
+        )
+        for filepath in sorted(filepaths)
+    ]
+    if len(frames) == 0:
+        data = pd.DataFrame({
+            column: pd.Series(dtype=dtypes[column]) for column in columns
+        })
+    else:
+        data = pd.concat(frames, ignore_index=True)
+
+    data[datetime_field] = pd.to_datetime(
+        data[datetime_field],
+        format=RAW_DATETIME_FORMAT
+    )
+    return data[columns]
+
+
+def get_raw_filename_date(filename):
+    """Gets the date of a raw Luftdaten archive file from its filename."""
+    date_str = os.path.basename(filename).split('_')[0]
+    return datetime.datetime.strptime(date_str, '%Y-%m-%d').date()
+
+
+def _get_raw_file_signature(filepath):
+    """Size and modification time, used to spot files that have changed
+    since they were cached."""
+    stat = os.stat(filepath)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def update_luftdaten_sensor_cache(
+        luftdaten_raw_data_dir,
+        luftdaten_cache_dir,
+        sensor_code,
+        datetime_field,
+        value_fields=RAW_VALUE_FIELDS,
+        report=None
+):
+    """Ingests raw files that are new, or have changed, since the sensor's
+    cache was last updated.
+
+    New files are appended to their month's partition. A month with a
+    changed file (e.g. a day that was partially mirrored) is rebuilt from
+    its raw files. If a RunReport is given, the parsing of each month is
+    recorded in it.
+
+    :returns: Sorted list of (year, month) partitions that were updated
+    :rtype: list"""
+    value_fields = list(value_fields)
+    sensor_cache_dir = get_sensor_cache_dir(luftdaten_cache_dir, sensor_code)
+    manifest = read_cache_manifest(sensor_cache_dir)
+    if manifest is None or manifest['value_fields'] != value_fields:
+        clear_cache(sensor_cache_dir)
+        manifest = create_cache_manifest(value_fields)
+    consumed_files = manifest['files']
+
+    filepaths_by_month = defaultdict(list)
+    new_filepaths_by_month = defaultdict(list)
+    changed_months = set()
+    signatures = get_existing_raw_luftdaten_files(
+        luftdaten_raw_data_dir,
+        sensor_code
+    )
+    for filepath, signature in signatures.items():
+        filename = get_raw_luftdaten_filename_from_path(filepath)
+        date_ = get_raw_filename_date(filename)
+        yearmonth = (date_.year, date_.month)
+        filepaths_by_month[yearmonth].append(filepath)
+
+        previous_signature = consumed_files.get(filename)
+        if previous_signature == signature:
+            continue
+        if previous_signature is None:
+            new_filepaths_by_month[yearmonth].append(filepath)
+        else:
+            changed_months.add(yearmonth)
+
+    updated_months = sorted(set(new_filepaths_by_month) | changed_months)
+    for year, month in updated_months:
+        cached_data = None
+        if (year, month) in changed_months:
+            filepaths = filepaths_by_month[(year, month)]
+        else:
+            filepaths = new_filepaths_by_month[(year, month)]
+            cached_data = read_cache_partition(
+                sensor_cache_dir, year, month, datetime_field, value_fields
+            )
+
+        with stage(
+                report,
+                'parse_raw_files',
+                sensor=sensor_code,
+                month=get_month_key(year, month)
+        ) as record:
+            data = read_raw_luftdaten_files(
+                filepaths, datetime_field, value_fields
+            )
+            record['files'] = len(filepaths)
+            record['rows'] = len(data)
+        if cached_data is not None:
+            data = pd.concat([cached_data, data], ignore_index=True)
+        write_cache_partition(
+            sensor_cache_dir, year, month, data, datetime_field, value_fields
+        )
+
+        for filepath in filepaths:
+            consumed_files[get_raw_luftdaten_filename_from_path(filepath)] = \
+                signatures[filepath]
+
+    if updated_months:
+        write_cache_manifest(sensor_cache_dir, manifest)
+
+    return updated_months
+
+
+def ingest_raw_luftdaten_files(
+        luftdaten_raw_data_dir,
+        storage,
+        sensor_code,
+        datetime_field,
+        value_fields=RAW_VALUE_FIELDS
+):
+    """Adds raw files that are new, or have changed, since they were last
+    ingested to a store. A changed file's day of readings is replaced.
+
+    :param storage: The store to add the readings to
+    :type storage: Storage
+    :returns: Sorted list of the dates ingested
+    :rtype: list"""
+    ingested_files = storage.get_ingested_files(sensor_code)
+    signatures = {
+        filepath: signature
+        for filepath, signature in get_existing_raw_luftdaten_files(
+            luftdaten_raw_data_dir,
+            sensor_code
+        ).items()
+        if ingested_files.get(get_raw_luftdaten_filename_from_path(filepath))
+        != signature
+    }
+    if len(signatures) == 0:
+        return []
+
+    dates = sorted(
+        get_raw_filename_date(get_raw_luftdaten_filename_from_path(filepath))
+        for filepath in signatures
+    )
+    data = read_raw_luftdaten_files(signatures, datetime_field, value_fields)
+    storage.replace_readings(
+        sensor_code,
+        [(date_, date_ + datetime.timedelta(days=1)) for date_ in dates],
+        data,
+        datetime_field,
+        {
+            get_raw_luftdaten_filename_from_path(filepath): signature
+            for filepath, signature in signatures.items()
+        }
+    )
+    return dates
+
+
 def load_luftdaten_sensor_data(
         luftdaten_raw_data_dir,
         sensor_code,
-        datetime_field
+        datetime_field,
+        value_fields=RAW_VALUE_FIELDS,
+        luftdaten_cache_dir=None,
+        storage=None,
+        start=None,
+        end=None,
+        report=None
 ):
-    """Loads all the raw data for a single luftdaten sensor."""
-    converters = {}
-    converters[datetime_field] = \
-        lambda val: datetime.datetime.strptime(val, "%Y-%m-%dT%H:%M:%S")
+    """Loads all the raw data for a single luftdaten sensor.
+
+    If a cache directory is given, the sensor's cache is brought up to
+    date and the data is read from there. If a store is given instead, new
+    raw files are ingested into it and the data is read from there, only
+    between start and end if given. Otherwise every raw file is parsed.
+    If a RunReport is given, the parsing of raw files is recorded in it."""
+    if storage is not None:
+        ingest_raw_luftdaten_files(
+            luftdaten_raw_data_dir,
+            storage,
+            sensor_code,
+            datetime_field,
+            value_fields
+        )
+        data = storage.read_readings(sensor_code, datetime_field, start, end)
+        return data[[datetime_field] + list(value_fields)].astype(
+            {field: np.float32 for field in value_fields}
+        )
+
+    if luftdaten_cache_dir is not None:
+        update_luftdaten_sensor_cache(
+            luftdaten_raw_data_dir,
+            luftdaten_cache_dir,
+            sensor_code,
+            datetime_field,
+            value_fields,
+            report=report
+        )
+        return read_cache(
+            get_sensor_cache_dir(luftdaten_cache_dir, sensor_code),
+            datetime_field,
+            value_fields
+        )
 
-    # Aggregate the raw data into a single data frame for current sensor
     filepaths = get_existing_raw_luftdaten_filepaths(
         luftdaten_raw_data_dir,
         sensor_code
     )
+    with stage(report, 'parse_raw_files', sensor=sensor_code) as record:
+        data = read_raw_luftdaten_files(filepaths, datetime_field, value_fields)
+        record['files'] = len(filepaths)
+        record['rows'] = len(data)
+    return data
 
-    data = pd.DataFrame()
-    for filepath in filepaths:
-        data = data.append(
-            pd.read_csv(
-                filepath,
-                delimiter=';',
-                converters=converters
+
+def clean_luftdaten_sensor_data(
+        data,
+        datetime_field,
+        value_fields=RAW_VALUE_FIELDS,
+        location=None,
+        counted_months=None
+):
+    """Drops or blanks out a sensor's bad readings:
+
+    - readings with the same timestamp as an earlier reading
+    - readings from further than MAX_LOCATION_DISTANCE_KM from the sensor's
+      latest location, if the data has the RAW_LOCATION_FIELDS
+    - values outside SDS011_VALUE_RANGE
+    - values that are outliers from the other readings in the same
+      OUTLIER_WINDOW period
+
+    Rejected values are set to NaN, and readings with all their values
+    rejected are dropped. Every check only depends on readings in the same
+    month, so months can be cleaned separately.
+
+    :param location: The sensor's latest location, as from
+        get_luftdaten_sensor_reference_location, so that months cleaned
+        separately are judged alike. By default, the location of the latest
+        readings in the data.
+    :type location: LatLongLocation
+    :param counted_months: Only count the readings in these (year, month)
+        pairs, e.g. to leave out a lead in that's counted with its own month
+    :type counted_months: iterable
+    :returns: The cleaned data with only the datetime and value columns, and
+        the number of readings in the data, dropped as duplicates, moved or
+        with all values rejected, location changes and values rejected as
+        out of range or outliers
+    :rtype: tuple"""
+    value_fields = list(value_fields)
+    if not data[datetime_field].is_monotonic_increasing:
+        data = data.sort_values(datetime_field, kind='mergesort')
+    timestamps = data[datetime_field].values.astype('datetime64[ns]') \
+        .view(np.int64)
+    counted = np.ones(len(data), dtype=bool)
+    if counted_months is not None:
+        month_keys = data[datetime_field].dt.year.values * 12 + \
+            data[datetime_field].dt.month.values
+        counted = np.isin(month_keys, [
+            year * 12 + month for year, month in counted_months
+        ])
+
+    duplicates = find_duplicate_timestamps(timestamps)
+    moved = np.zeros(len(data), dtype=bool)
+    location_changes = np.array([], dtype=np.int64)
+    if all(field in data for field in RAW_LOCATION_FIELDS):
+        latitudes, longitudes = [
+            data[field].values for field in RAW_LOCATION_FIELDS
+        ]
+        if location is None:
+            latest_location = find_latest_location(latitudes, longitudes)
+            if latest_location is not None:
+                location = LatLongLocation(*latest_location)
+        if location is not None:
+            moved = find_moved_readings(
+                latitudes,
+                longitudes,
+                location.latitude,
+                location.longitude,
+                MAX_LOCATION_DISTANCE_KM
             )
+        location_changes = find_location_changes(latitudes, longitudes)
+
+    # Duplicates are counted as such even if they were moved too
+    moved &= ~duplicates
+    kept = ~(duplicates | moved)
+    timestamps = timestamps[kept]
+    values = data[value_fields].values[kept].astype(np.float32)
+    out_of_range = find_out_of_range(values, *SDS011_VALUE_RANGE)
+    values[out_of_range] = np.nan
+    outliers = np.zeros(values.shape, dtype=bool)
+    for i in range(len(value_fields)):
+        outliers[:, i] = find_mad_outliers(
+            timestamps,
+            values[:, i],
+            OUTLIER_WINDOW,
+            OUTLIER_THRESHOLD,
+            min_deviation=OUTLIER_MIN_DEVIATION,
+            min_count=OUTLIER_MIN_COUNT
         )
-    return data
+    values[outliers] = np.nan
+    rejected = out_of_range | outliers
+    all_rejected = rejected.any(axis=1) & \
+        (rejected | np.isnan(data[value_fields].values[kept])).all(axis=1)
+
+    cleaned = pd.DataFrame({datetime_field: data[datetime_field].values[kept]})
+    for i, field in enumerate(value_fields):
+        cleaned[field] = values[:, i]
+    cleaned = cleaned[~all_rejected].reset_index(drop=True)
+
+    counted_kept = counted[kept]
+    counts = {
+        'rows': int(counted.sum()),
+        'duplicates': int((duplicates & counted).sum()),
+        'moved': int((moved & counted).sum()),
+        'location_changes': int(counted[location_changes].sum()),
+        'out_of_range': int(out_of_range[counted_kept].sum()),
+        'outliers': int(outliers[counted_kept].sum()),
+        'all_values_rejected': int((all_rejected & counted_kept).sum()),
+    }
+    counts['dropped'] = counts['rows'] - int(
+        (counted_kept & ~all_rejected).sum()
+    )
+    return cleaned, counts
 
 
-def find_start_date_for_sensor(sensor_code, earliest_date=None, latest_date=None, date_has_data_cache=None):
+def get_luftdaten_sensor_reference_location(
+        luftdaten_raw_data_dir,
+        sensor_code,
+        location=None
+):
+    """Where a sensor's readings should have been taken for them to be kept
+    by clean_luftdaten_sensor_data: where its latest mirrored readings with
+    a location were taken. Prints a warning if that's further than
+    MAX_LOCATION_DISTANCE_KM from its configured location, which may be out.
+
+    :param location: The sensor's configured location, used if none of its
+        mirrored readings have a location
+    :type location: LatLongLocation
+    :rtype: LatLongLocation"""
+    filepaths = sorted(
+        get_existing_raw_luftdaten_filepaths(
+            luftdaten_raw_data_dir,
+            sensor_code
+        ),
+        key=get_raw_luftdaten_filename_from_path,
+        reverse=True
+    )
+    latest_location = None
+    for filepath in filepaths:
+        data = read_raw_luftdaten_files(
+            [filepath], 'timestamp', RAW_LOCATION_FIELDS
+        )
+        latest_location = find_latest_location(
+            *[data[field].values for field in RAW_LOCATION_FIELDS]
+        )
+        if latest_location is not None:
+            break
+    if latest_location is None:
+        return location
+
+    if location is not None:
+        distance = haversine_distances(
+            [latest_location[0]],
+            [latest_location[1]],
+            [location.latitude],
+            [location.longitude]
+        )[0, 0]
+        if distance > MAX_LOCATION_DISTANCE_KM:
+            print("WARNING: sensor {} is configured {:.1f} km from where its "
+                  "latest readings were taken, {:.4f},{:.4f}".format(
+                      sensor_code, distance, *latest_location
+                  ))
+    return LatLongLocation(*latest_location)
+
+
+def get_cached_month_fingerprints(luftdaten_cache_dir, sensor_code):
+    """Fingerprints the raw files (names, sizes and modification times)
+    behind each month in a sensor's cache, so callers can tell which months
+    have changed since they were last processed.
+
+    :returns: Dict of (year, month) to fingerprint
+    :rtype: dict"""
+    sensor_cache_dir = get_sensor_cache_dir(luftdaten_cache_dir, sensor_code)
+    manifest = read_cache_manifest(sensor_cache_dir) or {'files': {}}
+
+    files_by_month = defaultdict(list)
+    for filename, signature in manifest['files'].items():
+        date_ = get_raw_filename_date(filename)
+        files_by_month[(date_.year, date_.month)].append([filename] + signature)
+
+    return {
+        yearmonth: hashlib.sha1(
+            json.dumps(sorted(files)).encode('utf-8')
+        ).hexdigest()
+        for yearmonth, files in files_by_month.items()
+    }
+
+
+def _get_previous_month(year, month):
+    return (year - 1, 12) if month == 1 else (year, month - 1)
+
+
+def load_cached_luftdaten_sensor_months(
+        luftdaten_cache_dir,
+        sensor_code,
+        months,
+        datetime_field,
+        value_fields=RAW_VALUE_FIELDS,
+        lead_in=None
+):
+    """Loads some months of a sensor's data from its cache.
+
+    :param months: The (year, month) pairs to load
+    :type months: iterable
+    :param lead_in: Also load this much data from before the start of each
+        month, e.g. for rolling windows which span the month boundary
+    :type lead_in: datetime.timedelta
+    :returns: DataFrame with the datetime and value columns, sorted by time
+    :rtype: DataFrame"""
+    value_fields = list(value_fields)
+    sensor_cache_dir = get_sensor_cache_dir(luftdaten_cache_dir, sensor_code)
+    months = set(months)
+
+    # Months only needed for their tail end, keyed to the month that needs it
+    lead_in_months = {}
+    if lead_in is not None:
+        for year, month in months:
+            previous_month = _get_previous_month(year, month)
+            if previous_month not in months:
+                lead_in_months[previous_month] = \
+                    datetime.datetime(year, month, 1) - lead_in
+
+    frames = []
+    for yearmonth in sorted(months | set(lead_in_months)):
+        data = read_cache_partition(
+            sensor_cache_dir, *yearmonth, datetime_field, value_fields
+        )
+        if data is None:
+            continue
+        if yearmonth in lead_in_months:
+            data = data[data[datetime_field] >= lead_in_months[yearmonth]]
+        frames.append(data)
+
+    if len(frames) == 0:
+        return read_raw_luftdaten_files([], datetime_field, value_fields)
+    return pd.concat(frames, ignore_index=True)
+
+
+def get_month_key(year, month):
+    """Label of a month in reports and the aggregation state, e.g.
+    '2020-01'."""
+    return '{}-{:02d}'.format(year, month)
+
+
+def _get_next_month(year, month):
+    return (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def iter_cached_luftdaten_sensor_months(
+        luftdaten_cache_dir,
+        sensor_code,
+        datetime_field,
+        value_fields=RAW_VALUE_FIELDS,
+        months=None,
+        lead_in=None,
+        report=None
+):
+    """Loads a sensor's data from its cache a month at a time, reading each
+    month once, so only around a month of data is in memory at a time.
+    If a RunReport is given, the reading of each month is recorded in it.
+
+    :param months: The (year, month) pairs to load, or None for every month
+        in the cache
+    :type months: iterable
+    :param lead_in: Also include this much data from before the start of
+        each month, carried over from the month before
+    :type lead_in: datetime.timedelta
+    :returns: Generator of ((year, month), DataFrame) in time order, each
+        DataFrame sorted by time
+    :rtype: generator"""
+    value_fields = list(value_fields)
+    sensor_cache_dir = get_sensor_cache_dir(luftdaten_cache_dir, sensor_code)
+    partitions = get_cached_partitions(sensor_cache_dir)
+    if months is not None:
+        months = set(months)
+        needed_months = set(months)
+        if lead_in is not None:
+            needed_months |= {
+                _get_previous_month(year, month) for year, month in months
+            }
+        partitions = [
+            yearmonth for yearmonth in partitions
+            if yearmonth in needed_months
+        ]
+
+    carried_over = None
+    for year, month in partitions:
+        with stage(
+                report,
+                'read_cache',
+                sensor=sensor_code,
+                month=get_month_key(year, month)
+        ) as record:
+            data = read_cache_partition(
+                sensor_cache_dir, year, month, datetime_field, value_fields
+            )
+            record['rows'] = len(data)
+        if months is None or (year, month) in months:
+            month_data = data
+            if carried_over is not None:
+                month_start = datetime.datetime(year, month, 1)
+                month_data = pd.concat([
+                    carried_over[
+                        carried_over[datetime_field] >= month_start - lead_in
+                    ],
+                    data
+                ], ignore_index=True)
+            yield (year, month), month_data
+
+        if lead_in is not None:
+            next_month_start = datetime.datetime(
+                *_get_next_month(year, month), 1
+            )
+            carried_over = data[
+                data[datetime_field] >= next_month_start - lead_in
+            ]
+
+
+def _check_dates_have_data(
+        sensor_code,
+        dates,
+        date_has_data_cache,
+        downloader,
+        probe_cache,
+        archive_url
+):
+    """Finds which of the dates have an archive file for the sensor, from
+    the caches where possible and otherwise with concurrent HEAD requests.
+
+    Requests that fail (e.g. connection errors) count as no data, but aren't
+    cached."""
+    date_has_data = {}
+    dates_to_request = []
+    for date_ in dates:
+        if date_ not in date_has_data_cache and probe_cache is not None:
+            has_data = probe_cache.get(sensor_code, date_)
+            if has_data is not None:
+                date_has_data_cache[date_] = has_data
+
+        if date_ in date_has_data_cache:
+            date_has_data[date_] = date_has_data_cache[date_]
+        else:
+            dates_to_request.append(date_)
+
+    results = downloader.check([
+        get_luftdaten_data_url(sensor_code, date_, archive_url=archive_url)
+        for date_ in dates_to_request
+    ])
+    for date_, result in zip(dates_to_request, results):
+        date_has_data[date_] = result.ok
+        if result.ok or result.not_found:
+            date_has_data_cache[date_] = result.ok
+            if probe_cache is not None:
+                probe_cache.set(sensor_code, date_, result.ok)
+
+    return date_has_data
+
+
+def find_start_date_for_sensor(
+        sensor_code,
+        earliest_date=None,
+        latest_date=None,
+        date_has_data_cache=None,
+        downloader=None,
+        probe_cache=None,
+        luftdaten_raw_data_dir=None,
+        archive_url=LUFTDATEN_ARCHIVE_URL
+):
     """Finds the date for which data was first available in Luftdaten archives.
 
     Recursive function.
@@ -92,18 +788,45 @@ def find_start_date_for_sensor(sensor_code, earliest_date=None, latest_date=None
     :param earliest_date: The earliest date with data so far
     :param latest_date: The latest date with data so far
     :param date_has_data_cache: Dict of dates to boolean to determine whether date has data
-        (saves redundant calls to api)"""
+        (saves redundant calls to api)
+    :param downloader: Used to check the dates in each round concurrently, a
+        new one is used if not given
+    :type downloader: ArchiveDownloader
+    :param probe_cache: Results of checks from previous runs, which are also
+        added to
+    :type probe_cache: ProbeCache
+    :param luftdaten_raw_data_dir: If given, dates already in the local
+        mirror are known to have data without checking the archive
+    :param archive_url: Base URL of the archive"""
+    if downloader is None:
+        with ArchiveDownloader() as downloader:
+            return find_start_date_for_sensor(
+                sensor_code,
+                earliest_date=earliest_date,
+                latest_date=latest_date,
+                date_has_data_cache=date_has_data_cache,
+                downloader=downloader,
+                probe_cache=probe_cache,
+                luftdaten_raw_data_dir=luftdaten_raw_data_dir,
+                archive_url=archive_url
+            )
+
     first_pass = earliest_date is None and latest_date is None
     earliest_date = earliest_date or datetime.date(2015, 10, 1)
     latest_date = latest_date or datetime.date.today()
     date_has_data_cache = date_has_data_cache or {}
-    print(f"Searching between {earliest_date} and {latest_date}")
+    if luftdaten_raw_data_dir is not None:
+        for filename in get_existing_raw_luftdaten_filenames(
+                luftdaten_raw_data_dir,
+                sensor_code
+        ):
+            date_has_data_cache[get_raw_filename_date(filename)] = True
+    print(f"Sensor {sensor_code}: searching between {earliest_date} and {latest_date}")
 
     # Find a distribution of dates between earliest/latest to check
     # Sometimes a sensor will go offline for day or two so worth checking
     # a spread of dates
     days_diff = (latest_date - earliest_date).days
-    # print("no", sensor_code, days_diff)
 
     dates_sample = set()
     if days_diff == 0:
@@ -131,17 +854,15 @@ def find_start_date_for_sensor(sensor_code, earliest_date=None, latest_date=None
 
     dates_to_check = sorted(list(dates_sample))
 
-    date_has_data = {}
-    for date_ in dates_to_check:
-        if date_ in date_has_data_cache:
-            date_has_data[date_] = date_has_data_cache[date_]
-        else:
-            url = get_luftdaten_data_url(sensor_code, date_)
-            response = requests.get(url)
-            has_data = response.status_code < 400
-            print("Url {} {}".format(url, 'has data' if has_data else 'no data'))
-            date_has_data[date_] = has_data
-            date_has_data_cache[date_] = date_has_data[date_]
+    # All the dates in this round are checked at once
+    date_has_data = _check_dates_have_data(
+        sensor_code,
+        dates_to_check,
+        date_has_data_cache,
+        downloader,
+        probe_cache,
+        archive_url
+    )
 
     if date_has_data[earliest_date]:
         # Earliest date has data, so we have our answer
@@ -169,16 +890,58 @@ def find_start_date_for_sensor(sensor_code, earliest_date=None, latest_date=None
                     sensor_code,
                     earliest_date=last_date_with_missing_data,
                     latest_date=date_,
-                    date_has_data_cache=date_has_data_cache
+                    date_has_data_cache=date_has_data_cache,
+                    downloader=downloader,
+                    probe_cache=probe_cache,
+                    luftdaten_raw_data_dir=luftdaten_raw_data_dir,
+                    archive_url=archive_url
                 )
             last_date_with_missing_data = date_
 
         raise RuntimeError("Shouldn't get here")
 
 
-def get_existing_raw_luftdaten_filepaths(luftdaten_raw_data_dir, sensor_code):
-    """Gets a list of luftdaten filepaths that have been downloaded
-    previously."""
+def find_start_dates_for_sensors(
+        sensor_codes,
+        max_workers=4,
+        downloader=None,
+        probe_cache=None,
+        luftdaten_raw_data_dir=None,
+        archive_url=LUFTDATEN_ARCHIVE_URL
+):
+    """Finds the start dates of many sensors, searching for several at once
+    over a shared downloader.
+
+    :returns: Dict of sensor code to start date (or None if not found)
+    :rtype: dict"""
+    if downloader is None:
+        with ArchiveDownloader() as downloader:
+            return find_start_dates_for_sensors(
+                sensor_codes,
+                max_workers=max_workers,
+                downloader=downloader,
+                probe_cache=probe_cache,
+                luftdaten_raw_data_dir=luftdaten_raw_data_dir,
+                archive_url=archive_url
+            )
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        start_dates = executor.map(
+            lambda sensor_code: find_start_date_for_sensor(
+                sensor_code,
+                downloader=downloader,
+                probe_cache=probe_cache,
+                luftdaten_raw_data_dir=luftdaten_raw_data_dir,
+                archive_url=archive_url
+            ),
+            sensor_codes
+        )
+        return dict(zip(sensor_codes, start_dates))
+
+
+def scan_raw_luftdaten_filepaths(luftdaten_raw_data_dir, sensor_code='*'):
+    """Finds the mirrored files for a sensor (or all sensors by default) by
+    scanning the mirror's directories."""
     filename_glob = luftdaten_raw_filename_pattern.format(
         year='*',
         month='*',
@@ -186,7 +949,140 @@ def get_existing_raw_luftdaten_filepaths(luftdaten_raw_data_dir, sensor_code):
         sensor_code=sensor_code
     )
     filepath_glob = os.path.join(luftdaten_raw_data_dir, "*", filename_glob)
-    return glob.glob(filepath_glob)
+    return glob.glob(filepath_glob) + \
+        glob.glob(filepath_glob + COMPRESSED_SUFFIX)
+
+
+def get_existing_raw_luftdaten_files(luftdaten_raw_data_dir, sensor_code):
+    """Gets the luftdaten files that have been downloaded previously, from
+    the sensor's manifest if it has one.
+
+    :returns: Dict of filepath to the file's [size, modification time]
+    :rtype: dict"""
+    manifest = read_raw_manifest(luftdaten_raw_data_dir, sensor_code)
+    if manifest is None:
+        return {
+            filepath: _get_raw_file_signature(filepath)
+            for filepath in scan_raw_luftdaten_filepaths(
+                luftdaten_raw_data_dir,
+                sensor_code
+            )
+        }
+    return {
+        os.path.join(luftdaten_raw_data_dir, entry['path']):
+            get_raw_manifest_signature(entry)
+        for entry in manifest.values()
+    }
+
+
+def get_existing_raw_luftdaten_filepaths(luftdaten_raw_data_dir, sensor_code):
+    """Gets a list of luftdaten filepaths that have been downloaded
+    previously, from the sensor's manifest if it has one."""
+    manifest = read_raw_manifest(luftdaten_raw_data_dir, sensor_code)
+    if manifest is None:
+        return scan_raw_luftdaten_filepaths(
+            luftdaten_raw_data_dir,
+            sensor_code
+        )
+    return get_raw_manifest_filepaths(luftdaten_raw_data_dir, manifest)
+
+
+def get_raw_filename_sensor_code(filename):
+    """Gets the sensor code of a raw Luftdaten archive file from its
+    filename."""
+    return os.path.splitext(filename)[0].rsplit('_', 1)[1]
+
+
+def rebuild_raw_luftdaten_manifests(luftdaten_raw_data_dir):
+    """Rebuilds the manifests of every sensor from the files in the mirror.
+
+    :returns: Dict of sensor code to the number of files found
+    :rtype: dict"""
+    filepaths_by_sensor = defaultdict(list)
+    for filepath in scan_raw_luftdaten_filepaths(luftdaten_raw_data_dir):
+        filename = get_raw_luftdaten_filename_from_path(filepath)
+        filepaths_by_sensor[get_raw_filename_sensor_code(filename)].append(
+            filepath
+        )
+
+    for sensor_code, filepaths in filepaths_by_sensor.items():
+        write_raw_manifest(luftdaten_raw_data_dir, sensor_code, {
+            get_raw_luftdaten_filename_from_path(filepath):
+                create_raw_manifest_entry(luftdaten_raw_data_dir, filepath)
+            for filepath in filepaths
+        })
+
+    # Drop manifests of sensors with no files left
+    manifest_glob = get_raw_manifest_filepath(luftdaten_raw_data_dir, '*')
+    for filepath in glob.glob(manifest_glob):
+        sensor_code = os.path.splitext(filepath)[0].rsplit('_', 1)[1]
+        if sensor_code not in filepaths_by_sensor:
+            os.remove(filepath)
+
+    return {
+        sensor_code: len(filepaths)
+        for sensor_code, filepaths in filepaths_by_sensor.items()
+    }
+
+
+def update_raw_luftdaten_manifests(luftdaten_raw_data_dir, filepaths):
+    """Adds newly downloaded (or replaced) files to their sensors'
+    manifests. A sensor without a manifest gets one built from the files
+    already in the mirror first."""
+    filepaths_by_sensor = defaultdict(list)
+    for filepath in filepaths:
+        filename = get_raw_luftdaten_filename_from_path(filepath)
+        filepaths_by_sensor[get_raw_filename_sensor_code(filename)].append(
+            filepath
+        )
+
+    for sensor_code, sensor_filepaths in filepaths_by_sensor.items():
+        manifest = read_raw_manifest(luftdaten_raw_data_dir, sensor_code)
+        if manifest is None:
+            manifest = {}
+            sensor_filepaths = scan_raw_luftdaten_filepaths(
+                luftdaten_raw_data_dir,
+                sensor_code
+            )
+        for filepath in sensor_filepaths:
+            manifest[get_raw_luftdaten_filename_from_path(filepath)] = \
+                create_raw_manifest_entry(luftdaten_raw_data_dir, filepath)
+        write_raw_manifest(luftdaten_raw_data_dir, sensor_code, manifest)
+
+
+def update_missing_luftdaten_days(luftdaten_raw_data_dir, results, now=None):
+    """Records the days that failed to download in each sensor's missing
+    days, and forgets the days that have now been downloaded. Failed
+    revalidations of files already in the mirror aren't recorded.
+
+    :param results: Results of downloads
+    :type results: list"""
+    outcomes_by_sensor = defaultdict(dict)
+    for result in results:
+        if result.not_modified:
+            continue
+        if not result.ok and os.path.exists(result.filepath):
+            continue
+        filename = get_raw_luftdaten_filename_from_path(result.filepath)
+        outcomes_by_sensor[get_raw_filename_sensor_code(filename)][
+            get_raw_filename_date(filename)
+        ] = result.status_code
+
+    for sensor_code, outcomes in outcomes_by_sensor.items():
+        missing_days = read_missing_days(luftdaten_raw_data_dir, sensor_code)
+        if record_attempts(missing_days, outcomes, now):
+            write_missing_days(
+                luftdaten_raw_data_dir, sensor_code, missing_days
+            )
+
+
+def get_raw_luftdaten_filename_from_path(filepath):
+    """Gets the archive filename of a mirrored file, which may have been
+    stored compressed."""
+    filename = os.path.basename(filepath)
+    if filename.endswith(COMPRESSED_SUFFIX):
+        filename = filename[:-len(COMPRESSED_SUFFIX)]
+    return filename
 
 
 def get_existing_raw_luftdaten_filenames(luftdaten_raw_data_dir, sensor_code):
@@ -196,13 +1092,36 @@ def get_existing_raw_luftdaten_filenames(luftdaten_raw_data_dir, sensor_code):
         luftdaten_raw_data_dir,
         sensor_code
     )
-    filenames = [os.path.basename(filepath) for filepath in filepaths]
+    filenames = [
+        get_raw_luftdaten_filename_from_path(filepath)
+        for filepath in filepaths
+    ]
     return filenames
 
 
-def download_raw_luftdaten_files(luftdaten_raw_data_dir, sensor):
-    """Downloads a mirror of Luftdaten archive files. Skips
-    files downloaded before."""
+def get_raw_luftdaten_downloads(
+        luftdaten_raw_data_dir,
+        sensor,
+        archive_url=LUFTDATEN_ARCHIVE_URL,
+        revalidate_days=0,
+        compress=False,
+        retry_policy=None
+):
+    """Gets the archive files for a sensor that haven't been downloaded
+    yet. Days that failed to download before are only included when the
+    retry policy says they're due.
+
+    :param revalidate_days: Also include the files already mirrored for
+        this many of the most recent days, as they may have been incomplete
+        when downloaded
+    :type revalidate_days: int
+    :param compress: Whether new files should be stored gzip compressed
+    :type compress: bool
+    :param retry_policy: Which failed days to request again, the default
+        RetryPolicy if None
+    :type retry_policy: RetryPolicy
+    :returns: List of (url, filepath) pairs, in date order
+    :rtype: list"""
     sensor_code = sensor.code
 
     # Find which files have been downloaded already and make a list of
@@ -210,103 +1129,584 @@ def download_raw_luftdaten_files(luftdaten_raw_data_dir, sensor):
     start_date = sensor.start_date
     end_date = datetime.date.today()
     date_delta = end_date - start_date
+    revalidate_from = end_date - datetime.timedelta(days=revalidate_days)
+    if retry_policy is None:
+        retry_policy = RetryPolicy()
+    missing_days = read_missing_days(luftdaten_raw_data_dir, sensor_code)
+    now = datetime.datetime.utcnow()
+
+    existing_filepaths = {
+        get_raw_luftdaten_filename_from_path(filepath): filepath
+        for filepath in get_existing_raw_luftdaten_filepaths(
+            luftdaten_raw_data_dir,
+            sensor_code
+        )
+    }
 
-    required_filenames_list = []
+    downloads = []
     for date_offset in range(date_delta.days):
-        requried_date = start_date + datetime.timedelta(days=date_offset)
-        required_filenames_list.append(
-            get_luftdaten_raw_filename(
-                sensor_code,
-                requried_date
+        required_date = start_date + datetime.timedelta(days=date_offset)
+        filename = get_luftdaten_raw_filename(sensor_code, required_date)
+        if filename in existing_filepaths:
+            if required_date < revalidate_from:
+                continue
+            # Revalidate in place, keeping the format it was stored in
+            filepath = existing_filepaths[filename]
+        elif not retry_policy.is_due(
+                required_date,
+                missing_days.get(required_date),
+                end_date,
+                now
+        ):
+            continue
+        else:
+            filepath = os.path.join(
+                luftdaten_raw_data_dir,
+                filename.split('_')[0],
+                filename + (COMPRESSED_SUFFIX if compress else '')
             )
-        )
-    required_filenames = set(required_filenames_list)
 
+        downloads.append((
+            get_luftdaten_data_url(sensor_code, required_date, archive_url),
+            filepath
+        ))
+    return downloads
+
+
+def get_luftdaten_sensor_coverage(
+        luftdaten_raw_data_dir,
+        sensor,
+        retry_policy=None,
+        today=None
+):
+    """Which of a sensor's days, from its start date up to yesterday, are
+    in the mirror.
+
+    Days are present if they've been downloaded, missing if the retry
+    policy has given up on them, and pending otherwise: never attempted,
+    or failed but still to be requested again.
+
+    :param retry_policy: The policy downloads are made with, the default
+        RetryPolicy if None
+    :type retry_policy: RetryPolicy
+    :param today: The current date, today by default
+    :type today: datetime.date
+    :returns: Dict of the sensor code, the number of days in each state
+        and the (first, last) date ranges of missing days, with the number
+        of pending days that have failed before as 'failed'
+    :rtype: dict"""
+    if retry_policy is None:
+        retry_policy = RetryPolicy()
+    if today is None:
+        today = datetime.date.today()
     existing_filenames = set(
         get_existing_raw_luftdaten_filenames(
             luftdaten_raw_data_dir,
-            sensor_code
+            sensor.code
         )
     )
+    missing_days = read_missing_days(luftdaten_raw_data_dir, sensor.code)
+
+    coverage = {
+        'code': sensor.code,
+        'start_date': sensor.start_date.isoformat(),
+        'days': 0,
+        'present': 0,
+        'missing': 0,
+        'pending': 0,
+        'failed': 0,
+        'missing_ranges': [],
+    }
+    missing_ranges = coverage['missing_ranges']
+    previous_missing = None
+    for date_offset in range((today - sensor.start_date).days):
+        date_ = sensor.start_date + datetime.timedelta(days=date_offset)
+        coverage['days'] += 1
+        filename = get_luftdaten_raw_filename(sensor.code, date_)
+        record = missing_days.get(date_)
+        if filename in existing_filenames:
+            coverage['present'] += 1
+            continue
+        if retry_policy.is_given_up(date_, record, today):
+            coverage['missing'] += 1
+            if previous_missing == date_ - datetime.timedelta(days=1):
+                missing_ranges[-1][1] = date_.isoformat()
+            else:
+                missing_ranges.append([date_.isoformat(), date_.isoformat()])
+            previous_missing = date_
+            continue
+        coverage['pending'] += 1
+        if record is not None:
+            coverage['failed'] += 1
+    return coverage
+
+
+def _run_downloads(luftdaten_raw_data_dir, downloads, downloader=None,
+                   report=None):
+    """Runs downloads, reporting any that failed, and adds the files
+    downloaded to the mirror's manifests. If a RunReport is given, the
+    downloads and each file's bytes, requests and time are recorded in it."""
+    if downloader is None:
+        with ArchiveDownloader() as downloader:
+            return _run_downloads(
+                luftdaten_raw_data_dir,
+                downloads,
+                downloader,
+                report
+            )
 
-    filenames_to_download = required_filenames - existing_filenames
+    for url, _ in downloads:
+        print("Downloading {}".format(url))
 
-    for filename in filenames_to_download:
-        date_str = filename.split('_')[0]
-        url = "http://archive.luftdaten.info/{date}/{filename}".format(
-            date=date_str,
-            filename=filename
+    with stage(report, 'download', files=len(downloads)) as record:
+        results = downloader.download(downloads)
+        record['bytes'] = sum(result.size for result in results)
+        record['requests'] = sum(result.attempts for result in results)
+        record['failed'] = sum(
+            not result.ok and not result.not_modified for result in results
         )
-        filepath = os.path.join(luftdaten_raw_data_dir, date_str, filename)
-        os.makedirs(os.path.dirname(filepath), exist_ok=True)
-        # logger.info("Downloading {}".format(url))
-        print("Downloading {}".format(url))
-        reponse = requests.get(url)
-        if reponse.status_code == requests.codes.ok:
-            with open(filepath, 'w') as file_:
-                file_.write(reponse.text)
-        else:
+    if report is not None:
+        report.add_stages([
+            {
+                'stage': 'download_file',
+                'url': result.url,
+                'status_code': result.status_code,
+                'bytes': result.size,
+                'requests': result.attempts,
+                'seconds': round(result.seconds, 6),
+            }
+            for result in results
+        ])
+    for result in results:
+        if not result.ok and not result.not_modified:
             print(
-                "WARNING: {url} download failed with http status code"
-                " {status_code}".format(
-                    url=url,
-                    status_code=reponse.status_code
+                "WARNING: {url} download failed with {reason}".format(
+                    url=result.url,
+                    reason=(
+                        "http status code {}".format(result.status_code)
+                        if result.status_code is not None
+                        else "error {}".format(result.error)
+                    )
                 )
             )
 
+    update_raw_luftdaten_manifests(
+        luftdaten_raw_data_dir,
+        [result.filepath for result in results if result.ok]
+    )
+    update_missing_luftdaten_days(luftdaten_raw_data_dir, results)
+
     print("Downloading done")
+    return results
 
 
-def download_luftdaten_data(luftdaten_raw_data_dir, luftdaten_sensors):
+def download_raw_luftdaten_files(
+        luftdaten_raw_data_dir,
+        sensor,
+        downloader=None,
+        archive_url=LUFTDATEN_ARCHIVE_URL,
+        revalidate_days=0,
+        compress=False,
+        report=None,
+        retry_policy=None
+):
+    """Downloads a mirror of Luftdaten archive files. Skips
+    files downloaded before, apart from the last revalidate_days which are
+    revalidated with conditional requests, and days that failed before
+    which the retry policy doesn't say to request again.
+
+    :param downloader: Downloader to use, a default one is created if None
+    :type downloader: ArchiveDownloader
+    :param retry_policy: Which failed days to request again
+    :type retry_policy: RetryPolicy
+    :param report: Report to record the downloads in
+    :type report: RunReport
+    :returns: A result for each file requested
+    :rtype: list"""
+    downloads = get_raw_luftdaten_downloads(
+        luftdaten_raw_data_dir,
+        sensor,
+        archive_url,
+        revalidate_days,
+        compress,
+        retry_policy
+    )
+    return _run_downloads(
+        luftdaten_raw_data_dir, downloads, downloader, report
+    )
+
+
+def download_luftdaten_data(
+        luftdaten_raw_data_dir,
+        luftdaten_sensors,
+        downloader=None,
+        archive_url=LUFTDATEN_ARCHIVE_URL,
+        revalidate_days=0,
+        compress=False,
+        report=None,
+        retry_policy=None
+):
+    """Downloads the missing archive files for all the sensors, sharing
+    one pool of downloads between them, recording them in report if given.
+    Days that failed before are requested again as retry_policy says."""
+    downloads = []
     for sensor in luftdaten_sensors:
-        download_raw_luftdaten_files(
-            luftdaten_raw_data_dir,
-            sensor
+        downloads.extend(
+            get_raw_luftdaten_downloads(
+                luftdaten_raw_data_dir,
+                sensor,
+                archive_url,
+                revalidate_days,
+                compress,
+                retry_policy
+            )
         )
+    return _run_downloads(
+        luftdaten_raw_data_dir, downloads, downloader, report
+    )
+
+
+def _get_summary_path(filepath):
+    """Path of an output file relative to the root of the site."""
+    return filepath[3:] if filepath.startswith('../') else filepath
 
 
 def _create_month_summary(month, filepath):
     """Dict summary of the information about a month's data."""
-    summary_filepath = filepath[3:] \
-        if filepath.startswith('../') else filepath
     return {
         'month': month,
         'month_name': calendar.month_name[month],
-        'path': summary_filepath
+        'path': _get_summary_path(filepath)
     }
 
 
+def _get_24_hour_means_filepath(
+        luftdaten_aggregated_data_dir,
+        sensor_code,
+        year,
+        month,
+        tier=None
+):
+    output_filename = '{year}_{month:02d}_{sensor_type}_sensor_' \
+        '{sensor_code}_24_hour_means{tier}.csv'.format(
+            year=year,
+            month=month,
+            sensor_type=SENSOR_TYPE,
+            sensor_code=sensor_code,
+            tier='' if tier is None else '_' + tier
+        )
+    return os.path.join(
+        luftdaten_aggregated_data_dir,
+        '24_hour_means',
+        output_filename
+    )
+
+
+def get_24_hour_means_signature(
+        luftdaten_aggregated_data_dir,
+        sensor_code,
+        year,
+        month,
+        tier=None
+):
+    """Size and modification time of a month's 24 hour means file, or of
+    one of its resolution tiers, which change whenever it's rewritten.
+
+    :returns: The signature, None if the month hasn't been written
+    :rtype: list"""
+    filepath = _get_24_hour_means_filepath(
+        luftdaten_aggregated_data_dir, sensor_code, year, month, tier
+    )
+    if not os.path.exists(filepath):
+        return None
+    return _get_raw_file_signature(filepath)
+
+
+def read_24_hour_means_month(
+        luftdaten_aggregated_data_dir,
+        sensor_code,
+        year,
+        month,
+        datetime_field,
+        value_fields=RAW_VALUE_FIELDS,
+        tier=None
+):
+    """Reads a month of a sensor's 24 hour means back from its file, or
+    from the file of one of its resolution tiers, with values as float32 as
+    they were written.
+
+    :param tier: A name in RESOLUTION_TIERS, None for every mean
+    :type tier: str
+    :returns: DataFrame of the means sorted by time, None if the month
+        (or its tier) hasn't been written
+    :rtype: DataFrame"""
+    filepath = _get_24_hour_means_filepath(
+        luftdaten_aggregated_data_dir, sensor_code, year, month, tier
+    )
+    if not os.path.exists(filepath):
+        return None
+    value_fields = list(value_fields)
+    data = pd.read_csv(
+        filepath,
+        usecols=[datetime_field] + value_fields,
+        dtype={field: np.float32 for field in value_fields}
+    )
+    data[datetime_field] = pd.to_datetime(data[datetime_field])
+    return data[[datetime_field] + value_fields]
+
+
+def _split_24_hour_means_by_yearmonth(df_24_hour_means, datetime_field):
+    """Adds year and month columns and splits the means, which are sorted
+    by time, into a contiguous block per month."""
+    timestamps = df_24_hour_means[datetime_field].dt
+    df_24_hour_means['year'] = timestamps.year.values
+    df_24_hour_means['month'] = timestamps.month.values
+    return split_by_year_month(
+        df_24_hour_means,
+        df_24_hour_means['year'].values,
+        df_24_hour_means['month'].values
+    )
+
+
+def _write_24_hour_means_month(
+        luftdaten_aggregated_data_dir,
+        sensor_code,
+        year,
+        month,
+        data_by_date,
+        value_fields,
+        datetime_field,
+        tier=None,
+        decimals=None,
+        compact=False,
+        storage=None
+):
+    """Writes a month of 24 hour means as CSV, and optionally a compact
+    binary file and to a store too.
+
+    :returns: The summary paths of the files written, by format
+    :rtype: dict"""
+    output_filepath = _get_24_hour_means_filepath(
+        luftdaten_aggregated_data_dir, sensor_code, year, month, tier
+    )
+    os.makedirs(os.path.dirname(output_filepath), exist_ok=True)
+    if decimals is not None:
+        data_by_date = data_by_date.round(decimals)
+    data_by_date.to_csv(output_filepath, index=False)
+    paths = {'csv': _get_summary_path(output_filepath)}
+
+    if compact:
+        compact_filepath = \
+            os.path.splitext(output_filepath)[0] + COMPACT_SUFFIX
+        write_compact_file(
+            compact_filepath,
+            data_by_date,
+            datetime_field,
+            value_fields,
+            decimals=decimals
+        )
+        paths['compact'] = _get_summary_path(compact_filepath)
+
+    if storage is not None:
+        storage.write_rolling_means(
+            sensor_code,
+            year,
+            month,
+            data_by_date,
+            datetime_field,
+            resolution=tier
+        )
+
+    return paths
+
+
 def write_24_hour_mean_aggregated_data_files(
     luftdaten_aggregated_data_dir,
     sensor_code,
     data,
     value_fields,
-    datetime_field
+    datetime_field,
+    months=None,
+    resolution_tiers=None,
+    decimals=None,
+    compact=False,
+    storage=None,
+    report=None,
+    means=None
 ):
     """Writes 24 hour mean aggregated data files to disk based on the raw
     data for a sensor.
 
-    Produces aggregate output split out for each month"""
-    df_24_hour_means = create_24_hour_means(
-        raw_data=data,
-        value_column=value_fields,
-        date_column=datetime_field
+    Produces aggregate output split out for each month. If months is given,
+    only those (year, month) files are written, any other data is only used
+    for the rolling means at the start of those months.
+
+    resolution_tiers can name tiers from RESOLUTION_TIERS (e.g. 'hourly')
+    to also write coarser files for each month, with a mean at the end of
+    each period rather than for every reading. These are listed in the
+    month's summary, coarsest last, so charts can fetch the smallest file
+    with enough detail.
+
+    Values are rounded to decimals places if given. If compact is True
+    each file also has a compact binary version (see data.compact), and
+    the month's summary lists the files by format. If a store is given the
+    means are written to it as well. If a RunReport is given, the time taken
+    to aggregate the data and to write each month is recorded in it. means
+    can give the 24 hour means of data if they've been created already,
+    e.g. for write_exceedance_data_files too."""
+    if means is None:
+        with stage(
+                report, 'aggregate_24_hour_means', sensor=sensor_code
+        ) as record:
+            df_24_hour_means = create_24_hour_means(
+                raw_data=data,
+                value_column=value_fields,
+                date_column=datetime_field
+            )
+            record['rows'] = len(data)
+    else:
+        # The year and month columns are added to a copy, not the caller's
+        df_24_hour_means = means.copy(deep=False)
+    data_24_hour_by_yearmonth = _split_24_hour_means_by_yearmonth(
+        df_24_hour_means,
+        datetime_field
     )
 
-    df_24_hour_means = add_month_year_columns(df_24_hour_means, datetime_field)
-    data_24_hour_by_yearmonth = df_24_hour_means.groupby(
-        [
-            df_24_hour_means['year'],
-            df_24_hour_means['month']
-        ]
+    years_to_months = defaultdict(list)
+    month_infos = {}
+    for (year, month), data_by_date in data_24_hour_by_yearmonth:
+        if months is not None and (year, month) not in months:
+            continue
+
+        with stage(
+                report,
+                'write_24_hour_means',
+                sensor=sensor_code,
+                month=get_month_key(year, month)
+        ) as record:
+            paths = _write_24_hour_means_month(
+                luftdaten_aggregated_data_dir,
+                sensor_code,
+                year,
+                month,
+                data_by_date,
+                value_fields,
+                datetime_field,
+                decimals=decimals,
+                compact=compact,
+                storage=storage
+            )
+            record['rows'] = len(data_by_date)
+
+        month_info = _create_month_summary(month, paths['csv'])
+        if compact:
+            month_info['formats'] = paths
+        years_to_months[year].append(month_info)
+        month_infos[(year, month)] = month_info
+
+    tier_order = list(RESOLUTION_TIERS)
+    for tier in sorted(resolution_tiers or [], key=tier_order.index):
+        resolution = RESOLUTION_TIERS[tier]
+        with stage(
+                report,
+                'aggregate_24_hour_means',
+                sensor=sensor_code,
+                tier=tier
+        ) as record:
+            df_tier_means = create_24_hour_means(
+                raw_data=data,
+                value_column=value_fields,
+                date_column=datetime_field,
+                resolution=resolution
+            )
+            record['rows'] = len(data)
+        for (year, month), data_by_date in _split_24_hour_means_by_yearmonth(
+                df_tier_means,
+                datetime_field
+        ):
+            # Periods ending at midnight on the 1st can spill into a month
+            # without any readings of its own
+            if (year, month) not in month_infos:
+                continue
+
+            with stage(
+                    report,
+                    'write_24_hour_means',
+                    sensor=sensor_code,
+                    month=get_month_key(year, month),
+                    tier=tier
+            ) as record:
+                paths = _write_24_hour_means_month(
+                    luftdaten_aggregated_data_dir,
+                    sensor_code,
+                    year,
+                    month,
+                    data_by_date,
+                    value_fields,
+                    datetime_field,
+                    tier=tier,
+                    decimals=decimals,
+                    compact=compact,
+                    storage=storage
+                )
+                record['rows'] = len(data_by_date)
+
+            tier_info = {
+                'name': tier,
+                'resolution_seconds': int(
+                    pd.Timedelta(resolution).total_seconds()
+                ),
+                'path': paths['csv']
+            }
+            if compact:
+                tier_info['formats'] = paths
+            month_infos[(year, month)].setdefault('tiers', []).append(
+                tier_info
+            )
+
+    return years_to_months
+
+
+def write_aggregated_dayofweek_data_files(
+    luftdaten_aggregated_data_dir,
+    sensor_code,
+    data,
+    value_fields,
+    datetime_field,
+    months=None,
+    decimals=None,
+    storage=None,
+    report=None
+):
+    """Writes day of week aggregated data files to disk based on the raw
+    data for a sensor.
+
+    Produces aggregate output split out for each month. If months is given,
+    only those (year, month) files are written. Values are rounded to
+    decimals places if given. If a store is given the means are written to
+    it as well. If a RunReport is given, the time taken to aggregate the
+    data and to write each month is recorded in it."""
+    # Means by day/hour for every month at once
+    with stage(report, 'aggregate_day_of_week', sensor=sensor_code) as record:
+        means_by_month = create_monthly_hourly_means_by_weekday_and_hour(
+            raw_data=data,
+            value_column=value_fields,
+            date_column=datetime_field
+        )
+        record['rows'] = len(data)
+    means_by_yearmonth = split_by_year_month(
+        means_by_month,
+        means_by_month['year'].values,
+        means_by_month['month'].values
     )
 
     years_to_months = defaultdict(list)
-    for (yearmonth, data_by_date) in data_24_hour_by_yearmonth:
-        year, month = yearmonth
+    for (year, month), mean_by_weekday_and_hour in means_by_yearmonth:
+        if months is not None and (year, month) not in months:
+            continue
 
         output_filename = '{year}_{month:02d}_{sensor_type}_sensor_' \
-            '{sensor_code}_24_hour_means.csv'.format(
+            '{sensor_code}_by_weekday_by_hour.csv'.format(
                 year=year,
                 month=month,
                 sensor_type=SENSOR_TYPE,
@@ -314,11 +1714,27 @@ def write_24_hour_mean_aggregated_data_files(
             )
         output_filepath = os.path.join(
             luftdaten_aggregated_data_dir,
-            '24_hour_means',
+            'weekday_by_hour',
             output_filename
         )
-        os.makedirs(os.path.dirname(output_filepath), exist_ok=True)
-        data_by_date.to_csv(output_filepath, index=False)
+        with stage(
+                report,
+                'write_day_of_week',
+                sensor=sensor_code,
+                month=get_month_key(year, month)
+        ):
+            os.makedirs(os.path.dirname(output_filepath), exist_ok=True)
+            if decimals is not None:
+                mean_by_weekday_and_hour = \
+                    mean_by_weekday_and_hour.round(decimals)
+            mean_by_weekday_and_hour.to_csv(output_filepath, index=False)
+            if storage is not None:
+                storage.write_weekday_hour_means(
+                    sensor_code,
+                    year,
+                    month,
+                    mean_by_weekday_and_hour
+                )
 
         month_info = _create_month_summary(month, output_filepath)
         years_to_months[year].append(month_info)
@@ -326,66 +1742,393 @@ def write_24_hour_mean_aggregated_data_files(
     return years_to_months
 
 
-def write_aggregated_dayofweek_data_files(
-    luftdaten_aggregated_data_dir,
-    sensor_code,
-    data,
-    value_fields,
-    datetime_field
+def load_luftdaten_sensor_bucket_means(
+        luftdaten_cache_dir,
+        sensor_code,
+        datetime_field,
+        value_fields=RAW_VALUE_FIELDS,
+        resolution=SPATIAL_RESOLUTION,
+        months=None,
+        clean=False,
+        location=None
 ):
-    """Writes day of week aggregated data files to disk based on the raw
-    data for a sensor.
+    """Loads the means of a sensor's readings over periods of a given
+    length from its cache, reading a month at a time.
+
+    :param months: The (year, month) pairs to load, or None for every month
+    :type months: iterable
+    :param clean: Whether to clean each month's readings first, with
+        clean_luftdaten_sensor_data. The cache needs the RAW_LOCATION_FIELDS
+        for readings from other locations to be dropped.
+    :type clean: bool
+    :param location: The sensor's latest location, for cleaning
+    :type location: LatLongLocation
+    :returns: DataFrame of means indexed by the start of each period
+    :rtype: DataFrame"""
+    value_fields = list(value_fields)
+    read_fields = value_fields
+    if clean:
+        read_fields = value_fields + list(RAW_LOCATION_FIELDS)
+    frames = []
+    for yearmonth, data in iter_cached_luftdaten_sensor_months(
+            luftdaten_cache_dir,
+            sensor_code,
+            datetime_field,
+            read_fields,
+            months=months
+    ):
+        if clean:
+            data, _ = clean_luftdaten_sensor_data(
+                data, datetime_field, value_fields, location=location
+            )
+        frames.append(create_bucket_means(
+            data, value_fields, datetime_field, resolution
+        ))
+    if len(frames) == 0:
+        return pd.DataFrame(
+            {field: pd.Series(dtype=np.float32) for field in value_fields},
+            index=pd.DatetimeIndex([], name=datetime_field)
+        )
+    return pd.concat(frames)
 
-    Produces aggregate output split out for each month."""
-    data = add_month_year_columns(data, datetime_field)
 
-    data_by_yearmonth = data.groupby([data['year'], data['month']])
-    years_to_months = defaultdict(list)
-    for (yearmonth, data_by_date) in data_by_yearmonth:
-        year, month = yearmonth
+def _get_composite_slug(name):
+    return re.sub('[^a-z0-9]+', '_', name.lower()).strip('_')
 
-        if not isinstance(month, int):
-            print(
-                "WARNING: Expected month to be int, instead got "
-                "{val} ({type_})".format(val=month, type_=type(month))
+
+def _create_spatial_composites(
+        sensors,
+        matrices,
+        value_fields,
+        cluster_distance_km,
+        points
+):
+    """Works out the composite series across sensors.
+
+    :returns: List of (summary info, DataFrame) for each composite"""
+    codes = list(matrices[value_fields[0]].columns)
+    locations_by_code = {sensor.code: sensor.location for sensor in sensors}
+    latitudes = np.array(
+        [locations_by_code[code].latitude for code in codes]
+    )
+    longitudes = np.array(
+        [locations_by_code[code].longitude for code in codes]
+    )
+
+    def create_means_frame(columns):
+        frame = pd.DataFrame(index=matrices[value_fields[0]].index)
+        for field in value_fields:
+            composite = create_composite_means(
+                matrices[field].iloc[:, columns]
             )
-            if isinstance(month, np.int64):
-                month = int(month)
-            elif isinstance(month, np.float64):
-                if month == np.floor(month):
-                    # Can safely convert to int
-                    month = int(month)
-
-            if not isinstance(month, int):
-                raise ValueError(
-                    "Expected month to be int, instead got "
-                    "{val} ({type_})".format(val=month, type_=type(month))
+            frame[field + '_mean'] = composite['mean']
+            frame[field + '_median'] = composite['median']
+            frame[field + '_sensors'] = composite['sensors']
+        return frame
+
+    composites = [(
+        {'name': 'citywide', 'kind': 'citywide', 'sensors': codes},
+        create_means_frame(np.arange(len(codes)))
+    )]
+
+    if cluster_distance_km is not None:
+        clusters = cluster_locations(latitudes, longitudes, cluster_distance_km)
+        for cluster in range(clusters.max() + 1 if len(codes) else 0):
+            columns = np.flatnonzero(clusters == cluster)
+            composites.append(({
+                'name': 'area_{}'.format(cluster + 1),
+                'kind': 'area',
+                'sensors': [codes[column] for column in columns],
+                'location': {
+                    'latitude': float(latitudes[columns].mean()),
+                    'longitude': float(longitudes[columns].mean()),
+                },
+            }, create_means_frame(columns)))
+
+    if points:
+        names = list(points)
+        weights = create_idw_weights(
+            latitudes,
+            longitudes,
+            [points[name].latitude for name in names],
+            [points[name].longitude for name in names]
+        )
+        values_by_field = {
+            field: interpolate(matrices[field], weights)
+            for field in value_fields
+        }
+        for index, name in enumerate(names):
+            composites.append(({
+                'name': 'point_{}'.format(_get_composite_slug(name)),
+                'kind': 'point',
+                'point': name,
+                'sensors': codes,
+                'location': {
+                    'latitude': points[name].latitude,
+                    'longitude': points[name].longitude,
+                },
+            }, pd.DataFrame(
+                {
+                    field: values_by_field[field][:, index].astype(
+                        np.float32
+                    )
+                    for field in value_fields
+                },
+                index=matrices[value_fields[0]].index
+            )))
+
+    return composites
+
+
+def write_spatial_aggregated_data_files(
+    luftdaten_aggregated_data_dir,
+    sensors,
+    bucket_means_by_sensor,
+    value_fields,
+    datetime_field,
+    cluster_distance_km=None,
+    points=None,
+    months=None,
+    decimals=None
+):
+    """Writes composite series across many sensors, split out for each
+    month.
+
+    The sensors' bucket means are aligned into a matrix per value field,
+    and composites are taken over it: the mean and median of every sensor
+    ('citywide'), of the sensors in each area where sensors within
+    cluster_distance_km of each other are grouped, and values at points
+    interpolated by inverse distance weighting.
+
+    :param sensors: The sensors, for their locations
+    :type sensors: list
+    :param bucket_means_by_sensor: Dict of sensor code to its means per
+        period, as from load_luftdaten_sensor_bucket_means. Sensors without
+        any are left out.
+    :type bucket_means_by_sensor: dict
+    :param points: Dict of name to LatLongLocation of points to
+        interpolate values at
+    :type points: dict
+    :param months: Only write these (year, month) files if given
+    :type months: iterable
+    :returns: Summary info of each composite, including the years/months
+        written for it in available_dates
+    :rtype: list"""
+    value_fields = list(value_fields)
+    bucket_means_by_sensor = {
+        code: means for code, means in bucket_means_by_sensor.items()
+        if len(means) > 0
+    }
+    if len(bucket_means_by_sensor) == 0:
+        return []
+    matrices = {
+        field: create_sensor_matrix(bucket_means_by_sensor, field)
+        for field in value_fields
+    }
+    composites = _create_spatial_composites(
+        sensors, matrices, value_fields, cluster_distance_km, points
+    )
+
+    timestamps = matrices[value_fields[0]].index
+    for info, frame in composites:
+        frame = frame.reset_index().rename(
+            columns={'index': datetime_field}
+        )
+        if decimals is not None:
+            frame = frame.round(decimals)
+
+        years_to_months = defaultdict(list)
+        for (year, month), data_by_month in split_by_year_month(
+                frame, timestamps.year, timestamps.month
+        ):
+            if months is not None and (year, month) not in months:
+                continue
+
+            output_filepath = os.path.join(
+                luftdaten_aggregated_data_dir,
+                'spatial',
+                '{year}_{month:02d}_{name}_hourly_means.csv'.format(
+                    year=year,
+                    month=month,
+                    name=info['name']
                 )
+            )
+            os.makedirs(os.path.dirname(output_filepath), exist_ok=True)
+            data_by_month.to_csv(output_filepath, index=False)
+            years_to_months[year].append(
+                _create_month_summary(month, output_filepath)
+            )
+        info['available_dates'] = years_to_months
+
+    return [info for info, _ in composites]
+
+
+def _find_sensor_exceedances(means, value_fields, datetime_field):
+    """Finds the episodes over each limit in a sensor's 24 hour means,
+    split at the start of each month.
+
+    :returns: DataFrame with a row per episode, sorted by start
+    :rtype: DataFrame"""
+    timestamps = means[datetime_field].values.astype('datetime64[ns]') \
+        .view(np.int64)
+    month_keys = means[datetime_field].dt.year.values * 12 + \
+        means[datetime_field].dt.month.values
+    month_starts = np.concatenate([[False], np.diff(month_keys) != 0])
+
+    frames = []
+    for field in value_fields:
+        for limit, threshold in sorted(LIMITS.get(field, {}).items()):
+            episodes = find_exceedance_episodes(
+                timestamps,
+                means[field].values,
+                threshold,
+                max_gap=pd.Timedelta(EXCEEDANCE_MAX_GAP).value,
+                breaks=month_starts
+            )
+            frames.append(pd.DataFrame({
+                'field': field,
+                'limit': limit,
+                'threshold': threshold,
+                'start': pd.to_datetime(episodes['start']),
+                'end': pd.to_datetime(episodes['end']),
+                'peak': episodes['peak'],
+                'duration_hours': np.round(
+                    (episodes['end'] - episodes['start']) /
+                    pd.Timedelta('1H').value,
+                    2
+                ),
+            }))
+    if len(frames) == 0:
+        return pd.DataFrame(columns=[
+            'field', 'limit', 'threshold', 'start', 'end', 'peak',
+            'duration_hours'
+        ])
+    return pd.concat(frames, ignore_index=True) \
+        .sort_values('start', kind='mergesort') \
+        .reset_index(drop=True)
+
+
+def _create_sensor_daily_bands(means, value_fields, datetime_field):
+    """Works out the highest 24 hour mean of each field on each day and its
+    Daily Air Quality Index band, and the day's band over all fields.
+
+    :returns: DataFrame with a row per day
+    :rtype: DataFrame"""
+    band_fields = [field for field in value_fields if field in DAQI_BANDS]
+    timestamps = means[datetime_field].values.astype('datetime64[ns]') \
+        .view(np.int64)
+    day_starts, maximums = create_daily_maximums(
+        timestamps,
+        means[band_fields].values.reshape(len(means), len(band_fields))
+    )
 
-        # Means by day/hour
-        mean_by_weekday_and_hour = create_hourly_means_by_weekday_and_hour(
-            raw_data=data_by_date,
-            value_column=value_fields,
-            date_column=datetime_field
+    daily = pd.DataFrame({'date': pd.to_datetime(day_starts).date})
+    bands = np.zeros(len(daily), dtype=np.int64)
+    for i, field in enumerate(band_fields):
+        field_bands = get_daqi_bands(maximums[:, i], DAQI_BANDS[field])
+        daily[field + '_max_24_hour_mean'] = \
+            maximums[:, i].astype(means[field].dtype)
+        daily[field + '_band'] = field_bands
+        bands = np.maximum(bands, field_bands)
+    daily['band'] = bands
+    daily['band_name'] = [DAQI_BAND_NAMES[band] for band in bands]
+    return daily
+
+
+def write_exceedance_data_files(
+    luftdaten_aggregated_data_dir,
+    sensor_code,
+    data,
+    value_fields,
+    datetime_field,
+    months=None,
+    report=None,
+    means=None
+):
+    """Writes the episodes where a sensor's 24 hour means were over the
+    limits in data.events.LIMITS, and the Daily Air Quality Index band of
+    each day from its highest 24 hour means, split out for each month.
+
+    Episodes are split at the start of each month, so a month's episodes
+    don't depend on the months either side, and where readings are further
+    apart than EXCEEDANCE_MAX_GAP. If months is given, only those
+    (year, month) files are written. means can give the 24 hour means of
+    data if they've been created already.
+
+    :returns: The years/months written, each month's info giving the
+        number of episodes over each limit and the month's highest band
+    :rtype: dict"""
+    value_fields = list(value_fields)
+    with stage(report, 'aggregate_exceedances', sensor=sensor_code) as record:
+        if means is None:
+            means = create_24_hour_means(
+                raw_data=data,
+                value_column=value_fields,
+                date_column=datetime_field
+            )
+        episodes = _find_sensor_exceedances(
+            means, value_fields, datetime_field
         )
-        mean_by_weekday_and_hour['year'] = year
-        mean_by_weekday_and_hour['month'] = month
-        output_filename = '{year}_{month:02d}_{sensor_type}_sensor_' \
-            '{sensor_code}_by_weekday_by_hour.csv'.format(
+        daily = _create_sensor_daily_bands(
+            means, value_fields, datetime_field
+        )
+        record['rows'] = len(data)
+
+    episode_months = episodes['start'].dt.year.values * 12 + \
+        episodes['start'].dt.month.values
+    day_dates = pd.to_datetime(daily['date'])
+    years_to_months = defaultdict(list)
+    for (year, month), daily_by_month in split_by_year_month(
+            daily, day_dates.dt.year.values, day_dates.dt.month.values
+    ):
+        if months is not None and (year, month) not in months:
+            continue
+
+        filename_prefix = '{year}_{month:02d}_{sensor_type}_sensor_' \
+            '{sensor_code}'.format(
                 year=year,
                 month=month,
                 sensor_type=SENSOR_TYPE,
                 sensor_code=sensor_code
             )
-        output_filepath = os.path.join(
+        episodes_filepath = os.path.join(
             luftdaten_aggregated_data_dir,
-            'weekday_by_hour',
-            output_filename
+            'exceedances',
+            filename_prefix + '_exceedances.csv'
+        )
+        daily_filepath = os.path.join(
+            luftdaten_aggregated_data_dir,
+            'daily_aqi',
+            filename_prefix + '_daily_aqi.csv'
         )
-        os.makedirs(os.path.dirname(output_filepath), exist_ok=True)
-        mean_by_weekday_and_hour.to_csv(output_filepath, index=False)
+        episodes_by_month = episodes[episode_months == year * 12 + month]
+        with stage(
+                report,
+                'write_exceedances',
+                sensor=sensor_code,
+                month=get_month_key(year, month)
+        ):
+            for filepath, frame in [
+                    (episodes_filepath, episodes_by_month),
+                    (daily_filepath, daily_by_month)
+            ]:
+                os.makedirs(os.path.dirname(filepath), exist_ok=True)
+                # Times are kept even where they're all at midnight
+                frame.to_csv(
+                    filepath, index=False, date_format='%Y-%m-%d %H:%M:%S'
+                )
 
-        month_info = _create_month_summary(month, output_filepath)
+        month_info = _create_month_summary(month, episodes_filepath)
+        month_info['daily_aqi_path'] = _get_summary_path(daily_filepath)
+        month_info['episodes'] = {
+            '{}_{}'.format(field, limit): int(np.sum(
+                (episodes_by_month['field'] == field) &
+                (episodes_by_month['limit'] == limit)
+            ))
+            for field in value_fields
+            for limit in sorted(LIMITS.get(field, {}))
+        }
+        month_info['max_band'] = int(daily_by_month['band'].max())
         years_to_months[year].append(month_info)
 
     return years_to_months
@@ -0,0 +1,492 @@
+"""Discovery of the sds011 sensors in an area from the Luftdaten archive's
+daily directory listings.
+
+Each day's listing names the files of every sensor with data that day, so
+scanning the listings gives the first and last day each sensor was seen.
+A sensor's location is read from the start of one of its files. Both are
+kept in a ListingIndex, so a repeat scan only requests the days and reads
+the sensors it hasn't seen before."""
+import bisect
+import datetime
+import json
+import os
+import re
+
+import numpy as np
+
+from data.spatial import haversine_distances
+from luftdaten.data import (
+    get_luftdaten_data_url,
+    LUFTDATEN_ARCHIVE_URL,
+    SENSOR_TYPE,
+)
+from luftdaten.download import write_chunks_atomically
+
+
+# The first day in the archive
+ARCHIVE_START_DATE = datetime.date(2015, 10, 1)
+
+# Listings of the last few days can still be growing
+DEFAULT_RECENT_DAYS = 2
+
+# Enough of a file for its header and first reading
+LOCATION_MAX_BYTES = 1024
+
+# Listings and files are requested, and the index saved, in batches this
+# many times the number of download workers
+BATCH_FACTOR = 4
+
+LISTING_FILENAME_PATTERN = re.compile(
+    r'href="(?:[^"]*/)?\d{4}-\d{2}-\d{2}_' + SENSOR_TYPE +
+    r'_sensor_(\d+)\.csv"'
+)
+
+
+def get_listing_url(date_, archive_url=LUFTDATEN_ARCHIVE_URL):
+    return '{}/{}/'.format(archive_url, date_.isoformat())
+
+
+def parse_listing_sensor_codes(listing):
+    """Gets the codes of the sensors with an sds011 file in a day's
+    directory listing. Indoor sensors' files are left out.
+
+    :param listing: HTML of the listing
+    :type listing: str
+    :rtype: set"""
+    return {
+        int(sensor_code)
+        for sensor_code in LISTING_FILENAME_PATTERN.findall(listing)
+    }
+
+
+def parse_sensor_location(content):
+    """Gets a sensor's location from the start of one of its archive files.
+
+    :param content: The header and at least one reading of the file
+    :type content: str
+    :returns: (latitude, longitude) of the first reading that has one, None
+        if none of them do
+    :rtype: tuple"""
+    lines = content.splitlines()
+    if not lines:
+        return None
+    header = lines[0].split(';')
+    if 'lat' not in header or 'lon' not in header:
+        return None
+    lat_index = header.index('lat')
+    lon_index = header.index('lon')
+    for line in lines[1:]:
+        fields = line.split(';')
+        try:
+            return float(fields[lat_index]), float(fields[lon_index])
+        except (IndexError, ValueError):
+            # Missing, or the line was cut off
+            continue
+    return None
+
+
+class ListingIndex(object):
+    """On disk record of the archive listings scanned, with the first and
+    last day each sensor was seen, its location and its start date if the
+    days before it was first seen have been checked.
+
+    Days are scanned again if they were less than recent_days old when last
+    scanned, as sensors' files can still be added to them."""
+    def __init__(self, filepath=None, recent_days=DEFAULT_RECENT_DAYS):
+        self.filepath = filepath
+        self.recent_days = recent_days
+        self.scanned = {}
+        self.first_seen = {}
+        self.last_seen = {}
+        self.locations = {}
+        self.start_dates = {}
+        if filepath is not None and os.path.exists(filepath):
+            with open(filepath, 'r') as file_:
+                index = json.load(file_)
+            self.scanned = {
+                datetime.date.fromisoformat(date_str):
+                    datetime.date.fromisoformat(scanned_on)
+                for date_str, scanned_on in index['scanned'].items()
+            }
+            for name in ('first_seen', 'last_seen'):
+                setattr(self, name, {
+                    int(sensor_code): datetime.date.fromisoformat(date_str)
+                    for sensor_code, date_str in index[name].items()
+                })
+            self.locations = {
+                int(sensor_code): (
+                    None if location is None else tuple(location),
+                    datetime.date.fromisoformat(read_from)
+                )
+                for sensor_code, (location, read_from)
+                in index['locations'].items()
+            }
+            self.start_dates = {
+                int(sensor_code): (
+                    datetime.date.fromisoformat(start_date),
+                    datetime.date.fromisoformat(first_seen)
+                )
+                for sensor_code, (start_date, first_seen)
+                in index.get('start_dates', {}).items()
+            }
+        self._scanned_dates = sorted(self.scanned)
+
+    def needs_scan(self, date_):
+        scanned_on = self.scanned.get(date_)
+        return scanned_on is None or \
+            (scanned_on - date_).days < self.recent_days
+
+    def add_listing(self, date_, sensor_codes, scanned_on=None):
+        """Records the sensors with files for a day."""
+        if date_ not in self.scanned:
+            bisect.insort(self._scanned_dates, date_)
+        self.scanned[date_] = scanned_on or datetime.date.today()
+        for sensor_code in sensor_codes:
+            if self.first_seen.get(sensor_code, date_) >= date_:
+                self.first_seen[sensor_code] = date_
+            if self.last_seen.get(sensor_code, date_) <= date_:
+                self.last_seen[sensor_code] = date_
+
+    def get_previous_scanned_date(self, date_):
+        """The last day scanned before date_, None if there isn't one."""
+        i = bisect.bisect_left(self._scanned_dates, date_)
+        return self._scanned_dates[i - 1] if i > 0 else None
+
+    def needs_location(self, sensor_code):
+        """Whether a sensor's location hasn't been read, or couldn't be and
+        it's been seen on a later day since."""
+        if sensor_code not in self.locations:
+            return True
+        location, read_from = self.locations[sensor_code]
+        return location is None and \
+            self.last_seen[sensor_code] > read_from
+
+    def set_location(self, sensor_code, location, read_from):
+        """Records a sensor's location, as read from its file for the day
+        read_from, None if it didn't have one."""
+        self.locations[sensor_code] = (location, read_from)
+
+    def get_location(self, sensor_code):
+        location, _ = self.locations.get(sensor_code, (None, None))
+        return location
+
+    def get_start_date(self, sensor_code):
+        """A sensor's start date, None if it hasn't been found or the
+        sensor has since been seen earlier."""
+        start_date, first_seen = self.start_dates.get(
+            sensor_code, (None, None)
+        )
+        if first_seen != self.first_seen.get(sensor_code):
+            return None
+        return start_date
+
+    def set_start_date(self, sensor_code, start_date):
+        self.start_dates[sensor_code] = (
+            start_date, self.first_seen[sensor_code]
+        )
+
+    def save(self):
+        if self.filepath is None:
+            return
+        content = json.dumps(
+            {
+                'scanned': {
+                    date_.isoformat(): scanned_on.isoformat()
+                    for date_, scanned_on in self.scanned.items()
+                },
+                'first_seen': {
+                    str(sensor_code): date_.isoformat()
+                    for sensor_code, date_ in self.first_seen.items()
+                },
+                'last_seen': {
+                    str(sensor_code): date_.isoformat()
+                    for sensor_code, date_ in self.last_seen.items()
+                },
+                'locations': {
+                    str(sensor_code): [
+                        None if location is None else list(location),
+                        read_from.isoformat()
+                    ]
+                    for sensor_code, (location, read_from)
+                    in self.locations.items()
+                },
+                'start_dates': {
+                    str(sensor_code): [
+                        start_date.isoformat(), first_seen.isoformat()
+                    ]
+                    for sensor_code, (start_date, first_seen)
+                    in self.start_dates.items()
+                },
+            },
+            sort_keys=True,
+            separators=(',', ':')
+        )
+        write_chunks_atomically(self.filepath, [content.encode('utf-8')])
+
+
+class SearchArea(object):
+    """A bounding box, a circle, or both, which sensors must be inside.
+
+    :param bounding_box: (min latitude, min longitude, max latitude,
+        max longitude)
+    :type bounding_box: tuple
+    :param centre: Centre of the circle
+    :type centre: LatLongLocation
+    :param radius_km: Radius of the circle"""
+    def __init__(self, bounding_box=None, centre=None, radius_km=None):
+        if bounding_box is None and centre is None:
+            raise ValueError("Expected a bounding box or a centre and radius")
+        if (centre is None) != (radius_km is None):
+            raise ValueError("Expected both a centre and a radius")
+        self.bounding_box = bounding_box
+        self.centre = centre
+        self.radius_km = radius_km
+
+    def contains(self, latitudes, longitudes):
+        """Which of the points are inside the area.
+
+        :returns: Boolean array with an element per point
+        :rtype: ndarray"""
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+        inside = np.ones(len(latitudes), dtype=bool)
+        if self.bounding_box is not None:
+            min_lat, min_lon, max_lat, max_lon = self.bounding_box
+            inside &= (latitudes >= min_lat) & (latitudes <= max_lat) & \
+                (longitudes >= min_lon) & (longitudes <= max_lon)
+        if self.centre is not None and len(latitudes):
+            distances = haversine_distances(
+                latitudes,
+                longitudes,
+                [self.centre.latitude],
+                [self.centre.longitude]
+            )[:, 0]
+            inside &= distances <= self.radius_km
+        return inside
+
+
+def _batches(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def scan_archive_listings(
+        index,
+        downloader,
+        dates,
+        archive_url=LUFTDATEN_ARCHIVE_URL
+):
+    """Scans the listings of the days that aren't in the index yet (or
+    were scanned while still recent) into it, saving it after each batch so
+    an interrupted scan can carry on where it left off.
+
+    :param index: The index to add to
+    :type index: ListingIndex
+    :param downloader: Requests the listings concurrently
+    :type downloader: ArchiveDownloader
+    :param dates: The days to scan
+    :type dates: list
+    :returns: The number of listings requested
+    :rtype: int"""
+    dates = [date_ for date_ in dates if index.needs_scan(date_)]
+    batch_size = downloader.max_workers * BATCH_FACTOR
+    scanned = 0
+    for batch in _batches(dates, batch_size):
+        results = downloader.fetch_texts([
+            get_listing_url(date_, archive_url) for date_ in batch
+        ])
+        for date_, result in zip(batch, results):
+            if result.ok:
+                index.add_listing(
+                    date_, parse_listing_sensor_codes(result.content)
+                )
+            elif result.not_found:
+                # A day the archive has nothing for
+                index.add_listing(date_, [])
+            else:
+                print("WARNING: {} listing failed with {}".format(
+                    result.url, result.status_code or result.error
+                ))
+        index.save()
+        scanned += len(batch)
+        print("Scanned {} of {} listings".format(scanned, len(dates)))
+    return len(dates)
+
+
+def read_sensor_locations(
+        index,
+        downloader,
+        sensor_codes,
+        archive_url=LUFTDATEN_ARCHIVE_URL
+):
+    """Reads the locations of the sensors the index doesn't have one for
+    from the start of their files for the last day they were seen, saving
+    the index after each batch.
+
+    :returns: The number of files requested
+    :rtype: int"""
+    sensor_codes = [
+        sensor_code for sensor_code in sensor_codes
+        if index.needs_location(sensor_code)
+    ]
+    batch_size = downloader.max_workers * BATCH_FACTOR
+    for batch in _batches(sensor_codes, batch_size):
+        dates = [index.last_seen[sensor_code] for sensor_code in batch]
+        results = downloader.fetch_texts(
+            [
+                get_luftdaten_data_url(sensor_code, date_, archive_url)
+                for sensor_code, date_ in zip(batch, dates)
+            ],
+            max_bytes=LOCATION_MAX_BYTES
+        )
+        for sensor_code, date_, result in zip(batch, dates, results):
+            if result.ok:
+                index.set_location(
+                    sensor_code, parse_sensor_location(result.content), date_
+                )
+            else:
+                print("WARNING: {} failed with {}".format(
+                    result.url, result.status_code or result.error
+                ))
+        index.save()
+    return len(sensor_codes)
+
+
+def find_sensor_start_date(
+        index,
+        downloader,
+        sensor_code,
+        earliest_date=ARCHIVE_START_DATE,
+        archive_url=LUFTDATEN_ARCHIVE_URL
+):
+    """The first day a sensor has data, checking the days between the
+    first one it was seen on and the day scanned before that, which weren't
+    scanned themselves. Days before earliest_date aren't checked, and the
+    start date found is kept in the index."""
+    start_date = index.get_start_date(sensor_code)
+    if start_date is not None:
+        return start_date
+    first_seen = index.first_seen[sensor_code]
+    previous_scanned = index.get_previous_scanned_date(first_seen)
+    # Unless the days checked are cut short by earliest_date, the start
+    # date found is right for as long as first_seen stays the same
+    conclusive = previous_scanned is not None and \
+        previous_scanned >= earliest_date - datetime.timedelta(days=1)
+    if previous_scanned is None:
+        previous_scanned = earliest_date - datetime.timedelta(days=1)
+    dates = [
+        previous_scanned + datetime.timedelta(days=offset)
+        for offset in range(1, (first_seen - previous_scanned).days)
+    ]
+    dates = [date_ for date_ in dates if date_ >= earliest_date]
+    results = downloader.check([
+        get_luftdaten_data_url(sensor_code, date_, archive_url)
+        for date_ in dates
+    ])
+    start_date = next(
+        (date_ for date_, result in zip(dates, results) if result.ok),
+        first_seen
+    )
+    if conclusive and all(
+            result.ok or result.not_found for result in results):
+        index.set_start_date(sensor_code, start_date)
+    return start_date
+
+
+def discover_sensors(
+        index,
+        downloader,
+        area,
+        start_date=ARCHIVE_START_DATE,
+        end_date=None,
+        step_days=1,
+        archive_url=LUFTDATEN_ARCHIVE_URL
+):
+    """Finds the sds011 sensors in an area from the archive's listings.
+
+    Sensors are placed where their files for the last day they were seen
+    put them. With step_days over 1 only every so many days' listings are
+    scanned, and the days in between are only checked for the sensors in
+    the area to find their start dates.
+
+    :param index: Listings scanned and locations read before, which are
+        added to
+    :type index: ListingIndex
+    :param downloader: Makes the requests concurrently
+    :type downloader: ArchiveDownloader
+    :param area: Area the sensors must be in
+    :type area: SearchArea
+    :param start_date: First day to scan, sensors with data before it are
+        given it as their start date
+    :type start_date: datetime.date
+    :param end_date: Last day to scan, yesterday by default
+    :type end_date: datetime.date
+    :returns: Dicts of each sensor's code, start date, latitude and
+        longitude, in code order
+    :rtype: list"""
+    if end_date is None:
+        end_date = datetime.date.today() - datetime.timedelta(days=1)
+    dates = [
+        start_date + datetime.timedelta(days=offset)
+        for offset in range(0, (end_date - start_date).days + 1, step_days)
+    ]
+    if dates and dates[-1] != end_date:
+        dates.append(end_date)
+
+    scan_archive_listings(index, downloader, dates, archive_url)
+
+    # Only the sensors seen in the days asked for, although the index may
+    # have others from earlier scans
+    sensor_codes = sorted(
+        sensor_code for sensor_code, last_seen in index.last_seen.items()
+        if last_seen >= start_date and
+        index.first_seen[sensor_code] <= end_date
+    )
+    read_sensor_locations(index, downloader, sensor_codes, archive_url)
+
+    located = [
+        (sensor_code, index.get_location(sensor_code))
+        for sensor_code in sensor_codes
+        if index.get_location(sensor_code) is not None
+    ]
+    inside = area.contains(
+        [location[0] for _, location in located],
+        [location[1] for _, location in located]
+    )
+
+    sensors = []
+    for (sensor_code, (latitude, longitude)), is_inside in \
+            zip(located, inside):
+        if not is_inside:
+            continue
+        sensors.append({
+            'code': sensor_code,
+            'start_date': max(
+                find_sensor_start_date(
+                    index, downloader, sensor_code, start_date, archive_url
+                ),
+                start_date
+            ),
+            'latitude': latitude,
+            'longitude': longitude,
+        })
+    index.save()
+    return sensors
+
+
+def format_sensor_config(sensors):
+    """Formats sensors as entries for the luftdaten section of the sensors
+    config file, named after their codes.
+
+    :param sensors: Dicts as from discover_sensors
+    :type sensors: list
+    :rtype: str"""
+    return '\n'.join(
+        '    {code}:\n'
+        '      name: Sensor {code}\n'
+        '      start_date: {start_date}\n'
+        '      location:\n'
+        '        latitude: {latitude:.4f}\n'
+        '        longitude: {longitude:.4f}\n'.format(**sensor)
+        for sensor in sensors
+    )
@@ -0,0 +1,370 @@
+"""Concurrent downloads of Luftdaten archive files."""
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+import gzip
+import json
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+# Responses worth trying again, anything else (e.g. 404) is final
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+CHUNK_SIZE = 64 * 1024
+
+
+def write_chunks_atomically(filepath, chunks):
+    """Streams chunks of bytes to a temporary file alongside the target and
+    renames it into place, so an interrupted write never leaves a truncated
+    file behind. Files ending in .gz are gzip compressed."""
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    temp_filepath = filepath + '.part'
+    open_ = gzip.open if filepath.endswith('.gz') else open
+    # Opened outside the try, so a file that can't be created isn't removed
+    file_ = open_(temp_filepath, 'wb')
+    try:
+        with file_:
+            for chunk in chunks:
+                file_.write(chunk)
+    except BaseException:
+        os.remove(temp_filepath)
+        raise
+    os.replace(temp_filepath, filepath)
+
+
+class ValidatorIndex(object):
+    """Sidecar index of the ETag and Last-Modified validators of downloaded
+    files, so they can be revalidated with conditional requests."""
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self._lock = threading.Lock()
+        self._validators = {}
+        if os.path.exists(filepath):
+            with open(filepath, 'r') as file_:
+                self._validators = json.load(file_)
+
+    def get(self, url):
+        with self._lock:
+            return self._validators.get(url)
+
+    def set(self, url, validators):
+        with self._lock:
+            self._validators[url] = validators
+
+    def save(self):
+        with self._lock:
+            content = json.dumps(self._validators, sort_keys=True)
+        write_chunks_atomically(self.filepath, [content.encode('utf-8')])
+
+
+class ProbeCache(object):
+    """On disk record of which sensors have archive files for which dates,
+    so searches don't repeat requests between runs.
+
+    Files that exist are remembered for good. Files that were missing are
+    checked again once the result is older than negative_ttl seconds, as the
+    archive can still add them."""
+    def __init__(self, filepath, negative_ttl=24 * 60 * 60):
+        self.filepath = filepath
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        self._probes = {}
+        if os.path.exists(filepath):
+            with open(filepath, 'r') as file_:
+                self._probes = json.load(file_)
+
+    @staticmethod
+    def _key(sensor_code, date_):
+        return '{}/{}'.format(sensor_code, date_.isoformat())
+
+    def get(self, sensor_code, date_):
+        """Whether the sensor has a file for the date, or None if unknown
+        (or too old to rely on)."""
+        with self._lock:
+            probe = self._probes.get(self._key(sensor_code, date_))
+        if probe is None:
+            return None
+        exists, checked_at = probe
+        if not exists and time.time() - checked_at > self.negative_ttl:
+            return None
+        return exists
+
+    def set(self, sensor_code, date_, exists):
+        with self._lock:
+            self._probes[self._key(sensor_code, date_)] = [exists, time.time()]
+
+    def save(self):
+        with self._lock:
+            content = json.dumps(self._probes, sort_keys=True)
+        write_chunks_atomically(self.filepath, [content.encode('utf-8')])
+
+
+class DownloadResult(object):
+    """The outcome of downloading a single file.
+
+    size is the number of bytes received, seconds the time taken over all
+    the attempts made. content is the text of files fetched into memory."""
+    def __init__(self, url, filepath, status_code=None, error=None, size=0,
+                 seconds=None, attempts=1, content=None):
+        self.url = url
+        self.filepath = filepath
+        self.status_code = status_code
+        self.error = error
+        self.size = size
+        self.seconds = seconds
+        self.attempts = attempts
+        self.content = content
+
+    @property
+    def ok(self):
+        return self.status_code == requests.codes.ok
+
+    @property
+    def not_modified(self):
+        return self.status_code == requests.codes.not_modified
+
+    @property
+    def not_found(self):
+        return self.status_code == requests.codes.not_found
+
+
+class ArchiveDownloader(object):
+    """Downloads files concurrently over a shared, pooled HTTP session.
+
+    At most max_per_host requests are in flight to any one host. Connection
+    errors and server errors are retried with exponential backoff. Responses
+    are streamed to disk.
+
+    Files that already exist are revalidated with a conditional request,
+    using the validators recorded in the ValidatorIndex if one is given, or
+    else the file's modification time. The index is saved on close."""
+    def __init__(
+            self,
+            max_workers=8,
+            max_per_host=4,
+            retries=3,
+            backoff=0.5,
+            timeout=60,
+            validators=None
+    ):
+        self.max_workers = max_workers
+        self.max_per_host = max_per_host
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.validators = validators
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._host_semaphores = {}
+        self._host_semaphores_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.session.close()
+        if self.validators is not None:
+            self.validators.save()
+
+    def _get_host_semaphore(self, url):
+        host = urlsplit(url).netloc
+        with self._host_semaphores_lock:
+            if host not in self._host_semaphores:
+                self._host_semaphores[host] = \
+                    threading.BoundedSemaphore(self.max_per_host)
+            return self._host_semaphores[host]
+
+    def _get_conditional_headers(self, url, filepath):
+        if not os.path.exists(filepath):
+            return {}
+
+        validators = self.validators.get(url) \
+            if self.validators is not None else None
+        if not validators:
+            return {
+                'If-Modified-Since': formatdate(
+                    os.path.getmtime(filepath), usegmt=True
+                )
+            }
+
+        headers = {}
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
+        return headers
+
+    def _fetch(self, url, filepath):
+        """Requests a file and streams it to disk if it was sent.
+
+        :returns: The status code and the number of bytes received"""
+        headers = self._get_conditional_headers(url, filepath)
+        with self._get_host_semaphore(url):
+            with self.session.get(
+                    url,
+                    headers=headers,
+                    timeout=self.timeout,
+                    stream=True
+            ) as response:
+                size = 0
+                if response.status_code == requests.codes.ok:
+                    def counted_chunks():
+                        nonlocal size
+                        for chunk in response.iter_content(CHUNK_SIZE):
+                            size += len(chunk)
+                            yield chunk
+
+                    # Content-Encoding (e.g. gzip) is decoded as it streams
+                    write_chunks_atomically(filepath, counted_chunks())
+                    if self.validators is not None:
+                        self.validators.set(url, {
+                            'etag': response.headers.get('ETag'),
+                            'last_modified':
+                                response.headers.get('Last-Modified'),
+                        })
+                return response.status_code, size
+
+    def _head(self, url):
+        """Requests just the headers for a file.
+
+        :returns: The status code and the number of bytes received"""
+        with self._get_host_semaphore(url):
+            response = self.session.head(
+                url,
+                timeout=self.timeout,
+                allow_redirects=True
+            )
+            return response.status_code, 0
+
+    def _get_text(self, url, max_bytes=None):
+        """Requests a file into memory, only up to max_bytes of it if given.
+
+        :returns: The status code, the number of bytes received and the
+            text, None unless the file was sent"""
+        headers = {}
+        if max_bytes is not None:
+            headers['Range'] = 'bytes=0-{}'.format(max_bytes - 1)
+        with self._get_host_semaphore(url):
+            with self.session.get(
+                    url,
+                    headers=headers,
+                    timeout=self.timeout,
+                    stream=True
+            ) as response:
+                # Servers that ignore the range send the whole file, of
+                # which only the start is read
+                if response.status_code not in (
+                        requests.codes.ok, requests.codes.partial_content):
+                    return response.status_code, 0, None
+                content = bytearray()
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    content.extend(chunk)
+                    if max_bytes is not None and len(content) >= max_bytes:
+                        del content[max_bytes:]
+                        break
+                text = content.decode('utf-8', errors='replace')
+                return requests.codes.ok, len(content), text
+
+    def _with_retries(self, url, filepath, request):
+        """Makes a request, retrying where it might help."""
+        start = time.perf_counter()
+        result = None
+        for attempt in range(self.retries + 1):
+            if attempt > 0:
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+
+            try:
+                status_code, size = request()
+            except requests.RequestException as exc:
+                result = DownloadResult(url, filepath, error=exc)
+                continue
+
+            result = DownloadResult(url, filepath, status_code, size=size)
+            if status_code not in RETRY_STATUS_CODES:
+                break
+
+        result.attempts = attempt + 1
+        result.seconds = time.perf_counter() - start
+        return result
+
+    def download_file(self, url, filepath):
+        """Downloads a single file, retrying where it might help.
+
+        :returns: The outcome of the download
+        :rtype: DownloadResult"""
+        return self._with_retries(
+            url, filepath, lambda: self._fetch(url, filepath)
+        )
+
+    def check_file(self, url):
+        """Checks whether a file exists with a HEAD request, without
+        downloading it.
+
+        :returns: The outcome of the request, ok if the file exists
+        :rtype: DownloadResult"""
+        return self._with_retries(url, None, lambda: self._head(url))
+
+    def fetch_text(self, url, max_bytes=None):
+        """Requests a file into memory, e.g. a directory listing, retrying
+        where it might help. With max_bytes, only the start of the file is
+        requested.
+
+        :returns: The outcome of the request, with the text in its content
+            if it was ok
+        :rtype: DownloadResult"""
+        texts = []
+
+        def request():
+            status_code, size, text = self._get_text(url, max_bytes)
+            texts.append(text)
+            return status_code, size
+
+        result = self._with_retries(url, None, request)
+        result.content = texts[-1] if texts else None
+        return result
+
+    def fetch_texts(self, urls, max_bytes=None):
+        """Requests many files into memory concurrently.
+
+        :returns: A result for each URL, in the same order
+        :rtype: list"""
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(
+                lambda url: self.fetch_text(url, max_bytes),
+                urls
+            ))
+
+    def check(self, urls):
+        """Checks whether many files exist concurrently.
+
+        :param urls: URLs of the files to check
+        :type urls: list
+        :returns: A result for each URL, in the same order
+        :rtype: list"""
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(self.check_file, urls))
+
+    def download(self, downloads):
+        """Downloads many files concurrently.
+
+        :param downloads: (url, filepath) pairs to download
+        :type downloads: list
+        :returns: A result for each download, in the same order
+        :rtype: list"""
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(
+                lambda download: self.download_file(*download),
+                downloads
+            ))
@@ -0,0 +1,599 @@
+"""Polling of the live Luftdaten API, which gives each sensor's readings
+from the last 5 minutes, to keep the current month's aggregates up to date
+between the daily archive files.
+
+Live readings are appended to day files in the archive's format, laid out
+as the raw mirror is, in their own directory. They're only used for days
+the archive doesn't have a file for yet, and removed once it does."""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import datetime
+import glob
+import json
+import os
+import random
+import time
+
+import numpy as np
+import pandas as pd
+import requests
+
+from data.dataframe import create_24_hour_means
+from luftdaten.data import (
+    clean_luftdaten_sensor_data,
+    get_existing_raw_luftdaten_filepaths,
+    get_luftdaten_raw_filename,
+    get_luftdaten_sensor_reference_location,
+    get_raw_filename_date,
+    get_raw_luftdaten_filename_from_path,
+    luftdaten_raw_filename_pattern,
+    RAW_DATETIME_FORMAT,
+    RAW_LOCATION_FIELDS,
+    RAW_VALUE_FIELDS,
+    read_raw_luftdaten_files,
+    write_24_hour_mean_aggregated_data_files,
+    write_aggregated_dayofweek_data_files,
+    write_exceedance_data_files,
+)
+from luftdaten.download import write_chunks_atomically
+
+
+LUFTDATEN_API_URL = 'http://api.luftdaten.info/v1/sensor'
+LIVE_SENSOR_TYPE = 'SDS011'
+LIVE_DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# The API gives the readings of the last 5 minutes
+DEFAULT_POLL_INTERVAL = 5 * 60
+DEFAULT_JITTER = 30
+DEFAULT_CONCURRENCY = 8
+DEFAULT_MAX_PENDING = 64
+
+# Columns of the live day files, before the value fields, as in the archive
+LIVE_LEADING_FIELDS = ['sensor_id', 'sensor_type', 'location', 'lat', 'lon',
+                       'timestamp']
+
+# The 24 hour means at the start of a month need the day before
+LIVE_LEAD_IN = datetime.timedelta(days=1)
+
+
+def get_luftdaten_live_data_dir(data_dir):
+    luftdaten_data_dir = os.path.join(data_dir, 'luftdaten')
+    return os.path.join(luftdaten_data_dir, 'live')
+
+
+def get_luftdaten_live_url(sensor_code, api_url=LUFTDATEN_API_URL):
+    """Get the url of a sensor's latest readings in the live API"""
+    return '{api_url}/{sensor_code}/'.format(
+        api_url=api_url,
+        sensor_code=sensor_code
+    )
+
+
+def _get_live_filepath(luftdaten_live_data_dir, sensor_code, date_):
+    filename = get_luftdaten_raw_filename(sensor_code, date_)
+    return os.path.join(
+        luftdaten_live_data_dir,
+        filename.split('_')[0],
+        filename
+    )
+
+
+def get_live_luftdaten_filepaths(luftdaten_live_data_dir, sensor_code):
+    """Gets the live day files kept for a sensor, in date order."""
+    filename_glob = luftdaten_raw_filename_pattern.format(
+        year='*',
+        month='*',
+        day='*',
+        sensor_code=sensor_code
+    )
+    return sorted(glob.glob(
+        os.path.join(luftdaten_live_data_dir, '*', filename_glob)
+    ))
+
+
+def parse_live_readings(items, value_fields=RAW_VALUE_FIELDS):
+    """Reads the readings of a sensor from the live API's JSON, in the
+    columns of the archive files.
+
+    :param items: The API's list of readings
+    :type items: list
+    :returns: DataFrame of the readings sorted by time, with the timestamp
+        as a datetime and values as float32
+    :rtype: DataFrame"""
+    value_fields = list(value_fields)
+    rows = []
+    for item in items:
+        sensor = item.get('sensor', {})
+        if sensor.get('sensor_type', {}).get('name') != LIVE_SENSOR_TYPE:
+            continue
+        location = item.get('location', {})
+        values = {
+            value['value_type']: value['value']
+            for value in item.get('sensordatavalues', [])
+        }
+        rows.append(
+            [
+                sensor.get('id'),
+                LIVE_SENSOR_TYPE,
+                location.get('id'),
+                location.get('latitude'),
+                location.get('longitude'),
+                item['timestamp'],
+            ] + [values.get(field) for field in value_fields]
+        )
+
+    data = pd.DataFrame(rows, columns=LIVE_LEADING_FIELDS + value_fields)
+    data['timestamp'] = pd.to_datetime(
+        data['timestamp'],
+        format=LIVE_DATETIME_FORMAT
+    )
+    for field in ['lat', 'lon']:
+        data[field] = pd.to_numeric(data[field])
+    for field in value_fields:
+        data[field] = pd.to_numeric(data[field]).astype(np.float32)
+    return data.sort_values('timestamp', kind='mergesort') \
+        .reset_index(drop=True)
+
+
+def get_last_live_timestamp(luftdaten_live_data_dir, sensor_code):
+    """Time of the latest live reading kept for a sensor.
+
+    :returns: The timestamp, None if there aren't any
+    :rtype: Timestamp"""
+    for filepath in reversed(get_live_luftdaten_filepaths(
+            luftdaten_live_data_dir,
+            sensor_code
+    )):
+        timestamps = pd.read_csv(
+            filepath,
+            delimiter=';',
+            usecols=['timestamp']
+        )['timestamp']
+        if len(timestamps) > 0:
+            return pd.to_datetime(
+                timestamps, format=RAW_DATETIME_FORMAT
+            ).max()
+    return None
+
+
+def append_live_readings(
+        luftdaten_live_data_dir,
+        sensor_code,
+        readings,
+        after=None
+):
+    """Appends readings to the sensor's live day files, skipping any at or
+    before after (e.g. already kept from an earlier poll).
+
+    :param readings: Readings as from parse_live_readings
+    :type readings: DataFrame
+    :param after: Time of the latest reading already kept
+    :type after: Timestamp
+    :returns: The readings appended
+    :rtype: DataFrame"""
+    if after is not None:
+        readings = readings[readings['timestamp'] > after]
+    dates = readings['timestamp'].dt.date
+    for date_, day_readings in readings.groupby(dates, sort=True):
+        filepath = _get_live_filepath(
+            luftdaten_live_data_dir, sensor_code, date_
+        )
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        exists = os.path.exists(filepath)
+        day_readings.to_csv(
+            filepath,
+            mode='a',
+            sep=';',
+            header=not exists,
+            index=False,
+            date_format=RAW_DATETIME_FORMAT
+        )
+    return readings
+
+
+def remove_archived_live_readings(
+        luftdaten_raw_data_dir,
+        luftdaten_live_data_dir,
+        sensor_code
+):
+    """Removes the sensor's live day files for days the archive has a file
+    for now.
+
+    :returns: The dates removed
+    :rtype: list"""
+    archived_dates = {
+        get_raw_filename_date(get_raw_luftdaten_filename_from_path(filepath))
+        for filepath in get_existing_raw_luftdaten_filepaths(
+            luftdaten_raw_data_dir,
+            sensor_code
+        )
+    }
+    removed = []
+    for filepath in get_live_luftdaten_filepaths(
+            luftdaten_live_data_dir,
+            sensor_code
+    ):
+        date_ = get_raw_filename_date(os.path.basename(filepath))
+        if date_ in archived_dates:
+            os.remove(filepath)
+            removed.append(date_)
+            day_dir = os.path.dirname(filepath)
+            if not os.listdir(day_dir):
+                os.rmdir(day_dir)
+    return removed
+
+
+def load_luftdaten_sensor_month_with_live_readings(
+        luftdaten_raw_data_dir,
+        luftdaten_live_data_dir,
+        sensor_code,
+        year,
+        month,
+        datetime_field,
+        value_fields=RAW_VALUE_FIELDS,
+        lead_in=LIVE_LEAD_IN
+):
+    """Loads a month of a sensor's readings, plus a lead in from the end of
+    the month before, from its archive files and the live readings of any
+    days without one.
+
+    :rtype: DataFrame"""
+    start = datetime.date(year, month, 1) - lead_in
+    end = datetime.date(year + month // 12, month % 12 + 1, 1)
+
+    def in_range(filepath):
+        date_ = get_raw_filename_date(
+            get_raw_luftdaten_filename_from_path(filepath)
+        )
+        return start <= date_ < end
+
+    archive_filepaths = [
+        filepath for filepath in get_existing_raw_luftdaten_filepaths(
+            luftdaten_raw_data_dir,
+            sensor_code
+        )
+        if in_range(filepath)
+    ]
+    archived_dates = {
+        get_raw_filename_date(get_raw_luftdaten_filename_from_path(filepath))
+        for filepath in archive_filepaths
+    }
+    live_filepaths = [
+        filepath for filepath in get_live_luftdaten_filepaths(
+            luftdaten_live_data_dir,
+            sensor_code
+        )
+        if in_range(filepath) and
+        get_raw_filename_date(os.path.basename(filepath)) not in archived_dates
+    ]
+    data = read_raw_luftdaten_files(
+        archive_filepaths + live_filepaths,
+        datetime_field,
+        value_fields
+    )
+    return data.sort_values(datetime_field, kind='mergesort') \
+        .reset_index(drop=True)
+
+
+def merge_months_into_summary(summary_filepath, sensor_code, months_by_key):
+    """Adds (or replaces) months written for a sensor in the summary written
+    by process_data.py, if it has the sensor.
+
+    :param months_by_key: The years/months written, by the summary key
+        they're listed under, e.g. '24_hour_means'
+    :type months_by_key: dict
+    :returns: Whether the summary had the sensor
+    :rtype: bool"""
+    if not os.path.exists(summary_filepath):
+        return False
+    with open(summary_filepath, 'r') as file_:
+        summary = json.load(file_)
+
+    for sensor_info in summary['luftdaten_sensors']:
+        if str(sensor_info['code']) == str(sensor_code):
+            break
+    else:
+        return False
+
+    for key, years_months in months_by_key.items():
+        available_dates = sensor_info.setdefault(key, {}) \
+            .setdefault('available_dates', {})
+        for year, month_infos in years_months.items():
+            months = {
+                month_info['month']: month_info
+                for month_info in available_dates.get(str(year), [])
+            }
+            for month_info in month_infos:
+                months[month_info['month']] = month_info
+            available_dates[str(year)] = [
+                months[month] for month in sorted(months)
+            ]
+        sensor_info[key]['available_dates'] = dict(
+            sorted(available_dates.items())
+        )
+
+    write_chunks_atomically(
+        summary_filepath,
+        [json.dumps(summary).encode('utf-8')]
+    )
+    return True
+
+
+class LivePoller(object):
+    """Polls the live API for each sensor's latest readings every interval
+    seconds, keeps any new readings and rewrites the aggregates of the
+    months they're in.
+
+    Each sensor's request is sent after a random delay of up to jitter
+    seconds into the round, with at most concurrency requests in flight.
+    Responses wait in a queue of at most max_pending to be stored, one
+    batch at a time, so polling slows down rather than piling up responses
+    if storing falls behind. A sensor with several responses waiting has
+    its months aggregated once for all of them.
+
+    :param sensors: The sensors to poll
+    :type sensors: list
+    :param output_options: The resolution_tiers, decimals and compact
+        options of the 24 hour means writer
+    :type output_options: dict
+    :param clean: Whether to clean the readings before they're aggregated,
+        as process_data.py --clean does
+    :type clean: bool
+    :param events: Whether to write the exceedances files too, as
+        process_data.py --events does
+    :type events: bool
+    :param summary_filepath: The summary written by process_data.py, which
+        new months are added to if given
+    :type summary_filepath: str"""
+    def __init__(
+            self,
+            sensors,
+            luftdaten_raw_data_dir,
+            luftdaten_live_data_dir,
+            luftdaten_aggregated_data_dir,
+            datetime_field='timestamp',
+            value_fields=RAW_VALUE_FIELDS,
+            api_url=LUFTDATEN_API_URL,
+            interval=DEFAULT_POLL_INTERVAL,
+            jitter=DEFAULT_JITTER,
+            concurrency=DEFAULT_CONCURRENCY,
+            max_pending=DEFAULT_MAX_PENDING,
+            timeout=30,
+            output_options=None,
+            clean=False,
+            events=False,
+            summary_filepath=None,
+            seed=None
+    ):
+        self.sensors = list(sensors)
+        self.luftdaten_raw_data_dir = luftdaten_raw_data_dir
+        self.luftdaten_live_data_dir = luftdaten_live_data_dir
+        self.luftdaten_aggregated_data_dir = luftdaten_aggregated_data_dir
+        self.datetime_field = datetime_field
+        self.value_fields = list(value_fields)
+        self.api_url = api_url
+        self.interval = interval
+        self.jitter = jitter
+        self.concurrency = concurrency
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.output_options = output_options or {}
+        self.clean = clean
+        self.events = events
+        self.summary_filepath = summary_filepath
+        self.random = random.Random(seed)
+        self.stats = {
+            'rounds': 0,
+            'requests': 0,
+            'failed': 0,
+            'readings': 0,
+            'months_written': 0,
+        }
+        # Time of the latest reading kept for each sensor
+        self._last_timestamps = {}
+        # Location each sensor's readings are cleaned against
+        self._locations = {}
+
+    def _fetch(self, session, sensor):
+        response = session.get(
+            get_luftdaten_live_url(sensor.code, self.api_url),
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        items = response.json()
+        if not isinstance(items, list):
+            raise ValueError("Expected a list of readings")
+        return items
+
+    async def _poll_sensor(self, session, executor, semaphore, queue,
+                           sensor):
+        await asyncio.sleep(self.random.uniform(0, self.jitter))
+        async with semaphore:
+            self.stats['requests'] += 1
+            try:
+                items = await asyncio.get_running_loop().run_in_executor(
+                    executor, self._fetch, session, sensor
+                )
+            except (requests.RequestException, ValueError) as exc:
+                self.stats['failed'] += 1
+                print("WARNING: polling sensor {} failed with {}".format(
+                    sensor.code, exc
+                ))
+                return
+        # Waits here while the queue is full
+        await queue.put((sensor, items))
+
+    def store_readings(self, sensor, items_list):
+        """Keeps a sensor's new readings from one or more responses and
+        rewrites the aggregates of the months they're in.
+
+        :param items_list: The API's responses for the sensor
+        :type items_list: list
+        :returns: The number of new readings
+        :rtype: int"""
+        if sensor.code not in self._last_timestamps:
+            self._last_timestamps[sensor.code] = get_last_live_timestamp(
+                self.luftdaten_live_data_dir, sensor.code
+            )
+        readings = parse_live_readings(
+            [item for items in items_list for item in items],
+            self.value_fields
+        ).drop_duplicates('timestamp')
+        appended = append_live_readings(
+            self.luftdaten_live_data_dir,
+            sensor.code,
+            readings,
+            after=self._last_timestamps[sensor.code]
+        )
+        remove_archived_live_readings(
+            self.luftdaten_raw_data_dir,
+            self.luftdaten_live_data_dir,
+            sensor.code
+        )
+        if len(appended) == 0:
+            return 0
+        self._last_timestamps[sensor.code] = appended['timestamp'].max()
+
+        months = sorted(set(zip(
+            appended['timestamp'].dt.year, appended['timestamp'].dt.month
+        )))
+        # Where each reading was taken is needed to clean the readings
+        read_fields = self.value_fields
+        if self.clean:
+            read_fields = self.value_fields + list(RAW_LOCATION_FIELDS)
+            if sensor.code not in self._locations:
+                self._locations[sensor.code] = \
+                    get_luftdaten_sensor_reference_location(
+                        self.luftdaten_raw_data_dir,
+                        sensor.code,
+                        sensor.location
+                    )
+        for year, month in months:
+            data = load_luftdaten_sensor_month_with_live_readings(
+                self.luftdaten_raw_data_dir,
+                self.luftdaten_live_data_dir,
+                sensor.code,
+                year,
+                month,
+                self.datetime_field,
+                read_fields
+            )
+            if self.clean:
+                data, _ = clean_luftdaten_sensor_data(
+                    data,
+                    self.datetime_field,
+                    self.value_fields,
+                    location=self._locations[sensor.code],
+                    counted_months={(year, month)}
+                )
+            means = create_24_hour_means(
+                raw_data=data,
+                value_column=self.value_fields,
+                date_column=self.datetime_field
+            )
+            months_by_key = {
+                'day_of_week': write_aggregated_dayofweek_data_files(
+                    self.luftdaten_aggregated_data_dir,
+                    sensor.code,
+                    data,
+                    self.value_fields,
+                    self.datetime_field,
+                    months={(year, month)},
+                    decimals=self.output_options.get('decimals')
+                ),
+                '24_hour_means': write_24_hour_mean_aggregated_data_files(
+                    self.luftdaten_aggregated_data_dir,
+                    sensor.code,
+                    data,
+                    self.value_fields,
+                    self.datetime_field,
+                    months={(year, month)},
+                    means=means,
+                    **self.output_options
+                ),
+            }
+            if self.events:
+                months_by_key['exceedances'] = write_exceedance_data_files(
+                    self.luftdaten_aggregated_data_dir,
+                    sensor.code,
+                    data,
+                    self.value_fields,
+                    self.datetime_field,
+                    months={(year, month)},
+                    means=means
+                )
+            if self.summary_filepath is not None:
+                merge_months_into_summary(
+                    self.summary_filepath, sensor.code, months_by_key
+                )
+            self.stats['months_written'] += 1
+        self.stats['readings'] += len(appended)
+        return len(appended)
+
+    async def _store(self, queue, executor):
+        """Stores the responses waiting in the queue, a batch at a time."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await queue.get()]
+            while not queue.empty():
+                batch.append(queue.get_nowait())
+            items_by_sensor = {}
+            for sensor, items in batch:
+                items_by_sensor.setdefault(sensor, []).append(items)
+            for sensor, items_list in items_by_sensor.items():
+                try:
+                    count = await loop.run_in_executor(
+                        executor, self.store_readings, sensor, items_list
+                    )
+                except Exception as exc:
+                    print("WARNING: storing sensor {} failed with {}".format(
+                        sensor.code, repr(exc)
+                    ))
+                    continue
+                if count:
+                    print("Sensor {}: {} new reading(s)".format(
+                        sensor.code, count
+                    ))
+            for _ in batch:
+                queue.task_done()
+
+    async def run(self, rounds=None):
+        """Polls every sensor once a round, until rounds more have been
+        polled or forever if None. A round that overruns the interval is
+        followed straight away by the next, rather than overlapping it.
+
+        :returns: Counts of the rounds, requests, readings and months
+            written, since the poller was created
+        :rtype: dict"""
+        queue = asyncio.Queue(maxsize=self.max_pending)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        fetch_executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        # Storing is CPU bound and writes shared files, so one at a time
+        store_executor = ThreadPoolExecutor(max_workers=1)
+        session = requests.Session()
+        store_task = asyncio.create_task(self._store(queue, store_executor))
+        polled = 0
+        try:
+            while rounds is None or polled < rounds:
+                started = time.monotonic()
+                await asyncio.gather(*[
+                    self._poll_sensor(
+                        session, fetch_executor, semaphore, queue, sensor
+                    )
+                    for sensor in self.sensors
+                ])
+                await queue.join()
+                polled += 1
+                self.stats['rounds'] += 1
+                if rounds is not None and polled >= rounds:
+                    break
+                await asyncio.sleep(
+                    max(0, started + self.interval - time.monotonic())
+                )
+        finally:
+            store_task.cancel()
+            await asyncio.gather(store_task, return_exceptions=True)
+            session.close()
+            fetch_executor.shutdown()
+            store_executor.shutdown()
+        return dict(self.stats)
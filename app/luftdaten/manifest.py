@@ -0,0 +1,81 @@
+"""Index of the raw Luftdaten archive files in the local mirror.
+
+Each sensor gets a JSON file in the mirror's manifest directory, mapping
+the archive filename of every file mirrored to its path (relative to the
+mirror), size, modification time and SHA-1 checksum. The downloader keeps
+it up to date, so a sensor's files can be found without scanning the
+mirror's directories. If files are added or removed by hand the manifest
+should be rebuilt (see scripts/rebuild_raw_manifest.py)."""
+import hashlib
+import json
+import os
+
+from luftdaten.download import write_chunks_atomically
+
+
+MANIFEST_DIRNAME = 'manifest'
+
+CHECKSUM_CHUNK_SIZE = 1024 * 1024
+
+
+def get_raw_manifest_filepath(luftdaten_raw_data_dir, sensor_code):
+    return os.path.join(
+        luftdaten_raw_data_dir,
+        MANIFEST_DIRNAME,
+        'sensor_{}.json'.format(sensor_code)
+    )
+
+
+def read_raw_manifest(luftdaten_raw_data_dir, sensor_code):
+    """Reads a sensor's manifest, None if it doesn't have one.
+
+    :returns: Dict of archive filename to file entry
+    :rtype: dict"""
+    filepath = get_raw_manifest_filepath(luftdaten_raw_data_dir, sensor_code)
+    if not os.path.exists(filepath):
+        return None
+    with open(filepath, 'r') as file_:
+        return json.load(file_)
+
+
+def write_raw_manifest(luftdaten_raw_data_dir, sensor_code, manifest):
+    content = json.dumps(manifest, sort_keys=True, separators=(',', ':'))
+    write_chunks_atomically(
+        get_raw_manifest_filepath(luftdaten_raw_data_dir, sensor_code),
+        [content.encode('utf-8')]
+    )
+
+
+def _get_file_checksum(filepath):
+    sha1 = hashlib.sha1()
+    with open(filepath, 'rb') as file_:
+        for chunk in iter(lambda: file_.read(CHECKSUM_CHUNK_SIZE), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def create_raw_manifest_entry(luftdaten_raw_data_dir, filepath):
+    """Describes a mirrored file for the manifest.
+
+    :rtype: dict"""
+    stat = os.stat(filepath)
+    return {
+        'path': os.path.relpath(filepath, luftdaten_raw_data_dir),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha1': _get_file_checksum(filepath),
+    }
+
+
+def get_raw_manifest_filepaths(luftdaten_raw_data_dir, manifest):
+    """Full paths of the files in a manifest, in filename order."""
+    return [
+        os.path.join(luftdaten_raw_data_dir, manifest[filename]['path'])
+        for filename in sorted(manifest)
+    ]
+
+
+def get_raw_manifest_signature(entry):
+    """The size and modification time of a file when it was added, the same
+    as the signatures the sensor caches use to spot changed files."""
+    return [entry['size'], entry['mtime_ns']]
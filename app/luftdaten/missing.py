@@ -0,0 +1,150 @@
+"""Record of the days a sensor's archive files couldn't be downloaded, so
+days the archive will never have aren't requested again on every run.
+
+Each sensor gets a JSON file in the mirror's missing directory, mapping the
+date of each failed download to the status code of its last attempt (None
+for a connection error), the times of its first and last attempts (UTC)
+and the number of attempts. A RetryPolicy decides which of them are worth
+requesting again."""
+import datetime
+import json
+import os
+
+from luftdaten.download import write_chunks_atomically
+
+
+MISSING_DIRNAME = 'missing'
+
+NOT_FOUND = 404
+
+# The archive can still add a file for a day a while afterwards
+DEFAULT_RECHECK_DAYS = 7
+DEFAULT_GIVE_UP_DAYS = 30
+DEFAULT_RECHECK_INTERVAL_DAYS = 7
+
+ATTEMPT_TIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+
+def get_missing_days_filepath(luftdaten_raw_data_dir, sensor_code):
+    return os.path.join(
+        luftdaten_raw_data_dir,
+        MISSING_DIRNAME,
+        'sensor_{}.json'.format(sensor_code)
+    )
+
+
+def read_missing_days(luftdaten_raw_data_dir, sensor_code):
+    """Reads the failed days recorded for a sensor.
+
+    :returns: Dict of date to the record of its attempts, empty if none
+        have been recorded
+    :rtype: dict"""
+    filepath = get_missing_days_filepath(luftdaten_raw_data_dir, sensor_code)
+    if not os.path.exists(filepath):
+        return {}
+    with open(filepath, 'r') as file_:
+        return {
+            datetime.date.fromisoformat(date_str): record
+            for date_str, record in json.load(file_).items()
+        }
+
+
+def write_missing_days(luftdaten_raw_data_dir, sensor_code, missing_days):
+    content = json.dumps(
+        {
+            date_.isoformat(): record
+            for date_, record in missing_days.items()
+        },
+        sort_keys=True,
+        separators=(',', ':')
+    )
+    write_chunks_atomically(
+        get_missing_days_filepath(luftdaten_raw_data_dir, sensor_code),
+        [content.encode('utf-8')]
+    )
+
+
+def record_attempts(missing_days, outcomes, now=None):
+    """Adds the outcomes of downloads to a sensor's failed days. Days that
+    were downloaded are forgotten.
+
+    :param missing_days: The failed days, as from read_missing_days, which
+        are updated
+    :type missing_days: dict
+    :param outcomes: Dict of date to the status code of its download, None
+        for a connection error
+    :type outcomes: dict
+    :param now: Time of the attempts (UTC), now by default
+    :type now: datetime.datetime
+    :returns: Whether any records changed
+    :rtype: bool"""
+    attempted_at = (now or datetime.datetime.utcnow()).strftime(
+        ATTEMPT_TIME_FORMAT
+    )
+    changed = False
+    for date_, status_code in outcomes.items():
+        if status_code == 200:
+            changed |= missing_days.pop(date_, None) is not None
+            continue
+        record = missing_days.get(date_)
+        if record is None:
+            record = missing_days[date_] = {
+                'first_attempt': attempted_at,
+                'attempts': 0,
+            }
+        record['status_code'] = status_code
+        record['last_attempt'] = attempted_at
+        record['attempts'] += 1
+        changed = True
+    return changed
+
+
+class RetryPolicy(object):
+    """Which failed days to request again.
+
+    Days up to recheck_days old are always requested, as are days whose
+    last attempt failed for any reason other than the archive not having
+    the file (e.g. a server or connection error). Days the archive didn't
+    have are given up on once they're more than give_up_days old, and
+    requested again at most every recheck_interval_days until then.
+
+    :param give_up_days: Age of days to give up on, None to never give up
+    :type give_up_days: int"""
+    def __init__(
+            self,
+            recheck_days=DEFAULT_RECHECK_DAYS,
+            give_up_days=DEFAULT_GIVE_UP_DAYS,
+            recheck_interval_days=DEFAULT_RECHECK_INTERVAL_DAYS
+    ):
+        self.recheck_days = recheck_days
+        self.give_up_days = give_up_days
+        self.recheck_interval_days = recheck_interval_days
+
+    def is_given_up(self, date_, record, today):
+        """Whether a failed day won't be requested again."""
+        return record is not None and \
+            record.get('status_code') == NOT_FOUND and \
+            self.give_up_days is not None and \
+            (today - date_).days > max(self.give_up_days, self.recheck_days)
+
+    def is_due(self, date_, record, today, now=None):
+        """Whether a day should be requested.
+
+        :param record: The record of the day's failed attempts, None if
+            there aren't any
+        :type record: dict
+        :param today: The current date
+        :type today: datetime.date
+        :param now: The current time (UTC), now by default
+        :type now: datetime.datetime
+        :rtype: bool"""
+        if record is None or (today - date_).days <= self.recheck_days or \
+                record.get('status_code') != NOT_FOUND:
+            return True
+        if self.is_given_up(date_, record, today):
+            return False
+        last_attempt = datetime.datetime.strptime(
+            record['last_attempt'], ATTEMPT_TIME_FORMAT
+        )
+        return (now or datetime.datetime.utcnow()) - last_attempt >= \
+            datetime.timedelta(days=self.recheck_interval_days)
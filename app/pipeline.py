@@ -0,0 +1,68 @@
+"""Runs items through two stages at once, e.g. downloading each sensor's
+files and then processing them, so the second stage starts on each item as
+soon as the first has finished with it rather than after every item has."""
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+
+
+def run_pipeline(items, produce, consume, producers=1, consumers=1,
+                 processes=False):
+    """Calls produce on each item, then consume once its produce has
+    finished. At most producers items are produced at once, in threads, and
+    at most consumers items consumed at once, each waiting its turn in a
+    queue as it's produced.
+
+    An exception from either stage cancels the items not yet started in
+    both stages, and is raised once the work already started has finished.
+
+    :param items: The items to run through the stages
+    :type items: list
+    :param produce: Called with each item, its result isn't kept
+    :type produce: function
+    :param consume: Called with each item, a picklable function if
+        processes is set
+    :type consume: function
+    :param producers: Most items to produce at once
+    :type producers: int
+    :param consumers: Most items to consume at once
+    :type consumers: int
+    :param processes: Whether to consume items in worker processes rather
+        than threads, for CPU bound work
+    :type processes: bool
+    :returns: The result of consume for each item, in the same order
+    :rtype: list"""
+    consumer_executor_class = ProcessPoolExecutor if processes \
+        else ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=producers) as producer_executor, \
+            consumer_executor_class(max_workers=consumers) as \
+            consumer_executor:
+        produced = {
+            producer_executor.submit(produce, item): index
+            for index, item in enumerate(items)
+        }
+        consumed = {}
+        try:
+            # Both stages' futures are waited on together, so an exception
+            # from either is raised as soon as it happens
+            pending = set(produced)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    future.result()
+                    if future in produced:
+                        index = produced[future]
+                        consumed[index] = consumer_executor.submit(
+                            consume, items[index]
+                        )
+                        pending.add(consumed[index])
+            return [consumed[index].result() for index in range(len(items))]
+        except BaseException:
+            # Otherwise leaving the executors would wait for every queued
+            # item to be produced and consumed
+            for future in list(produced) + list(consumed.values()):
+                future.cancel()
+            raise
@@ -0,0 +1,3 @@
+from .cache import LRUCache
+from .query import AggregatedDataService, QueryError
+from .server import create_server
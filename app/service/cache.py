@@ -0,0 +1,66 @@
+"""A least recently used cache, limited by the size of what it holds."""
+from collections import OrderedDict
+import threading
+
+
+class LRUCache(object):
+    """Keeps the most recently used values up to a total size in bytes,
+    evicting the least recently used first. Safe to share between threads.
+
+    :param max_bytes: Most bytes to hold, values bigger than this aren't
+        cached at all
+    :type max_bytes: int
+    :param get_size: Gives the size of a value in bytes
+    :type get_size: function"""
+    def __init__(self, max_bytes, get_size):
+        self.max_bytes = max_bytes
+        self.get_size = get_size
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def get(self, key, default=None):
+        """The value for key, marking it as the most recently used.
+
+        :returns: The value, or default if it isn't cached"""
+        with self._lock:
+            if key not in self._items:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._items.move_to_end(key)
+            return self._items[key][0]
+
+    def put(self, key, value):
+        """Caches a value, evicting the least recently used values until
+        there's room for it."""
+        size = self.get_size(value)
+        with self._lock:
+            if key in self._items:
+                self.bytes -= self._items.pop(key)[1]
+            if size > self.max_bytes:
+                return
+            while self.bytes + size > self.max_bytes:
+                _, (_, evicted_size) = self._items.popitem(last=False)
+                self.bytes -= evicted_size
+            self._items[key] = (value, size)
+            self.bytes += size
+
+    def get_stats(self):
+        """Counts of the cache's use, e.g. to report on its hit rate."""
+        with self._lock:
+            return {
+                'items': len(self._items),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
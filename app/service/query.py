@@ -0,0 +1,238 @@
+"""Time range queries over a sensor's 24 hour means files."""
+import datetime
+import hashlib
+import json
+
+import numpy as np
+import pandas as pd
+
+from luftdaten.data import (
+    get_24_hour_means_signature,
+    RAW_VALUE_FIELDS,
+    read_24_hour_means_month,
+    RESOLUTION_TIERS,
+)
+from service.cache import LRUCache
+
+
+DEFAULT_CACHE_BYTES = 64 * 1024 ** 2
+
+# Resolution of the means as they were written
+FULL_RESOLUTION = 'full'
+
+
+class QueryError(ValueError):
+    """A query that can't be answered, e.g. for an unknown value field."""
+
+
+def get_months_between(start, end):
+    """The (year, month) pairs of the months overlapping [start, end).
+
+    :rtype: list"""
+    months = []
+    year, month = start.year, start.month
+    while datetime.datetime(year, month, 1) < end:
+        months.append((year, month))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+def select_last_in_periods(timestamps, resolution):
+    """Indexes of the last reading in each period of a given length, with
+    periods ending at multiples of the resolution from the epoch (as the
+    resolution tiers' do).
+
+    :param timestamps: Sorted timestamps, as int64 nanoseconds
+    :type timestamps: ndarray
+    :param resolution: Length of the periods in nanoseconds
+    :type resolution: int
+    :rtype: ndarray"""
+    periods = -(-np.asarray(timestamps, dtype=np.int64) // resolution)
+    if len(periods) == 0:
+        return np.array([], dtype=np.int64)
+    return np.flatnonzero(
+        np.concatenate([periods[1:] != periods[:-1], [True]])
+    )
+
+
+class AggregatedDataService(object):
+    """Answers queries for a sensor's 24 hour means over any time range, from
+    the monthly files written by process_data.py.
+
+    The months read are kept in an LRU cache up to cache_bytes, and reread
+    if their files have changed since.
+
+    :param luftdaten_aggregated_data_dir: Directory of the aggregated data
+    :type luftdaten_aggregated_data_dir: str
+    :param cache_bytes: Most memory to use for cached months
+    :type cache_bytes: int"""
+    def __init__(
+            self,
+            luftdaten_aggregated_data_dir,
+            datetime_field='timestamp',
+            value_fields=RAW_VALUE_FIELDS,
+            cache_bytes=DEFAULT_CACHE_BYTES
+    ):
+        self.luftdaten_aggregated_data_dir = luftdaten_aggregated_data_dir
+        self.datetime_field = datetime_field
+        self.value_fields = list(value_fields)
+        # Cached as (signature, data)
+        self.cache = LRUCache(
+            cache_bytes,
+            lambda item: int(item[1].memory_usage(index=True).sum())
+        )
+
+    def _get_month_source(self, sensor_code, year, month, resolution):
+        """The tier a month is read from at a resolution, which is the
+        resolution's own tier where its file has been written, and the
+        signature of the file.
+
+        :returns: The tier (None for every mean) and signature
+        :rtype: tuple"""
+        if resolution != FULL_RESOLUTION:
+            signature = get_24_hour_means_signature(
+                self.luftdaten_aggregated_data_dir,
+                sensor_code,
+                year,
+                month,
+                tier=resolution
+            )
+            if signature is not None:
+                return resolution, signature
+        return None, get_24_hour_means_signature(
+            self.luftdaten_aggregated_data_dir, sensor_code, year, month
+        )
+
+    def _check_query(self, resolution, fields):
+        resolutions = [FULL_RESOLUTION] + list(RESOLUTION_TIERS)
+        if resolution not in resolutions:
+            raise QueryError(
+                "Unknown resolution '{}', expected one of {}".format(
+                    resolution, ', '.join(resolutions)
+                )
+            )
+        unknown_fields = [
+            field for field in fields if field not in self.value_fields
+        ]
+        if unknown_fields:
+            raise QueryError("Unknown value field(s) {}, expected {}".format(
+                ', '.join(unknown_fields), ', '.join(self.value_fields)
+            ))
+
+    def get_etag(
+            self,
+            sensor_code,
+            start,
+            end,
+            resolution=FULL_RESOLUTION,
+            fields=None
+    ):
+        """An entity tag for the answer to a query, which changes if any of
+        the months' files are rewritten. Found without reading the files.
+
+        :rtype: str"""
+        fields = list(fields or self.value_fields)
+        self._check_query(resolution, fields)
+        key = json.dumps([
+            sensor_code,
+            start.isoformat(),
+            end.isoformat(),
+            resolution,
+            fields,
+            [
+                self._get_month_source(sensor_code, year, month, resolution)
+                for year, month in get_months_between(start, end)
+            ]
+        ])
+        return '"{}"'.format(hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+    def load_month(self, sensor_code, year, month, tier=None):
+        """A month of a sensor's 24 hour means, or of one of its resolution
+        tiers, from the cache if its file hasn't changed since.
+
+        :returns: DataFrame of the means, None if the month hasn't been
+            written
+        :rtype: DataFrame"""
+        signature = get_24_hour_means_signature(
+            self.luftdaten_aggregated_data_dir, sensor_code, year, month, tier
+        )
+        if signature is None:
+            return None
+        key = (sensor_code, year, month, tier)
+        cached = self.cache.get(key)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        data = read_24_hour_means_month(
+            self.luftdaten_aggregated_data_dir,
+            sensor_code,
+            year,
+            month,
+            self.datetime_field,
+            self.value_fields,
+            tier
+        )
+        self.cache.put(key, (signature, data))
+        return data
+
+    def query(
+            self,
+            sensor_code,
+            start,
+            end,
+            resolution=FULL_RESOLUTION,
+            fields=None
+    ):
+        """A sensor's 24 hour means from start up to end.
+
+        At a coarser resolution than 'full' (one of RESOLUTION_TIERS), the
+        months are read from the resolution's tier files, with a mean at the
+        end of each period as written by process_data.py --tiers. Months
+        without a tier file give the mean at the last reading of each
+        period instead.
+
+        :param start: Start of the range
+        :type start: datetime.datetime
+        :param end: End of the range, which isn't included
+        :type end: datetime.datetime
+        :param resolution: 'full' or a name in RESOLUTION_TIERS
+        :type resolution: str
+        :param fields: The value fields to give, all of them by default
+        :type fields: list
+        :returns: DataFrame of the datetime and value fields
+        :rtype: DataFrame"""
+        fields = list(fields or self.value_fields)
+        self._check_query(resolution, fields)
+        columns = [self.datetime_field] + fields
+        start_ns = pd.Timestamp(start).value
+        end_ns = pd.Timestamp(end).value
+
+        frames = []
+        for year, month in get_months_between(start, end):
+            tier, _ = self._get_month_source(
+                sensor_code, year, month, resolution
+            )
+            data = self.load_month(sensor_code, year, month, tier)
+            if data is None:
+                continue
+            timestamps = data[self.datetime_field].values.view(np.int64)
+            first, last = np.searchsorted(timestamps, [start_ns, end_ns])
+            frames.append(data[columns].iloc[first:last])
+
+        if len(frames) == 0:
+            data = pd.DataFrame({
+                self.datetime_field: pd.Series(dtype='datetime64[ns]')
+            })
+            for field in fields:
+                data[field] = pd.Series(dtype=np.float32)
+        else:
+            data = pd.concat(frames, ignore_index=True)
+
+        if resolution != FULL_RESOLUTION:
+            # A no-op on the tier files' means, which are already one per
+            # period
+            data = data.iloc[select_last_in_periods(
+                data[self.datetime_field].values.view(np.int64),
+                pd.Timedelta(RESOLUTION_TIERS[resolution]).value
+            )]
+        return data
@@ -0,0 +1,209 @@
+"""HTTP API for range queries over the aggregated data.
+
+    GET /sensors/<code>/24_hour_means?start=2020-01-01&end=2020-01-08
+
+gives CSV of the sensor's 24 hour means from start up to end. Instead of
+start, days gives that many days up to end, or up to the current minute if
+end isn't given. resolution can be 'full' (the default) or a resolution
+tier name, e.g. 'hourly', and fields a comma separated list of the value
+fields to give, e.g. 'P1'.
+
+Responses have an ETag, so clients can revalidate with If-None-Match, and
+are gzip compressed for clients that accept it. The most recently sent
+responses are kept by ETag, so popular queries (e.g. the last 7 days of
+each sensor) aren't encoded again for every request."""
+import datetime
+import gzip
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import re
+from urllib.parse import parse_qs, urlsplit
+
+import pandas as pd
+
+from service.cache import LRUCache
+from service.query import FULL_RESOLUTION, QueryError
+
+
+DEFAULT_PORT = 8001
+DEFAULT_RESPONSE_CACHE_BYTES = 16 * 1024 ** 2
+
+# Smaller responses aren't worth compressing. Higher levels take several
+# times as long for only slightly smaller responses.
+GZIP_MIN_BYTES = 1024
+GZIP_LEVEL = 1
+
+means_path_regex = re.compile(r'^/sensors/(\d+)/24_hour_means/?$')
+
+
+def _get_parameter(query, name):
+    values = query.get(name)
+    return values[-1] if values else None
+
+
+def _parse_time(value):
+    # Times with an offset are given as naive UTC, like the means files
+    time = pd.Timestamp(value)
+    if time.tz is not None:
+        time = time.tz_convert(None)
+    return time
+
+
+def parse_means_query(query, now=None):
+    """Reads the parameters of a 24 hour means query.
+
+    :param query: The query string's parameters, as from parse_qs
+    :type query: dict
+    :param now: The time days are counted back from without an end, the
+        current time by default
+    :type now: datetime.datetime
+    :returns: The start, end, resolution and fields (None for all)
+    :rtype: tuple"""
+    try:
+        end = _get_parameter(query, 'end')
+        if end is None:
+            now = now or datetime.datetime.utcnow()
+            # Rounded down, so the response (and its ETag) is the same for
+            # a minute at a time
+            end = _parse_time(now).floor('1min')
+        else:
+            end = _parse_time(end)
+
+        start = _get_parameter(query, 'start')
+        days = _get_parameter(query, 'days')
+        if start is not None:
+            start = _parse_time(start)
+        elif days is not None:
+            start = end - pd.Timedelta(days=int(days))
+        else:
+            raise QueryError("Either start or days is needed")
+    except (ValueError, OverflowError) as error:
+        raise QueryError(str(error))
+    if start >= end:
+        raise QueryError("start must be before end")
+
+    fields = _get_parameter(query, 'fields')
+    return (
+        start.to_pydatetime(),
+        end.to_pydatetime(),
+        _get_parameter(query, 'resolution') or FULL_RESOLUTION,
+        fields.split(',') if fields else None
+    )
+
+
+def _accepts_gzip(accept_encoding):
+    return any(
+        encoding.split(';')[0].strip() == 'gzip'
+        for encoding in (accept_encoding or '').split(',')
+    )
+
+
+class QueryRequestHandler(BaseHTTPRequestHandler):
+    """Handles requests to the server's AggregatedDataService."""
+    server_version = 'LuftdatenQuery/1.0'
+    # Keeps connections open between requests
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        match = means_path_regex.match(url.path)
+        if match is None:
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+        sensor_code = int(match.group(1))
+
+        service = self.server.service
+        try:
+            start, end, resolution, fields = parse_means_query(
+                parse_qs(url.query)
+            )
+            etag = service.get_etag(
+                sensor_code, start, end, resolution, fields
+            )
+        except QueryError as error:
+            self.send_error(HTTPStatus.BAD_REQUEST, explain=str(error))
+            return
+
+        if_none_match = self.headers.get('If-None-Match', '')
+        if etag in [tag.strip() for tag in if_none_match.split(',')]:
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self._send_common_headers(etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        accepts_gzip = _accepts_gzip(self.headers.get('Accept-Encoding'))
+        response = self.server.responses.get((etag, accepts_gzip))
+        if response is None:
+            try:
+                response = self._encode_query(
+                    sensor_code, start, end, resolution, fields, accepts_gzip
+                )
+            except Exception as error:
+                self.log_error("Error answering %s: %r", self.path, error)
+                self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR)
+                return
+            self.server.responses.put((etag, accepts_gzip), response)
+        body, encoding = response
+
+        self.send_response(HTTPStatus.OK)
+        self._send_common_headers(etag)
+        self.send_header('Content-Type', 'text/csv; charset=utf-8')
+        if encoding is not None:
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _encode_query(
+            self, sensor_code, start, end, resolution, fields, accepts_gzip):
+        data = self.server.service.query(
+            sensor_code, start, end, resolution, fields
+        )
+        body = data.to_csv(index=False).encode('utf-8')
+        encoding = None
+        if accepts_gzip and len(body) >= GZIP_MIN_BYTES:
+            body = gzip.compress(body, compresslevel=GZIP_LEVEL)
+            encoding = 'gzip'
+        return body, encoding
+
+    def _send_common_headers(self, etag):
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Vary', 'Accept-Encoding')
+        # The site itself may be served from elsewhere
+        self.send_header('Access-Control-Allow-Origin', '*')
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+def create_server(
+        service,
+        host='127.0.0.1',
+        port=DEFAULT_PORT,
+        quiet=False,
+        response_cache_bytes=DEFAULT_RESPONSE_CACHE_BYTES
+):
+    """An HTTP server answering queries with a service, handling each
+    request in its own thread. Call serve_forever to start it.
+
+    :param service: The service to answer queries with
+    :type service: AggregatedDataService
+    :param port: Port to listen on, 0 for any free port
+    :type port: int
+    :param quiet: Whether to leave out the log of each request
+    :type quiet: bool
+    :param response_cache_bytes: Most memory to use for keeping encoded
+        responses
+    :type response_cache_bytes: int
+    :rtype: ThreadingHTTPServer"""
+    server = ThreadingHTTPServer((host, port), QueryRequestHandler)
+    server.daemon_threads = True
+    server.service = service
+    server.quiet = quiet
+    server.responses = LRUCache(
+        response_cache_bytes, lambda response: len(response[0])
+    )
+    return server
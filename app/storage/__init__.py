@@ -0,0 +1,2 @@
+from .base import Storage
+from .sqlite import SQLiteStorage
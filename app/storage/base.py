@@ -0,0 +1,79 @@
+"""Interface of the stores that sensor readings and aggregated data can be
+kept in, alongside the CSV files."""
+from abc import ABC, abstractmethod
+
+
+class Storage(ABC):
+    """A store of sensor readings and their aggregates.
+
+    Readings are kept per sensor with the raw files they came from, so
+    files can be ingested again when they change. Aggregates are kept per
+    sensor and month. Timestamps are stored to the second.
+
+    Stores can be used as context managers, which close them on exit."""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        pass
+
+    @abstractmethod
+    def get_ingested_files(self, sensor_code):
+        """Gets the raw files ingested for a sensor.
+
+        :returns: Dict of archive filename to the signature it had when it
+            was ingested
+        :rtype: dict"""
+
+    @abstractmethod
+    def replace_readings(self, sensor_code, periods, data, datetime_field,
+                         files):
+        """Replaces a sensor's readings in some periods, in one transaction.
+
+        :param periods: (start, end) datetimes, any readings in [start, end)
+            are removed before the new data is added
+        :type periods: list
+        :param data: The new readings
+        :type data: DataFrame
+        :param files: Dict of the filenames the data came from to their
+            signatures
+        :type files: dict"""
+
+    @abstractmethod
+    def read_readings(self, sensor_code, datetime_field, start=None,
+                      end=None):
+        """Reads a sensor's readings in [start, end), sorted by time.
+
+        :returns: DataFrame with the datetime and value columns
+        :rtype: DataFrame"""
+
+    @abstractmethod
+    def write_rolling_means(self, sensor_code, year, month, data,
+                            datetime_field, resolution=None):
+        """Replaces a month of rolling means for a sensor.
+
+        :param resolution: Name of the resolution tier the means are at,
+            None for a mean for every reading"""
+
+    @abstractmethod
+    def read_rolling_means(self, sensor_code, datetime_field, start=None,
+                           end=None, resolution=None):
+        """Reads a sensor's rolling means in [start, end), sorted by time.
+
+        :rtype: DataFrame"""
+
+    @abstractmethod
+    def write_weekday_hour_means(self, sensor_code, year, month, data):
+        """Replaces a month of means by day of week and hour for a sensor.
+
+        :param data: With dayOfWeek, hourOfDay and value columns
+        :type data: DataFrame"""
+
+    @abstractmethod
+    def read_weekday_hour_means(self, sensor_code, year, month):
+        """Reads a month of means by day of week and hour for a sensor.
+
+        :rtype: DataFrame"""
@@ -0,0 +1,268 @@
+"""SQLite store of sensor readings and aggregated data.
+
+Readings and rolling means are indexed on sensor and timestamp (in seconds
+since the epoch), so a sensor's data over a range of time can be read
+without touching anything else. There's a column per value field."""
+import datetime
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from storage.base import Storage
+
+
+NANOSECONDS_PER_SECOND = 10 ** 9
+
+# Resolution stored for rolling means with a value for every reading
+PER_READING = ''
+
+
+def _to_seconds(timestamps):
+    return pd.to_datetime(timestamps).values.astype('datetime64[ns]') \
+        .view(np.int64) // NANOSECONDS_PER_SECOND
+
+
+def _to_timestamp_seconds(value):
+    return int(pd.Timestamp(value).value // NANOSECONDS_PER_SECOND)
+
+
+def _month_range(year, month):
+    start = datetime.datetime(year, month, 1)
+    end = datetime.datetime(year + month // 12, month % 12 + 1, 1)
+    return _to_timestamp_seconds(start), _to_timestamp_seconds(end)
+
+
+class SQLiteStorage(Storage):
+    """Stores readings and aggregates in a SQLite database file.
+
+    :param filepath: The database file, created if it doesn't exist
+    :type filepath: str
+    :param value_fields: Names of the value columns
+    :type value_fields: list
+    :param timeout: Seconds to wait for other connections' writes"""
+    def __init__(self, filepath, value_fields, timeout=60):
+        value_fields = list(value_fields)
+        for field in value_fields:
+            if not field.isidentifier():
+                raise ValueError(
+                    "Value field {} can't be used as a column".format(field)
+                )
+        self.filepath = filepath
+        self.value_fields = value_fields
+
+        directory = os.path.dirname(filepath)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(filepath, timeout=timeout)
+        self._create_tables()
+
+    def close(self):
+        self.connection.close()
+
+    def _create_tables(self):
+        value_columns = ''.join(
+            ', {} REAL'.format(field) for field in self.value_fields
+        )
+        with self.connection:
+            self.connection.executescript('''
+                CREATE TABLE IF NOT EXISTS readings (
+                    sensor_id INTEGER NOT NULL,
+                    timestamp INTEGER NOT NULL{value_columns}
+                );
+                CREATE INDEX IF NOT EXISTS readings_sensor_timestamp
+                    ON readings (sensor_id, timestamp);
+
+                CREATE TABLE IF NOT EXISTS ingested_files (
+                    sensor_id INTEGER NOT NULL,
+                    filename TEXT NOT NULL,
+                    size INTEGER,
+                    mtime_ns INTEGER,
+                    PRIMARY KEY (sensor_id, filename)
+                );
+
+                CREATE TABLE IF NOT EXISTS rolling_means (
+                    sensor_id INTEGER NOT NULL,
+                    resolution TEXT NOT NULL,
+                    timestamp INTEGER NOT NULL{value_columns}
+                );
+                CREATE INDEX IF NOT EXISTS rolling_means_sensor_timestamp
+                    ON rolling_means (sensor_id, resolution, timestamp);
+
+                CREATE TABLE IF NOT EXISTS weekday_hour_means (
+                    sensor_id INTEGER NOT NULL,
+                    year INTEGER NOT NULL,
+                    month INTEGER NOT NULL,
+                    day_of_week TEXT NOT NULL,
+                    hour_of_day INTEGER NOT NULL{value_columns}
+                );
+                CREATE INDEX IF NOT EXISTS weekday_hour_means_sensor_month
+                    ON weekday_hour_means (sensor_id, year, month);
+            '''.format(value_columns=value_columns))
+
+    def _insert_rows(self, table, leading_columns, leading_values, data):
+        """Inserts rows of leading values followed by the value fields."""
+        columns = list(leading_columns) + self.value_fields
+        # NaNs are stored as NULL
+        values = [
+            [
+                None if value != value else value
+                for value in data[field].astype(np.float64).tolist()
+            ]
+            for field in self.value_fields
+        ]
+        self.connection.executemany(
+            'INSERT INTO {table} ({columns}) VALUES ({placeholders})'.format(
+                table=table,
+                columns=', '.join(columns),
+                placeholders=', '.join('?' * len(columns))
+            ),
+            zip(*(list(leading_values) + values))
+        )
+
+    def _read_frame(self, query, parameters, columns):
+        rows = self.connection.execute(query, parameters).fetchall()
+        return pd.DataFrame.from_records(rows, columns=columns)
+
+    def _values_as_float(self, data):
+        for field in self.value_fields:
+            data[field] = data[field].astype(np.float64)
+        return data
+
+    def _read_time_series(self, table, sensor_code, datetime_field, start,
+                          end, extra_condition='', extra_parameters=()):
+        conditions = ['sensor_id = ?']
+        parameters = [sensor_code]
+        if start is not None:
+            conditions.append('timestamp >= ?')
+            parameters.append(_to_timestamp_seconds(start))
+        if end is not None:
+            conditions.append('timestamp < ?')
+            parameters.append(_to_timestamp_seconds(end))
+        if extra_condition:
+            conditions.append(extra_condition)
+            parameters.extend(extra_parameters)
+
+        data = self._read_frame(
+            'SELECT timestamp, {fields} FROM {table} WHERE {conditions} '
+            'ORDER BY timestamp, rowid'.format(
+                fields=', '.join(self.value_fields),
+                table=table,
+                conditions=' AND '.join(conditions)
+            ),
+            parameters,
+            [datetime_field] + self.value_fields
+        )
+        data[datetime_field] = pd.to_datetime(
+            data[datetime_field].astype(np.int64), unit='s'
+        )
+        return self._values_as_float(data)
+
+    def get_ingested_files(self, sensor_code):
+        rows = self.connection.execute(
+            'SELECT filename, size, mtime_ns FROM ingested_files '
+            'WHERE sensor_id = ?',
+            (sensor_code,)
+        )
+        return {
+            filename: [size, mtime_ns] for filename, size, mtime_ns in rows
+        }
+
+    def replace_readings(self, sensor_code, periods, data, datetime_field,
+                         files):
+        with self.connection:
+            self.connection.executemany(
+                'DELETE FROM readings WHERE sensor_id = ? '
+                'AND timestamp >= ? AND timestamp < ?',
+                [
+                    (
+                        sensor_code,
+                        _to_timestamp_seconds(start),
+                        _to_timestamp_seconds(end)
+                    )
+                    for start, end in periods
+                ]
+            )
+            self._insert_rows(
+                'readings',
+                ['sensor_id', 'timestamp'],
+                [
+                    [sensor_code] * len(data),
+                    _to_seconds(data[datetime_field]).tolist()
+                ],
+                data
+            )
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO ingested_files '
+                '(sensor_id, filename, size, mtime_ns) VALUES (?, ?, ?, ?)',
+                [
+                    (sensor_code, filename, size, mtime_ns)
+                    for filename, (size, mtime_ns) in files.items()
+                ]
+            )
+
+    def read_readings(self, sensor_code, datetime_field, start=None,
+                      end=None):
+        return self._read_time_series(
+            'readings', sensor_code, datetime_field, start, end
+        )
+
+    def write_rolling_means(self, sensor_code, year, month, data,
+                            datetime_field, resolution=None):
+        resolution = resolution or PER_READING
+        start, end = _month_range(year, month)
+        with self.connection:
+            self.connection.execute(
+                'DELETE FROM rolling_means WHERE sensor_id = ? '
+                'AND resolution = ? AND timestamp >= ? AND timestamp < ?',
+                (sensor_code, resolution, start, end)
+            )
+            self._insert_rows(
+                'rolling_means',
+                ['sensor_id', 'resolution', 'timestamp'],
+                [
+                    [sensor_code] * len(data),
+                    [resolution] * len(data),
+                    _to_seconds(data[datetime_field]).tolist()
+                ],
+                data
+            )
+
+    def read_rolling_means(self, sensor_code, datetime_field, start=None,
+                           end=None, resolution=None):
+        return self._read_time_series(
+            'rolling_means', sensor_code, datetime_field, start, end,
+            'resolution = ?', [resolution or PER_READING]
+        )
+
+    def write_weekday_hour_means(self, sensor_code, year, month, data):
+        with self.connection:
+            self.connection.execute(
+                'DELETE FROM weekday_hour_means WHERE sensor_id = ? '
+                'AND year = ? AND month = ?',
+                (sensor_code, year, month)
+            )
+            self._insert_rows(
+                'weekday_hour_means',
+                ['sensor_id', 'year', 'month', 'day_of_week', 'hour_of_day'],
+                [
+                    [sensor_code] * len(data),
+                    [year] * len(data),
+                    [month] * len(data),
+                    data['dayOfWeek'].tolist(),
+                    data['hourOfDay'].astype(int).tolist()
+                ],
+                data
+            )
+
+    def read_weekday_hour_means(self, sensor_code, year, month):
+        data = self._read_frame(
+            'SELECT day_of_week, hour_of_day, {fields} '
+            'FROM weekday_hour_means '
+            'WHERE sensor_id = ? AND year = ? AND month = ? '
+            'ORDER BY rowid'.format(fields=', '.join(self.value_fields)),
+            (sensor_code, year, month),
+            ['dayOfWeek', 'hourOfDay'] + self.value_fields
+        )
+        return self._values_as_float(data)
@@ -0,0 +1,105 @@
+"""A local HTTP server standing in for the Luftdaten archive in tests."""
+from collections import Counter
+from functools import partial
+import gzip
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+import os
+import threading
+import time
+
+
+class _ArchiveRequestHandler(SimpleHTTPRequestHandler):
+
+    def __init__(self, *args, archive=None, **kwargs):
+        self.archive = archive
+        super().__init__(*args, **kwargs)
+
+    def _should_fail(self):
+        if self.archive.delay:
+            time.sleep(self.archive.delay)
+        with self.archive.lock:
+            self.archive.requests.append((self.command, self.path))
+            self.archive.request_counts[self.path] += 1
+            remaining = self.archive.failures.get(self.path, 0)
+            if remaining > 0:
+                self.archive.failures[self.path] = remaining - 1
+                return True
+        return False
+
+    def do_GET(self):
+        if self._should_fail():
+            self.send_error(503)
+            return
+        filepath = self.translate_path(self.path)
+        if self.archive.gzip_encoding and os.path.isfile(filepath) and \
+                'gzip' in self.headers.get('Accept-Encoding', ''):
+            with open(filepath, 'rb') as file_:
+                body = gzip.compress(file_.read())
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/csv')
+            self.send_header('Content-Encoding', 'gzip')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        super().do_GET()
+
+    def do_HEAD(self):
+        if self._should_fail():
+            self.send_error(503)
+            return
+        super().do_HEAD()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _ArchiveHTTPServer(ThreadingHTTPServer):
+    # The default backlog of 5 drops connections when many requests are
+    # made at once, which then wait to be retried
+    request_queue_size = 64
+
+
+class ArchiveServer(object):
+    """Serves the files in a directory on localhost.
+
+    Use as a context manager, the archive's base url is in `url`. Requests
+    made are recorded in `requests`, and `failures` maps a path to the
+    number of times it should fail with a 503 before being served. With
+    gzip_encoding set, files are sent gzip encoded to clients accepting it.
+    Each request takes at least delay seconds, as over a real network."""
+    def __init__(self, directory, gzip_encoding=False, delay=0):
+        self.directory = directory
+        self.gzip_encoding = gzip_encoding
+        self.delay = delay
+        self.requests = []
+        self.request_counts = Counter()
+        self.failures = {}
+        self.lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return 'http://{}:{}'.format(host, port)
+
+    def __enter__(self):
+        handler = partial(
+            _ArchiveRequestHandler,
+            archive=self,
+            directory=self.directory
+        )
+        self._server = _ArchiveHTTPServer(('127.0.0.1', 0), handler)
+        self._thread = threading.Thread(
+            target=self._server.serve_forever,
+            kwargs={'poll_interval': 0.01}
+        )
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
@@ -0,0 +1,131 @@
+"""Benchmarks the weekday/hour means against the previous implementation,
+checking both produce the same output.
+
+Run from the app directory:
+    python -m tests.benchmark.benchmark_dataframe --days 365
+"""
+import argparse
+import calendar
+import datetime
+
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal
+
+from data.dataframe import (
+    create_hourly_means_by_weekday_and_hour,
+    create_monthly_hourly_means_by_weekday_and_hour,
+)
+from tests.benchmark.timing import best_time, report
+
+
+def map_create_hourly_means_by_weekday_and_hour(
+        raw_data, value_column, date_column
+):
+    """The previous implementation: copies the frame, maps each row to its
+    day name and hour in Python and groups on the strings."""
+    data = raw_data.copy()
+    data['dayOfWeek'] = data[date_column].map(
+        lambda x: calendar.day_name[x.weekday()]
+    )
+    data['hourOfDay'] = data[date_column].map(lambda x: x.hour)
+    grouped = data[value_column].groupby([data['dayOfWeek'], data['hourOfDay']])
+    return grouped.mean().reset_index()
+
+
+def half_hourly_weeks_fixture():
+    """Six weeks of half hourly data, as used by the unit tests."""
+    data = []
+    for weeks in range(6):
+        for days in range(7):
+            for hours in range(24):
+                for min in [0, 30]:
+                    data.append({
+                        'date': datetime.datetime(2018, 10, 1) +
+                        datetime.timedelta(
+                            weeks=weeks, days=days, hours=hours, minutes=min
+                        ),
+                        'data': float(days * hours)
+                    })
+    return pd.DataFrame(data)
+
+
+def sensor_fixture(days, seed=0):
+    """Readings every ~2.5 minutes with float32 P1/P2 values and some gaps."""
+    random = np.random.RandomState(seed)
+    count = days * 24 * 24
+    offsets = np.arange(count) * 150 + random.randint(0, 30, count)
+    data = pd.DataFrame({
+        'timestamp': pd.Timestamp('2020-01-01') +
+        pd.to_timedelta(offsets, unit='s'),
+        'P1': random.gamma(2.0, 6.0, count).astype(np.float32),
+        'P2': random.gamma(2.0, 2.0, count).astype(np.float32),
+    })
+    data.loc[random.rand(count) < 0.01, 'P2'] = np.nan
+    return data
+
+
+def check_same_output(raw_data, value_column, date_column):
+    expected = map_create_hourly_means_by_weekday_and_hour(
+        raw_data, value_column, date_column
+    )
+    actual = create_hourly_means_by_weekday_and_hour(
+        raw_data, value_column, date_column
+    )
+    assert_frame_equal(actual, expected)
+    assert actual.to_csv(index=False) == expected.to_csv(index=False)
+
+
+def main(days, repeat):
+    check_same_output(half_hourly_weeks_fixture(), 'data', 'date')
+    check_same_output(half_hourly_weeks_fixture(), ['data'], 'date')
+
+    data = sensor_fixture(days)
+    check_same_output(data, ['P1', 'P2'], 'timestamp')
+    print("Output matches the previous implementation")
+
+    seconds, _ = best_time(
+        lambda: map_create_hourly_means_by_weekday_and_hour(
+            data, ['P1', 'P2'], 'timestamp'
+        ),
+        repeat
+    )
+    report('map weekday/hour ({} days)'.format(days), seconds, len(data))
+
+    seconds, _ = best_time(
+        lambda: create_hourly_means_by_weekday_and_hour(
+            data, ['P1', 'P2'], 'timestamp'
+        ),
+        repeat
+    )
+    report('vectorised weekday/hour ({} days)'.format(days), seconds, len(data))
+
+    def per_month_groups():
+        timestamps = data['timestamp'].dt
+        grouped = data.groupby([timestamps.year, timestamps.month])
+        return [
+            create_hourly_means_by_weekday_and_hour(
+                month_data, ['P1', 'P2'], 'timestamp'
+            )
+            for _, month_data in grouped
+        ]
+
+    seconds, _ = best_time(per_month_groups, repeat)
+    report('per month weekday/hour ({} days)'.format(days), seconds, len(data))
+
+    seconds, _ = best_time(
+        lambda: create_monthly_hourly_means_by_weekday_and_hour(
+            data, ['P1', 'P2'], 'timestamp'
+        ),
+        repeat
+    )
+    report('single pass monthly weekday/hour ({} days)'.format(days),
+           seconds, len(data))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    main(args.days, args.repeat)
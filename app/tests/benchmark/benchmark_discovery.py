@@ -0,0 +1,102 @@
+"""Times discovering the sensors in an area from an archive with thousands
+of sensors, first with an empty listing index and then again with the
+index from the first run.
+
+The archive is a local stand-in with a day file for every sensor, each
+placed at random across a wide area of which a small part is searched.
+
+Run from the app directory:
+    python -m tests.benchmark.benchmark_discovery --sensors 2000 --days 14
+"""
+import argparse
+import datetime
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from luftdaten.discovery import discover_sensors, ListingIndex, SearchArea
+from luftdaten.download import ArchiveDownloader
+from tests.archive_server import ArchiveServer
+from tests.raw_files import write_raw_file
+
+
+START_DATE = datetime.date(2020, 1, 1)
+
+# Around Bristol, within the wider area the sensors are spread over
+BOUNDING_BOX = (51.3, -2.8, 51.6, -2.4)
+
+
+def write_archive(archive_dir, sensors, days, seed=0):
+    random = np.random.RandomState(seed)
+    latitudes = random.uniform(50.0, 53.0, sensors).round(4)
+    longitudes = random.uniform(-5.0, 1.0, sensors).round(4)
+    for sensor_code, latitude, longitude in zip(
+            range(1, sensors + 1), latitudes, longitudes):
+        # Sensors start over the first half of the days
+        first_day = random.randint(0, max(days // 2, 1))
+        for day_offset in range(first_day, days):
+            date_ = START_DATE + datetime.timedelta(days=day_offset)
+            write_raw_file(archive_dir, sensor_code, date_, [
+                (date_.strftime('%Y-%m-%dT12:00:00'), 1.0, 0.5),
+            ], location=(latitude, longitude))
+    return SearchArea(bounding_box=BOUNDING_BOX).contains(
+        latitudes, longitudes
+    ).sum()
+
+
+def run(archive, index_filepath, days, step_days, workers):
+    end_date = START_DATE + datetime.timedelta(days=days - 1)
+    archive.requests.clear()
+    start = time.perf_counter()
+    with ArchiveDownloader(max_workers=workers, max_per_host=workers) \
+            as downloader:
+        sensors = discover_sensors(
+            ListingIndex(index_filepath),
+            downloader,
+            SearchArea(bounding_box=BOUNDING_BOX),
+            start_date=START_DATE,
+            end_date=end_date,
+            step_days=step_days,
+            archive_url=archive.url
+        )
+    return time.perf_counter() - start, len(archive.requests), len(sensors)
+
+
+def main(sensors, days, step_days, workers, delay):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        archive_dir = os.path.join(temp_dir, 'archive')
+        index_filepath = os.path.join(temp_dir, 'archive-listings.json')
+        expected = write_archive(archive_dir, sensors, days)
+
+        with ArchiveServer(archive_dir, delay=delay) as archive:
+            results = [
+                ('first scan', run(
+                    archive, index_filepath, days, step_days, workers
+                )),
+                ('repeat scan', run(
+                    archive, index_filepath, days, step_days, workers
+                )),
+            ]
+        index_bytes = os.path.getsize(index_filepath)
+
+    print("{} sensors over {} days, scanning every {} day(s), {} in the "
+          "area".format(sensors, days, step_days, expected))
+    for name, (seconds, requests, found) in results:
+        print("{:<12} {:8.2f}s {:8d} requests {:6d} found".format(
+            name, seconds, requests, found
+        ))
+    print("Index {:.1f} KB".format(index_bytes / 1024))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sensors', type=int, default=2000)
+    parser.add_argument('--days', type=int, default=14)
+    parser.add_argument('--step-days', type=int, default=1)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--delay', type=float, default=0.0,
+                        help='Seconds each archive request takes')
+    args = parser.parse_args()
+    main(args.sensors, args.days, args.step_days, args.workers, args.delay)
@@ -0,0 +1,107 @@
+"""Benchmarks loading a sensor's raw history.
+
+Compares the bulk loader against the previous implementation, which
+appended one file at a time and parsed timestamps with strptime, and
+against loading through the columnar cache.
+
+Run from the app directory:
+    python -m tests.benchmark.benchmark_load_data --days 365
+"""
+import argparse
+import datetime
+import os
+import tempfile
+
+import pandas as pd
+
+from luftdaten.data import (
+    get_existing_raw_luftdaten_filepaths,
+    load_luftdaten_sensor_data,
+)
+from tests.benchmark.raw_data import write_raw_luftdaten_files
+from tests.benchmark.timing import best_time, report
+
+
+SENSOR_CODE = 12345
+DATETIME_FIELD = 'timestamp'
+
+
+def append_loop_load_luftdaten_sensor_data(
+        luftdaten_raw_data_dir,
+        sensor_code,
+        datetime_field
+):
+    """The previous loader: one read and a full copy per file."""
+    converters = {}
+    converters[datetime_field] = \
+        lambda val: datetime.datetime.strptime(val, "%Y-%m-%dT%H:%M:%S")
+
+    filepaths = get_existing_raw_luftdaten_filepaths(
+        luftdaten_raw_data_dir,
+        sensor_code
+    )
+
+    data = pd.DataFrame()
+    for filepath in filepaths:
+        data = pd.concat([
+            data,
+            pd.read_csv(filepath, delimiter=';', converters=converters)
+        ])
+    return data
+
+
+def main(days, repeat):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        raw_dir = os.path.join(temp_dir, 'raw')
+        cache_dir = os.path.join(temp_dir, 'cache')
+        write_raw_luftdaten_files(
+            raw_dir, SENSOR_CODE, datetime.date(2020, 1, 1), days
+        )
+
+        seconds, data = best_time(
+            lambda: append_loop_load_luftdaten_sensor_data(
+                raw_dir, SENSOR_CODE, DATETIME_FIELD
+            ),
+            repeat
+        )
+        report('append loop ({} days)'.format(days), seconds, len(data))
+
+        seconds, data = best_time(
+            lambda: load_luftdaten_sensor_data(
+                raw_dir, SENSOR_CODE, DATETIME_FIELD
+            ),
+            repeat
+        )
+        report('bulk loader ({} days)'.format(days), seconds, len(data))
+
+        seconds, data = best_time(
+            lambda: load_luftdaten_sensor_data(
+                raw_dir, SENSOR_CODE, DATETIME_FIELD,
+                luftdaten_cache_dir=cache_dir
+            ),
+            1
+        )
+        report('cache, cold ({} days)'.format(days), seconds, len(data))
+
+        write_raw_luftdaten_files(
+            raw_dir,
+            SENSOR_CODE,
+            datetime.date(2020, 1, 1) + datetime.timedelta(days=days),
+            1
+        )
+        seconds, data = best_time(
+            lambda: load_luftdaten_sensor_data(
+                raw_dir, SENSOR_CODE, DATETIME_FIELD,
+                luftdaten_cache_dir=cache_dir
+            ),
+            repeat
+        )
+        report('cache, one new day ({} days)'.format(days), seconds, len(data))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    main(args.days, args.repeat)
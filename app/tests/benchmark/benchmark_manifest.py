@@ -0,0 +1,90 @@
+"""Benchmarks finding a sensor's mirrored files by scanning the mirror
+against reading the sensor's manifest, in a mirror of many sensors.
+
+Run from the app directory:
+    python -m tests.benchmark.benchmark_manifest --sensors 20 --days 365
+"""
+import argparse
+import datetime
+import os
+import tempfile
+
+from location import LatLongLocation
+from luftdaten.data import (
+    get_existing_raw_luftdaten_filepaths,
+    get_raw_luftdaten_downloads,
+    rebuild_raw_luftdaten_manifests,
+    scan_raw_luftdaten_filepaths,
+    update_luftdaten_sensor_cache,
+)
+from sensor import Sensor
+from tests.benchmark.timing import best_time, report
+from tests.raw_files import write_raw_file
+
+
+def write_mirror(raw_dir, sensors, days):
+    """A mirror with a small file per sensor per day."""
+    start_date = datetime.date.today() - datetime.timedelta(days=days)
+    for day_offset in range(days):
+        date_ = start_date + datetime.timedelta(days=day_offset)
+        for sensor_code in range(1, sensors + 1):
+            write_raw_file(raw_dir, sensor_code, date_, [
+                (date_.strftime('%Y-%m-%dT12:00:00'), 1.0, 0.5),
+            ])
+    return start_date
+
+
+def main(sensors, days, repeat):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        raw_dir = os.path.join(temp_dir, 'raw')
+        cache_dir = os.path.join(temp_dir, 'cache')
+        start_date = write_mirror(raw_dir, sensors, days)
+        sensor = Sensor(1, 'Test', start_date, LatLongLocation(51.4, -2.5))
+        files = sensors * days
+
+        seconds, _ = best_time(
+            lambda: scan_raw_luftdaten_filepaths(raw_dir, 1), repeat
+        )
+        report('scan for one sensor', seconds, files)
+        seconds, _ = best_time(
+            lambda: get_raw_luftdaten_downloads(raw_dir, sensor), repeat
+        )
+        report('downloads to make, scanning', seconds, files)
+        update_luftdaten_sensor_cache(raw_dir, cache_dir, 1, 'timestamp')
+        seconds, _ = best_time(
+            lambda: update_luftdaten_sensor_cache(
+                raw_dir, cache_dir, 1, 'timestamp'
+            ),
+            repeat
+        )
+        report('unchanged cache update, scanning', seconds, files)
+
+        seconds, _ = best_time(
+            lambda: rebuild_raw_luftdaten_manifests(raw_dir), 1
+        )
+        report('rebuild manifests', seconds, files)
+
+        seconds, _ = best_time(
+            lambda: get_existing_raw_luftdaten_filepaths(raw_dir, 1), repeat
+        )
+        report('manifest for one sensor', seconds, files)
+        seconds, _ = best_time(
+            lambda: get_raw_luftdaten_downloads(raw_dir, sensor), repeat
+        )
+        report('downloads to make, manifest', seconds, files)
+        seconds, _ = best_time(
+            lambda: update_luftdaten_sensor_cache(
+                raw_dir, cache_dir, 1, 'timestamp'
+            ),
+            repeat
+        )
+        report('unchanged cache update, manifest', seconds, files)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sensors', type=int, default=20)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    main(args.sensors, args.days, args.repeat)
@@ -0,0 +1,79 @@
+"""Benchmarks the size and parse time of a month of 24 hour means as CSV
+and as compact binary files.
+
+Run from the app directory:
+    python -m tests.benchmark.benchmark_output_formats --decimals 2
+"""
+import argparse
+import gzip
+import os
+import tempfile
+
+import pandas as pd
+
+from data.compact import read_compact_file, write_compact_file
+from data.dataframe import add_month_year_columns, create_24_hour_means
+from tests.benchmark.benchmark_dataframe import sensor_fixture
+from tests.benchmark.timing import best_time, report
+
+
+def gzipped_size(filepath):
+    with open(filepath, 'rb') as file_:
+        return len(gzip.compress(file_.read()))
+
+
+def main(decimals, repeat):
+    value_fields = ['P1', 'P2']
+    means = create_24_hour_means(sensor_fixture(31), value_fields, 'timestamp')
+    means = add_month_year_columns(means, 'timestamp')
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        def path(name):
+            return os.path.join(temp_dir, name)
+
+        means.to_csv(path('means.csv'), index=False)
+        means.round(decimals).to_csv(path('rounded.csv'), index=False)
+        write_compact_file(
+            path('float32.bin'), means, 'timestamp', value_fields
+        )
+        write_compact_file(
+            path('scaled.bin'), means, 'timestamp', value_fields,
+            decimals=decimals
+        )
+
+        outputs = [
+            ('CSV', 'means.csv'),
+            ('CSV, {} decimals'.format(decimals), 'rounded.csv'),
+            ('compact float32', 'float32.bin'),
+            ('compact, {} decimals'.format(decimals), 'scaled.bin'),
+        ]
+        print("{:<45} {:>10} {:>10}".format('', 'bytes', 'gzipped'))
+        for name, filename in outputs:
+            print("{:<45} {:>10,} {:>10,}".format(
+                name,
+                os.path.getsize(path(filename)),
+                gzipped_size(path(filename))
+            ))
+
+        for name, filename in outputs:
+            if filename.endswith('.csv'):
+                seconds, _ = best_time(
+                    lambda: pd.read_csv(
+                        path(filename), parse_dates=['timestamp']
+                    ),
+                    repeat
+                )
+            else:
+                seconds, _ = best_time(
+                    lambda: read_compact_file(path(filename)),
+                    repeat
+                )
+            report('parse ' + name, seconds, len(means))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--decimals', type=int, default=2)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    main(args.decimals, args.repeat)
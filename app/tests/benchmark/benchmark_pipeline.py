@@ -0,0 +1,84 @@
+"""Compares downloading every sensor and then processing them with
+process_data.py --download, which processes each sensor as soon as its own
+files are downloaded.
+
+The archive is a local stand-in serving a generated mirror, with a delay
+on each request as over a real network. Each run starts from an empty
+mirror, so everything is downloaded and processed. Ideally the pipeline
+takes about as long as the slower of downloading and processing, rather
+than both.
+
+Run from the app directory:
+    python -m tests.benchmark.benchmark_pipeline --sensors 4 --days 180 \\
+        --delay 0.1
+"""
+import argparse
+import datetime
+import os
+import shutil
+import tempfile
+
+from tests.archive_server import ArchiveServer
+from tests.benchmark.benchmark_suite import (
+    DEFECT_RATES,
+    run_process_data,
+    write_site,
+)
+from tests.benchmark.raw_data import write_raw_luftdaten_mirror
+
+
+def clear_data(site_dir):
+    shutil.rmtree(os.path.join(site_dir, 'data'), ignore_errors=True)
+
+
+def main(sensors, days, delay, workers):
+    # Archive files are requested up to today
+    start_date = datetime.date.today() - datetime.timedelta(days=days)
+    with tempfile.TemporaryDirectory() as archive_dir, \
+            tempfile.TemporaryDirectory() as site_dir:
+        sensor_codes = write_raw_luftdaten_mirror(
+            archive_dir, sensors, start_date, days, **DEFECT_RATES
+        )
+        write_site(site_dir, sensor_codes, start_date)
+
+        with ArchiveServer(archive_dir, delay=delay) as archive:
+            archive_arguments = ['--archive-url', archive.url]
+            process_arguments = ['--workers', str(workers)]
+
+            clear_data(site_dir)
+            download_seconds, _ = run_process_data(
+                site_dir, archive_arguments, script='download_data.py'
+            )
+            process_seconds, _ = run_process_data(site_dir, process_arguments)
+
+            clear_data(site_dir)
+            pipeline_seconds, _ = run_process_data(
+                site_dir, ['--download'] + archive_arguments + process_arguments
+            )
+
+    print("{} sensors over {} days, {:.0f} ms per request".format(
+        sensors, days, delay * 1000
+    ))
+    print("{:<40} {:8.2f}s".format('download_data.py', download_seconds))
+    print("{:<40} {:8.2f}s".format('process_data.py', process_seconds))
+    print("{:<40} {:8.2f}s".format(
+        'download_data.py, then process_data.py',
+        download_seconds + process_seconds
+    ))
+    print("{:<40} {:8.2f}s  ({:.0%} of the slower alone)".format(
+        'process_data.py --download',
+        pipeline_seconds,
+        pipeline_seconds / max(download_seconds, process_seconds)
+    ))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sensors', type=int, default=4)
+    parser.add_argument('--days', type=int, default=180)
+    parser.add_argument('--delay', type=float, default=0.1,
+                        help='Seconds each archive request takes')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of sensors to process in parallel')
+    args = parser.parse_args()
+    main(args.sensors, args.days, args.delay, args.workers)
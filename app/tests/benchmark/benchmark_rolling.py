@@ -0,0 +1,65 @@
+"""Benchmarks the NumPy rolling 24 hour means against pandas' rolling
+windows.
+
+Run from the app directory:
+    python -m tests.benchmark.benchmark_rolling --days 365
+"""
+import argparse
+
+import numpy as np
+
+from data.dataframe import create_24_hour_means
+from tests.benchmark.benchmark_dataframe import sensor_fixture
+from tests.benchmark.timing import best_time, report
+
+
+def pandas_create_24_hour_means(raw_data, value_column, date_column):
+    """The previous implementation, using pandas' rolling windows."""
+    df1 = raw_data.set_index(date_column).sort_index()
+    df_24_hour_means = df1[value_column].rolling('24H').mean()
+    return df_24_hour_means.reset_index()
+
+
+def main(days, repeat):
+    data = sensor_fixture(days)
+    value_fields = ['P1', 'P2']
+
+    seconds, expected = best_time(
+        lambda: pandas_create_24_hour_means(data, value_fields, 'timestamp'),
+        repeat
+    )
+    report('pandas rolling ({} days)'.format(days), seconds, len(data))
+
+    seconds, actual = best_time(
+        lambda: create_24_hour_means(data, value_fields, 'timestamp'),
+        repeat
+    )
+    report('numpy rolling ({} days)'.format(days), seconds, len(data))
+    np.testing.assert_allclose(
+        actual[value_fields].values,
+        expected[value_fields].values,
+        rtol=1e-6
+    )
+
+    for resolution in ['10min', '1H']:
+        seconds, means = best_time(
+            lambda: create_24_hour_means(
+                data, value_fields, 'timestamp', resolution=resolution
+            ),
+            repeat
+        )
+        report(
+            'numpy rolling, {} ({} days, {} rows out)'.format(
+                resolution, days, len(means)
+            ),
+            seconds,
+            len(data)
+        )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    main(args.days, args.repeat)
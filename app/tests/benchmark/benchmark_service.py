@@ -0,0 +1,201 @@
+"""Load test of the query service, reporting latency percentiles and
+requests per second.
+
+By default a service is started in this process on generated data, so its
+cache statistics can be reported too. With --url a running service (e.g.
+scripts/serve_data.py) is tested instead, for sensors numbered 1 to
+--sensors with data from --start-date.
+
+Requests are drawn from a pool of --distinct queries, each for a random
+sensor over a random range of 1, 7 or 31 days at a random resolution, and
+a share of them revalidate a response already seen with its ETag, as a
+browser would.
+
+Run from the app directory:
+    python -m tests.benchmark.benchmark_service --requests 2000 \\
+        --concurrency 8
+"""
+import argparse
+import datetime
+import http.client
+import os
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode, urlsplit
+
+import numpy as np
+
+from luftdaten.data import (
+    load_luftdaten_sensor_data,
+    RESOLUTION_TIERS,
+    write_24_hour_mean_aggregated_data_files,
+)
+from service import AggregatedDataService, create_server
+from service.query import FULL_RESOLUTION
+from tests.benchmark.raw_data import write_raw_luftdaten_mirror
+
+
+DATETIME_FIELD = 'timestamp'
+VALUE_FIELDS = ['P1', 'P2']
+RANGE_DAYS = [1, 7, 31]
+RESOLUTIONS = [FULL_RESOLUTION] + list(RESOLUTION_TIERS)
+
+
+def write_aggregated_data(data_dir, sensors, start_date, days):
+    """Writes the 24 hour means of a generated mirror.
+
+    :returns: The directory of the aggregated data"""
+    raw_dir = os.path.join(data_dir, 'raw')
+    aggregated_dir = os.path.join(data_dir, 'aggregated')
+    for sensor_code in write_raw_luftdaten_mirror(
+            raw_dir, sensors, start_date, days
+    ):
+        write_24_hour_mean_aggregated_data_files(
+            aggregated_dir,
+            sensor_code,
+            load_luftdaten_sensor_data(
+                raw_dir, sensor_code, DATETIME_FIELD, VALUE_FIELDS
+            ),
+            VALUE_FIELDS,
+            DATETIME_FIELD
+        )
+    return aggregated_dir
+
+
+def create_requests(count, distinct, sensors, start_date, days, seed=0):
+    """Random query paths for the load test, drawn from a pool of distinct
+    queries."""
+    random = np.random.RandomState(seed)
+    pool = []
+    for _ in range(distinct):
+        range_days = RANGE_DAYS[random.randint(len(RANGE_DAYS))]
+        start = datetime.datetime.combine(start_date, datetime.time()) + \
+            datetime.timedelta(
+                hours=int(random.randint(max(days - range_days, 1) * 24))
+            )
+        pool.append('/sensors/{}/24_hour_means?{}'.format(
+            random.randint(1, sensors + 1),
+            urlencode({
+                'start': start.isoformat(),
+                'end': (start + datetime.timedelta(days=range_days))
+                .isoformat(),
+                'resolution': RESOLUTIONS[random.randint(len(RESOLUTIONS))],
+            })
+        ))
+    return [pool[i] for i in random.randint(len(pool), size=count)]
+
+
+def run_load(host, port, paths, concurrency, revalidate_rate, seed=0):
+    """Sends the requests from concurrency threads, each with its own
+    connection.
+
+    :returns: Latency of each request in seconds, status codes, bytes
+        received and the seconds taken overall"""
+    random = np.random.RandomState(seed)
+    revalidate = random.rand(len(paths)) < revalidate_rate
+    etags = {}
+    latencies = np.zeros(len(paths))
+    statuses = [None] * len(paths)
+    received = [0] * len(paths)
+    next_request = iter(range(len(paths)))
+    lock = threading.Lock()
+
+    def worker():
+        connection = http.client.HTTPConnection(host, port)
+        try:
+            while True:
+                with lock:
+                    i = next(next_request, None)
+                if i is None:
+                    return
+                headers = {'Accept-Encoding': 'gzip'}
+                etag = etags.get(paths[i])
+                if revalidate[i] and etag is not None:
+                    headers['If-None-Match'] = etag
+                start = time.perf_counter()
+                connection.request('GET', paths[i], headers=headers)
+                response = connection.getresponse()
+                body = response.read()
+                latencies[i] = time.perf_counter() - start
+                statuses[i] = response.status
+                received[i] = len(body)
+                if response.getheader('ETag'):
+                    etags[paths[i]] = response.getheader('ETag')
+        finally:
+            connection.close()
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, statuses, sum(received), time.perf_counter() - start
+
+
+def print_results(latencies, statuses, received, seconds):
+    p50, p90, p99 = np.percentile(latencies, [50, 90, 99]) * 1000
+    print("{} requests in {:.2f}s: {:,.0f} requests/s".format(
+        len(latencies), seconds, len(latencies) / seconds
+    ))
+    print("Latency p50 {:.1f} ms, p90 {:.1f} ms, p99 {:.1f} ms, "
+          "max {:.1f} ms".format(p50, p90, p99, latencies.max() * 1000))
+    print("Statuses: {}".format(', '.join(
+        '{} x{}'.format(status, statuses.count(status))
+        for status in sorted(set(statuses), key=str)
+    )))
+    print("Received {:,} bytes".format(received))
+
+
+def main(args):
+    start_date = datetime.date.fromisoformat(args.start_date)
+    paths = create_requests(
+        args.requests, args.distinct, args.sensors, start_date, args.days
+    )
+
+    if args.url is not None:
+        url = urlsplit(args.url)
+        print_results(*run_load(
+            url.hostname, url.port or 80, paths, args.concurrency,
+            args.revalidate_rate
+        ))
+        return
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        service = AggregatedDataService(
+            write_aggregated_data(
+                data_dir, args.sensors, start_date, args.days
+            ),
+            cache_bytes=args.cache_mb * 1024 ** 2
+        )
+        server = create_server(service, port=0, quiet=True)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            print_results(*run_load(
+                *server.server_address[:2], paths, args.concurrency,
+                args.revalidate_rate
+            ))
+        finally:
+            server.shutdown()
+            server.server_close()
+        print("Months cache: {}".format(service.cache.get_stats()))
+        print("Responses cache: {}".format(server.responses.get_stats()))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default=None,
+                        help='Test the service running at this URL')
+    parser.add_argument('--sensors', type=int, default=3)
+    parser.add_argument('--days', type=int, default=180)
+    parser.add_argument('--start-date', default='2018-01-01')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--revalidate-rate', type=float, default=0.3,
+                        help='Share of requests sent with a seen ETag')
+    parser.add_argument('--distinct', type=int, default=200,
+                        help='Number of different queries to draw from')
+    parser.add_argument('--cache-mb', type=int, default=64)
+    main(parser.parse_args())
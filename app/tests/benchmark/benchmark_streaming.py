@@ -0,0 +1,117 @@
+"""Benchmarks the peak memory and time of aggregating a long sensor history
+all at once against a month at a time.
+
+Each run is made in its own process so its peak resident set size can be
+measured. Run from the app directory:
+    python -m tests.benchmark.benchmark_streaming --days 730
+"""
+import argparse
+import datetime
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from luftdaten.data import (
+    iter_cached_luftdaten_sensor_months,
+    load_luftdaten_sensor_data,
+    update_luftdaten_sensor_cache,
+    write_24_hour_mean_aggregated_data_files,
+    write_aggregated_dayofweek_data_files,
+)
+from tests.benchmark.raw_data import write_raw_luftdaten_files
+
+
+SENSOR_CODE = 1
+VALUE_FIELDS = ['P1', 'P2']
+# As in process_data.py, for the 24 hour rolling means
+LEAD_IN = datetime.timedelta(hours=24)
+
+
+def aggregate(raw_dir, cache_dir, aggregated_dir, streaming):
+    if streaming:
+        chunks = (
+            ({yearmonth}, data)
+            for yearmonth, data in iter_cached_luftdaten_sensor_months(
+                cache_dir,
+                SENSOR_CODE,
+                'timestamp',
+                VALUE_FIELDS,
+                lead_in=LEAD_IN
+            )
+        )
+    else:
+        chunks = [(None, load_luftdaten_sensor_data(
+            raw_dir,
+            SENSOR_CODE,
+            'timestamp',
+            VALUE_FIELDS,
+            luftdaten_cache_dir=cache_dir
+        ))]
+    for months, data in chunks:
+        write_aggregated_dayofweek_data_files(
+            aggregated_dir, SENSOR_CODE, data, VALUE_FIELDS, 'timestamp',
+            months=months
+        )
+        write_24_hour_mean_aggregated_data_files(
+            aggregated_dir, SENSOR_CODE, data, VALUE_FIELDS, 'timestamp',
+            months=months
+        )
+
+
+def run_child(temp_dir, streaming):
+    """Aggregates in this process and prints its time and peak RSS."""
+    start = time.perf_counter()
+    aggregate(
+        os.path.join(temp_dir, 'raw'),
+        os.path.join(temp_dir, 'cache'),
+        os.path.join(temp_dir, 'aggregated', str(streaming)),
+        streaming
+    )
+    seconds = time.perf_counter() - start
+    # ru_maxrss is in kilobytes on Linux
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(seconds, peak_kb)
+
+
+def main(days):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        raw_dir = os.path.join(temp_dir, 'raw')
+        write_raw_luftdaten_files(
+            raw_dir, SENSOR_CODE, datetime.date(2017, 1, 1), days
+        )
+        update_luftdaten_sensor_cache(
+            raw_dir, os.path.join(temp_dir, 'cache'), SENSOR_CODE,
+            'timestamp', VALUE_FIELDS
+        )
+
+        for name, flag in [('all at once', []), ('streaming', ['--streaming'])]:
+            output = subprocess.run(
+                [sys.executable, '-m', 'tests.benchmark.benchmark_streaming',
+                 '--child', temp_dir] + flag,
+                check=True,
+                stdout=subprocess.PIPE,
+                universal_newlines=True
+            ).stdout
+            seconds, peak_kb = output.split()
+            print("{name:<45} {seconds:8.3f}s {peak:10.1f} MB peak RSS".format(
+                name='{} days, {}'.format(days, name),
+                seconds=float(seconds),
+                peak=int(peak_kb) / 1024
+            ))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--days', type=int, default=730)
+    parser.add_argument('--child', metavar='TEMP_DIR',
+                        help=argparse.SUPPRESS)
+    parser.add_argument('--streaming', action='store_true',
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        run_child(args.child, args.streaming)
+    else:
+        main(args.days)
@@ -0,0 +1,257 @@
+"""Benchmarks the main stages of the pipeline on a synthetic mirror of
+several sensors over several years, with gaps, NaNs and malformed rows.
+
+Each benchmark's best time, throughput in rows per second and peak memory
+are reported. Peak memory is the most allocated while the stage runs, as
+tracked by tracemalloc in a separate run from the timed ones, or the peak
+RSS of the process for the end to end run of process_data.py. Results can
+be saved and compared with a previous run's.
+
+Run from the app directory:
+    python -m tests.benchmark.benchmark_suite --sensors 3 --days 730 \\
+        --output after.json --baseline before.json
+"""
+import argparse
+import datetime
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import yaml
+
+from data.dataframe import (
+    create_24_hour_means,
+    create_hourly_means_by_weekday_and_hour,
+)
+from luftdaten.data import (
+    clean_luftdaten_sensor_data,
+    load_luftdaten_sensor_data,
+    write_24_hour_mean_aggregated_data_files,
+    write_aggregated_dayofweek_data_files,
+    write_exceedance_data_files,
+)
+from tests.benchmark.raw_data import (
+    SENSOR_LATITUDE,
+    SENSOR_LONGITUDE,
+    write_raw_luftdaten_mirror,
+)
+from tests.benchmark.timing import best_time
+
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__)
+)))
+SCRIPTS_DIR = os.path.join(os.path.dirname(APP_DIR), 'scripts')
+
+START_DATE = datetime.date(2018, 1, 1)
+DATETIME_FIELD = 'timestamp'
+VALUE_FIELDS = ['P1', 'P2']
+
+# Roughly the imperfections of the real archive
+DEFECT_RATES = {
+    'missing_day_rate': 0.02,
+    'outage_rate': 0.05,
+    'nan_rate': 0.005,
+    'malformed_rate': 0.0005,
+}
+
+
+def traced_peak_mb(func):
+    """Most memory allocated while func runs, in megabytes."""
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / 1024 ** 2
+
+
+def write_site(site_dir, sensor_codes, start_date=START_DATE):
+    """Lays out a copy of the site around the mirror, so process_data.py
+    can be run on it with its relative paths."""
+    os.symlink(APP_DIR, os.path.join(site_dir, 'app'))
+    # Copied rather than linked, as '..' from a linked working directory
+    # would be the real site's directory, and its data
+    shutil.copytree(SCRIPTS_DIR, os.path.join(site_dir, 'scripts'))
+    os.makedirs(os.path.join(site_dir, 'config'))
+    with open(os.path.join(site_dir, 'config', 'sensors.yaml'), 'w') as file_:
+        yaml.safe_dump({'sensors': {'luftdaten': {
+            sensor_code: {
+                'name': 'Sensor {}'.format(sensor_code),
+                'start_date': start_date,
+                'location': {
+                    'latitude': SENSOR_LATITUDE,
+                    'longitude': SENSOR_LONGITUDE,
+                },
+            }
+            for sensor_code in sensor_codes
+        }}}, file_)
+
+
+def run_process_data(site_dir, arguments, script='process_data.py'):
+    """Runs process_data.py, or another of the scripts, on the site.
+
+    :returns: Seconds taken and the peak RSS of the process in megabytes"""
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, script] + arguments,
+        cwd=os.path.join(site_dir, 'scripts'),
+        stdout=subprocess.DEVNULL
+    )
+    # Waits for this process alone, to get its own resource usage
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    seconds = time.perf_counter() - start
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, process.args)
+    # ru_maxrss is in kilobytes on Linux
+    return seconds, usage.ru_maxrss / 1024
+
+
+def run_benchmarks(site_dir, sensor_codes, repeat):
+    """Runs each benchmark in turn.
+
+    :returns: A result dict for each benchmark
+    :rtype: list"""
+    raw_dir = os.path.join(site_dir, 'data', 'luftdaten', 'raw')
+    output_dir = os.path.join(site_dir, 'output')
+    sensor_code = sensor_codes[0]
+    data = load_luftdaten_sensor_data(
+        raw_dir, sensor_code, DATETIME_FIELD, VALUE_FIELDS
+    )
+    rows = len(data)
+
+    benchmarks = [
+        ('load_luftdaten_sensor_data', rows, lambda: load_luftdaten_sensor_data(
+            raw_dir, sensor_code, DATETIME_FIELD, VALUE_FIELDS
+        )),
+        ('clean_luftdaten_sensor_data', rows,
+         lambda: clean_luftdaten_sensor_data(
+             data, DATETIME_FIELD, VALUE_FIELDS
+         )),
+        ('create_24_hour_means', rows, lambda: create_24_hour_means(
+            data, VALUE_FIELDS, DATETIME_FIELD
+        )),
+        ('create_hourly_means_by_weekday_and_hour', rows,
+         lambda: create_hourly_means_by_weekday_and_hour(
+             data, VALUE_FIELDS, DATETIME_FIELD
+         )),
+        ('write_24_hour_mean_aggregated_data_files', rows,
+         lambda: write_24_hour_mean_aggregated_data_files(
+             output_dir, sensor_code, data, VALUE_FIELDS, DATETIME_FIELD
+         )),
+        ('write_aggregated_dayofweek_data_files', rows,
+         lambda: write_aggregated_dayofweek_data_files(
+             output_dir, sensor_code, data, VALUE_FIELDS, DATETIME_FIELD
+         )),
+        ('write_exceedance_data_files', rows,
+         lambda: write_exceedance_data_files(
+             output_dir, sensor_code, data, VALUE_FIELDS, DATETIME_FIELD
+         )),
+    ]
+
+    results = []
+    for name, benchmark_rows, func in benchmarks:
+        seconds, _ = best_time(func, repeat)
+        results.append(create_result(
+            name, seconds, benchmark_rows, traced_peak_mb(func)
+        ))
+
+    total_rows = rows + sum(
+        len(load_luftdaten_sensor_data(
+            raw_dir, other_code, DATETIME_FIELD, VALUE_FIELDS
+        ))
+        for other_code in sensor_codes[1:]
+    )
+    del data
+    for name, arguments in [
+            ('process_data.py', []),
+            ('process_data.py --incremental, unchanged', ['--incremental']),
+    ]:
+        best_seconds = None
+        for _ in range(repeat):
+            seconds, peak_mb = run_process_data(site_dir, arguments)
+            best_seconds = seconds if best_seconds is None \
+                else min(best_seconds, seconds)
+        results.append(create_result(name, best_seconds, total_rows, peak_mb))
+    return results
+
+
+def create_result(name, seconds, rows, peak_memory_mb):
+    return {
+        'name': name,
+        'seconds': round(seconds, 6),
+        'rows': rows,
+        'rows_per_second': round(rows / seconds) if seconds else None,
+        'peak_memory_mb': round(peak_memory_mb, 1),
+    }
+
+
+def print_results(results, baseline=None):
+    baseline_by_name = {
+        result['name']: result for result in (baseline or {}).get(
+            'results', []
+        )
+    }
+    for result in results:
+        line = "{name:<45} {seconds:8.3f}s {rate:12,} rows/s " \
+            "{peak:8.1f} MB".format(
+                name=result['name'],
+                seconds=result['seconds'],
+                rate=result['rows_per_second'] or 0,
+                peak=result['peak_memory_mb']
+            )
+        previous = baseline_by_name.get(result['name'])
+        if previous is not None:
+            line += "  time {:+.0%}, memory {:+.0%}".format(
+                result['seconds'] / previous['seconds'] - 1,
+                result['peak_memory_mb'] / previous['peak_memory_mb'] - 1
+            )
+        print(line)
+
+
+def main(sensors, days, repeat, output_filepath, baseline_filepath):
+    baseline = None
+    if baseline_filepath is not None:
+        with open(baseline_filepath, 'r') as file_:
+            baseline = json.load(file_)
+
+    with tempfile.TemporaryDirectory() as site_dir:
+        sensor_codes = write_raw_luftdaten_mirror(
+            os.path.join(site_dir, 'data', 'luftdaten', 'raw'),
+            sensors,
+            START_DATE,
+            days,
+            **DEFECT_RATES
+        )
+        write_site(site_dir, sensor_codes)
+        results = run_benchmarks(site_dir, sensor_codes, repeat)
+
+    print_results(results, baseline)
+    if output_filepath is not None:
+        with open(output_filepath, 'w') as file_:
+            json.dump({
+                'sensors': sensors,
+                'days': days,
+                'defect_rates': DEFECT_RATES,
+                'results': results,
+            }, file_, indent=2)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sensors', type=int, default=3)
+    parser.add_argument('--days', type=int, default=730)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', default=None,
+                        help='Save the results to this JSON file')
+    parser.add_argument('--baseline', default=None,
+                        help='Compare with the results saved in this file')
+    args = parser.parse_args()
+    main(args.sensors, args.days, args.repeat, args.output, args.baseline)
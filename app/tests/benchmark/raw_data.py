@@ -0,0 +1,126 @@
+"""Synthetic raw Luftdaten archive files for benchmarking."""
+import datetime
+import os
+
+import numpy as np
+
+from luftdaten.data import get_luftdaten_raw_filename
+from tests.raw_files import RAW_HEADER
+
+
+READING_INTERVAL_SECONDS = 150
+
+# Where every generated sensor's readings are from
+SENSOR_LATITUDE = 51.475
+SENSOR_LONGITUDE = -2.576
+
+
+def write_raw_luftdaten_files(
+        luftdaten_raw_data_dir,
+        sensor_code,
+        start_date,
+        days,
+        seed=0,
+        missing_day_rate=0.0,
+        outage_rate=0.0,
+        nan_rate=0.0,
+        malformed_rate=0.0
+):
+    """Writes a day file per date in the same layout as the Luftdaten
+    archive, with a reading roughly every 2.5 minutes.
+
+    The real archive's imperfections can be added too, each at a rate
+    between 0 and 1:
+
+    - missing_day_rate of days have no file at all
+    - outage_rate of days have a few hours without readings
+    - nan_rate of values are empty
+    - malformed_rate of rows are cut off after the timestamp, as when a
+      sensor's upload was interrupted
+
+    These are drawn from a separate random state, so the readings are the
+    same whichever are used.
+
+    :returns: List of the filepaths written"""
+    random = np.random.RandomState(seed)
+    defects = np.random.RandomState([seed, 1])
+    readings_per_day = 24 * 60 * 60 // READING_INTERVAL_SECONDS
+
+    filepaths = []
+    for day_offset in range(days):
+        date_ = start_date + datetime.timedelta(days=day_offset)
+        filename = get_luftdaten_raw_filename(sensor_code, date_)
+        filepath = os.path.join(
+            luftdaten_raw_data_dir,
+            filename.split('_')[0],
+            filename
+        )
+
+        day_start = datetime.datetime.combine(date_, datetime.time())
+        offsets = np.arange(readings_per_day) * READING_INTERVAL_SECONDS + \
+            random.randint(0, 30, readings_per_day)
+        p1 = random.gamma(2.0, 6.0, readings_per_day)
+        p2 = p1 * random.uniform(0.2, 0.6, readings_per_day)
+
+        if missing_day_rate and defects.rand() < missing_day_rate:
+            continue
+        keep = np.ones(readings_per_day, dtype=bool)
+        if outage_rate and defects.rand() < outage_rate:
+            outage_start = defects.randint(readings_per_day)
+            outage_length = defects.randint(1, 7) * 3600 // \
+                READING_INTERVAL_SECONDS
+            keep[outage_start:outage_start + outage_length] = False
+        p1_missing = defects.rand(readings_per_day) < nan_rate
+        p2_missing = defects.rand(readings_per_day) < nan_rate
+        malformed = defects.rand(readings_per_day) < malformed_rate
+
+        lines = [RAW_HEADER]
+        for i in np.flatnonzero(keep):
+            timestamp = day_start + datetime.timedelta(seconds=int(offsets[i]))
+            line = '{code};SDS011;{location};{lat};{lon};{timestamp};'.format(
+                code=sensor_code,
+                location=sensor_code + 1,
+                lat=SENSOR_LATITUDE,
+                lon=SENSOR_LONGITUDE,
+                timestamp=timestamp.strftime('%Y-%m-%dT%H:%M:%S')
+            )
+            if not malformed[i]:
+                line += '{p1};;;{p2};;'.format(
+                    p1='' if p1_missing[i] else '{:.2f}'.format(p1[i]),
+                    p2='' if p2_missing[i] else '{:.2f}'.format(p2[i])
+                )
+            lines.append(line)
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        with open(filepath, 'w') as file_:
+            file_.write('\n'.join(lines) + '\n')
+        filepaths.append(filepath)
+
+    return filepaths
+
+
+def write_raw_luftdaten_mirror(
+        luftdaten_raw_data_dir,
+        sensors,
+        start_date,
+        days,
+        seed=0,
+        **defect_rates
+):
+    """Writes a mirror of the archive for sensors numbered 1 to sensors,
+    each with its own readings.
+
+    :param defect_rates: Rates of missing days, outages, NaNs and
+        malformed rows, as for write_raw_luftdaten_files
+    :returns: The sensor codes written
+    :rtype: list"""
+    sensor_codes = list(range(1, sensors + 1))
+    for sensor_code in sensor_codes:
+        write_raw_luftdaten_files(
+            luftdaten_raw_data_dir,
+            sensor_code,
+            start_date,
+            days,
+            seed=seed + sensor_code,
+            **defect_rates
+        )
+    return sensor_codes
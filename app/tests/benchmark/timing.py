@@ -0,0 +1,23 @@
+"""Timing helpers shared by the benchmarks."""
+import time
+
+
+def best_time(func, repeat=3):
+    """Runs func repeatedly and returns (best time in seconds, last result)."""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def report(name, seconds, rows):
+    """Prints a single benchmark result line."""
+    print("{name:<45} {seconds:8.3f}s {rate:12,.0f} rows/s".format(
+        name=name,
+        seconds=seconds,
+        rate=rows / seconds if seconds else float('inf')
+    ))
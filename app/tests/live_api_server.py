@@ -0,0 +1,111 @@
+"""A local HTTP server standing in for the live Luftdaten API in tests."""
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import re
+import threading
+import time
+
+
+sensor_path_regex = re.compile(r'^/v1/sensor/(\d+)/$')
+
+
+def create_live_item(sensor_code, timestamp, p1, p2, latitude='51.45',
+                     longitude='-2.58'):
+    """A reading as the live API gives it."""
+    return {
+        'id': 1,
+        'timestamp': timestamp,
+        'location': {
+            'id': 100 + sensor_code,
+            'latitude': latitude,
+            'longitude': longitude,
+        },
+        'sensor': {
+            'id': sensor_code,
+            'sensor_type': {'id': 14, 'name': 'SDS011'},
+        },
+        'sensordatavalues': [
+            {'value_type': 'P1', 'value': str(p1)},
+            {'value_type': 'P2', 'value': str(p2)},
+        ],
+    }
+
+
+class _LiveApiRequestHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        api = self.server.api
+        if api.delay:
+            time.sleep(api.delay)
+        with api.lock:
+            api.request_counts[self.path] += 1
+            api.in_flight += 1
+            api.max_in_flight = max(api.max_in_flight, api.in_flight)
+            match = sensor_path_regex.match(self.path)
+            failures = api.failures.get(self.path, 0)
+            if failures > 0:
+                api.failures[self.path] = failures - 1
+            items = api.readings.get(int(match.group(1))) if match else None
+            body = json.dumps(items).encode('utf-8')
+        try:
+            if failures > 0:
+                self.send_error(503)
+            elif items is None:
+                self.send_error(404)
+            else:
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+        finally:
+            with api.lock:
+                api.in_flight -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+class LiveApiServer(object):
+    """Serves each sensor's latest readings on localhost, as the live API's
+    /v1/sensor/<code>/ does.
+
+    Use as a context manager, the API's base url is in `url`. `readings`
+    maps a sensor code to the list of readings to give, which tests can
+    change between polls, and `failures` maps a path to the number of times
+    it should fail with a 503. Each request takes at least delay seconds,
+    and the most requests handled at once is kept in `max_in_flight`."""
+    def __init__(self, readings=None, delay=0):
+        self.readings = readings if readings is not None else {}
+        self.delay = delay
+        self.failures = {}
+        self.request_counts = Counter()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return 'http://{}:{}/v1/sensor'.format(host, port)
+
+    def __enter__(self):
+        self._server = ThreadingHTTPServer(
+            ('127.0.0.1', 0), _LiveApiRequestHandler
+        )
+        self._server.api = self
+        self._thread = threading.Thread(
+            target=self._server.serve_forever,
+            kwargs={'poll_interval': 0.01}
+        )
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
@@ -0,0 +1,25 @@
+"""Helpers for writing raw Luftdaten archive files in tests."""
+import os
+
+from luftdaten.data import get_luftdaten_raw_filename
+
+
+RAW_HEADER = 'sensor_id;sensor_type;location;lat;lon;timestamp;' \
+    'P1;durP1;ratioP1;P2;durP2;ratioP2'
+
+
+def write_raw_file(raw_data_dir, sensor_code, date_, rows,
+                   location=(51.4, -2.5)):
+    """Writes a raw archive file with (timestamp, P1, P2) rows, from a
+    sensor at the (latitude, longitude) location."""
+    filename = get_luftdaten_raw_filename(sensor_code, date_)
+    filepath = os.path.join(raw_data_dir, filename.split('_')[0], filename)
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    with open(filepath, 'w') as file_:
+        file_.write(RAW_HEADER + '\n')
+        for timestamp, p1, p2 in rows:
+            file_.write(
+                f"{sensor_code};SDS011;1;{location[0]};{location[1]};"
+                f"{timestamp};{p1};;;{p2};;\n"
+            )
+    return filepath
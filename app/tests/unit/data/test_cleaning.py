@@ -0,0 +1,111 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from data.cleaning import (
+    create_window_medians,
+    find_duplicate_timestamps,
+    find_latest_location,
+    find_location_changes,
+    find_mad_outliers,
+    find_moved_readings,
+    find_out_of_range,
+)
+
+
+def nanoseconds(timestamps):
+    return pd.to_datetime(timestamps).values.view(np.int64)
+
+
+class TestReadingChecks(unittest.TestCase):
+
+    def test_duplicate_timestamps(self):
+        duplicates = find_duplicate_timestamps(nanoseconds([
+            '2018-01-01 00:00', '2018-01-01 00:00', '2018-01-01 00:05',
+            '2018-01-01 00:05', '2018-01-01 00:05',
+        ]))
+
+        self.assertEqual(list(duplicates), [False, True, False, True, True])
+
+    def test_out_of_range(self):
+        out_of_range = find_out_of_range(
+            np.array([-1.0, 0.0, 50.0, 999.9, np.nan], dtype=np.float32),
+            0.0,
+            999.9
+        )
+
+        self.assertEqual(list(out_of_range), [True, False, False, True, False])
+
+    def test_moved_readings(self):
+        # About 0.1 km and 11 km from the sensor
+        moved = find_moved_readings(
+            [51.451, 51.55, np.nan], [-2.58, -2.58, np.nan], 51.45, -2.58, 1.0
+        )
+
+        self.assertEqual(list(moved), [False, True, False])
+
+    def test_location_changes(self):
+        changes = find_location_changes(
+            [51.45, 51.45, np.nan, 51.46, 51.46, 51.45],
+            [-2.58, -2.58, np.nan, -2.58, -2.58, -2.58]
+        )
+
+        self.assertEqual(list(changes), [3, 5])
+
+    def test_latest_location(self):
+        self.assertEqual(
+            find_latest_location(
+                [51.45, 51.46, 51.46, np.nan], [-2.58, -2.58, -2.58, np.nan]
+            ),
+            (51.46, -2.58)
+        )
+        self.assertEqual(
+            find_latest_location([np.nan, 51.45], [np.nan, -2.58]),
+            (51.45, -2.58)
+        )
+        self.assertIsNone(find_latest_location([np.nan], [np.nan]))
+
+
+class TestMadOutliers(unittest.TestCase):
+
+    def test_window_medians(self):
+        medians, counts = create_window_medians(
+            np.array([0, 0, 0, 1, 1, 2, 3, 3, 3, 3]),
+            np.array([3, 1, 2, 5, np.nan, np.nan, 4, 1, 3, 2])
+        )
+
+        np.testing.assert_array_equal(
+            medians, [2, 2, 2, 5, 5, np.nan, 2.5, 2.5, 2.5, 2.5]
+        )
+        self.assertEqual(list(counts), [3, 3, 3, 1, 1, 0, 4, 4, 4, 4])
+
+    def test_spikes_are_outliers(self):
+        timestamps = nanoseconds(
+            pd.date_range('2018-01-01 00:00', periods=24, freq='5min')
+        )
+        values = np.tile([10.0, 12.0, 11.0, 13.0], 6)
+        values[5] = 200.0
+        values[13] = np.nan
+        # In the next hour, so judged against the readings in that hour
+        values[20] = 30.0
+
+        outliers = find_mad_outliers(timestamps, values, '1H', 5.0)
+
+        self.assertEqual(list(np.flatnonzero(outliers)), [5, 20])
+
+    def test_min_deviation_and_count(self):
+        timestamps = nanoseconds(
+            pd.date_range('2018-01-01 00:00', periods=6, freq='5min')
+        )
+        values = np.array([10.0, 10.0, 10.0, 10.0, 10.0, 15.0])
+
+        outliers = find_mad_outliers(timestamps, values, '1H', 5.0)
+
+        self.assertEqual(list(np.flatnonzero(outliers)), [5])
+        self.assertFalse(find_mad_outliers(
+            timestamps, values, '1H', 5.0, min_deviation=2.0
+        ).any())
+        self.assertFalse(find_mad_outliers(
+            timestamps, values, '1H', 5.0, min_count=10
+        ).any())
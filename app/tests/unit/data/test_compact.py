@@ -0,0 +1,83 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from data.compact import read_compact_file, write_compact_file
+
+
+class TestCompactFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.filepath = os.path.join(self.temp_dir.name, 'means.bin')
+        self.data = pd.DataFrame({
+            'timestamp': pd.to_datetime([
+                '2018-01-01 00:00:05',
+                '2018-01-01 00:02:41',
+                '2018-01-01 00:02:41',
+                '2018-01-03 12:00:00',
+            ]),
+            'P1': [4.813120567375722, np.nan, 10.0, 0.126],
+            'P2': [1.0, 2.0, 3.0, 999.5],
+            'year': 2018,
+        })
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_float32_round_trip(self):
+        write_compact_file(self.filepath, self.data, 'timestamp', ['P1', 'P2'])
+
+        data = read_compact_file(self.filepath)
+
+        self.assertEqual(list(data.columns), ['timestamp', 'P1', 'P2'])
+        pd.testing.assert_series_equal(data['timestamp'], self.data['timestamp'])
+        np.testing.assert_allclose(
+            data[['P1', 'P2']].values,
+            self.data[['P1', 'P2']].values,
+            rtol=1e-7
+        )
+
+    def test_scaled_round_trip(self):
+        write_compact_file(
+            self.filepath, self.data, 'timestamp', ['P1', 'P2'], decimals=2
+        )
+
+        data = read_compact_file(self.filepath)
+
+        np.testing.assert_array_equal(data['P1'], [4.81, np.nan, 10.0, 0.13])
+        np.testing.assert_array_equal(data['P2'], [1.0, 2.0, 3.0, 999.5])
+
+    def test_smaller_than_csv(self):
+        write_compact_file(self.filepath, self.data, 'timestamp', ['P1', 'P2'])
+        csv_filepath = os.path.join(self.temp_dir.name, 'means.csv')
+        self.data.to_csv(csv_filepath, index=False)
+
+        self.assertLess(
+            os.path.getsize(self.filepath), os.path.getsize(csv_filepath)
+        )
+
+    def test_empty(self):
+        write_compact_file(
+            self.filepath, self.data.iloc[:0], 'timestamp', ['P1', 'P2']
+        )
+
+        data = read_compact_file(self.filepath)
+
+        self.assertEqual(len(data), 0)
+        self.assertEqual(list(data.columns), ['timestamp', 'P1', 'P2'])
+
+    def test_unsorted_data_is_rejected(self):
+        with self.assertRaises(ValueError):
+            write_compact_file(
+                self.filepath, self.data.iloc[::-1], 'timestamp', ['P1']
+            )
+
+    def test_other_files_are_rejected(self):
+        self.data.to_csv(self.filepath)
+
+        with self.assertRaises(ValueError):
+            read_compact_file(self.filepath)
@@ -8,6 +8,8 @@ from data.dataframe import (
     add_month_year_columns,
     create_24_hour_means,
     create_hourly_means_by_weekday_and_hour,
+    create_monthly_hourly_means_by_weekday_and_hour,
+    split_by_year_month,
 )
 
 
@@ -42,6 +44,29 @@ class TestAddMonthYearColumns(unittest.TestCase):
         self.assertEqual(new_df['year'][3], 2018)
         self.assertEqual(new_df['month'][3], 6)
 
+        # The original DataFrame is left alone
+        self.assertEqual(list(df.columns), ['data', 'date'])
+
+
+class TestSplitByYearMonth(unittest.TestCase):
+
+    def test_split_by_year_month(self):
+        df = pd.DataFrame({'data': [1, 2, 3, 4, 5]})
+        years = np.array([2017, 2017, 2017, 2018, 2018])
+        months = np.array([11, 11, 12, 1, 1])
+
+        parts = split_by_year_month(df, years, months)
+
+        self.assertEqual(
+            [yearmonth for yearmonth, _ in parts],
+            [(2017, 11), (2017, 12), (2018, 1)]
+        )
+        self.assertEqual(
+            [list(part['data']) for _, part in parts],
+            [[1, 2], [3], [4, 5]]
+        )
+        self.assertEqual(split_by_year_month(df.iloc[:0], [], []), [])
+
 
 class TestCreate24HourMeans(unittest.TestCase):
 
@@ -87,6 +112,33 @@ class TestCreate24HourMeans(unittest.TestCase):
             )
 
 
+    def test_create_24_hour_means_at_resolution(self):
+        # 48 hours of data every 30 minutes, with the value of the hour
+        data = pd.DataFrame({
+            'date': pd.date_range('2018-06-01 00:30', periods=96, freq='30min'),
+            'data': np.arange(96, dtype=np.float32) // 2,
+        })
+
+        results = create_24_hour_means(data, ['data'], 'date', resolution='1H')
+
+        self.assertEqual(len(results), 48)
+        self.assertEqual(results['data'].dtype, np.float32)
+        self.assertEqual(
+            results['date'][0], datetime.datetime(2018, 6, 1, 1)
+        )
+        # The mean at each hour is that of all the readings in the 24 hours
+        # before it
+        for i in range(48):
+            window = data[
+                (data['date'] > results['date'][i] -
+                    datetime.timedelta(hours=24)) &
+                (data['date'] <= results['date'][i])
+            ]
+            self.assertAlmostEqual(
+                results['data'][i], window['data'].mean(), places=5
+            )
+
+
 class TestcreateHourlyMeansByWeekdayAndHour(unittest.TestCase):
 
     def test_create_hourly_means_by_weekday_and_hour(self):
@@ -149,3 +201,61 @@ class TestcreateHourlyMeansByWeekdayAndHour(unittest.TestCase):
                 hour_data = day_data[day_data['hourOfDay'] == hour]
                 self.assertEqual(len(hour_data), 1)
                 self.assertEqual(hour_data[value_column].iloc[0], day_index * hour)
+
+    def test_output_order_and_input_unchanged(self):
+        raw_data = pd.DataFrame({
+            'date': [
+                datetime.datetime(2018, 10, 1, 5),   # Monday
+                datetime.datetime(2018, 10, 5, 7),   # Friday
+                datetime.datetime(2018, 10, 5, 1),   # Friday
+                datetime.datetime(2018, 10, 8, 5),   # Monday
+            ],
+            'data': [1.0, 2.0, 3.0, 4.0]
+        })
+        original = raw_data.copy()
+
+        results = create_hourly_means_by_weekday_and_hour(
+            raw_data, ['data'], 'date'
+        )
+
+        # Rows are ordered by day name, then hour
+        self.assertEqual(
+            list(results.columns), ['dayOfWeek', 'hourOfDay', 'data']
+        )
+        self.assertEqual(
+            list(results['dayOfWeek']), ['Friday', 'Friday', 'Monday']
+        )
+        self.assertEqual(list(results['hourOfDay']), [1, 7, 5])
+        self.assertEqual(list(results['data']), [3.0, 2.0, 2.5])
+        self.assertTrue(raw_data.equals(original))
+
+
+class TestCreateMonthlyHourlyMeansByWeekdayAndHour(unittest.TestCase):
+
+    def test_matches_means_for_each_month(self):
+        # Hourly data over three months with a value per hour
+        dates = pd.date_range('2018-10-01', '2018-12-31 23:00', freq='H')
+        raw_data = pd.DataFrame({
+            'date': dates,
+            'data': np.arange(len(dates), dtype=float) % 37,
+        })
+
+        results = create_monthly_hourly_means_by_weekday_and_hour(
+            raw_data, ['data'], 'date'
+        )
+
+        self.assertEqual(
+            list(results.columns),
+            ['dayOfWeek', 'hourOfDay', 'data', 'year', 'month']
+        )
+        self.assertEqual(len(results), 3 * 7 * 24)
+        for month in [10, 11, 12]:
+            month_data = raw_data[raw_data['date'].dt.month == month]
+            expected = create_hourly_means_by_weekday_and_hour(
+                month_data, ['data'], 'date'
+            )
+            expected['year'] = 2018
+            expected['month'] = month
+
+            actual = results[results['month'] == month].reset_index(drop=True)
+            pd.testing.assert_frame_equal(actual, expected)
@@ -0,0 +1,98 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from data.events import (
+    create_daily_maximums,
+    find_exceedance_episodes,
+    find_runs,
+    get_daqi_bands,
+)
+
+
+def nanoseconds(timestamps):
+    return pd.to_datetime(timestamps).values.view(np.int64)
+
+
+class TestFindRuns(unittest.TestCase):
+
+    def test_runs(self):
+        starts, ends = find_runs([True, True, False, True, False, True])
+
+        self.assertEqual(list(starts), [0, 3, 5])
+        self.assertEqual(list(ends), [2, 4, 6])
+
+    def test_runs_split_at_breaks(self):
+        starts, ends = find_runs(
+            [True, True, True, False],
+            breaks=[False, False, True, False]
+        )
+
+        self.assertEqual(list(starts), [0, 2])
+        self.assertEqual(list(ends), [2, 3])
+
+    def test_no_runs(self):
+        starts, ends = find_runs([False, False])
+
+        self.assertEqual(len(starts), 0)
+        self.assertEqual(len(ends), 0)
+
+
+class TestFindExceedanceEpisodes(unittest.TestCase):
+
+    def setUp(self):
+        self.timestamps = nanoseconds([
+            '2018-01-01 00:00', '2018-01-01 01:00', '2018-01-01 02:00',
+            '2018-01-01 03:00', '2018-01-01 06:00', '2018-01-01 07:00',
+        ])
+
+    def test_episodes(self):
+        episodes = find_exceedance_episodes(
+            self.timestamps, [10, 20, 30, 5, 40, 50], 15
+        )
+
+        self.assertEqual(list(episodes['start']), [
+            self.timestamps[1], self.timestamps[4]
+        ])
+        self.assertEqual(list(episodes['end']), [
+            self.timestamps[2], self.timestamps[5]
+        ])
+        self.assertEqual(list(episodes['peak']), [30, 50])
+        self.assertEqual(list(episodes['readings']), [2, 2])
+
+    def test_nans_and_gaps_end_episodes(self):
+        episodes = find_exceedance_episodes(
+            self.timestamps,
+            [20, np.nan, 30, 40, 50, 60],
+            15,
+            max_gap=pd.Timedelta('1H').value
+        )
+
+        self.assertEqual(list(episodes['readings']), [1, 2, 2])
+        self.assertEqual(list(episodes['peak']), [20, 40, 60])
+
+
+class TestDailyAirQualityIndex(unittest.TestCase):
+
+    def test_bands(self):
+        bands = get_daqi_bands(
+            np.array([0, 11.9, 12, 70.9, 71, 500, np.nan]),
+            [0, 12, 24, 36, 42, 48, 54, 59, 65, 71]
+        )
+
+        self.assertEqual(list(bands), [1, 1, 2, 9, 10, 10, 0])
+
+    def test_daily_maximums(self):
+        timestamps = nanoseconds([
+            '2018-01-01 00:00', '2018-01-01 12:00', '2018-01-03 00:00',
+        ])
+
+        days, maximums = create_daily_maximums(
+            timestamps, [[1, np.nan], [3, np.nan], [2, 4]]
+        )
+
+        self.assertEqual(list(days), list(nanoseconds([
+            '2018-01-01', '2018-01-03'
+        ])))
+        np.testing.assert_array_equal(maximums, [[3, np.nan], [2, 4]])
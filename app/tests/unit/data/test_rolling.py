@@ -0,0 +1,66 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from data.rolling import rolling_window_means
+
+
+MINUTE = 60 * 10 ** 9
+
+
+class TestRollingWindowMeans(unittest.TestCase):
+
+    def test_matches_pandas_rolling(self):
+        random = np.random.RandomState(0)
+        # Irregular readings with gaps, duplicate timestamps and NaNs
+        offsets = np.sort(random.randint(0, 5 * 24 * 60, 2000)) * MINUTE
+        timestamps = pd.Timestamp('2018-06-01').value + offsets
+        values = random.gamma(2.0, 5.0, (2000, 2))
+        values[random.rand(2000, 2) < 0.1] = np.nan
+
+        output_timestamps, means = rolling_window_means(
+            timestamps, values, '24H'
+        )
+
+        expected = pd.DataFrame(
+            values, index=pd.to_datetime(timestamps)
+        ).rolling('24H').mean()
+        np.testing.assert_array_equal(output_timestamps, timestamps)
+        np.testing.assert_allclose(means, expected.values, rtol=1e-10)
+
+    def test_one_dimensional_values(self):
+        timestamps = np.array([0, 1, 2, 3]) * MINUTE
+        values = np.array([1.0, 2.0, np.nan, 4.0])
+
+        _, means = rolling_window_means(timestamps, values, '2min')
+
+        np.testing.assert_array_equal(means, [1.0, 1.5, 2.0, 4.0])
+
+    def test_min_count(self):
+        timestamps = np.array([0, 1, 2, 3]) * MINUTE
+        values = np.array([1.0, 2.0, np.nan, 4.0])
+
+        _, means = rolling_window_means(
+            timestamps, values, '2min', min_count=2
+        )
+
+        np.testing.assert_array_equal(means, [np.nan, 1.5, np.nan, np.nan])
+
+    def test_resolution(self):
+        # Readings at 1, 2, 11 and 35 minutes
+        timestamps = np.array([1, 2, 11, 35]) * MINUTE
+        values = np.array([[1.0, 10.0], [2.0, 20.0], [3.0, 30.0], [4.0, 40.0]])
+
+        output_timestamps, means = rolling_window_means(
+            timestamps, values, '20min', resolution='10min'
+        )
+
+        # Buckets ending at 10, 20 and 40 minutes have readings
+        np.testing.assert_array_equal(
+            output_timestamps, np.array([10, 20, 40]) * MINUTE
+        )
+        np.testing.assert_array_equal(
+            means,
+            [[1.5, 15.0], [2.0, 20.0], [4.0, 40.0]]
+        )
@@ -0,0 +1,114 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from data.spatial import (
+    cluster_locations,
+    create_bucket_means,
+    create_composite_means,
+    create_idw_weights,
+    create_sensor_matrix,
+    haversine_distances,
+    interpolate,
+)
+
+
+def readings(timestamps, p1, p2):
+    return pd.DataFrame({
+        'timestamp': pd.to_datetime(timestamps),
+        'P1': np.array(p1, dtype=np.float32),
+        'P2': np.array(p2, dtype=np.float32),
+    })
+
+
+class TestSensorMatrix(unittest.TestCase):
+
+    def test_bucket_means(self):
+        data = readings(
+            ['2018-01-01 00:10:00', '2018-01-01 00:50:00',
+             '2018-01-01 02:00:00'],
+            [1, 3, 5],
+            [2, np.nan, 6]
+        )
+
+        means = create_bucket_means(data, ['P1', 'P2'], 'timestamp')
+
+        self.assertEqual(
+            list(means.index),
+            list(pd.to_datetime(['2018-01-01 00:00', '2018-01-01 02:00']))
+        )
+        self.assertEqual(list(means['P1']), [2.0, 5.0])
+        self.assertEqual(list(means['P2']), [2.0, 6.0])
+
+    def test_matrix_aligns_sensors(self):
+        first = create_bucket_means(readings(
+            ['2018-01-01 00:00:00', '2018-01-01 01:00:00'], [1, 2], [1, 2]
+        ), ['P1', 'P2'], 'timestamp')
+        second = create_bucket_means(readings(
+            ['2018-01-01 01:00:00', '2018-01-01 02:00:00'], [3, 4], [3, 4]
+        ), ['P1', 'P2'], 'timestamp')
+
+        matrix = create_sensor_matrix({2: second, 1: first}, 'P1')
+
+        self.assertEqual(list(matrix.columns), [2, 1])
+        np.testing.assert_array_equal(
+            matrix.values,
+            [[np.nan, 1.0], [3.0, 2.0], [4.0, np.nan]]
+        )
+
+    def test_composite_means_skip_missing_sensors(self):
+        matrix = pd.DataFrame({
+            1: [1.0, np.nan, np.nan],
+            2: [2.0, 4.0, np.nan],
+            3: [6.0, 8.0, np.nan],
+        })
+
+        composite = create_composite_means(matrix)
+
+        np.testing.assert_array_equal(composite['mean'], [3.0, 6.0, np.nan])
+        np.testing.assert_array_equal(
+            composite['median'], [2.0, 6.0, np.nan]
+        )
+        self.assertEqual(list(composite['sensors']), [3, 2, 0])
+
+
+class TestLocations(unittest.TestCase):
+
+    def test_haversine_distances(self):
+        # A degree of latitude is about 111 km
+        distances = haversine_distances([51.0, 52.0], [-2.5, -2.5],
+                                        [51.0], [-2.5])
+        np.testing.assert_allclose(distances[:, 0], [0.0, 111.2], atol=0.1)
+
+    def test_clusters_are_connected_by_distance(self):
+        # About 0.7 km apart in a chain, then one far away
+        latitudes = [51.450, 51.500, 51.456, 51.462]
+        longitudes = [-2.58] * 4
+
+        clusters = cluster_locations(latitudes, longitudes, 1.0)
+
+        self.assertEqual(list(clusters), [0, 1, 0, 0])
+        self.assertEqual(
+            list(cluster_locations(latitudes, longitudes, 0.1)), [0, 1, 2, 3]
+        )
+
+    def test_idw_interpolation(self):
+        # A point a third of the way from the first sensor to the second
+        weights = create_idw_weights(
+            [51.45, 51.45], [-2.60, -2.57], [51.45], [-2.59]
+        )
+        matrix = pd.DataFrame({1: [10.0, 10.0], 2: [40.0, np.nan]})
+
+        values = interpolate(matrix, weights)
+
+        # Weights of 1 / 1 and 1 / 4 (distance squared)
+        np.testing.assert_allclose(values[:, 0], [16.0, 10.0], rtol=1e-3)
+
+    def test_point_at_a_sensor_takes_its_value(self):
+        weights = create_idw_weights(
+            [51.45, 51.46], [-2.60, -2.60], [51.46], [-2.60]
+        )
+        matrix = pd.DataFrame({1: [10.0], 2: [20.0]})
+
+        np.testing.assert_array_equal(interpolate(matrix, weights), [[20.0]])
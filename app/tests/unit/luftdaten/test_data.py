@@ -1,12 +1,37 @@
 import datetime
+import json
+import os
+import tempfile
 import unittest
 from unittest.mock import patch
 
+import numpy as np
+import pandas as pd
+
+from data.compact import read_compact_file
+from data.dataframe import create_24_hour_means
+from luftdaten.cache import read_cache_partition
 from luftdaten.data import (
+    clean_luftdaten_sensor_data,
     find_start_date_for_sensor,
+    get_cached_month_fingerprints,
     get_luftdaten_data_url,
     get_luftdaten_raw_filename,
+    get_luftdaten_sensor_reference_location,
+    ingest_raw_luftdaten_files,
+    iter_cached_luftdaten_sensor_months,
+    load_cached_luftdaten_sensor_months,
+    load_luftdaten_sensor_data,
+    read_raw_luftdaten_files,
+    update_luftdaten_sensor_cache,
+    write_24_hour_mean_aggregated_data_files,
+    write_exceedance_data_files,
+    write_spatial_aggregated_data_files,
 )
+from location import LatLongLocation
+from sensor import Sensor
+from storage import SQLiteStorage
+from tests.raw_files import write_raw_file
 
 
 class TestgetLuftdatenFilename(unittest.TestCase):
@@ -27,6 +52,646 @@ class TestgetLuftdatenUrl(unittest.TestCase):
         )
 
 
+class TestLoadLuftdatenSensorData(unittest.TestCase):
+
+    def test_load_luftdaten_sensor_data(self):
+        with tempfile.TemporaryDirectory() as raw_data_dir:
+            write_raw_file(raw_data_dir, 1, datetime.date(2018, 1, 2), [
+                ('2018-01-02T00:01:00', 3.5, 1.25),
+            ])
+            write_raw_file(raw_data_dir, 1, datetime.date(2018, 1, 1), [
+                ('2018-01-01T00:01:00', 1.5, 0.5),
+                ('2018-01-01T23:59:30', 2.0, ''),
+            ])
+            # A different sensor which shouldn't be loaded
+            write_raw_file(raw_data_dir, 2, datetime.date(2018, 1, 1), [
+                ('2018-01-01T00:01:00', 9.0, 9.0),
+            ])
+
+            data = load_luftdaten_sensor_data(raw_data_dir, 1, 'timestamp')
+
+        self.assertEqual(list(data.columns), ['timestamp', 'P1', 'P2'])
+        self.assertEqual(list(data.index), [0, 1, 2])
+        self.assertEqual(data['P1'].dtype, np.float32)
+        self.assertEqual(data['P2'].dtype, np.float32)
+        self.assertEqual(
+            list(data['timestamp']),
+            [
+                datetime.datetime(2018, 1, 1, 0, 1),
+                datetime.datetime(2018, 1, 1, 23, 59, 30),
+                datetime.datetime(2018, 1, 2, 0, 1),
+            ]
+        )
+        self.assertEqual(list(data['P1']), [1.5, 2.0, 3.5])
+        self.assertTrue(np.isnan(data['P2'][1]))
+
+    def test_load_luftdaten_sensor_data_without_files(self):
+        with tempfile.TemporaryDirectory() as raw_data_dir:
+            data = load_luftdaten_sensor_data(raw_data_dir, 1, 'timestamp')
+
+        self.assertEqual(len(data), 0)
+        self.assertEqual(list(data.columns), ['timestamp', 'P1', 'P2'])
+        self.assertTrue(np.issubdtype(data['timestamp'].dtype, np.datetime64))
+
+
+class TestUpdateLuftdatenSensorCache(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.raw_data_dir = os.path.join(self.temp_dir.name, 'raw')
+        self.cache_dir = os.path.join(self.temp_dir.name, 'cache')
+        write_raw_file(self.raw_data_dir, 1, datetime.date(2018, 1, 31), [
+            ('2018-01-31T12:00:00', 1.0, 0.5),
+        ])
+        write_raw_file(self.raw_data_dir, 1, datetime.date(2018, 2, 1), [
+            ('2018-02-01T12:00:00', 2.0, 1.0),
+        ])
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def update(self):
+        return update_luftdaten_sensor_cache(
+            self.raw_data_dir, self.cache_dir, 1, 'timestamp'
+        )
+
+    def load(self):
+        return load_luftdaten_sensor_data(
+            self.raw_data_dir, 1, 'timestamp',
+            luftdaten_cache_dir=self.cache_dir
+        )
+
+    def read_manifest(self):
+        with open(os.path.join(self.cache_dir, '1', 'manifest.json')) as f:
+            return json.load(f)
+
+    def test_cold_start_matches_raw_data(self):
+        self.assertEqual(self.update(), [(2018, 1), (2018, 2)])
+
+        cached = self.load()
+        raw = load_luftdaten_sensor_data(self.raw_data_dir, 1, 'timestamp')
+        self.assertTrue(cached.equals(raw))
+
+        manifest = self.read_manifest()
+        self.assertEqual(
+            sorted(manifest['files']),
+            [
+                '2018-01-31_sds011_sensor_1.csv',
+                '2018-02-01_sds011_sensor_1.csv',
+            ]
+        )
+
+    def test_only_new_files_are_ingested(self):
+        self.update()
+        self.assertEqual(self.update(), [])
+
+        write_raw_file(self.raw_data_dir, 1, datetime.date(2018, 2, 2), [
+            ('2018-02-02T12:00:00', 3.0, 1.5),
+        ])
+        with patch(
+            'luftdaten.data.read_raw_luftdaten_files',
+            wraps=read_raw_luftdaten_files
+        ) as read_raw:
+            self.assertEqual(self.update(), [(2018, 2)])
+        read_raw.assert_called_once()
+        self.assertEqual(len(read_raw.call_args[0][0]), 1)
+
+        data = self.load()
+        self.assertEqual(list(data['P1']), [1.0, 2.0, 3.0])
+        self.assertIn(
+            '2018-02-02_sds011_sensor_1.csv', self.read_manifest()['files']
+        )
+
+    def test_changed_file_rebuilds_month(self):
+        self.update()
+
+        filepath = write_raw_file(
+            self.raw_data_dir, 1, datetime.date(2018, 2, 1), [
+                ('2018-02-01T12:00:00', 2.0, 1.0),
+                ('2018-02-01T13:00:00', 4.0, 2.0),
+            ]
+        )
+        os.utime(filepath, ns=(0, 0))
+        self.assertEqual(self.update(), [(2018, 2)])
+
+        data = self.load()
+        self.assertEqual(list(data['P1']), [1.0, 2.0, 4.0])
+
+    def test_month_fingerprints_only_change_with_their_files(self):
+        self.update()
+        fingerprints = get_cached_month_fingerprints(self.cache_dir, 1)
+        self.assertEqual(sorted(fingerprints), [(2018, 1), (2018, 2)])
+
+        write_raw_file(self.raw_data_dir, 1, datetime.date(2018, 2, 2), [
+            ('2018-02-02T12:00:00', 3.0, 1.5),
+        ])
+        self.update()
+        new_fingerprints = get_cached_month_fingerprints(self.cache_dir, 1)
+        self.assertEqual(new_fingerprints[(2018, 1)], fingerprints[(2018, 1)])
+        self.assertNotEqual(
+            new_fingerprints[(2018, 2)], fingerprints[(2018, 2)]
+        )
+
+    def test_load_cached_months_with_lead_in(self):
+        write_raw_file(self.raw_data_dir, 1, datetime.date(2018, 1, 30), [
+            ('2018-01-30T12:00:00', 0.5, 0.25),
+        ])
+        self.update()
+
+        data = load_cached_luftdaten_sensor_months(
+            self.cache_dir, 1, [(2018, 2)], 'timestamp',
+            lead_in=datetime.timedelta(hours=24)
+        )
+        self.assertEqual(list(data['P1']), [1.0, 2.0])
+
+        data = load_cached_luftdaten_sensor_months(
+            self.cache_dir, 1, [(2018, 2)], 'timestamp'
+        )
+        self.assertEqual(list(data['P1']), [2.0])
+
+    def test_iter_cached_months_matches_loading_each_month(self):
+        write_raw_file(self.raw_data_dir, 1, datetime.date(2018, 1, 30), [
+            ('2018-01-30T12:00:00', 0.5, 0.25),
+        ])
+        write_raw_file(self.raw_data_dir, 1, datetime.date(2018, 3, 1), [
+            ('2018-03-01T12:00:00', 3.0, 1.5),
+        ])
+        self.update()
+        lead_in = datetime.timedelta(hours=24)
+
+        chunks = list(iter_cached_luftdaten_sensor_months(
+            self.cache_dir, 1, 'timestamp', lead_in=lead_in
+        ))
+
+        self.assertEqual(
+            [yearmonth for yearmonth, _ in chunks],
+            [(2018, 1), (2018, 2), (2018, 3)]
+        )
+        for yearmonth, data in chunks:
+            expected = load_cached_luftdaten_sensor_months(
+                self.cache_dir, 1, [yearmonth], 'timestamp', lead_in=lead_in
+            )
+            pd.testing.assert_frame_equal(data, expected)
+        # No lead in carried over from more than a day before March
+        self.assertEqual(list(chunks[2][1]['P1']), [3.0])
+
+    def test_iter_cached_months_only_reads_months_needed(self):
+        write_raw_file(self.raw_data_dir, 1, datetime.date(2018, 3, 1), [
+            ('2018-03-01T12:00:00', 3.0, 1.5),
+        ])
+        self.update()
+
+        with patch(
+            'luftdaten.data.read_cache_partition',
+            wraps=read_cache_partition
+        ) as read_partition:
+            chunks = list(iter_cached_luftdaten_sensor_months(
+                self.cache_dir, 1, 'timestamp', months=[(2018, 2)],
+                lead_in=datetime.timedelta(hours=24)
+            ))
+
+        self.assertEqual(len(chunks), 1)
+        self.assertEqual(list(chunks[0][1]['P1']), [1.0, 2.0])
+        self.assertEqual(
+            [call[0][1:3] for call in read_partition.call_args_list],
+            [(2018, 1), (2018, 2)]
+        )
+
+
+class TestIngestRawLuftdatenFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.raw_data_dir = os.path.join(self.temp_dir.name, 'raw')
+        write_raw_file(self.raw_data_dir, 1, datetime.date(2018, 1, 31), [
+            ('2018-01-31T12:00:00', 1.0, 0.5),
+        ])
+        write_raw_file(self.raw_data_dir, 1, datetime.date(2018, 2, 1), [
+            ('2018-02-01T12:00:00', 2.0, 1.0),
+        ])
+        self.storage = SQLiteStorage(
+            os.path.join(self.temp_dir.name, 'data.sqlite3'),
+            ['P1', 'P2']
+        )
+
+    def tearDown(self):
+        self.storage.close()
+        self.temp_dir.cleanup()
+
+    def ingest(self):
+        return ingest_raw_luftdaten_files(
+            self.raw_data_dir, self.storage, 1, 'timestamp'
+        )
+
+    def test_load_from_storage(self):
+        data = load_luftdaten_sensor_data(
+            self.raw_data_dir, 1, 'timestamp', storage=self.storage
+        )
+
+        raw = load_luftdaten_sensor_data(self.raw_data_dir, 1, 'timestamp')
+        self.assertTrue(data.equals(raw))
+        self.assertEqual(self.ingest(), [])
+
+    def test_load_range_from_storage(self):
+        data = load_luftdaten_sensor_data(
+            self.raw_data_dir, 1, 'timestamp', storage=self.storage,
+            start=datetime.date(2018, 2, 1)
+        )
+
+        self.assertEqual(list(data['P1']), [2.0])
+
+    def test_changed_file_replaces_its_day(self):
+        self.ingest()
+
+        filepath = write_raw_file(
+            self.raw_data_dir, 1, datetime.date(2018, 2, 1), [
+                ('2018-02-01T12:00:00', 2.0, 1.0),
+                ('2018-02-01T13:00:00', 4.0, 2.0),
+            ]
+        )
+        os.utime(filepath, ns=(0, 0))
+        self.assertEqual(self.ingest(), [datetime.date(2018, 2, 1)])
+
+        data = self.storage.read_readings(1, 'timestamp')
+        self.assertEqual(list(data['P1']), [1.0, 2.0, 4.0])
+
+
+class TestWrite24HourMeanAggregatedDataFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.agg_dir = os.path.join(self.temp_dir.name, 'aggregated')
+        self.means_dir = os.path.join(self.agg_dir, '24_hour_means')
+        # Readings every 10 minutes over the last two days of January
+        timestamps = pd.date_range(
+            '2018-01-30', '2018-01-31 23:50', freq='10min'
+        )
+        self.data = pd.DataFrame({
+            'timestamp': timestamps,
+            'P1': np.arange(len(timestamps), dtype=np.float64),
+            'P2': np.ones(len(timestamps)),
+        })
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write(self, **kwargs):
+        return write_24_hour_mean_aggregated_data_files(
+            self.agg_dir, 1, self.data, ['P1', 'P2'], 'timestamp', **kwargs
+        )
+
+    def test_without_tiers(self):
+        years_to_months = self.write()
+
+        self.assertEqual(len(years_to_months[2018]), 1)
+        self.assertNotIn('tiers', years_to_months[2018][0])
+        self.assertEqual(
+            os.listdir(self.means_dir),
+            ['2018_01_sds011_sensor_1_24_hour_means.csv']
+        )
+
+    def test_resolution_tiers(self):
+        years_to_months = self.write(resolution_tiers=['daily', 'hourly'])
+
+        january = years_to_months[2018][0]
+        self.assertEqual(
+            [(tier['name'], tier['resolution_seconds'])
+             for tier in january['tiers']],
+            [('hourly', 3600), ('daily', 86400)]
+        )
+        hourly = pd.read_csv(january['tiers'][0]['path'])
+        # The hour ending at midnight on the 1st February is left out, as
+        # there's no February file for it to go with
+        self.assertEqual(len(hourly), 48)
+        self.assertEqual(
+            list(hourly.columns), ['timestamp', 'P1', 'P2', 'year', 'month']
+        )
+        self.assertEqual(
+            sorted(os.listdir(self.means_dir)),
+            ['2018_01_sds011_sensor_1_24_hour_means.csv',
+             '2018_01_sds011_sensor_1_24_hour_means_daily.csv',
+             '2018_01_sds011_sensor_1_24_hour_means_hourly.csv']
+        )
+
+        # Each value is the 24 hour mean at the end of the hour
+        all_readings = pd.read_csv(january['path']).set_index('timestamp')
+        np.testing.assert_allclose(
+            hourly['P1'].values,
+            all_readings.loc[hourly['timestamp'], 'P1'].values
+        )
+
+    def test_means_written_to_storage(self):
+        with SQLiteStorage(
+                os.path.join(self.temp_dir.name, 'data.sqlite3'),
+                ['P1', 'P2']
+        ) as storage:
+            years_to_months = self.write(
+                resolution_tiers=['daily'], storage=storage
+            )
+            means = storage.read_rolling_means(1, 'timestamp')
+            daily_means = storage.read_rolling_means(
+                1, 'timestamp', resolution='daily'
+            )
+
+        csv_means = pd.read_csv(
+            years_to_months[2018][0]['path'], parse_dates=['timestamp']
+        )
+        pd.testing.assert_frame_equal(
+            means,
+            csv_means[['timestamp', 'P1', 'P2']]
+        )
+        self.assertEqual(len(daily_means), 2)
+
+    def test_compact_files_and_rounding(self):
+        self.data['P1'] /= 3
+        years_to_months = self.write(
+            resolution_tiers=['hourly'], decimals=1, compact=True
+        )
+
+        january = years_to_months[2018][0]
+        self.assertEqual(january['formats']['csv'], january['path'])
+        self.assertEqual(
+            january['tiers'][0]['formats']['compact'],
+            os.path.join(
+                self.means_dir,
+                '2018_01_sds011_sensor_1_24_hour_means_hourly.bin'
+            )
+        )
+        csv_data = pd.read_csv(january['path'], parse_dates=['timestamp'])
+        compact_data = read_compact_file(january['formats']['compact'])
+        self.assertEqual(list(csv_data['P1'][:3]), [0.0, 0.2, 0.3])
+        pd.testing.assert_frame_equal(
+            compact_data,
+            csv_data[['timestamp', 'P1', 'P2']]
+        )
+
+
+class TestWriteSpatialAggregatedDataFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.agg_dir = os.path.join(self.temp_dir.name, 'aggregated')
+        start_date = datetime.date(2018, 1, 1)
+        self.sensors = [
+            Sensor(1, 'A', start_date, LatLongLocation(51.450, -2.58)),
+            Sensor(2, 'B', start_date, LatLongLocation(51.455, -2.58)),
+            Sensor(3, 'C', start_date, LatLongLocation(51.500, -2.58)),
+        ]
+        timestamps = pd.to_datetime(['2018-01-31 23:00', '2018-02-01 00:00'])
+        self.bucket_means = {
+            code: pd.DataFrame(
+                {'P1': [code, code * 2.0], 'P2': [1.0, np.nan]},
+                index=pd.Index(timestamps, name='timestamp')
+            )
+            for code in [1, 2, 3]
+        }
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write(self, **kwargs):
+        return write_spatial_aggregated_data_files(
+            self.agg_dir,
+            self.sensors,
+            self.bucket_means,
+            ['P1', 'P2'],
+            'timestamp',
+            **kwargs
+        )
+
+    def read(self, filename):
+        return pd.read_csv(os.path.join(self.agg_dir, 'spatial', filename))
+
+    def test_citywide_and_area_composites(self):
+        composites = self.write(cluster_distance_km=1.0)
+
+        self.assertEqual(
+            [(c['name'], c['sensors']) for c in composites],
+            [
+                ('citywide', [1, 2, 3]),
+                ('area_1', [1, 2]),
+                ('area_2', [3]),
+            ]
+        )
+        self.assertEqual(
+            [info['month'] for info in composites[0]['available_dates'][2018]],
+            [1, 2]
+        )
+        citywide = self.read('2018_02_citywide_hourly_means.csv')
+        self.assertEqual(list(citywide['P1_mean']), [4.0])
+        self.assertEqual(list(citywide['P1_median']), [4.0])
+        self.assertEqual(list(citywide['P2_sensors']), [0])
+        area = self.read('2018_01_area_1_hourly_means.csv')
+        self.assertEqual(list(area['P1_mean']), [1.5])
+        self.assertEqual(list(area['timestamp']), ['2018-01-31 23:00:00'])
+
+    def test_points_and_months(self):
+        composites = self.write(
+            points={'At B': LatLongLocation(51.455, -2.58)},
+            months={(2018, 2)}
+        )
+
+        point = composites[-1]
+        self.assertEqual(point['name'], 'point_at_b')
+        self.assertEqual(list(point['available_dates']), [2018])
+        self.assertEqual(
+            sorted(os.listdir(os.path.join(self.agg_dir, 'spatial'))),
+            [
+                '2018_02_citywide_hourly_means.csv',
+                '2018_02_point_at_b_hourly_means.csv',
+            ]
+        )
+        self.assertEqual(
+            list(self.read('2018_02_point_at_b_hourly_means.csv')['P1']),
+            [4.0]
+        )
+
+    def test_sensors_without_data_are_left_out(self):
+        self.bucket_means[3] = self.bucket_means[3].iloc[:0]
+
+        composites = self.write()
+
+        self.assertEqual(composites[0]['sensors'], [1, 2])
+
+
+class TestCleanLuftdatenSensorData(unittest.TestCase):
+
+    def setUp(self):
+        timestamps = pd.date_range('2018-01-31 23:00', periods=24,
+                                   freq='5min')
+        p1 = np.tile([10.0, 12.0, 11.0, 13.0], 6)
+        p1[[2, 14]] = [999.9, 300.0]
+        p2 = p1 / 2
+        p2[2] = np.nan
+        # Moved about 11 km for the last few readings
+        latitudes = np.full(24, 51.45, dtype=np.float32)
+        latitudes[20:] = 51.55
+        self.data = pd.DataFrame({
+            'timestamp': timestamps,
+            'P1': p1.astype(np.float32),
+            'P2': p2.astype(np.float32),
+            'lat': latitudes,
+            'lon': np.full(24, -2.58, dtype=np.float32),
+        })
+        self.data = pd.concat([self.data, self.data.iloc[[7]]]) \
+            .sort_values('timestamp', kind='mergesort')
+
+    def test_clean(self):
+        cleaned, counts = clean_luftdaten_sensor_data(
+            self.data,
+            'timestamp',
+            ['P1', 'P2'],
+            location=LatLongLocation(51.45, -2.58)
+        )
+
+        self.assertEqual(list(cleaned.columns), ['timestamp', 'P1', 'P2'])
+        self.assertEqual(len(cleaned), 18)
+        self.assertEqual(counts, {
+            'rows': 25,
+            'duplicates': 1,
+            'moved': 4,
+            'location_changes': 1,
+            'out_of_range': 1,
+            'outliers': 2,
+            'all_values_rejected': 2,
+            'dropped': 7,
+        })
+        self.assertFalse((cleaned['P1'] > 100).any())
+
+    def test_location_defaults_to_latest_readings(self):
+        cleaned, counts = clean_luftdaten_sensor_data(
+            self.data, 'timestamp', ['P1', 'P2']
+        )
+
+        # Only the readings from after the sensor moved are kept
+        self.assertEqual(counts['moved'], 20)
+        self.assertEqual(len(cleaned), 4)
+
+    def test_configured_location_slightly_off(self):
+        # The readings are about 2.8 km from the configured location
+        configured = LatLongLocation(51.45, -2.58)
+        with tempfile.TemporaryDirectory() as raw_dir:
+            for day in (1, 2):
+                write_raw_file(raw_dir, 1, datetime.date(2018, 2, day), [
+                    ('2018-02-0{}T12:00:00'.format(day), 10.0, 5.0),
+                ], location=(51.475, -2.576))
+            with patch('builtins.print') as print_:
+                location = get_luftdaten_sensor_reference_location(
+                    raw_dir, 1, configured
+                )
+            self.assertIn('WARNING', print_.call_args[0][0])
+            self.assertAlmostEqual(location.latitude, 51.475, places=4)
+            self.assertAlmostEqual(location.longitude, -2.576, places=4)
+            data = read_raw_luftdaten_files(
+                [os.path.join(raw_dir, '2018-02-01',
+                              '2018-02-01_sds011_sensor_1.csv')],
+                'timestamp',
+                ['P1', 'P2', 'lat', 'lon']
+            )
+
+        cleaned, counts = clean_luftdaten_sensor_data(
+            data, 'timestamp', ['P1', 'P2'], location=location
+        )
+        self.assertEqual(counts['moved'], 0)
+        self.assertEqual(len(cleaned), 1)
+
+    def test_reference_location_falls_back_to_configured(self):
+        configured = LatLongLocation(51.45, -2.58)
+        with tempfile.TemporaryDirectory() as raw_dir:
+            self.assertIs(
+                get_luftdaten_sensor_reference_location(
+                    raw_dir, 1, configured
+                ),
+                configured
+            )
+
+    def test_without_location_and_counted_months(self):
+        cleaned, counts = clean_luftdaten_sensor_data(
+            self.data[['timestamp', 'P1', 'P2']],
+            'timestamp',
+            ['P1', 'P2'],
+            counted_months={(2018, 2)}
+        )
+
+        self.assertEqual(len(cleaned), 22)
+        self.assertEqual(counts['rows'], 12)
+        self.assertEqual(counts['moved'], 0)
+        self.assertEqual(counts['duplicates'], 0)
+        self.assertEqual(counts['dropped'], 1)
+
+
+class TestWriteExceedanceDataFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.agg_dir = os.path.join(self.temp_dir.name, 'aggregated')
+        timestamps = pd.date_range('2018-01-31 00:00', '2018-02-01 23:00',
+                                   freq='1H')
+        self.data = pd.DataFrame({
+            'timestamp': timestamps,
+            'P1': np.full(len(timestamps), 60.0, dtype=np.float32),
+            'P2': np.full(len(timestamps), 5.0, dtype=np.float32),
+        })
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write(self, **kwargs):
+        return write_exceedance_data_files(
+            self.agg_dir, 1, self.data, ['P1', 'P2'], 'timestamp', **kwargs
+        )
+
+    def read(self, *path):
+        return pd.read_csv(os.path.join(self.agg_dir, *path))
+
+    def test_episodes_are_split_by_month(self):
+        years_to_months = self.write()
+
+        self.assertEqual(
+            [info['month'] for info in years_to_months[2018]], [1, 2]
+        )
+        self.assertEqual(
+            years_to_months[2018][0]['episodes'],
+            {'P1_uk_24h': 1, 'P1_who_24h': 1, 'P2_who_24h': 0}
+        )
+        episodes = self.read(
+            'exceedances', '2018_02_sds011_sensor_1_exceedances.csv'
+        )
+        self.assertEqual(list(episodes['limit']), ['uk_24h', 'who_24h'])
+        self.assertEqual(list(episodes['start']), ['2018-02-01 00:00:00'] * 2)
+        self.assertEqual(list(episodes['end']), ['2018-02-01 23:00:00'] * 2)
+        self.assertEqual(list(episodes['peak']), [60.0, 60.0])
+        self.assertEqual(list(episodes['duration_hours']), [23.0, 23.0])
+
+    def test_daily_bands(self):
+        years_to_months = self.write(months={(2018, 2)})
+
+        self.assertEqual(list(years_to_months), [2018])
+        self.assertEqual(years_to_months[2018][0]['max_band'], 5)
+        daily = self.read('daily_aqi', '2018_02_sds011_sensor_1_daily_aqi.csv')
+        self.assertEqual(list(daily['date']), ['2018-02-01'])
+        self.assertEqual(list(daily['P1_band']), [5])
+        self.assertEqual(list(daily['P2_band']), [1])
+        self.assertEqual(list(daily['band_name']), ['Moderate'])
+        self.assertFalse(os.path.exists(os.path.join(
+            self.agg_dir, 'daily_aqi', '2018_01_sds011_sensor_1_daily_aqi.csv'
+        )))
+
+    def test_means_already_created_are_used(self):
+        expected = self.write()
+        means = create_24_hour_means(self.data, ['P1', 'P2'], 'timestamp')
+        columns = list(means.columns)
+        with patch('luftdaten.data.create_24_hour_means') as create_means:
+            self.assertEqual(self.write(means=means), expected)
+            write_24_hour_mean_aggregated_data_files(
+                self.agg_dir, 1, self.data, ['P1', 'P2'], 'timestamp',
+                means=means
+            )
+        create_means.assert_not_called()
+        # The caller's means are left as they were
+        self.assertEqual(list(means.columns), columns)
+
+
 class MockRequestsResponse:
     """Dummy response for Requests library"""
     def __init__(self, status_code, text=None):
@@ -35,9 +700,9 @@ class MockRequestsResponse:
 
 
 # Source: https://stackoverflow.com/questions/15753390/how-can-i-mock-requests-and-the-response
-# This method will be used by the mock to replace requests.get
-def mocked_requests_get(*args, **kwargs):
-    """Creates a dummy Requests response for requests.get"""
+# This method will be used by the mock to replace requests.Session.head
+def mocked_requests_head(*args, **kwargs):
+    """Creates a dummy Requests response for requests.Session.head"""
     url = args[0]
 
     # Mimic data available between 1 Jan 2018 and 1 Mar 2018
@@ -55,14 +720,36 @@ class TestFindStartDate(unittest.TestCase):
     def test_find_luftdaten_data_start_date(self):
         sensor_number = 123
 
-        with patch('requests.get', side_effect=mocked_requests_get) as p:
+        with patch('requests.Session.head', side_effect=mocked_requests_head) as p:
             start_date = find_start_date_for_sensor(sensor_number)
             self.assertEqual(start_date, datetime.date(2018, 1, 1))
 
+    def test_mirrored_dates_arent_checked(self):
+        with tempfile.TemporaryDirectory() as raw_dir:
+            for day in range(60):
+                date_ = datetime.date(2018, 1, 1) + datetime.timedelta(days=day)
+                write_raw_file(raw_dir, 123, date_, [
+                    (date_.strftime('%Y-%m-%dT12:00:00'), 1.0, 0.5),
+                ])
+
+            with patch('requests.Session.head',
+                       side_effect=mocked_requests_head) as head:
+                start_date = find_start_date_for_sensor(
+                    123, luftdaten_raw_data_dir=raw_dir
+                )
+        self.assertEqual(start_date, datetime.date(2018, 1, 1))
+        checked_dates = [
+            call[0][0].split('/')[3] for call in head.call_args_list
+        ]
+        self.assertFalse([
+            date_ for date_ in checked_dates
+            if '2018-01-01' <= date_ <= '2018-03-01'
+        ])
+
     def test_it_shouldnt_find_luftdaten_data_past_data_period_end(self):
         sensor_number = 123
 
-        with patch('requests.get', side_effect=mocked_requests_get) as p:
+        with patch('requests.Session.head', side_effect=mocked_requests_head) as p:
             start_date = find_start_date_for_sensor(
                 sensor_number,
                 earliest_date=datetime.date(2018, 5, 1)
@@ -72,7 +759,7 @@ class TestFindStartDate(unittest.TestCase):
     def test_it_shouldnt_find_luftdaten_data_before_data_period_begins(self):
         sensor_number = 123
 
-        with patch('requests.get', side_effect=mocked_requests_get) as p:
+        with patch('requests.Session.head', side_effect=mocked_requests_head) as p:
             start_date = find_start_date_for_sensor(
                 sensor_number,
                 latest_date=datetime.date(2017, 9, 1)
@@ -0,0 +1,198 @@
+import datetime
+import os
+import tempfile
+import unittest
+
+import yaml
+
+from config import validate_config
+from location import LatLongLocation
+from luftdaten.discovery import (
+    discover_sensors,
+    format_sensor_config,
+    ListingIndex,
+    parse_listing_sensor_codes,
+    parse_sensor_location,
+    SearchArea,
+)
+from luftdaten.download import ArchiveDownloader
+from tests.archive_server import ArchiveServer
+from tests.raw_files import RAW_HEADER, write_raw_file
+
+
+BRISTOL = (51.45, -2.58)
+LONDON = (51.51, -0.13)
+
+
+class TestParsing(unittest.TestCase):
+
+    def test_parse_listing_sensor_codes(self):
+        listing = '\n'.join([
+            '<a href="../">../</a>',
+            '<a href="2020-01-01_sds011_sensor_12.csv">2020-01-01_sds0..</a>',
+            '<a href="2020-01-01_sds011_sensor_345.csv">2020-01-01_sds0..</a>',
+            '<a href="2020-01-01_sds011_sensor_6_indoor.csv">x</a>',
+            '<a href="2020-01-01_dht22_sensor_13.csv">x</a>',
+        ])
+        self.assertEqual(parse_listing_sensor_codes(listing), {12, 345})
+
+    def test_parse_sensor_location(self):
+        content = '\n'.join([
+            RAW_HEADER,
+            '1;SDS011;1;;;2020-01-01T00:00:00;1;;;2;;',
+            '1;SDS011;1;51.45;-2.58;2020-01-01T00:02:30;1;;;2;;',
+            '1;SDS011;1;51.4',
+        ])
+        self.assertEqual(parse_sensor_location(content), (51.45, -2.58))
+        self.assertIsNone(parse_sensor_location(content.splitlines()[0]))
+        self.assertIsNone(parse_sensor_location(''))
+
+
+class TestSearchArea(unittest.TestCase):
+
+    def test_bounding_box(self):
+        area = SearchArea(bounding_box=(51.4, -2.7, 51.5, -2.5))
+        self.assertEqual(
+            list(area.contains([51.45, 51.45, 51.6], [-2.58, -2.4, -2.58])),
+            [True, False, False]
+        )
+
+    def test_radius(self):
+        area = SearchArea(centre=LatLongLocation(*BRISTOL), radius_km=10)
+        self.assertEqual(
+            list(area.contains([BRISTOL[0], LONDON[0]],
+                               [BRISTOL[1], LONDON[1]])),
+            [True, False]
+        )
+
+    def test_area_is_required(self):
+        with self.assertRaises(ValueError):
+            SearchArea()
+        with self.assertRaises(ValueError):
+            SearchArea(centre=LatLongLocation(*BRISTOL))
+
+
+class TestListingIndex(unittest.TestCase):
+
+    def test_index_is_kept(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            filepath = os.path.join(temp_dir, 'archive-listings.json')
+            index = ListingIndex(filepath, recent_days=2)
+            day = datetime.date(2020, 1, 2)
+            index.add_listing(day, [1, 2], scanned_on=datetime.date(2020, 2, 1))
+            index.add_listing(
+                day - datetime.timedelta(days=1), [1],
+                scanned_on=datetime.date(2020, 1, 2)
+            )
+            index.set_location(1, BRISTOL, day)
+            index.set_location(2, None, day)
+            index.save()
+
+            index = ListingIndex(filepath, recent_days=2)
+            self.assertFalse(index.needs_scan(day))
+            # Scanned the day after, when it may have been incomplete
+            self.assertTrue(index.needs_scan(day - datetime.timedelta(days=1)))
+            self.assertEqual(index.first_seen, {
+                1: datetime.date(2020, 1, 1), 2: day
+            })
+            self.assertEqual(index.last_seen, {1: day, 2: day})
+            self.assertEqual(index.get_location(1), BRISTOL)
+            self.assertFalse(index.needs_location(2))
+            self.assertTrue(index.needs_location(3))
+
+            index.add_listing(datetime.date(2020, 1, 3), [2])
+            self.assertTrue(index.needs_location(2))
+            self.assertEqual(
+                index.get_previous_scanned_date(day),
+                datetime.date(2020, 1, 1)
+            )
+
+
+class TestDiscoverSensors(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.archive_dir = os.path.join(self.temp_dir.name, 'archive')
+        self.index_filepath = os.path.join(
+            self.temp_dir.name, 'archive-listings.json'
+        )
+        self.dates = [
+            datetime.date(2020, 1, 1) + datetime.timedelta(days=i)
+            for i in range(6)
+        ]
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def add_sensor(self, sensor_code, dates, location):
+        for date_ in dates:
+            write_raw_file(self.archive_dir, sensor_code, date_, [
+                (date_.strftime('%Y-%m-%dT12:00:00'), 1.0, 0.5),
+            ], location=location)
+
+    def discover(self, archive, area, **kwargs):
+        with ArchiveDownloader(backoff=0) as downloader:
+            return discover_sensors(
+                ListingIndex(self.index_filepath),
+                downloader,
+                area,
+                start_date=self.dates[0],
+                end_date=self.dates[-1],
+                archive_url=archive.url,
+                **kwargs
+            )
+
+    def test_discover_sensors(self):
+        self.add_sensor(1, self.dates, BRISTOL)
+        self.add_sensor(2, self.dates[3:], (51.46, -2.6))
+        self.add_sensor(3, self.dates, LONDON)
+        # Only every other day's listing is scanned, which the second
+        # sensor first appears in the day after it starts
+        area = SearchArea(centre=LatLongLocation(*BRISTOL), radius_km=10)
+
+        with ArchiveServer(self.archive_dir) as archive:
+            sensors = self.discover(archive, area, step_days=2)
+            self.assertEqual(sensors, [
+                {
+                    'code': 1,
+                    'start_date': self.dates[0],
+                    'latitude': BRISTOL[0],
+                    'longitude': BRISTOL[1],
+                },
+                {
+                    'code': 2,
+                    'start_date': self.dates[3],
+                    'latitude': 51.46,
+                    'longitude': -2.6,
+                },
+            ])
+            listing_requests = sorted(
+                path for _, path in archive.requests if path.endswith('/')
+            )
+            self.assertEqual(listing_requests, [
+                '/{}/'.format(self.dates[i]) for i in (0, 2, 4, 5)
+            ])
+
+            # The listings, locations and start dates are reused
+            archive.requests.clear()
+            self.assertEqual(
+                self.discover(archive, area, step_days=2), sensors
+            )
+            self.assertEqual(archive.requests, [])
+
+    def test_config_entries(self):
+        sensors = [{
+            'code': 1,
+            'start_date': self.dates[0],
+            'latitude': BRISTOL[0],
+            'longitude': BRISTOL[1],
+        }]
+        config = yaml.safe_load(
+            'sensors:\n  luftdaten:\n' + format_sensor_config(sensors)
+        )
+        validate_config(config)
+        self.assertEqual(config['sensors']['luftdaten'][1], {
+            'name': 'Sensor 1',
+            'start_date': self.dates[0],
+            'location': {'latitude': 51.45, 'longitude': -2.58},
+        })
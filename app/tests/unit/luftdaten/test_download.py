@@ -0,0 +1,493 @@
+import datetime
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from instrumentation import RunReport
+from location import LatLongLocation
+from luftdaten.data import (
+    download_raw_luftdaten_files,
+    find_start_date_for_sensor,
+    find_start_dates_for_sensors,
+    get_existing_raw_luftdaten_filenames,
+    get_luftdaten_raw_filename,
+    get_luftdaten_sensor_coverage,
+    load_luftdaten_sensor_data,
+)
+from luftdaten.download import (
+    ArchiveDownloader,
+    ProbeCache,
+    ValidatorIndex,
+    write_chunks_atomically,
+)
+from luftdaten.missing import read_missing_days, RetryPolicy
+from sensor import Sensor
+from tests.archive_server import ArchiveServer
+from tests.raw_files import write_raw_file
+
+
+class ArchiveTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.archive_dir = os.path.join(self.temp_dir.name, 'archive')
+        self.raw_data_dir = os.path.join(self.temp_dir.name, 'raw')
+        self.archive = ArchiveServer(self.archive_dir)
+        self.archive.__enter__()
+
+    def tearDown(self):
+        self.archive.__exit__(None, None, None)
+        self.temp_dir.cleanup()
+
+    def add_archive_file(self, sensor_code, date_):
+        return write_raw_file(self.archive_dir, sensor_code, date_, [
+            (date_.strftime('%Y-%m-%dT12:00:00'), 1.0, 0.5),
+        ])
+
+    def archive_path(self, sensor_code, date_):
+        filename = get_luftdaten_raw_filename(sensor_code, date_)
+        return '/{}/{}'.format(filename.split('_')[0], filename)
+
+
+class TestWriteChunksAtomically(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.filepath = os.path.join(self.temp_dir.name, 'file.csv')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_failed_write_leaves_nothing_behind(self):
+        def chunks():
+            yield b'partial'
+            raise IOError("Connection lost")
+
+        with self.assertRaises(IOError):
+            write_chunks_atomically(self.filepath, chunks())
+        self.assertEqual(os.listdir(self.temp_dir.name), [])
+
+    def test_open_error_is_raised(self):
+        with patch('builtins.open', side_effect=PermissionError):
+            with self.assertRaises(PermissionError):
+                write_chunks_atomically(self.filepath, [b'data'])
+
+
+class TestArchiveDownloader(ArchiveTestCase):
+
+    def test_download(self):
+        dates = [datetime.date(2018, 1, day) for day in range(1, 11)]
+        for date_ in dates:
+            self.add_archive_file(1, date_)
+        missing_date = datetime.date(2018, 1, 11)
+
+        downloads = [
+            (
+                self.archive.url + self.archive_path(1, date_),
+                os.path.join(self.raw_data_dir, '{}.csv'.format(date_))
+            )
+            for date_ in dates + [missing_date]
+        ]
+        with ArchiveDownloader(max_workers=4, backoff=0) as downloader:
+            results = downloader.download(downloads)
+
+        self.assertEqual([result.url for result in results],
+                         [url for url, _ in downloads])
+        self.assertEqual([result.status_code for result in results],
+                         [200] * 10 + [404])
+        for date_, (_, filepath) in zip(dates, downloads):
+            archive_filepath = self.archive_dir + self.archive_path(1, date_)
+            with open(archive_filepath, 'rb') as expected, \
+                    open(filepath, 'rb') as actual:
+                self.assertEqual(actual.read(), expected.read())
+        self.assertEqual(
+            sorted(os.listdir(self.raw_data_dir)),
+            sorted('{}.csv'.format(date_) for date_ in dates)
+        )
+
+    def test_server_errors_are_retried(self):
+        date_ = datetime.date(2018, 1, 1)
+        self.add_archive_file(1, date_)
+        path = self.archive_path(1, date_)
+        self.archive.failures[path] = 2
+        filepath = os.path.join(self.raw_data_dir, 'file.csv')
+
+        with ArchiveDownloader(retries=3, backoff=0) as downloader:
+            result = downloader.download_file(self.archive.url + path, filepath)
+
+        self.assertTrue(result.ok)
+        self.assertEqual(self.archive.request_counts[path], 3)
+        self.assertTrue(os.path.exists(filepath))
+        self.assertEqual(result.attempts, 3)
+        self.assertEqual(result.size, os.path.getsize(filepath))
+
+    def test_gives_up_after_retries(self):
+        date_ = datetime.date(2018, 1, 1)
+        self.add_archive_file(1, date_)
+        path = self.archive_path(1, date_)
+        self.archive.failures[path] = 10
+        filepath = os.path.join(self.raw_data_dir, 'file.csv')
+
+        with ArchiveDownloader(retries=2, backoff=0) as downloader:
+            result = downloader.download_file(self.archive.url + path, filepath)
+
+        self.assertFalse(result.ok)
+        self.assertEqual(result.status_code, 503)
+        self.assertEqual(self.archive.request_counts[path], 3)
+        self.assertFalse(os.path.exists(self.raw_data_dir))
+
+    def test_connection_errors_are_reported(self):
+        with ArchiveDownloader(retries=1, backoff=0) as downloader:
+            result = downloader.download_file(
+                'http://127.0.0.1:1/file.csv',
+                os.path.join(self.raw_data_dir, 'file.csv')
+            )
+
+        self.assertFalse(result.ok)
+        self.assertIsNone(result.status_code)
+        self.assertIsNotNone(result.error)
+
+    def test_requests_in_flight_per_host_are_limited(self):
+        dates = [datetime.date(2018, 1, day) for day in range(1, 13)]
+        for date_ in dates:
+            self.add_archive_file(1, date_)
+
+        lock = threading.Lock()
+        in_flight = [0]
+        max_in_flight = [0]
+
+        with ArchiveDownloader(max_workers=6, max_per_host=2) as downloader:
+            session_get = downloader.session.get
+
+            def get(*args, **kwargs):
+                with lock:
+                    in_flight[0] += 1
+                    max_in_flight[0] = max(max_in_flight[0], in_flight[0])
+                try:
+                    time.sleep(0.01)
+                    return session_get(*args, **kwargs)
+                finally:
+                    with lock:
+                        in_flight[0] -= 1
+
+            downloader.session.get = get
+            results = downloader.download([
+                (
+                    self.archive.url + self.archive_path(1, date_),
+                    os.path.join(self.raw_data_dir, '{}.csv'.format(date_))
+                )
+                for date_ in dates
+            ])
+
+        self.assertTrue(all(result.ok for result in results))
+        self.assertEqual(max_in_flight[0], 2)
+
+
+class TestDownloadRawLuftdatenFiles(ArchiveTestCase):
+
+    def test_download_raw_luftdaten_files(self):
+        today = datetime.date.today()
+        dates = [today - datetime.timedelta(days=i) for i in range(1, 5)]
+        for date_ in dates[:3]:
+            self.add_archive_file(1, date_)
+        # Already mirrored
+        write_raw_file(self.raw_data_dir, 1, dates[0], [])
+
+        sensor = Sensor(1, 'Test', dates[-1], LatLongLocation(51.4, -2.5))
+        with ArchiveDownloader(backoff=0) as downloader:
+            results = download_raw_luftdaten_files(
+                self.raw_data_dir,
+                sensor,
+                downloader=downloader,
+                archive_url=self.archive.url
+            )
+
+        self.assertEqual(
+            [result.status_code for result in results],
+            [404, 200, 200]
+        )
+        self.assertNotIn(
+            ('GET', self.archive_path(1, dates[0])),
+            self.archive.requests
+        )
+        self.assertEqual(
+            sorted(get_existing_raw_luftdaten_filenames(self.raw_data_dir, 1)),
+            sorted(get_luftdaten_raw_filename(1, date_) for date_ in dates[:3])
+        )
+
+    def test_missing_days_are_not_requested_every_run(self):
+        today = datetime.date.today()
+        dates = [today - datetime.timedelta(days=i) for i in range(1, 5)]
+        self.add_archive_file(1, dates[0])
+        self.add_archive_file(1, dates[2])
+        sensor = Sensor(1, 'Test', dates[-1], LatLongLocation(51.4, -2.5))
+        policy = RetryPolicy(
+            recheck_days=1, give_up_days=2, recheck_interval_days=7
+        )
+
+        def download(retry_policy):
+            with ArchiveDownloader(backoff=0) as downloader:
+                return download_raw_luftdaten_files(
+                    self.raw_data_dir,
+                    sensor,
+                    downloader=downloader,
+                    archive_url=self.archive.url,
+                    retry_policy=retry_policy
+                )
+
+        self.assertEqual(
+            [result.status_code for result in download(policy)],
+            [404, 200, 404, 200]
+        )
+        self.assertEqual(
+            sorted(read_missing_days(self.raw_data_dir, 1)),
+            [dates[3], dates[1]]
+        )
+
+        # The oldest day is given up on and the other isn't due yet
+        self.assertEqual(download(policy), [])
+        coverage = get_luftdaten_sensor_coverage(
+            self.raw_data_dir, sensor, policy
+        )
+        self.assertEqual(
+            [coverage[state] for state in
+             ('days', 'present', 'missing', 'pending', 'failed')],
+            [4, 2, 1, 1, 1]
+        )
+        self.assertEqual(
+            coverage['missing_ranges'],
+            [[dates[3].isoformat(), dates[3].isoformat()]]
+        )
+
+        # Both are requested when retrying everything, and the day the
+        # archive has since added is forgotten
+        self.add_archive_file(1, dates[1])
+        results = download(
+            RetryPolicy(give_up_days=None, recheck_interval_days=0)
+        )
+        self.assertEqual(
+            [result.status_code for result in results], [404, 200]
+        )
+        self.assertEqual(
+            list(read_missing_days(self.raw_data_dir, 1)), [dates[3]]
+        )
+        self.assertEqual(
+            read_missing_days(self.raw_data_dir, 1)[dates[3]]['attempts'], 2
+        )
+
+    def test_downloads_are_recorded_in_report(self):
+        today = datetime.date.today()
+        dates = [today - datetime.timedelta(days=i) for i in range(1, 3)]
+        filepath = self.add_archive_file(1, dates[0])
+
+        sensor = Sensor(1, 'Test', dates[-1], LatLongLocation(51.4, -2.5))
+        report = RunReport('test')
+        with ArchiveDownloader(backoff=0) as downloader:
+            download_raw_luftdaten_files(
+                self.raw_data_dir,
+                sensor,
+                downloader=downloader,
+                archive_url=self.archive.url,
+                report=report
+            )
+
+        download, *file_downloads = report.stages
+        self.assertEqual(download['stage'], 'download')
+        self.assertEqual(download['files'], 2)
+        self.assertEqual(download['requests'], 2)
+        self.assertEqual(download['failed'], 1)
+        self.assertEqual(download['bytes'], os.path.getsize(filepath))
+        self.assertEqual(
+            sorted(
+                (record['status_code'], record['bytes'])
+                for record in file_downloads
+            ),
+            [(200, os.path.getsize(filepath)), (404, 0)]
+        )
+
+    def test_files_can_be_stored_compressed(self):
+        today = datetime.date.today()
+        dates = [today - datetime.timedelta(days=i) for i in range(1, 3)]
+        for date_ in dates:
+            self.add_archive_file(1, date_)
+
+        sensor = Sensor(1, 'Test', dates[-1], LatLongLocation(51.4, -2.5))
+        download_raw_luftdaten_files(
+            self.raw_data_dir,
+            sensor,
+            archive_url=self.archive.url,
+            compress=True
+        )
+
+        filename = get_luftdaten_raw_filename(1, dates[0])
+        self.assertTrue(os.path.exists(os.path.join(
+            self.raw_data_dir, filename.split('_')[0], filename + '.gz'
+        )))
+        self.assertEqual(
+            sorted(get_existing_raw_luftdaten_filenames(self.raw_data_dir, 1)),
+            sorted(get_luftdaten_raw_filename(1, date_) for date_ in dates)
+        )
+        data = load_luftdaten_sensor_data(self.raw_data_dir, 1, 'timestamp')
+        self.assertEqual(len(data), 2)
+
+    def test_gzip_transfer_encoding_is_decoded(self):
+        self.archive.gzip_encoding = True
+        date_ = datetime.date(2018, 1, 1)
+        archive_filepath = self.add_archive_file(1, date_)
+        filepath = os.path.join(self.raw_data_dir, 'file.csv')
+
+        with ArchiveDownloader(backoff=0) as downloader:
+            result = downloader.download_file(
+                self.archive.url + self.archive_path(1, date_),
+                filepath
+            )
+
+        self.assertTrue(result.ok)
+        with open(archive_filepath, 'rb') as expected, \
+                open(filepath, 'rb') as actual:
+            self.assertEqual(actual.read(), expected.read())
+
+    def test_recent_days_are_revalidated(self):
+        yesterday = datetime.date.today() - datetime.timedelta(days=1)
+        archive_filepath = self.add_archive_file(1, yesterday)
+        old_mtime = os.path.getmtime(archive_filepath) - 3600
+        os.utime(archive_filepath, (old_mtime, old_mtime))
+        sensor = Sensor(1, 'Test', yesterday, LatLongLocation(51.4, -2.5))
+        validators_filepath = os.path.join(self.raw_data_dir, 'validators.json')
+
+        def download():
+            validators = ValidatorIndex(validators_filepath)
+            with ArchiveDownloader(backoff=0, validators=validators) as d:
+                return download_raw_luftdaten_files(
+                    self.raw_data_dir,
+                    sensor,
+                    downloader=d,
+                    archive_url=self.archive.url,
+                    revalidate_days=2
+                )
+
+        self.assertEqual([r.status_code for r in download()], [200])
+        self.assertIsNotNone(
+            ValidatorIndex(validators_filepath).get(
+                self.archive.url + self.archive_path(1, yesterday)
+            )['last_modified']
+        )
+
+        # Unchanged, so nothing is transferred
+        self.assertEqual([r.status_code for r in download()], [304])
+
+        # The archive file was completed later in the day
+        write_raw_file(self.archive_dir, 1, yesterday, [
+            ('{}T12:00:00'.format(yesterday), 1.0, 0.5),
+            ('{}T13:00:00'.format(yesterday), 2.0, 1.0),
+        ])
+        self.assertEqual([r.status_code for r in download()], [200])
+        data = load_luftdaten_sensor_data(self.raw_data_dir, 1, 'timestamp')
+        self.assertEqual(len(data), 2)
+
+    def test_partial_downloads_are_not_treated_as_mirrored(self):
+        date_ = datetime.date(2018, 1, 1)
+        filepath = write_raw_file(self.raw_data_dir, 1, date_, [])
+        os.rename(filepath, filepath + '.part')
+
+        self.assertEqual(
+            get_existing_raw_luftdaten_filenames(self.raw_data_dir, 1), []
+        )
+
+
+class TestFindStartDate(ArchiveTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # Sensor 1 has data from the 10th January to the end of February
+        start_date = datetime.date(2018, 1, 10)
+        for day in range(50):
+            self.add_archive_file(1, start_date + datetime.timedelta(days=day))
+        self.probe_cache_filepath = os.path.join(
+            self.temp_dir.name, 'probes.json'
+        )
+
+    def find_start_date(self, **kwargs):
+        with ArchiveDownloader(backoff=0) as downloader:
+            return find_start_date_for_sensor(
+                1,
+                earliest_date=datetime.date(2017, 10, 1),
+                latest_date=datetime.date(2018, 2, 28),
+                downloader=downloader,
+                archive_url=self.archive.url,
+                **kwargs
+            )
+
+    def test_only_head_requests_are_made(self):
+        self.assertEqual(self.find_start_date(), datetime.date(2018, 1, 10))
+        self.assertEqual(
+            {method for method, _ in self.archive.requests}, {'HEAD'}
+        )
+
+    def test_probes_are_cached_between_runs(self):
+        probe_cache = ProbeCache(self.probe_cache_filepath)
+        self.find_start_date(probe_cache=probe_cache)
+        probe_cache.save()
+        request_count = len(self.archive.requests)
+
+        start_date = self.find_start_date(
+            probe_cache=ProbeCache(self.probe_cache_filepath)
+        )
+
+        self.assertEqual(start_date, datetime.date(2018, 1, 10))
+        self.assertEqual(len(self.archive.requests), request_count)
+
+    def test_missing_files_are_checked_again_after_ttl(self):
+        probe_cache = ProbeCache(self.probe_cache_filepath, negative_ttl=-1)
+        probe_cache.set(1, datetime.date(2018, 1, 1), True)
+        probe_cache.set(1, datetime.date(2018, 1, 2), False)
+
+        self.assertTrue(probe_cache.get(1, datetime.date(2018, 1, 1)))
+        self.assertIsNone(probe_cache.get(1, datetime.date(2018, 1, 2)))
+        self.assertIsNone(probe_cache.get(2, datetime.date(2018, 1, 1)))
+
+    def test_local_mirror_is_consulted(self):
+        write_raw_file(self.raw_data_dir, 1, datetime.date(2018, 2, 28), [])
+
+        self.find_start_date(luftdaten_raw_data_dir=self.raw_data_dir)
+
+        self.assertNotIn(
+            ('HEAD', self.archive_path(1, datetime.date(2018, 2, 28))),
+            self.archive.requests
+        )
+
+    def test_failed_requests_are_not_cached(self):
+        probe_cache = ProbeCache(self.probe_cache_filepath)
+        path = self.archive_path(1, datetime.date(2018, 2, 28))
+        self.archive.failures[path] = 10
+
+        with ArchiveDownloader(retries=0) as downloader:
+            find_start_date_for_sensor(
+                1,
+                earliest_date=datetime.date(2018, 2, 27),
+                latest_date=datetime.date(2018, 2, 28),
+                downloader=downloader,
+                probe_cache=probe_cache,
+                archive_url=self.archive.url
+            )
+
+        self.assertTrue(probe_cache.get(1, datetime.date(2018, 2, 27)))
+        self.assertIsNone(probe_cache.get(1, datetime.date(2018, 2, 28)))
+
+    def test_many_sensors(self):
+        today = datetime.date.today()
+        self.add_archive_file(2, today)
+
+        start_dates = find_start_dates_for_sensors(
+            [1, 2, 3],
+            archive_url=self.archive.url
+        )
+
+        self.assertEqual(start_dates, {
+            1: datetime.date(2018, 1, 10),
+            2: today,
+            3: None,
+        })
@@ -0,0 +1,319 @@
+import asyncio
+import datetime
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from location import LatLongLocation
+from luftdaten.live import (
+    append_live_readings,
+    get_last_live_timestamp,
+    get_live_luftdaten_filepaths,
+    LivePoller,
+    load_luftdaten_sensor_month_with_live_readings,
+    merge_months_into_summary,
+    parse_live_readings,
+    remove_archived_live_readings,
+)
+from sensor import Sensor
+from tests.live_api_server import create_live_item, LiveApiServer
+from tests.raw_files import write_raw_file
+
+
+def create_sensor(sensor_code):
+    return Sensor(
+        sensor_code,
+        'Sensor {}'.format(sensor_code),
+        datetime.date(2020, 1, 1),
+        LatLongLocation(51.45, -2.58)
+    )
+
+
+def create_items(sensor_code, start, periods, value=10.0):
+    """Live API readings every 2.5 minutes from start."""
+    return [
+        create_live_item(
+            sensor_code,
+            timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+            value + i,
+            value / 2
+        )
+        for i, timestamp in enumerate(
+            pd.date_range(start, periods=periods, freq='150s')
+        )
+    ]
+
+
+class TestParseLiveReadings(unittest.TestCase):
+
+    def test_parse_live_readings(self):
+        items = [
+            create_live_item(1, '2020-02-01 12:02:30', 12.5, 6.25),
+            create_live_item(1, '2020-02-01 12:00:00', 10, 5),
+        ]
+        other_sensor = create_live_item(2, '2020-02-01 12:00:00', 1, 1)
+        other_sensor['sensor']['sensor_type']['name'] = 'DHT22'
+        data = parse_live_readings(items + [other_sensor])
+
+        self.assertEqual(list(data['timestamp']), [
+            pd.Timestamp('2020-02-01 12:00:00'),
+            pd.Timestamp('2020-02-01 12:02:30'),
+        ])
+        self.assertEqual(list(data['P1']), [10.0, 12.5])
+        self.assertEqual(list(data['P2']), [5.0, 6.25])
+        self.assertEqual(list(data['lat']), [51.45, 51.45])
+
+    def test_no_readings(self):
+        data = parse_live_readings([])
+        self.assertEqual(len(data), 0)
+        self.assertIn('P1', data)
+
+
+class TestLiveReadingFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.raw_dir = os.path.join(self.temp_dir.name, 'raw')
+        self.live_dir = os.path.join(self.temp_dir.name, 'live')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_append_live_readings(self):
+        self.assertIsNone(get_last_live_timestamp(self.live_dir, 1))
+        # Over midnight, into a second day file
+        readings = parse_live_readings(
+            create_items(1, '2020-01-31 23:55', 4)
+        )
+        appended = append_live_readings(self.live_dir, 1, readings)
+        self.assertEqual(len(appended), 4)
+        self.assertEqual(
+            [os.path.basename(filepath) for filepath in
+             get_live_luftdaten_filepaths(self.live_dir, 1)],
+            ['2020-01-31_sds011_sensor_1.csv',
+             '2020-02-01_sds011_sensor_1.csv']
+        )
+        last_timestamp = get_last_live_timestamp(self.live_dir, 1)
+        self.assertEqual(last_timestamp, pd.Timestamp('2020-02-01 00:02:30'))
+
+        # Only the readings after the last one kept are appended
+        readings = parse_live_readings(
+            create_items(1, '2020-02-01 00:00', 3)
+        )
+        appended = append_live_readings(
+            self.live_dir, 1, readings, after=last_timestamp
+        )
+        self.assertEqual(list(appended['timestamp']),
+                         [pd.Timestamp('2020-02-01 00:05')])
+
+        data = load_luftdaten_sensor_month_with_live_readings(
+            self.raw_dir, self.live_dir, 1, 2020, 2, 'timestamp'
+        )
+        self.assertEqual(list(data['timestamp']), [
+            pd.Timestamp('2020-01-31 23:55'),
+            pd.Timestamp('2020-01-31 23:57:30'),
+            pd.Timestamp('2020-02-01 00:00'),
+            pd.Timestamp('2020-02-01 00:02:30'),
+            pd.Timestamp('2020-02-01 00:05'),
+        ])
+
+    def test_archive_files_replace_live_readings(self):
+        append_live_readings(
+            self.live_dir,
+            1,
+            parse_live_readings(create_items(1, '2020-02-01 23:55', 4))
+        )
+        write_raw_file(self.raw_dir, 1, datetime.date(2020, 2, 1), [
+            ('2020-02-01T12:00:00', 1.0, 2.0),
+        ])
+
+        data = load_luftdaten_sensor_month_with_live_readings(
+            self.raw_dir, self.live_dir, 1, 2020, 2, 'timestamp'
+        )
+        self.assertEqual(list(data['timestamp']), [
+            pd.Timestamp('2020-02-01 12:00'),
+            pd.Timestamp('2020-02-02 00:00'),
+            pd.Timestamp('2020-02-02 00:02:30'),
+        ])
+
+        self.assertEqual(
+            remove_archived_live_readings(self.raw_dir, self.live_dir, 1),
+            [datetime.date(2020, 2, 1)]
+        )
+        self.assertEqual(len(get_live_luftdaten_filepaths(self.live_dir, 1)), 1)
+        self.assertFalse(os.path.exists(
+            os.path.join(self.live_dir, '2020-02-01')
+        ))
+
+
+class TestMergeMonthsIntoSummary(unittest.TestCase):
+
+    def test_merge_months_into_summary(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            summary_filepath = os.path.join(temp_dir, 'sensor-summary.json')
+            self.assertFalse(merge_months_into_summary(
+                summary_filepath, 1, {}
+            ))
+            with open(summary_filepath, 'w') as file_:
+                json.dump({'luftdaten_sensors': [{
+                    'code': 1,
+                    '24_hour_means': {'available_dates': {
+                        '2020': [{'month': 1, 'path': 'old'}]
+                    }},
+                }]}, file_)
+
+            self.assertTrue(merge_months_into_summary(
+                summary_filepath,
+                1,
+                {'24_hour_means': {2020: [
+                    {'month': 2, 'path': 'new'}, {'month': 1, 'path': 'new'}
+                ]}}
+            ))
+            self.assertFalse(merge_months_into_summary(
+                summary_filepath, 2, {}
+            ))
+            with open(summary_filepath, 'r') as file_:
+                summary = json.load(file_)
+            self.assertEqual(
+                summary['luftdaten_sensors'][0]['24_hour_means'],
+                {'available_dates': {'2020': [
+                    {'month': 1, 'path': 'new'}, {'month': 2, 'path': 'new'}
+                ]}}
+            )
+
+
+class TestLivePoller(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.raw_dir = os.path.join(self.temp_dir.name, 'raw')
+        self.live_dir = os.path.join(self.temp_dir.name, 'live')
+        self.aggregated_dir = os.path.join(self.temp_dir.name, 'aggregated')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def create_poller(self, api, sensor_codes, **kwargs):
+        return LivePoller(
+            [create_sensor(sensor_code) for sensor_code in sensor_codes],
+            self.raw_dir,
+            self.live_dir,
+            self.aggregated_dir,
+            api_url=api.url,
+            interval=0,
+            jitter=0,
+            **kwargs
+        )
+
+    def read_24_hour_means(self, sensor_code, year, month):
+        return pd.read_csv(os.path.join(
+            self.aggregated_dir,
+            '24_hour_means',
+            '{}_{:02d}_sds011_sensor_{}_24_hour_means.csv'.format(
+                year, month, sensor_code
+            )
+        ))
+
+    def test_new_readings_update_their_month(self):
+        summary_filepath = os.path.join(
+            self.aggregated_dir, 'sensor-summary.json'
+        )
+        os.makedirs(self.aggregated_dir)
+        with open(summary_filepath, 'w') as file_:
+            json.dump({'luftdaten_sensors': [{'code': 1}]}, file_)
+        # The end of January is in the archive already
+        write_raw_file(self.raw_dir, 1, datetime.date(2020, 1, 31), [
+            ('2020-01-31T23:50:00', 20.0, 10.0),
+        ])
+
+        with LiveApiServer({1: create_items(1, '2020-02-01 00:00', 2)}) \
+                as api:
+            poller = self.create_poller(
+                api, [1], summary_filepath=summary_filepath
+            )
+            stats = asyncio.run(poller.run(rounds=1))
+            self.assertEqual(stats['readings'], 2)
+            means = self.read_24_hour_means(1, 2020, 2)
+            np.testing.assert_allclose(
+                means['P1'], [15.0, (20 + 10 + 11) / 3], rtol=1e-6
+            )
+
+            # The next poll overlaps the last
+            api.readings[1] = create_items(1, '2020-02-01 00:02:30', 2)
+            stats = asyncio.run(poller.run(rounds=1))
+            self.assertEqual(stats['rounds'], 2)
+            self.assertEqual(stats['readings'], 3)
+            self.assertEqual(len(self.read_24_hour_means(1, 2020, 2)), 3)
+
+        with open(summary_filepath, 'r') as file_:
+            sensor_info = json.load(file_)['luftdaten_sensors'][0]
+        self.assertEqual(
+            [month_info['month'] for month_info in
+             sensor_info['24_hour_means']['available_dates']['2020']],
+            [2]
+        )
+        self.assertIn('day_of_week', sensor_info)
+
+    def test_readings_are_cleaned_and_exceedances_written(self):
+        summary_filepath = os.path.join(
+            self.aggregated_dir, 'sensor-summary.json'
+        )
+        os.makedirs(self.aggregated_dir)
+        with open(summary_filepath, 'w') as file_:
+            json.dump({'luftdaten_sensors': [{'code': 1}]}, file_)
+        write_raw_file(self.raw_dir, 1, datetime.date(2020, 1, 31), [
+            ('2020-01-31T23:50:00', 20.0, 10.0),
+        ], location=(51.45, -2.58))
+        items = create_items(1, '2020-02-01 00:00', 3)
+        # What the SDS011 gives when it's saturated
+        items[1] = create_live_item(1, '2020-02-01 00:02:30', 999.9, 999.9)
+
+        with LiveApiServer({1: items}) as api:
+            poller = self.create_poller(
+                api, [1], clean=True, events=True,
+                summary_filepath=summary_filepath
+            )
+            stats = asyncio.run(poller.run(rounds=1))
+        self.assertEqual(stats['readings'], 3)
+        means = self.read_24_hour_means(1, 2020, 2)
+        # The saturated reading is left out
+        np.testing.assert_allclose(
+            means['P1'], [15.0, (20 + 10 + 12) / 3], rtol=1e-6
+        )
+
+        with open(summary_filepath, 'r') as file_:
+            sensor_info = json.load(file_)['luftdaten_sensors'][0]
+        months = sensor_info['exceedances']['available_dates']['2020']
+        self.assertEqual([month_info['month'] for month_info in months], [2])
+
+    def test_failures_are_skipped(self):
+        with LiveApiServer({1: create_items(1, '2020-02-01 00:00', 2)}) \
+                as api:
+            api.failures['/v1/sensor/1/'] = 1
+            # Sensor 2 isn't in the API at all
+            poller = self.create_poller(api, [1, 2])
+            stats = asyncio.run(poller.run(rounds=2))
+        self.assertEqual(stats['requests'], 4)
+        self.assertEqual(stats['failed'], 3)
+        self.assertEqual(stats['readings'], 2)
+
+    def test_requests_are_limited(self):
+        sensor_codes = list(range(1, 11))
+        with LiveApiServer(
+                {
+                    sensor_code: create_items(sensor_code, '2020-02-01', 2)
+                    for sensor_code in sensor_codes
+                },
+                delay=0.05
+        ) as api:
+            poller = self.create_poller(
+                api, sensor_codes, concurrency=3, max_pending=1
+            )
+            stats = asyncio.run(poller.run(rounds=1))
+            self.assertLessEqual(api.max_in_flight, 3)
+        self.assertEqual(stats['readings'], 20)
+        self.assertEqual(stats['months_written'], 10)
@@ -0,0 +1,104 @@
+import datetime
+import hashlib
+import os
+import tempfile
+import unittest
+
+from location import LatLongLocation
+from luftdaten.data import (
+    download_raw_luftdaten_files,
+    get_existing_raw_luftdaten_filenames,
+    get_luftdaten_raw_filename,
+    load_luftdaten_sensor_data,
+    rebuild_raw_luftdaten_manifests,
+)
+from luftdaten.manifest import get_raw_manifest_filepath, read_raw_manifest
+from sensor import Sensor
+from tests.archive_server import ArchiveServer
+from tests.raw_files import write_raw_file
+
+
+class TestRawManifest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.raw_data_dir = os.path.join(self.temp_dir.name, 'raw')
+        self.archive_dir = os.path.join(self.temp_dir.name, 'archive')
+        self.today = datetime.date.today()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write_day(self, directory, sensor_code, days_ago):
+        date_ = self.today - datetime.timedelta(days=days_ago)
+        return write_raw_file(directory, sensor_code, date_, [
+            (date_.strftime('%Y-%m-%dT12:00:00'), days_ago, 1.0),
+        ])
+
+    def download(self, sensor_code, days):
+        sensor = Sensor(
+            sensor_code,
+            'Test',
+            self.today - datetime.timedelta(days=days),
+            LatLongLocation(51.4, -2.5)
+        )
+        with ArchiveServer(self.archive_dir) as archive:
+            download_raw_luftdaten_files(
+                self.raw_data_dir,
+                sensor,
+                archive_url=archive.url
+            )
+
+    def test_downloads_are_added_with_existing_files(self):
+        for days_ago in range(1, 4):
+            self.write_day(self.archive_dir, 1, days_ago)
+        # Mirrored before there was a manifest
+        existing_filepath = self.write_day(self.raw_data_dir, 1, 3)
+
+        self.download(1, 3)
+
+        manifest = read_raw_manifest(self.raw_data_dir, 1)
+        self.assertEqual(len(manifest), 3)
+        filename = os.path.basename(existing_filepath)
+        with open(existing_filepath, 'rb') as file_:
+            self.assertEqual(
+                manifest[filename]['sha1'],
+                hashlib.sha1(file_.read()).hexdigest()
+            )
+        self.assertEqual(
+            manifest[filename]['path'],
+            os.path.relpath(existing_filepath, self.raw_data_dir)
+        )
+
+    def test_listing_uses_manifest(self):
+        self.write_day(self.archive_dir, 1, 1)
+        self.download(1, 1)
+        # Not downloaded, so not in the manifest
+        self.write_day(self.raw_data_dir, 1, 2)
+
+        self.assertEqual(
+            get_existing_raw_luftdaten_filenames(self.raw_data_dir, 1),
+            [get_luftdaten_raw_filename(
+                1, self.today - datetime.timedelta(days=1)
+            )]
+        )
+        data = load_luftdaten_sensor_data(self.raw_data_dir, 1, 'timestamp')
+        self.assertEqual(list(data['P1']), [1.0])
+
+    def test_rebuild(self):
+        self.write_day(self.archive_dir, 1, 1)
+        self.download(1, 1)
+        self.write_day(self.raw_data_dir, 1, 2)
+        self.write_day(self.raw_data_dir, 2, 1)
+        os.makedirs(os.path.dirname(
+            get_raw_manifest_filepath(self.raw_data_dir, 3)
+        ), exist_ok=True)
+        with open(get_raw_manifest_filepath(self.raw_data_dir, 3), 'w') as f:
+            f.write('{}')
+
+        file_counts = rebuild_raw_luftdaten_manifests(self.raw_data_dir)
+
+        self.assertEqual(file_counts, {'1': 2, '2': 1})
+        self.assertEqual(len(read_raw_manifest(self.raw_data_dir, 1)), 2)
+        self.assertEqual(len(read_raw_manifest(self.raw_data_dir, 2)), 1)
+        self.assertIsNone(read_raw_manifest(self.raw_data_dir, 3))
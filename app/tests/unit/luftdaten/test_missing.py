@@ -0,0 +1,98 @@
+import datetime
+import tempfile
+import unittest
+
+from luftdaten.missing import (
+    read_missing_days,
+    record_attempts,
+    RetryPolicy,
+    write_missing_days,
+)
+
+
+TODAY = datetime.date(2020, 3, 1)
+NOW = datetime.datetime(2020, 3, 1, 12)
+
+
+def days_ago(days):
+    return TODAY - datetime.timedelta(days=days)
+
+
+def create_record(status_code, last_attempt_days_ago):
+    last_attempt = NOW - datetime.timedelta(days=last_attempt_days_ago)
+    return {
+        'status_code': status_code,
+        'first_attempt': last_attempt.strftime('%Y-%m-%dT%H:%M:%S'),
+        'last_attempt': last_attempt.strftime('%Y-%m-%dT%H:%M:%S'),
+        'attempts': 1,
+    }
+
+
+class TestRecordAttempts(unittest.TestCase):
+
+    def test_record_attempts(self):
+        missing_days = {}
+        self.assertTrue(record_attempts(
+            missing_days,
+            {days_ago(1): 404, days_ago(2): None, days_ago(3): 200},
+            NOW - datetime.timedelta(days=1)
+        ))
+        self.assertEqual(sorted(missing_days), [days_ago(2), days_ago(1)])
+        self.assertIsNone(missing_days[days_ago(2)]['status_code'])
+
+        self.assertTrue(record_attempts(
+            missing_days, {days_ago(1): 500, days_ago(2): 200}, NOW
+        ))
+        self.assertEqual(missing_days, {days_ago(1): {
+            'status_code': 500,
+            'first_attempt': '2020-02-29T12:00:00',
+            'last_attempt': '2020-03-01T12:00:00',
+            'attempts': 2,
+        }})
+        self.assertFalse(record_attempts(missing_days, {days_ago(5): 200}))
+
+    def test_missing_days_are_kept(self):
+        missing_days = {days_ago(1): create_record(404, 0)}
+        with tempfile.TemporaryDirectory() as raw_dir:
+            self.assertEqual(read_missing_days(raw_dir, 1), {})
+            write_missing_days(raw_dir, 1, missing_days)
+            self.assertEqual(read_missing_days(raw_dir, 1), missing_days)
+
+
+class TestRetryPolicy(unittest.TestCase):
+
+    def setUp(self):
+        self.policy = RetryPolicy(
+            recheck_days=7, give_up_days=30, recheck_interval_days=7
+        )
+
+    def is_due(self, days, record):
+        return self.policy.is_due(days_ago(days), record, TODAY, NOW)
+
+    def test_days_never_attempted_are_due(self):
+        self.assertTrue(self.is_due(100, None))
+
+    def test_recent_days_are_always_due(self):
+        self.assertTrue(self.is_due(7, create_record(404, 0)))
+
+    def test_older_days_are_rechecked_at_intervals(self):
+        self.assertFalse(self.is_due(8, create_record(404, 6)))
+        self.assertTrue(self.is_due(8, create_record(404, 7)))
+        self.assertTrue(self.is_due(30, create_record(404, 7)))
+
+    def test_old_missing_days_are_given_up_on(self):
+        record = create_record(404, 100)
+        self.assertFalse(self.is_due(31, record))
+        self.assertTrue(self.policy.is_given_up(days_ago(31), record, TODAY))
+        self.assertFalse(
+            RetryPolicy(give_up_days=None).is_given_up(
+                days_ago(31), record, TODAY
+            )
+        )
+
+    def test_other_failures_are_always_due(self):
+        self.assertTrue(self.is_due(100, create_record(500, 0)))
+        self.assertTrue(self.is_due(100, create_record(None, 0)))
+        self.assertFalse(
+            self.policy.is_given_up(days_ago(100), create_record(500, 0), TODAY)
+        )
@@ -0,0 +1,42 @@
+import unittest
+
+from service import LRUCache
+
+
+class TestLRUCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = LRUCache(10, len)
+
+    def test_get(self):
+        self.cache.put('a', 'xxx')
+        self.assertEqual(self.cache.get('a'), 'xxx')
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(self.cache.get('b', 'default'), 'default')
+        stats = self.cache.get_stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 2)
+
+    def test_evicts_least_recently_used(self):
+        self.cache.put('a', 'xxxx')
+        self.cache.put('b', 'xxxx')
+        # Using a makes b the least recently used
+        self.cache.get('a')
+        self.cache.put('c', 'xxxx')
+        self.assertIn('a', self.cache)
+        self.assertNotIn('b', self.cache)
+        self.assertIn('c', self.cache)
+        self.assertEqual(self.cache.bytes, 8)
+
+    def test_replaces_value(self):
+        self.cache.put('a', 'xxxx')
+        self.cache.put('a', 'xxxxxxxx')
+        self.assertEqual(self.cache.get('a'), 'xxxxxxxx')
+        self.assertEqual(len(self.cache), 1)
+        self.assertEqual(self.cache.bytes, 8)
+
+    def test_too_big_value_isnt_cached(self):
+        self.cache.put('a', 'xxxx')
+        self.cache.put('b', 'x' * 11)
+        self.assertNotIn('b', self.cache)
+        self.assertIn('a', self.cache)
@@ -0,0 +1,154 @@
+import datetime
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from luftdaten.data import write_24_hour_mean_aggregated_data_files
+from service import AggregatedDataService, QueryError
+from service.query import get_months_between, select_last_in_periods
+
+
+def write_means(aggregated_dir, sensor_code, start, periods, freq='5min'):
+    timestamps = pd.date_range(start, periods=periods, freq=freq)
+    data = pd.DataFrame({
+        'timestamp': timestamps,
+        'P1': np.arange(periods, dtype=np.float64),
+        'P2': np.arange(periods, dtype=np.float64) / 2,
+    })
+    write_24_hour_mean_aggregated_data_files(
+        aggregated_dir, sensor_code, data, ['P1', 'P2'], 'timestamp'
+    )
+
+
+class TestGetMonthsBetween(unittest.TestCase):
+
+    def test_get_months_between(self):
+        self.assertEqual(
+            get_months_between(
+                datetime.datetime(2019, 11, 15),
+                datetime.datetime(2020, 2, 1)
+            ),
+            [(2019, 11), (2019, 12), (2020, 1)]
+        )
+
+
+class TestSelectLastInPeriods(unittest.TestCase):
+
+    def test_select_last_in_periods(self):
+        hour = pd.Timedelta('1H').value
+        timestamps = np.array([0, 1, hour, hour + 1, 3 * hour], np.int64)
+        # Periods end on the hour, so a reading on the hour ends its period
+        np.testing.assert_array_equal(
+            select_last_in_periods(timestamps, hour), [0, 2, 3, 4]
+        )
+        self.assertEqual(len(select_last_in_periods([], hour)), 0)
+
+
+class TestAggregatedDataService(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.aggregated_dir = os.path.join(self.temp_dir.name, 'aggregated')
+        # Over the end of January into February
+        write_means(self.aggregated_dir, 1, '2020-01-31 12:00', 24 * 12)
+        self.service = AggregatedDataService(self.aggregated_dir)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_query_across_months(self):
+        data = self.service.query(
+            1,
+            datetime.datetime(2020, 1, 31, 23),
+            datetime.datetime(2020, 2, 1, 1)
+        )
+        self.assertEqual(list(data.columns), ['timestamp', 'P1', 'P2'])
+        self.assertEqual(len(data), 24)
+        self.assertEqual(data['timestamp'].iloc[0],
+                         pd.Timestamp('2020-01-31 23:00'))
+        self.assertEqual(data['timestamp'].iloc[-1],
+                         pd.Timestamp('2020-02-01 00:55'))
+
+    def test_query_resolution_and_fields(self):
+        data = self.service.query(
+            1,
+            datetime.datetime(2020, 1, 31, 12),
+            datetime.datetime(2020, 2, 1, 12),
+            resolution='hourly',
+            fields=['P2']
+        )
+        self.assertEqual(list(data.columns), ['timestamp', 'P2'])
+        # The reading on each hour, then the last one before the end
+        self.assertEqual(len(data), 25)
+        self.assertEqual(data['timestamp'].iloc[0],
+                         pd.Timestamp('2020-01-31 12:00'))
+        self.assertEqual(data['timestamp'].iloc[-1],
+                         pd.Timestamp('2020-02-01 11:55'))
+
+    def test_query_resolution_matches_tier_files(self):
+        # Irregular readings, with a gap of a few hours
+        timestamps = pd.to_datetime([
+            '2020-03-01 00:02:30', '2020-03-01 00:57:30',
+            '2020-03-01 01:20:00', '2020-03-01 05:10:00',
+            '2020-03-01 05:59:00', '2020-03-01 06:00:00',
+        ])
+        data = pd.DataFrame({
+            'timestamp': timestamps,
+            'P1': np.arange(len(timestamps), dtype=np.float64) * 3,
+            'P2': np.arange(len(timestamps), dtype=np.float64),
+        })
+        write_24_hour_mean_aggregated_data_files(
+            self.aggregated_dir, 2, data, ['P1', 'P2'], 'timestamp',
+            resolution_tiers=['hourly']
+        )
+        tier_data = pd.read_csv(
+            os.path.join(self.aggregated_dir, '24_hour_means',
+                         '2020_03_sds011_sensor_2_24_hour_means_hourly.csv'),
+            parse_dates=['timestamp']
+        )
+
+        data = self.service.query(
+            2,
+            datetime.datetime(2020, 3, 1),
+            datetime.datetime(2020, 3, 2),
+            resolution='hourly'
+        )
+        self.assertEqual(
+            list(data['timestamp']), list(tier_data['timestamp'])
+        )
+        self.assertEqual(data['timestamp'].iloc[0],
+                         pd.Timestamp('2020-03-01 01:00'))
+        np.testing.assert_allclose(data['P1'], tier_data['P1'], rtol=1e-6)
+        np.testing.assert_allclose(data['P2'], tier_data['P2'], rtol=1e-6)
+
+    def test_query_without_data(self):
+        data = self.service.query(
+            2, datetime.datetime(2020, 1, 1), datetime.datetime(2020, 1, 2)
+        )
+        self.assertEqual(len(data), 0)
+        self.assertEqual(list(data.columns), ['timestamp', 'P1', 'P2'])
+
+    def test_bad_query(self):
+        start = datetime.datetime(2020, 2, 1)
+        end = datetime.datetime(2020, 2, 2)
+        with self.assertRaises(QueryError):
+            self.service.query(1, start, end, resolution='weekly')
+        with self.assertRaises(QueryError):
+            self.service.get_etag(1, start, end, fields=['NO2'])
+
+    def test_months_are_cached_until_rewritten(self):
+        start = datetime.datetime(2020, 2, 1)
+        end = datetime.datetime(2020, 2, 2)
+        etag = self.service.get_etag(1, start, end)
+        first = self.service.query(1, start, end)
+        self.service.query(1, start, end)
+        self.assertEqual(self.service.cache.get_stats()['hits'], 1)
+        self.assertEqual(self.service.get_etag(1, start, end), etag)
+
+        write_means(self.aggregated_dir, 1, '2020-02-01', 24 * 12, '1min')
+        self.assertNotEqual(self.service.get_etag(1, start, end), etag)
+        second = self.service.query(1, start, end)
+        self.assertNotEqual(len(first), len(second))
@@ -0,0 +1,143 @@
+import datetime
+import gzip
+import http.client
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+from service import AggregatedDataService, create_server, QueryError
+from service.server import parse_means_query
+from tests.unit.service.test_query import write_means
+
+
+class TestParseMeansQuery(unittest.TestCase):
+
+    def test_start_and_end(self):
+        start, end, resolution, fields = parse_means_query({
+            'start': ['2020-01-01'],
+            'end': ['2020-01-08T12:00'],
+            'fields': ['P1'],
+        })
+        self.assertEqual(start, datetime.datetime(2020, 1, 1))
+        self.assertEqual(end, datetime.datetime(2020, 1, 8, 12))
+        self.assertEqual(resolution, 'full')
+        self.assertEqual(fields, ['P1'])
+
+    def test_days_up_to_now(self):
+        start, end, _, fields = parse_means_query(
+            {'days': ['7'], 'resolution': ['hourly']},
+            now=datetime.datetime(2020, 1, 8, 12, 30, 45)
+        )
+        self.assertEqual(end, datetime.datetime(2020, 1, 8, 12, 30))
+        self.assertEqual(start, datetime.datetime(2020, 1, 1, 12, 30))
+        self.assertIsNone(fields)
+
+    def test_utc_offsets(self):
+        start, end, _, _ = parse_means_query({
+            'start': ['2020-01-01T00:00Z'],
+            'end': ['2020-01-02T01:00+01:00'],
+        })
+        self.assertEqual(start, datetime.datetime(2020, 1, 1))
+        self.assertEqual(end, datetime.datetime(2020, 1, 2))
+
+    def test_bad_query(self):
+        for query in [
+            {},
+            {'start': ['not a date']},
+            {'days': ['seven']},
+            {'start': ['2020-01-08'], 'end': ['2020-01-01']},
+            {'days': ['100000000']},
+        ]:
+            with self.assertRaises(QueryError):
+                parse_means_query(query)
+
+
+class TestQueryServer(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.aggregated_dir = os.path.join(self.temp_dir.name, 'aggregated')
+        write_means(self.aggregated_dir, 1, '2020-02-01', 24 * 12)
+        self.server = create_server(
+            AggregatedDataService(self.aggregated_dir), port=0, quiet=True
+        )
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.connection = http.client.HTTPConnection(
+            *self.server.server_address[:2]
+        )
+
+    def tearDown(self):
+        self.connection.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.temp_dir.cleanup()
+
+    def get(self, path, headers=None):
+        self.connection.request('GET', path, headers=headers or {})
+        response = self.connection.getresponse()
+        return response, response.read()
+
+    def test_csv(self):
+        response, body = self.get(
+            '/sensors/1/24_hour_means?start=2020-02-01T01:00'
+            '&end=2020-02-01T03:00&resolution=hourly&fields=P1'
+        )
+        self.assertEqual(response.status, 200)
+        self.assertEqual(
+            body.decode('utf-8').splitlines(),
+            ['timestamp,P1', '2020-02-01 01:00:00,6.0',
+             '2020-02-01 02:00:00,12.0', '2020-02-01 02:55:00,17.5']
+        )
+
+    def test_not_modified(self):
+        path = '/sensors/1/24_hour_means?start=2020-02-01&end=2020-02-02'
+        response, _ = self.get(path)
+        etag = response.getheader('ETag')
+        response, body = self.get(path, {'If-None-Match': etag})
+        self.assertEqual(response.status, 304)
+        self.assertEqual(body, b'')
+
+        # Rewriting the month changes the ETag
+        write_means(self.aggregated_dir, 1, '2020-02-01', 24 * 12, '1min')
+        response, _ = self.get(path, {'If-None-Match': etag})
+        self.assertEqual(response.status, 200)
+        self.assertNotEqual(response.getheader('ETag'), etag)
+
+    def test_gzip(self):
+        path = '/sensors/1/24_hour_means?start=2020-02-01&end=2020-02-02'
+        response, plain = self.get(path)
+        self.assertIsNone(response.getheader('Content-Encoding'))
+        response, body = self.get(path, {'Accept-Encoding': 'gzip, deflate'})
+        self.assertEqual(response.getheader('Content-Encoding'), 'gzip')
+        self.assertEqual(gzip.decompress(body), plain)
+
+    def test_errors(self):
+        response, _ = self.get('/sensors/1/24_hour_means?days=1&fields=NO2')
+        self.assertEqual(response.status, 400)
+        response, _ = self.get('/sensors/1/24_hour_means?start=2020-02-01'
+                               '&resolution=weekly')
+        self.assertEqual(response.status, 400)
+        response, _ = self.get('/sensors/1/24_hour_means?days=100000000')
+        self.assertEqual(response.status, 400)
+        response, _ = self.get('/sensors/1/daily')
+        self.assertEqual(response.status, 404)
+
+    def test_utc_offsets(self):
+        response, body = self.get(
+            '/sensors/1/24_hour_means?start=2020-02-01T01:00Z'
+            '&end=2020-02-01T02:00Z&fields=P1'
+        )
+        self.assertEqual(response.status, 200)
+        self.assertEqual(
+            body.decode('utf-8').splitlines()[1], '2020-02-01 01:00:00,6.0'
+        )
+
+    def test_internal_error(self):
+        with patch.object(
+                AggregatedDataService, 'query', side_effect=OSError):
+            response, _ = self.get(
+                '/sensors/1/24_hour_means?start=2020-02-01&end=2020-02-02'
+            )
+        self.assertEqual(response.status, 500)
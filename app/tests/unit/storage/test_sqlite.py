@@ -0,0 +1,142 @@
+import datetime
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from storage import SQLiteStorage
+
+
+def readings(timestamps, p1, p2):
+    return pd.DataFrame({
+        'timestamp': pd.to_datetime(timestamps),
+        'P1': np.array(p1, dtype=np.float32),
+        'P2': np.array(p2, dtype=np.float32),
+    })
+
+
+class TestSQLiteStorage(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.storage = SQLiteStorage(
+            os.path.join(self.temp_dir.name, 'data', 'test.sqlite3'),
+            ['P1', 'P2']
+        )
+
+    def tearDown(self):
+        self.storage.close()
+        self.temp_dir.cleanup()
+
+    def test_readings_round_trip(self):
+        data = readings(
+            ['2018-01-02 00:00:05', '2018-01-01 12:30:00'],
+            [1.5, np.nan],
+            [0.25, 3.0]
+        )
+        self.storage.replace_readings(
+            1, [], data, 'timestamp', {'2018-01-01.csv': [10, 20]}
+        )
+        self.storage.replace_readings(
+            2, [], data.iloc[:1], 'timestamp', {}
+        )
+
+        actual = self.storage.read_readings(1, 'timestamp')
+
+        pd.testing.assert_frame_equal(
+            actual,
+            data.iloc[::-1].reset_index(drop=True).astype(
+                {'P1': np.float64, 'P2': np.float64}
+            )
+        )
+        self.assertEqual(
+            self.storage.get_ingested_files(1), {'2018-01-01.csv': [10, 20]}
+        )
+        self.assertEqual(self.storage.get_ingested_files(2), {})
+
+    def test_range_query(self):
+        self.storage.replace_readings(1, [], readings(
+            ['2018-01-01 23:59:59', '2018-01-02 00:00:00',
+             '2018-01-02 23:59:59', '2018-01-03 00:00:00'],
+            [1, 2, 3, 4],
+            [1, 2, 3, 4]
+        ), 'timestamp', {})
+
+        data = self.storage.read_readings(
+            1,
+            'timestamp',
+            start=datetime.date(2018, 1, 2),
+            end=datetime.date(2018, 1, 3)
+        )
+
+        self.assertEqual(list(data['P1']), [2.0, 3.0])
+
+    def test_replace_periods(self):
+        self.storage.replace_readings(1, [], readings(
+            ['2018-01-01 12:00:00', '2018-01-02 12:00:00'], [1, 2], [1, 2]
+        ), 'timestamp', {})
+
+        self.storage.replace_readings(
+            1,
+            [(datetime.date(2018, 1, 2), datetime.date(2018, 1, 3))],
+            readings(['2018-01-02 13:00:00'], [3], [3]),
+            'timestamp',
+            {}
+        )
+
+        data = self.storage.read_readings(1, 'timestamp')
+        self.assertEqual(list(data['P1']), [1.0, 3.0])
+
+    def test_rolling_means_by_month_and_resolution(self):
+        self.storage.write_rolling_means(1, 2018, 1, readings(
+            ['2018-01-01 00:00:00', '2018-01-31 23:00:00'], [1, 2], [1, 2]
+        ), 'timestamp')
+        self.storage.write_rolling_means(1, 2018, 1, readings(
+            ['2018-01-01 00:00:00'], [5], [5]
+        ), 'timestamp', resolution='hourly')
+        self.storage.write_rolling_means(1, 2018, 2, readings(
+            ['2018-02-01 00:00:00'], [3], [3]
+        ), 'timestamp')
+
+        # Rewriting a month replaces it
+        self.storage.write_rolling_means(1, 2018, 1, readings(
+            ['2018-01-01 00:00:00'], [4], [4]
+        ), 'timestamp')
+
+        self.assertEqual(
+            list(self.storage.read_rolling_means(1, 'timestamp')['P1']),
+            [4.0, 3.0]
+        )
+        self.assertEqual(
+            list(self.storage.read_rolling_means(
+                1, 'timestamp', resolution='hourly'
+            )['P1']),
+            [5.0]
+        )
+
+    def test_weekday_hour_means(self):
+        data = pd.DataFrame({
+            'dayOfWeek': ['Monday', 'Monday'],
+            'hourOfDay': [0, 1],
+            'P1': [1.0, np.nan],
+            'P2': [2.0, 3.0],
+        })
+        self.storage.write_weekday_hour_means(1, 2018, 1, data)
+        self.storage.write_weekday_hour_means(1, 2018, 1, data)
+
+        pd.testing.assert_frame_equal(
+            self.storage.read_weekday_hour_means(1, 2018, 1),
+            data
+        )
+        self.assertEqual(
+            len(self.storage.read_weekday_hour_means(1, 2018, 2)), 0
+        )
+
+    def test_value_fields_must_be_column_names(self):
+        with self.assertRaises(ValueError):
+            SQLiteStorage(
+                os.path.join(self.temp_dir.name, 'other.sqlite3'),
+                ['P1; DROP TABLE readings']
+            )
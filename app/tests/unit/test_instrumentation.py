@@ -0,0 +1,80 @@
+import json
+import os
+import pstats
+import tempfile
+import unittest
+
+from instrumentation import profile, RunReport, stage
+
+
+class TestRunReport(unittest.TestCase):
+
+    def test_stages_are_timed_with_their_counts(self):
+        report = RunReport('test')
+        with report.stage('load', sensor=1) as record:
+            record['rows'] = 10
+        with stage(report, 'load', sensor=2):
+            pass
+
+        self.assertEqual(
+            [
+                {key: value for key, value in record.items()
+                 if key != 'seconds'}
+                for record in report.stages
+            ],
+            [
+                {'stage': 'load', 'sensor': 1, 'rows': 10},
+                {'stage': 'load', 'sensor': 2},
+            ]
+        )
+        self.assertTrue(all(
+            record['seconds'] >= 0 for record in report.stages
+        ))
+        self.assertEqual(report.get_totals()['load']['count'], 2)
+
+    def test_stage_is_recorded_when_it_fails(self):
+        report = RunReport('test')
+        with self.assertRaises(ValueError):
+            with report.stage('load'):
+                raise ValueError
+        self.assertEqual(report.stages[0]['stage'], 'load')
+
+    def test_stage_without_report(self):
+        with stage(None, 'load') as record:
+            record['rows'] = 10
+
+    def test_write(self):
+        report = RunReport('test')
+        report.add_stages([{'stage': 'load', 'sensor': 1, 'seconds': 0.5}])
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            filepath = os.path.join(temp_dir, 'reports', 'test.json')
+            report.write(filepath)
+            with open(filepath) as file_:
+                written = json.load(file_)
+
+        self.assertEqual(written['name'], 'test')
+        self.assertEqual(written['totals'], {
+            'load': {'count': 1, 'seconds': 0.5}
+        })
+        self.assertEqual(len(written['stages']), 1)
+        self.assertGreater(written['peak_memory_mb'], 0)
+
+
+class TestProfile(unittest.TestCase):
+
+    def test_stats_are_dumped(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            filepath = os.path.join(temp_dir, 'profile', 'test.prof')
+            with profile(filepath):
+                sorted(range(1000))
+
+            stats = pstats.Stats(filepath)
+            self.assertTrue(any(
+                function_name == '<built-in method builtins.sorted>'
+                for _, _, function_name in stats.stats
+            ))
+
+    def test_no_filepath(self):
+        with profile(None):
+            pass
@@ -0,0 +1,83 @@
+import threading
+import time
+import unittest
+
+from pipeline import run_pipeline
+
+
+class TestRunPipeline(unittest.TestCase):
+
+    def test_results_are_in_item_order(self):
+        produced = []
+        results = run_pipeline(
+            [3, 1, 2],
+            produced.append,
+            lambda item: item * 10,
+            producers=3,
+            consumers=2
+        )
+        self.assertEqual(results, [30, 10, 20])
+        self.assertEqual(sorted(produced), [1, 2, 3])
+
+    def test_items_are_consumed_as_soon_as_produced(self):
+        first_consumed = threading.Event()
+
+        def produce(item):
+            # The second item can only be produced once the first has been
+            # consumed, which would never happen if consuming waited for
+            # every item to be produced
+            if item == 2 and not first_consumed.wait(timeout=5):
+                raise AssertionError("Item 1 wasn't consumed first")
+
+        def consume(item):
+            if item == 1:
+                first_consumed.set()
+            return item
+
+        self.assertEqual(run_pipeline([1, 2], produce, consume), [1, 2])
+
+    def test_item_is_consumed_after_it_is_produced(self):
+        produced = set()
+
+        def consume(item):
+            return item in produced
+
+        results = run_pipeline(
+            list(range(20)), produced.add, consume, producers=4, consumers=4
+        )
+        self.assertTrue(all(results))
+
+    def test_errors_are_raised(self):
+        def produce(item):
+            if item == 2:
+                raise IOError("Download failed")
+
+        with self.assertRaises(IOError):
+            run_pipeline([1, 2, 3], produce, lambda item: item)
+
+    def test_later_items_are_not_produced_after_an_error(self):
+        produced = []
+
+        def produce(item):
+            produced.append(item)
+            if item == 0:
+                raise IOError("Download failed")
+
+        with self.assertRaises(IOError):
+            run_pipeline(list(range(20)), produce, lambda item: item)
+        self.assertEqual(produced, [0])
+
+    def test_later_items_are_not_produced_after_a_consume_error(self):
+        produced = []
+
+        def produce(item):
+            produced.append(item)
+            if item > 0:
+                time.sleep(0.01)
+
+        def consume(item):
+            raise ValueError("Bad data")
+
+        with self.assertRaises(ValueError):
+            run_pipeline(list(range(20)), produce, consume)
+        self.assertLess(len(produced), 5)
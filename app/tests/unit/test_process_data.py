@@ -0,0 +1,58 @@
+import datetime
+import os
+import tempfile
+import unittest
+
+from tests.benchmark.benchmark_suite import run_process_data, write_site
+from tests.benchmark.raw_data import write_raw_luftdaten_mirror
+
+
+def read_output_files(site_dir):
+    """The contents of the aggregated data files, by their relative path."""
+    aggregated_dir = os.path.join(site_dir, 'data', 'luftdaten', 'aggregated')
+    files = {}
+    for dirpath, _, filenames in os.walk(aggregated_dir):
+        for filename in filenames:
+            filepath = os.path.join(dirpath, filename)
+            with open(filepath, 'rb') as file_:
+                files[os.path.relpath(filepath, aggregated_dir)] = \
+                    file_.read()
+    return files
+
+
+class TestIncrementalProcessing(unittest.TestCase):
+
+    def create_site(self):
+        site_dir = tempfile.mkdtemp(dir=self.temp_dir.name)
+        sensor_codes = write_raw_luftdaten_mirror(
+            os.path.join(site_dir, 'data', 'luftdaten', 'raw'),
+            1,
+            datetime.date(2020, 1, 25),
+            10
+        )
+        write_site(site_dir, sensor_codes)
+        return site_dir
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_changed_options_give_the_same_output_as_a_fresh_run(self):
+        site_dir = self.create_site()
+        run_process_data(site_dir, [
+            '--incremental', '--events', '--tiers', 'hourly', 'daily',
+            '--compact'
+        ])
+        run_process_data(site_dir, ['--incremental', '--events'])
+
+        fresh_site_dir = self.create_site()
+        run_process_data(fresh_site_dir, ['--events'])
+
+        files = read_output_files(site_dir)
+        self.assertFalse(any(
+            path.endswith(('_hourly.csv', '_daily.csv', '.bin'))
+            for path in files
+        ))
+        self.assertEqual(files, read_output_files(fresh_site_dir))
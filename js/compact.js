@@ -0,0 +1,104 @@
+"use strict";
+
+var compact = compact || (function (d3) {
+    // Reads the compact binary data files written by app/data/compact.py
+    // (see there for the layout)
+    var MAGIC = 'AQC1',
+        ENCODING_FLOAT32 = 0,
+        ENCODING_SCALED_INT32 = 1,
+        MISSING_INT32 = -2147483648,
+
+        // The timestamps are written without a timezone, so treat them as
+        // local time, the same as the CSV files
+        toLocalDate = function (seconds) {
+            let utc = new Date(seconds * 1000);
+            return new Date(
+                utc.getUTCFullYear(), utc.getUTCMonth(), utc.getUTCDate(),
+                utc.getUTCHours(), utc.getUTCMinutes(), utc.getUTCSeconds());
+        },
+
+        parse = function (buffer, dateField) {
+            let view = new DataView(buffer),
+                magic = String.fromCharCode(
+                    view.getUint8(0), view.getUint8(1), view.getUint8(2), view.getUint8(3)),
+                rows = view.getUint32(4, true),
+                fieldCount = view.getUint32(8, true),
+                // Seconds since the epoch fit exactly in a double
+                seconds = view.getUint32(12, true) + view.getInt32(16, true) * 4294967296,
+                offset = 20,
+                fields = [],
+                data = [],
+                i, j, field, length, name, value, values;
+
+            if (magic !== MAGIC) {
+                throw new Error('Not a compact data file');
+            }
+
+            for (i = 0; i < rows; i++) {
+                seconds += view.getUint32(offset + i * 4, true);
+                data.push({});
+                data[i][dateField] = toLocalDate(seconds);
+            }
+            offset += rows * 4;
+
+            for (i = 0; i < fieldCount; i++) {
+                field = {
+                    encoding: view.getUint8(offset),
+                    decimals: view.getUint8(offset + 1)
+                };
+                length = view.getUint16(offset + 2, true);
+                offset += 4;
+                name = '';
+                for (j = 0; j < length && view.getUint8(offset + j) !== 0; j++) {
+                    name += String.fromCharCode(view.getUint8(offset + j));
+                }
+                field.name = name;
+                offset += length;
+                fields.push(field);
+            }
+
+            fields.forEach(function (field) {
+                if (field.encoding === ENCODING_FLOAT32) {
+                    values = new Float32Array(buffer, offset, rows);
+                } else if (field.encoding === ENCODING_SCALED_INT32) {
+                    values = new Int32Array(buffer, offset, rows);
+                } else {
+                    throw new Error('Unknown encoding for ' + field.name);
+                }
+                for (i = 0; i < rows; i++) {
+                    value = values[i];
+                    if (field.encoding === ENCODING_SCALED_INT32) {
+                        value = value === MISSING_INT32 ?
+                            NaN : value / Math.pow(10, field.decimals);
+                    }
+                    data[i][field.name] = value;
+                }
+                offset += rows * 4;
+            });
+
+            return data;
+        },
+
+        // Loads a file, calling back with (error, data) like d3.csv
+        load = function (url, dateField, callback) {
+            d3.request(url)
+                .responseType('arraybuffer')
+                .get(function (error, xhr) {
+                    if (error) {
+                        callback(error);
+                        return;
+                    }
+                    try {
+                        callback(null, parse(xhr.response, dateField));
+                    } catch (e) {
+                        callback(e);
+                    }
+                });
+        };
+
+    // Public interface
+    return {
+        parse: parse,
+        load: load
+    }
+} (d3));
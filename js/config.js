@@ -4,6 +4,9 @@ var config = config || (function ($) {
     // Private properties
     var valField = "P1",
         dateField = "timestamp",
+        // The sensors send a reading roughly every 2.5 minutes, and the
+        // full 24 hour means files have a mean for each
+        fullResolutionSeconds = 150,
 
         // Private methods
         loadSpec = function (url) {
@@ -35,17 +38,50 @@ var config = config || (function ($) {
             }
             return url;
         },
-        twentyFourHourMeansDataUrl = function (config, sensorCode, year, month) {
+        // Pick the most detailed file with at most maxPoints values over
+        // the month, the full file if it's small enough and otherwise the
+        // finest tier that is, falling back to the coarsest tier available
+        tierInfo = function (monthInfo, maxPoints) {
+            let monthSeconds = 31 * 24 * 60 * 60,
+                tiers = monthInfo.tiers || [],
+                i;
+            if (!maxPoints || tiers.length === 0 ||
+                    monthSeconds / fullResolutionSeconds <= maxPoints) {
+                return monthInfo;
+            }
+            for (i = 0; i < tiers.length; i++) {
+                if (monthSeconds / tiers[i].resolution_seconds <= maxPoints) {
+                    return tiers[i];
+                }
+            }
+            return tiers[tiers.length - 1];
+        },
+        twentyFourHourMeansFileInfo = function (config, sensorCode, year, month, maxPoints) {
             let sensorConfig = getSensorConfig(config, sensorCode),
                 datesInfo = sensorConfig['24_hour_means'].available_dates[year.toString()],
-                url = null, i;
+                i;
             for (i = 0; i < datesInfo.length; i++) {
                 if (datesInfo[i].month.toString() === month.toString()) {
-                    url = datesInfo[i].path;
-                    break;
+                    return tierInfo(datesInfo[i], maxPoints);
                 }
             }
-            return url;
+            return null;
+        },
+        twentyFourHourMeansDataUrl = function (config, sensorCode, year, month, maxPoints) {
+            let fileInfo = twentyFourHourMeansFileInfo(config, sensorCode, year, month, maxPoints);
+            return fileInfo === null ? null : fileInfo.path;
+        },
+        // Like twentyFourHourMeansDataUrl, but gives the compact binary
+        // file instead of the CSV where there is one, as {url, format}
+        twentyFourHourMeansDataSource = function (config, sensorCode, year, month, maxPoints) {
+            let fileInfo = twentyFourHourMeansFileInfo(config, sensorCode, year, month, maxPoints);
+            if (fileInfo === null) {
+                return null;
+            }
+            if (fileInfo.formats && fileInfo.formats.compact) {
+                return {url: fileInfo.formats.compact, format: 'compact'};
+            }
+            return {url: fileInfo.path, format: 'csv'};
         };
 
     // Public interface
@@ -53,6 +89,7 @@ var config = config || (function ($) {
         loadSpec: loadSpec,
         getSensorConfig: getSensorConfig,
         dayOfWeekDataUrl: dayOfWeekDataUrl,
-        twentyFourHourMeansDataUrl: twentyFourHourMeansDataUrl
+        twentyFourHourMeansDataUrl: twentyFourHourMeansDataUrl,
+        twentyFourHourMeansDataSource: twentyFourHourMeansDataSource
     }
 } (jQuery));
@@ -79,7 +79,10 @@ $(function () {
         // Note: mutates data
         var parseDate = d3.timeParse("%Y-%m-%d %H:%M:%S");
         data.forEach(function(d) {
-            d[dateField] = parseDate(d[dateField]);
+            // Dates from compact files are already parsed
+            if (typeof d[dateField] === 'string') {
+                d[dateField] = parseDate(d[dateField]);
+            }
             d[valueField] = +d[valueField];
         });
         return data;
@@ -420,12 +423,17 @@ $(function () {
         var queue = d3.queue();
         $.each(sensors, function (i, sensor) {
             var chartEl = '#twentyfour-hour-means-chart-' + sensor.id,
-                dateInfo, dataUrl;
+                dateInfo, dataSource;
             $(chartEl).empty();
             if (sensor.isActive) {
                 dateInfo = parseHyphenatedDate(sensor.date);
-                dataUrl = config.twentyFourHourMeansDataUrl(configData, sensor.code, dateInfo.year, dateInfo.month);
-                queue.defer(d3.csv, dataUrl);
+                // Up to two values per pixel is plenty of detail for the chart
+                dataSource = config.twentyFourHourMeansDataSource(configData, sensor.code, dateInfo.year, dateInfo.month, 2 * $(chartEl).width());
+                if (dataSource.format === 'compact') {
+                    queue.defer(compact.load, dataSource.url, 'timestamp');
+                } else {
+                    queue.defer(d3.csv, dataSource.url);
+                }
             } else {
                 $(chartEl).text('[Select sensor and date above]');
             }
@@ -0,0 +1,95 @@
+import argparse
+import datetime
+import os
+import sys
+sys.path.append('../app')
+
+from config import get_config
+from location import LatLongLocation
+from luftdaten.data import get_luftdaten_cache_dir, LUFTDATEN_ARCHIVE_URL
+from luftdaten.discovery import (
+    ARCHIVE_START_DATE,
+    discover_sensors,
+    format_sensor_config,
+    ListingIndex,
+    SearchArea,
+)
+from luftdaten.download import ArchiveDownloader
+
+parser = argparse.ArgumentParser(description='Find the sensors in an area from the Luftdaten archive\'s daily listings, writing config entries for them.')
+parser.add_argument('--bbox', type=float, nargs=4, default=None,
+                    metavar=('MIN_LAT', 'MIN_LON', 'MAX_LAT', 'MAX_LON'),
+                    help='Bounding box the sensors must be in')
+parser.add_argument('--centre', type=float, nargs=2, default=None,
+                    metavar=('LAT', 'LON'),
+                    help='Centre of a circle the sensors must be in')
+parser.add_argument('--radius-km', type=float, default=None,
+                    help='Radius of the circle around --centre')
+parser.add_argument('--start', type=datetime.date.fromisoformat,
+                    default=ARCHIVE_START_DATE,
+                    help='First day to scan (YYYY-MM-DD)')
+parser.add_argument('--end', type=datetime.date.fromisoformat, default=None,
+                    help='Last day to scan (YYYY-MM-DD), yesterday by default')
+parser.add_argument('--step-days', type=int, default=1,
+                    help='Only scan every so many days\' listings, checking '
+                         'the days in between just for the sensors found')
+parser.add_argument('--workers', type=int, default=8,
+                    help='Number of requests to make at once')
+parser.add_argument('--max-per-host', type=int, default=4,
+                    help='Maximum number of requests in flight to the archive')
+parser.add_argument('--archive-url', default=LUFTDATEN_ARCHIVE_URL,
+                    help='Archive to scan')
+parser.add_argument('--no-cache', action='store_true',
+                    help="Don't use or update the index of previous scans")
+parser.add_argument('--all', action='store_true',
+                    help='Include the sensors already in the config')
+parser.add_argument('--output', default=None, metavar='FILEPATH',
+                    help='Where to write the config entries, instead of '
+                         'printing them')
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    if (args.centre is None) != (args.radius_km is None):
+        parser.error('--centre and --radius-km must be given together')
+    if args.bbox is None and args.centre is None:
+        parser.error('--bbox or --centre and --radius-km is required')
+    data_dir = os.path.join('..', 'data')
+
+    area = SearchArea(
+        bounding_box=args.bbox,
+        centre=LatLongLocation(*args.centre) if args.centre else None,
+        radius_km=args.radius_km
+    )
+    index = ListingIndex(
+        None if args.no_cache else
+        os.path.join(get_luftdaten_cache_dir(data_dir), 'archive-listings.json')
+    )
+    with ArchiveDownloader(
+            max_workers=args.workers,
+            max_per_host=args.max_per_host
+    ) as downloader:
+        sensors = discover_sensors(
+            index,
+            downloader,
+            area,
+            start_date=args.start,
+            end_date=args.end,
+            step_days=args.step_days,
+            archive_url=args.archive_url
+        )
+
+    if not args.all:
+        config_file_path = '../config/sensors.yaml'
+        configured = set(get_config(config_file_path)['sensors']['luftdaten'])
+        sensors = [
+            sensor for sensor in sensors if sensor['code'] not in configured
+        ]
+
+    print("Found {} sensor(s)".format(len(sensors)))
+    entries = format_sensor_config(sensors)
+    if args.output:
+        with open(args.output, 'w') as file_:
+            file_.write(entries)
+    else:
+        print(entries)
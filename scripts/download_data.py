@@ -1,17 +1,104 @@
+import argparse
 import os
 import sys
 sys.path.append('../app')
 
 from config import get_config
-from luftdaten.data import download_luftdaten_data, get_luftdaten_raw_data_dir
+from instrumentation import get_report_filepath, profile, RunReport
+from luftdaten.data import (
+    download_luftdaten_data,
+    get_luftdaten_raw_data_dir,
+    get_luftdaten_reports_dir,
+    LUFTDATEN_ARCHIVE_URL,
+)
+from luftdaten.download import ArchiveDownloader, ValidatorIndex
+from luftdaten.missing import (
+    DEFAULT_GIVE_UP_DAYS,
+    DEFAULT_RECHECK_DAYS,
+    DEFAULT_RECHECK_INTERVAL_DAYS,
+    RetryPolicy,
+)
 from luftdaten.sensor import get_luftdaten_sensors
 
+parser = argparse.ArgumentParser(description='Download any new data from the Luftdaten archive.')
+parser.add_argument('--workers', type=int, default=8,
+                    help='Number of files to download at once')
+parser.add_argument('--max-per-host', type=int, default=4,
+                    help='Maximum number of requests in flight to the archive')
+parser.add_argument('--retries', type=int, default=3,
+                    help='Number of times to retry a failed download')
+parser.add_argument('--revalidate-days', type=int, default=2,
+                    help='Check whether the files for this many recent days '
+                         'have changed since they were downloaded')
+parser.add_argument('--recheck-days', type=int, default=DEFAULT_RECHECK_DAYS,
+                    help='Request days missing from the archive again on '
+                         'every run while they are this many days old or '
+                         'less')
+parser.add_argument('--give-up-days', type=int, default=DEFAULT_GIVE_UP_DAYS,
+                    help='Stop requesting days missing from the archive once '
+                         'they are more than this many days old')
+parser.add_argument('--recheck-interval-days', type=int,
+                    default=DEFAULT_RECHECK_INTERVAL_DAYS,
+                    help='Days to wait before requesting a day missing from '
+                         'the archive again, until it is given up on')
+parser.add_argument('--retry-missing', action='store_true',
+                    help='Request every day that failed before again, '
+                         'including those given up on')
+parser.add_argument('--compress', action='store_true',
+                    help='Store newly downloaded files gzip compressed')
+parser.add_argument('--archive-url', default=LUFTDATEN_ARCHIVE_URL,
+                    help='Archive to download from')
+parser.add_argument('--report', default=None, metavar='FILEPATH',
+                    help='Where to write the JSON report of the downloads '
+                         '(in data/luftdaten/reports by default)')
+parser.add_argument('--profile', action='store_true',
+                    help='Profile the downloads with cProfile, writing the '
+                         'stats alongside the report')
+
 if __name__ == '__main__':
+    args = parser.parse_args()
     data_dir = os.path.join('..', 'data')
+    report = RunReport('download_data')
+    report_filepath = args.report or get_report_filepath(
+        get_luftdaten_reports_dir(data_dir),
+        report.name,
+        report.started_at
+    )
+    profile_filepath = os.path.splitext(report_filepath)[0] + '.prof' \
+        if args.profile else None
 
     config_file_path = '../config/sensors.yaml'
     config = get_config(config_file_path)
-    
+
     luftdaten_sensors = get_luftdaten_sensors(config)
     luftdaten_raw_data_dir = get_luftdaten_raw_data_dir(data_dir)
-    download_luftdaten_data(luftdaten_raw_data_dir, luftdaten_sensors)
+    if args.retry_missing:
+        retry_policy = RetryPolicy(give_up_days=None, recheck_interval_days=0)
+    else:
+        retry_policy = RetryPolicy(
+            recheck_days=args.recheck_days,
+            give_up_days=args.give_up_days,
+            recheck_interval_days=args.recheck_interval_days
+        )
+    validators = ValidatorIndex(
+        os.path.join(luftdaten_raw_data_dir, 'validators.json')
+    )
+    with ArchiveDownloader(
+            max_workers=args.workers,
+            max_per_host=args.max_per_host,
+            retries=args.retries,
+            validators=validators
+    ) as downloader, profile(profile_filepath):
+        download_luftdaten_data(
+            luftdaten_raw_data_dir,
+            luftdaten_sensors,
+            downloader=downloader,
+            archive_url=args.archive_url,
+            revalidate_days=args.revalidate_days,
+            compress=args.compress,
+            report=report,
+            retry_policy=retry_policy
+        )
+
+    report.write(report_filepath)
+    print("Run report written to {}".format(report_filepath))
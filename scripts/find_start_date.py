@@ -1,15 +1,53 @@
 import argparse
+import os
 import sys
 sys.path.append('../app')
 
-from luftdaten.data import find_start_date_for_sensor
+from luftdaten.data import (
+    find_start_dates_for_sensors,
+    get_luftdaten_cache_dir,
+    get_luftdaten_raw_data_dir,
+)
+from luftdaten.download import ArchiveDownloader, ProbeCache
 
 parser = argparse.ArgumentParser(description='Find the earliest date of sensor data in Luftdaten archive.')
-parser.add_argument('sensor_number', metavar='SensorNumber', type=int, nargs=1,
-                    help='The sensor number')
+parser.add_argument('sensor_number', metavar='SensorNumber', type=int, nargs='+',
+                    help='The sensor number(s)')
+parser.add_argument('--workers', type=int, default=4,
+                    help='Number of sensors to search at once')
+parser.add_argument('--negative-ttl-hours', type=float, default=24,
+                    help='Check dates that had no data again after this long')
+parser.add_argument('--no-cache', action='store_true',
+                    help="Don't use or update the cache of previous checks")
+parser.add_argument('--mirror', action='store_true',
+                    help='Treat dates already downloaded as having data')
 
 
 if __name__ == '__main__':
     args = parser.parse_args()
-    start_date = find_start_date_for_sensor(args.sensor_number[0])
-    print("Earliest date found with data: ", start_date)
+    data_dir = os.path.join('..', 'data')
+
+    probe_cache = None
+    if not args.no_cache:
+        probe_cache = ProbeCache(
+            os.path.join(get_luftdaten_cache_dir(data_dir), 'probe-cache.json'),
+            negative_ttl=args.negative_ttl_hours * 60 * 60
+        )
+    luftdaten_raw_data_dir = get_luftdaten_raw_data_dir(data_dir) \
+        if args.mirror else None
+
+    with ArchiveDownloader() as downloader:
+        start_dates = find_start_dates_for_sensors(
+            args.sensor_number,
+            max_workers=args.workers,
+            downloader=downloader,
+            probe_cache=probe_cache,
+            luftdaten_raw_data_dir=luftdaten_raw_data_dir
+        )
+    if probe_cache is not None:
+        probe_cache.save()
+
+    for sensor_number, start_date in start_dates.items():
+        print("Sensor {}: earliest date found with data: {}".format(
+            sensor_number, start_date
+        ))
@@ -0,0 +1,84 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+sys.path.append('../app')
+
+from config import get_config
+from luftdaten.data import (
+    get_luftdaten_aggregated_data_dir,
+    get_luftdaten_cache_dir,
+    get_luftdaten_raw_data_dir,
+)
+from luftdaten.live import (
+    DEFAULT_CONCURRENCY,
+    DEFAULT_JITTER,
+    DEFAULT_MAX_PENDING,
+    DEFAULT_POLL_INTERVAL,
+    get_luftdaten_live_data_dir,
+    LivePoller,
+    LUFTDATEN_API_URL,
+)
+from luftdaten.sensor import get_luftdaten_sensors
+
+parser = argparse.ArgumentParser(description="Keep polling the live Luftdaten API, updating the current month's data between the daily archive files.")
+parser.add_argument('--interval', type=float, default=DEFAULT_POLL_INTERVAL,
+                    help='Seconds between polls of each sensor')
+parser.add_argument('--jitter', type=float, default=DEFAULT_JITTER,
+                    help="Spread each poll's requests over up to this many "
+                         "seconds")
+parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                    help='Maximum number of requests in flight to the API')
+parser.add_argument('--max-pending', type=int, default=DEFAULT_MAX_PENDING,
+                    help='Maximum number of responses waiting to be stored '
+                         'before polling waits for them')
+parser.add_argument('--rounds', type=int, default=None,
+                    help='Stop after polling every sensor this many times')
+parser.add_argument('--api-url', default=LUFTDATEN_API_URL,
+                    help='Live API to poll')
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    data_dir = os.path.join('..', 'data')
+
+    config_file_path = '../config/sensors.yaml'
+    config = get_config(config_file_path)
+
+    luftdaten_aggregated_data_dir = get_luftdaten_aggregated_data_dir(data_dir)
+    # Written with the same options as the last run of process_data.py
+    aggregation_state = {}
+    aggregation_state_filepath = os.path.join(
+        get_luftdaten_cache_dir(data_dir),
+        'aggregation-state.json'
+    )
+    if os.path.exists(aggregation_state_filepath):
+        with open(aggregation_state_filepath, 'r') as input_file:
+            aggregation_state = json.load(input_file)
+
+    poller = LivePoller(
+        get_luftdaten_sensors(config),
+        get_luftdaten_raw_data_dir(data_dir),
+        get_luftdaten_live_data_dir(data_dir),
+        luftdaten_aggregated_data_dir,
+        api_url=args.api_url,
+        interval=args.interval,
+        jitter=args.jitter,
+        concurrency=args.concurrency,
+        max_pending=args.max_pending,
+        output_options=aggregation_state.get('output_options', {}),
+        clean=aggregation_state.get('clean', False),
+        events=aggregation_state.get('events', False),
+        summary_filepath=os.path.join(
+            luftdaten_aggregated_data_dir,
+            'sensor-summary.json'
+        )
+    )
+    try:
+        stats = asyncio.run(poller.run(rounds=args.rounds))
+    except KeyboardInterrupt:
+        stats = poller.stats
+    print("Polled {rounds} time(s): {requests} requests, {failed} failed, "
+          "{readings} new readings, {months_written} month(s) "
+          "written".format(**stats))
@@ -2,6 +2,10 @@ import sys
 sys.path.append('../app')
 
 
+import argparse
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+import datetime
 import json
 import os
 import shutil
@@ -9,74 +13,625 @@ import shutil
 import numpy as np
 
 from config import get_config
+from data.dataframe import create_24_hour_means
+from data.events import LIMITS
+from instrumentation import (
+    get_peak_memory_mb,
+    get_report_filepath,
+    profile,
+    RunReport,
+    stage,
+)
 from luftdaten.data import (
+    clean_luftdaten_sensor_data,
+    download_raw_luftdaten_files,
+    get_cached_month_fingerprints,
     get_luftdaten_raw_data_dir,
     get_luftdaten_aggregated_data_dir,
-    get_existing_raw_luftdaten_filepaths,
+    get_luftdaten_cache_dir,
+    get_luftdaten_reports_dir,
+    get_luftdaten_sensor_reference_location,
+    get_luftdaten_sqlite_filepath,
+    get_month_key,
+    ingest_raw_luftdaten_files,
+    iter_cached_luftdaten_sensor_months,
+    load_cached_luftdaten_sensor_months,
+    load_luftdaten_sensor_bucket_means,
     load_luftdaten_sensor_data,
+    LUFTDATEN_ARCHIVE_URL,
+    MAX_DROPPED_FRACTION,
+    RAW_LOCATION_FIELDS,
+    RESOLUTION_TIERS,
+    update_luftdaten_sensor_cache,
     write_aggregated_dayofweek_data_files,
+    write_exceedance_data_files,
     write_24_hour_mean_aggregated_data_files,
+    write_spatial_aggregated_data_files,
+)
+from location import LatLongLocation
+from luftdaten.download import (
+    ArchiveDownloader,
+    ValidatorIndex,
+    write_chunks_atomically,
 )
 from luftdaten.sensor import get_luftdaten_sensors
+from pipeline import run_pipeline
+from storage import SQLiteStorage
 
 
 value_fields = ['P1', 'P2']
 datetime_field = 'timestamp'
 
+# The 24 hour means at the start of a month need the end of the month before
+rolling_window_lead_in = datetime.timedelta(hours=24)
 
-if __name__ == '__main__':
-    data_dir = os.path.join('..', 'data')
+parser = argparse.ArgumentParser(description='Aggregate the downloaded Luftdaten data.')
+parser.add_argument('--incremental', action='store_true',
+                    help='Only reprocess months whose raw data has changed '
+                         'since the last run')
+parser.add_argument('--workers', type=int, default=1,
+                    help='Number of sensors to process in parallel')
+parser.add_argument('--tiers', nargs='*', default=[],
+                    choices=list(RESOLUTION_TIERS),
+                    help='Also write coarser 24 hour means files at these '
+                         'resolutions, for charts of longer periods')
+parser.add_argument('--decimals', type=int, default=None,
+                    help='Round aggregated values to this many decimal places')
+parser.add_argument('--compact', action='store_true',
+                    help='Also write the 24 hour means as compact binary files')
+parser.add_argument('--streaming', action='store_true',
+                    help='Process each sensor a month at a time, to limit the '
+                         'memory used for long histories')
+parser.add_argument('--clean', action='store_true',
+                    help='Drop duplicate, out of range and outlying readings, '
+                         'and readings from where a sensor used to be')
+parser.add_argument('--events', action='store_true',
+                    help='Also write the episodes over the WHO/UK limits and '
+                         'the daily air quality index bands of each sensor')
+parser.add_argument('--spatial', action='store_true',
+                    help='Also write composite series across all the sensors '
+                         '(see the spatial section of the config file)')
+parser.add_argument('--sqlite', nargs='?', const='', default=None,
+                    metavar='FILEPATH',
+                    help='Also keep the readings and aggregated data in a '
+                         'SQLite database (data/luftdaten/luftdaten.sqlite3 '
+                         'by default)')
+parser.add_argument('--download', action='store_true',
+                    help='Download any new data from the archive first, '
+                         'processing each sensor as soon as its files are '
+                         'downloaded')
+parser.add_argument('--download-workers', type=int, default=8,
+                    help='Number of files to download at once')
+parser.add_argument('--download-sensors', type=int, default=1,
+                    help='Number of sensors to download at once')
+parser.add_argument('--revalidate-days', type=int, default=2,
+                    help='Check whether the files for this many recent days '
+                         'have changed since they were downloaded')
+parser.add_argument('--compress', action='store_true',
+                    help='Store newly downloaded files gzip compressed')
+parser.add_argument('--archive-url', default=LUFTDATEN_ARCHIVE_URL,
+                    help='Archive to download from')
+parser.add_argument('--report', default=None, metavar='FILEPATH',
+                    help='Where to write the JSON report of the time taken by '
+                         'each stage (in data/luftdaten/reports by default)')
+parser.add_argument('--profile', action='store_true',
+                    help='Profile the processing of each sensor with cProfile, '
+                         'writing the stats alongside the report')
 
-    config_file_path = '../config/sensors.yaml'
-    config = get_config(config_file_path)
 
-    luftdaten_raw_data_dir = get_luftdaten_raw_data_dir(data_dir)
-    luftdaten_aggregated_data_dir = get_luftdaten_aggregated_data_dir(data_dir)
-    luftdaten_sensors = get_luftdaten_sensors(config)
+def read_json_file(filepath, default):
+    if not os.path.exists(filepath):
+        return default
+    with open(filepath, 'r') as input_file:
+        return json.load(input_file)
 
-    # Clear any previous runs of data
-    if os.path.exists(luftdaten_aggregated_data_dir):
-        shutil.rmtree(luftdaten_aggregated_data_dir)
 
-    # Keep track of the years/months data available for each sensor
-    sensors_info = []
+def get_months_to_process(month_fingerprints, previous_month_fingerprints):
+    """Finds the months whose raw data changed since they were last
+    processed, plus the month after each, since its 24 hour means start with
+    the changed month's data."""
+    changed_months = {
+        yearmonth for yearmonth, fingerprint in month_fingerprints.items()
+        if previous_month_fingerprints.get(get_month_key(*yearmonth)) != fingerprint
+    }
+    following_months = {
+        (year + 1, 1) if month == 12 else (year, month + 1)
+        for year, month in changed_months
+    }
+    return changed_months | (following_months & set(month_fingerprints))
 
-    for sensor in luftdaten_sensors:
-        sensor_code = sensor.code
 
-        data = load_luftdaten_sensor_data(
+def merge_available_dates(available_dates, updated_dates):
+    """Merges newly written months into the available dates of a previous
+    run, keeping years and months in order."""
+    months_by_year = {}
+    for dates in (available_dates, updated_dates):
+        for year, month_infos in dates.items():
+            months = months_by_year.setdefault(str(year), {})
+            for month_info in month_infos:
+                months[month_info['month']] = month_info
+
+    return {
+        year: [months[month] for month in sorted(months)]
+        for year, months in sorted(months_by_year.items())
+    }
+
+
+def merge_composites(previous_composites, composites):
+    """Merges the months written for each composite into those of a
+    previous run, matching composites by name."""
+    previous_by_name = {
+        composite['name']: composite for composite in previous_composites
+    }
+    merged = []
+    for composite in composites:
+        previous = previous_by_name.get(composite['name'], {})
+        merged.append(dict(
+            composite,
+            available_dates=merge_available_dates(
+                previous.get('available_dates', {}),
+                composite['available_dates']
+            )
+        ))
+    return merged
+
+
+def process_spatial(
+        sensors,
+        spatial_config,
+        months,
+        luftdaten_raw_data_dir,
+        luftdaten_cache_dir,
+        luftdaten_aggregated_data_dir,
+        decimals=None,
+        clean=False,
+        report=None
+):
+    """Writes the composite series across all the sensors from their
+    caches, for every month or only those given, cleaning their readings
+    first if clean is set.
+
+    :returns: Summary info of each composite
+    :rtype: list"""
+    bucket_means_by_sensor = {}
+    for sensor in sensors:
+        with stage(report, 'spatial_load', sensor=sensor.code) as record:
+            bucket_means_by_sensor[sensor.code] = \
+                load_luftdaten_sensor_bucket_means(
+                    luftdaten_cache_dir,
+                    sensor.code,
+                    datetime_field,
+                    value_fields,
+                    months=months,
+                    clean=clean,
+                    # Any warning about the configured location was given
+                    # when the sensor was processed
+                    location=get_luftdaten_sensor_reference_location(
+                        luftdaten_raw_data_dir, sensor.code
+                    ) if clean else None
+                )
+            record['rows'] = len(bucket_means_by_sensor[sensor.code])
+
+    points = {
+        name: LatLongLocation(location['latitude'], location['longitude'])
+        for name, location in spatial_config.get('points', {}).items()
+    }
+    with stage(report, 'spatial_write', sensors=len(sensors)):
+        return write_spatial_aggregated_data_files(
+            luftdaten_aggregated_data_dir,
+            sensors,
+            bucket_means_by_sensor,
+            value_fields,
+            datetime_field,
+            cluster_distance_km=spatial_config.get('cluster_distance_km'),
+            points=points,
+            months=months,
+            decimals=decimals
+        )
+
+
+def process_sensor(
+        sensor_code,
+        previous_month_fingerprints,
+        luftdaten_raw_data_dir,
+        luftdaten_cache_dir,
+        luftdaten_aggregated_data_dir,
+        output_options=None,
+        streaming=False,
+        events=False,
+        clean=False,
+        location=None,
+        storage=None,
+        report=None
+):
+    """Loads, aggregates and writes the data files for a single sensor.
+
+    If previous_month_fingerprints is None every month is processed,
+    otherwise only the months that have changed since. output_options are
+    the resolution_tiers, decimals and compact options of the writers.
+    With streaming, the sensor's data is processed a month at a time rather
+    than all at once. With events, the exceedances of limits and daily index
+    bands are written too. With clean, the sensor's readings are cleaned
+    before they're aggregated, dropping readings from further than allowed
+    from where its latest readings were taken, or its location if given and
+    none of them have one. If a store is given, new raw files are
+    ingested into it and the aggregated data is written to it too. If a
+    RunReport is given the time taken by each stage is recorded in it.
+
+    :returns: The years/months written for the day of week, 24 hour means
+        and exceedances files, and the fingerprints of the sensor's months"""
+    output_options = output_options or {}
+    # Where each reading was taken is needed to clean the readings
+    read_fields = value_fields
+    if clean:
+        read_fields = value_fields + list(RAW_LOCATION_FIELDS)
+        location = get_luftdaten_sensor_reference_location(
+            luftdaten_raw_data_dir, sensor_code, location
+        )
+    if storage is not None:
+        with stage(report, 'ingest', sensor=sensor_code) as record:
+            record['days'] = len(ingest_raw_luftdaten_files(
+                luftdaten_raw_data_dir,
+                storage,
+                sensor_code,
+                datetime_field,
+                value_fields
+            ))
+    if previous_month_fingerprints is not None or streaming:
+        update_luftdaten_sensor_cache(
             luftdaten_raw_data_dir,
+            luftdaten_cache_dir,
             sensor_code,
-            datetime_field
+            datetime_field,
+            read_fields,
+            report=report
         )
 
-        # Produce aggregated data files
-        years_months_day_of_week = write_aggregated_dayofweek_data_files(
+    months = None
+    if previous_month_fingerprints is not None:
+        month_fingerprints = get_cached_month_fingerprints(
+            luftdaten_cache_dir,
+            sensor_code
+        )
+        months = get_months_to_process(
+            month_fingerprints,
+            previous_month_fingerprints
+        )
+        print("Sensor {}: {} month(s) to process".format(
+            sensor_code, len(months)
+        ))
+        if len(months) == 0:
+            return {}, {}, {}, month_fingerprints
+
+    if streaming:
+        # A month at a time, with the lead in for its rolling means carried
+        # over from the month before
+        chunks = (
+            ({yearmonth}, data)
+            for yearmonth, data in iter_cached_luftdaten_sensor_months(
+                luftdaten_cache_dir,
+                sensor_code,
+                datetime_field,
+                read_fields,
+                months=months,
+                lead_in=rolling_window_lead_in,
+                report=report
+            )
+        )
+    else:
+        with stage(report, 'load', sensor=sensor_code) as record:
+            if months is not None:
+                data = load_cached_luftdaten_sensor_months(
+                    luftdaten_cache_dir,
+                    sensor_code,
+                    months,
+                    datetime_field,
+                    read_fields,
+                    lead_in=rolling_window_lead_in
+                )
+            else:
+                data = load_luftdaten_sensor_data(
+                    luftdaten_raw_data_dir,
+                    sensor_code,
+                    datetime_field,
+                    read_fields,
+                    luftdaten_cache_dir=luftdaten_cache_dir,
+                    report=report
+                )
+            record['rows'] = len(data)
+        chunks = [(months, data)]
+
+    # Produce aggregated data files
+    years_months_day_of_week = defaultdict(list)
+    years_months_24_hour = defaultdict(list)
+    years_months_exceedances = defaultdict(list)
+    cleaning_counts = defaultdict(int)
+    for chunk_months, data in chunks:
+        if clean:
+            with stage(report, 'clean', sensor=sensor_code) as record:
+                # Lead ins are counted with their own months
+                data, counts = clean_luftdaten_sensor_data(
+                    data,
+                    datetime_field,
+                    value_fields,
+                    location=location,
+                    counted_months=chunk_months
+                )
+                record.update(counts)
+            for name, count in counts.items():
+                cleaning_counts[name] += count
+        day_of_week_months = write_aggregated_dayofweek_data_files(
             luftdaten_aggregated_data_dir,
             sensor_code,
             data,
             value_fields,
-            datetime_field
+            datetime_field,
+            months=chunk_months,
+            decimals=output_options.get('decimals'),
+            storage=storage,
+            report=report
         )
-
-        years_months_24_hour = write_24_hour_mean_aggregated_data_files(
+        # Created once for both the 24 hour means and exceedances files
+        with stage(
+                report, 'aggregate_24_hour_means', sensor=sensor_code
+        ) as record:
+            means = create_24_hour_means(
+                raw_data=data,
+                value_column=value_fields,
+                date_column=datetime_field
+            )
+            record['rows'] = len(data)
+        twenty_four_hour_months = write_24_hour_mean_aggregated_data_files(
             luftdaten_aggregated_data_dir,
             sensor_code,
             data,
             value_fields,
-            datetime_field
+            datetime_field,
+            months=chunk_months,
+            storage=storage,
+            report=report,
+            means=means,
+            **output_options
         )
+        if events:
+            exceedance_months = write_exceedance_data_files(
+                luftdaten_aggregated_data_dir,
+                sensor_code,
+                data,
+                value_fields,
+                datetime_field,
+                months=chunk_months,
+                report=report,
+                means=means
+            )
+            for year, month_infos in exceedance_months.items():
+                years_months_exceedances[year].extend(month_infos)
+        for year, month_infos in day_of_week_months.items():
+            years_months_day_of_week[year].extend(month_infos)
+        for year, month_infos in twenty_four_hour_months.items():
+            years_months_24_hour[year].extend(month_infos)
 
-        # Remap year keys from integer to string (for JSON)
-        years_months_24_hour = {
-            str(key): val for key, val in years_months_24_hour.items()
-        }
-        years_months_day_of_week = {
-            str(key): val for key, val in years_months_day_of_week.items()
+    if clean:
+        print("Sensor {}: dropped {} of {} readings, rejected {} values "
+              "out of range and {} outliers, {} location change(s)".format(
+                  sensor_code,
+                  cleaning_counts['dropped'],
+                  cleaning_counts['rows'],
+                  cleaning_counts['out_of_range'],
+                  cleaning_counts['outliers'],
+                  cleaning_counts['location_changes']
+              ))
+        if cleaning_counts['dropped'] > \
+                cleaning_counts['rows'] * MAX_DROPPED_FRACTION:
+            print("WARNING: cleaning dropped most of sensor {}'s readings, "
+                  "check its config".format(sensor_code))
+
+    month_fingerprints = get_cached_month_fingerprints(
+        luftdaten_cache_dir,
+        sensor_code
+    )
+    return (
+        years_months_day_of_week,
+        years_months_24_hour,
+        years_months_exceedances,
+        month_fingerprints
+    )
+
+
+def process_sensor_job(job):
+    """Processes a sensor, possibly in a worker process.
+
+    :returns: The result of process_sensor and the stages recorded"""
+    *args, sqlite_filepath, profile_filepath = job
+    report = RunReport('process_sensor')
+    with profile(profile_filepath), \
+            stage(report, 'sensor', sensor=args[0]) as record:
+        if sqlite_filepath is None:
+            result = process_sensor(*args, report=report)
+        else:
+            # Each process needs its own connection to the database
+            with SQLiteStorage(sqlite_filepath, value_fields) as storage:
+                result = process_sensor(
+                    *args, storage=storage, report=report
+                )
+        record['peak_memory_mb'] = get_peak_memory_mb()
+    return result, report.stages
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    data_dir = os.path.join('..', 'data')
+    report = RunReport('process_data')
+    report_filepath = args.report or get_report_filepath(
+        get_luftdaten_reports_dir(data_dir),
+        report.name,
+        report.started_at
+    )
+
+    config_file_path = '../config/sensors.yaml'
+    config = get_config(config_file_path)
+
+    luftdaten_raw_data_dir = get_luftdaten_raw_data_dir(data_dir)
+    luftdaten_aggregated_data_dir = get_luftdaten_aggregated_data_dir(data_dir)
+    luftdaten_cache_dir = get_luftdaten_cache_dir(data_dir)
+    luftdaten_sensors = get_luftdaten_sensors(config)
+
+    summary_filepath = os.path.join(
+        luftdaten_aggregated_data_dir,
+        'sensor-summary.json'
+    )
+    aggregation_state_filepath = os.path.join(
+        luftdaten_cache_dir,
+        'aggregation-state.json'
+    )
+
+    previous_sensors_info = {}
+    previous_composites = []
+    previous_output_kept = False
+    spatial_config = config.get('spatial', {}) if args.spatial else None
+    sqlite_filepath = args.sqlite
+    if sqlite_filepath == '':
+        sqlite_filepath = get_luftdaten_sqlite_filepath(data_dir)
+    output_options = {
+        'resolution_tiers': sorted(
+            set(args.tiers), key=list(RESOLUTION_TIERS).index
+        ),
+        'decimals': args.decimals,
+        'compact': args.compact,
+    }
+    aggregation_state = {
+        'value_fields': value_fields,
+        'output_options': output_options,
+        'sqlite_filepath': sqlite_filepath,
+        'spatial': spatial_config,
+        'events': args.events,
+        'clean': args.clean,
+        'sensors': {}
+    }
+    if args.incremental:
+        previous_summary = read_json_file(summary_filepath, None)
+        previous_state = read_json_file(aggregation_state_filepath, None)
+        # Without both the previous output and a record of its inputs
+        # everything has to be reprocessed
+        if previous_summary is not None and previous_state is not None and \
+                previous_state['value_fields'] == value_fields and \
+                previous_state.get('output_options') == output_options and \
+                previous_state.get('sqlite_filepath') == sqlite_filepath and \
+                previous_state.get('spatial') == spatial_config and \
+                previous_state.get('events', False) == args.events and \
+                previous_state.get('clean', False) == args.clean:
+            previous_sensors_info = {
+                str(sensor_info['code']): sensor_info
+                for sensor_info in previous_summary['luftdaten_sensors']
+            }
+            previous_composites = previous_summary.get('spatial', {}) \
+                .get('composites', [])
+            aggregation_state = previous_state
+            previous_output_kept = True
+    if not previous_output_kept and \
+            os.path.exists(luftdaten_aggregated_data_dir):
+        # Clear any previous runs of data, e.g. the files of resolution
+        # tiers or formats no longer written
+        shutil.rmtree(luftdaten_aggregated_data_dir)
+
+    sensor_jobs = []
+    for sensor in luftdaten_sensors:
+        profile_filepath = '{}_sensor_{}.prof'.format(
+            os.path.splitext(report_filepath)[0],
+            sensor.code
+        ) if args.profile else None
+        # New sensors, or ones missing from the summary, are fully processed
+        previous_month_fingerprints = aggregation_state['sensors'].get(
+            str(sensor.code), {}
+        ) if str(sensor.code) in previous_sensors_info else {}
+        sensor_jobs.append((
+            sensor.code,
+            previous_month_fingerprints if args.incremental else None,
+            luftdaten_raw_data_dir,
+            luftdaten_cache_dir,
+            luftdaten_aggregated_data_dir,
+            output_options,
+            args.streaming,
+            args.events,
+            args.clean,
+            sensor.location,
+            sqlite_filepath,
+            profile_filepath
+        ))
+
+    # Results come back in sensor order however many workers there are, so
+    # the summary is the same as a serial run
+    if args.download:
+        sensors_by_code = {sensor.code: sensor for sensor in luftdaten_sensors}
+        validators = ValidatorIndex(
+            os.path.join(luftdaten_raw_data_dir, 'validators.json')
+        )
+        with ArchiveDownloader(
+                max_workers=args.download_workers,
+                validators=validators
+        ) as downloader:
+            # Each sensor is processed once its own files are downloaded,
+            # while the other sensors' downloads carry on
+            job_results = run_pipeline(
+                sensor_jobs,
+                lambda job: download_raw_luftdaten_files(
+                    luftdaten_raw_data_dir,
+                    sensors_by_code[job[0]],
+                    downloader=downloader,
+                    archive_url=args.archive_url,
+                    revalidate_days=args.revalidate_days,
+                    compress=args.compress,
+                    report=report
+                ),
+                process_sensor_job,
+                producers=args.download_sensors,
+                consumers=args.workers,
+                processes=args.workers > 1
+            )
+    elif args.workers > 1:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            job_results = list(executor.map(process_sensor_job, sensor_jobs))
+    else:
+        job_results = [process_sensor_job(job) for job in sensor_jobs]
+    results = []
+    for result, stages in job_results:
+        results.append(result)
+        report.add_stages(stages)
+
+    # Keep track of the years/months data available for each sensor
+    sensors_info = []
+    months_written = set()
+    for sensor, result in zip(luftdaten_sensors, results):
+        sensor_code = sensor.code
+        previous_sensor_info = previous_sensors_info.get(str(sensor_code), {})
+        years_months_day_of_week, years_months_24_hour, \
+            years_months_exceedances, month_fingerprints = result
+        months_written.update(
+            (year, month_info['month'])
+            for year, month_infos in years_months_24_hour.items()
+            for month_info in month_infos
+        )
+
+        aggregation_state['sensors'][str(sensor_code)] = {
+            get_month_key(*yearmonth): fingerprint
+            for yearmonth, fingerprint in sorted(month_fingerprints.items())
         }
 
+        # Merge with the months from the previous run (if any), this also
+        # remaps year keys from integer to string (for JSON)
+        years_months_24_hour = merge_available_dates(
+            previous_sensor_info.get('24_hour_means', {})
+            .get('available_dates', {}),
+            years_months_24_hour
+        )
+        years_months_day_of_week = merge_available_dates(
+            previous_sensor_info.get('day_of_week', {})
+            .get('available_dates', {}),
+            years_months_day_of_week
+        )
+
         sensor_config = config['sensors']['luftdaten'][sensor_code]
-        sensors_info.append({
+        sensor_info = {
             'code': sensor_code,
             'name': sensor_config['name'],
             '24_hour_means': {
@@ -85,21 +640,63 @@ if __name__ == '__main__':
             'day_of_week': {
                 'available_dates': years_months_day_of_week
             }
-        })
+        }
+        if args.events:
+            sensor_info['exceedances'] = {
+                'limits': LIMITS,
+                'available_dates': merge_available_dates(
+                    previous_sensor_info.get('exceedances', {})
+                    .get('available_dates', {}),
+                    years_months_exceedances
+                )
+            }
+        sensors_info.append(sensor_info)
 
     # Write a summary file
     summary_json = {
         'luftdaten_sensors': sensors_info
     }
-    summary_filepath = os.path.join(
-        luftdaten_aggregated_data_dir,
-        'sensor-summary.json'
-    )
+
+    if spatial_config is not None:
+        # Only the months that changed for some sensor need rewriting
+        spatial_months = months_written if previous_sensors_info else None
+        composites = previous_composites
+        if spatial_months is None or spatial_months:
+            composites = merge_composites(
+                previous_composites,
+                process_spatial(
+                    luftdaten_sensors,
+                    spatial_config,
+                    spatial_months,
+                    luftdaten_raw_data_dir,
+                    luftdaten_cache_dir,
+                    luftdaten_aggregated_data_dir,
+                    decimals=args.decimals,
+                    clean=args.clean,
+                    report=report
+                )
+            )
+        summary_json['spatial'] = {
+            'resolution': 'hourly',
+            'composites': composites
+        }
 
     def default(o):
         if isinstance(o, np.int64):
             return int(o)
         raise TypeError
 
-    with open(summary_filepath, 'w') as output_file:
-        json.dump(summary_json, output_file, default=default)
+    # Replaced in one go, so the site never reads a partly written summary
+    write_chunks_atomically(
+        summary_filepath,
+        [json.dumps(summary_json, default=default).encode('utf-8')]
+    )
+
+    # Record the inputs behind this run's output for the next incremental run
+    write_chunks_atomically(
+        aggregation_state_filepath,
+        [json.dumps(aggregation_state).encode('utf-8')]
+    )
+
+    report.write(report_filepath)
+    print("Run report written to {}".format(report_filepath))
@@ -0,0 +1,48 @@
+import argparse
+import datetime
+import os
+import sys
+sys.path.append('../app')
+
+import numpy as np
+
+from luftdaten.data import (
+    get_luftdaten_sqlite_filepath,
+    RAW_VALUE_FIELDS,
+)
+from storage import SQLiteStorage
+
+parser = argparse.ArgumentParser(description='Query the data kept in the SQLite database by process_data.py --sqlite.')
+parser.add_argument('sensor_number', metavar='SensorNumber', type=int,
+                    help='The sensor number')
+parser.add_argument('--days', type=int, default=7,
+                    help='Number of days up to now to show')
+parser.add_argument('--start', type=datetime.date.fromisoformat,
+                    help='First date to show (YYYY-MM-DD), instead of --days')
+parser.add_argument('--end', type=datetime.date.fromisoformat,
+                    help='Show data before this date (YYYY-MM-DD)')
+parser.add_argument('--means', action='store_true',
+                    help='Show the 24 hour means rather than the readings')
+parser.add_argument('--database', default=None,
+                    help='The database file')
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    data_dir = os.path.join('..', 'data')
+    sqlite_filepath = args.database or get_luftdaten_sqlite_filepath(data_dir)
+
+    start = args.start or \
+        datetime.datetime.utcnow() - datetime.timedelta(days=args.days)
+    with SQLiteStorage(sqlite_filepath, RAW_VALUE_FIELDS) as storage:
+        if args.means:
+            data = storage.read_rolling_means(
+                args.sensor_number, 'timestamp', start, args.end
+            )
+        else:
+            data = storage.read_readings(
+                args.sensor_number, 'timestamp', start, args.end
+            )
+    # The values were float32 before they were stored
+    data = data.astype({field: np.float32 for field in RAW_VALUE_FIELDS})
+    data.to_csv(sys.stdout, index=False)
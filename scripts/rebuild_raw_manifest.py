@@ -0,0 +1,17 @@
+import os
+import sys
+sys.path.append('../app')
+
+from luftdaten.data import (
+    get_luftdaten_raw_data_dir,
+    rebuild_raw_luftdaten_manifests,
+)
+
+
+if __name__ == '__main__':
+    data_dir = os.path.join('..', 'data')
+    luftdaten_raw_data_dir = get_luftdaten_raw_data_dir(data_dir)
+
+    file_counts = rebuild_raw_luftdaten_manifests(luftdaten_raw_data_dir)
+    for sensor_code, file_count in sorted(file_counts.items()):
+        print("Sensor {}: {} file(s)".format(sensor_code, file_count))
@@ -0,0 +1,60 @@
+import argparse
+import json
+import os
+import sys
+sys.path.append('../app')
+
+from config import get_config
+from luftdaten.data import (
+    get_luftdaten_raw_data_dir,
+    get_luftdaten_sensor_coverage,
+)
+from luftdaten.missing import (
+    DEFAULT_GIVE_UP_DAYS,
+    DEFAULT_RECHECK_DAYS,
+    RetryPolicy,
+)
+from luftdaten.sensor import get_luftdaten_sensors
+
+parser = argparse.ArgumentParser(description='Report how many of each sensor\'s days have been downloaded from the Luftdaten archive.')
+parser.add_argument('--recheck-days', type=int, default=DEFAULT_RECHECK_DAYS,
+                    help='As for download_data.py')
+parser.add_argument('--give-up-days', type=int, default=DEFAULT_GIVE_UP_DAYS,
+                    help='As for download_data.py')
+parser.add_argument('--json', action='store_true',
+                    help='Write the report as JSON, with the ranges of '
+                         'missing days')
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    data_dir = os.path.join('..', 'data')
+    config_file_path = '../config/sensors.yaml'
+    config = get_config(config_file_path)
+
+    luftdaten_sensors = get_luftdaten_sensors(config)
+    luftdaten_raw_data_dir = get_luftdaten_raw_data_dir(data_dir)
+    retry_policy = RetryPolicy(
+        recheck_days=args.recheck_days,
+        give_up_days=args.give_up_days
+    )
+    coverages = [
+        get_luftdaten_sensor_coverage(
+            luftdaten_raw_data_dir,
+            sensor,
+            retry_policy
+        )
+        for sensor in luftdaten_sensors
+    ]
+
+    if args.json:
+        json.dump(coverages, sys.stdout, indent=2)
+        print()
+    else:
+        print("{:>8} {:>10} {:>6} {:>8} {:>8} {:>8} {:>8}".format(
+            'Sensor', 'Start', 'Days', 'Present', 'Missing', 'Pending',
+            'Failed'
+        ))
+        for coverage in coverages:
+            print("{code:>8} {start_date:>10} {days:>6} {present:>8} "
+                  "{missing:>8} {pending:>8} {failed:>8}".format(**coverage))
@@ -0,0 +1,45 @@
+import argparse
+import os
+import sys
+sys.path.append('../app')
+
+from luftdaten.data import get_luftdaten_aggregated_data_dir
+from service import AggregatedDataService, create_server
+from service.server import DEFAULT_PORT
+
+parser = argparse.ArgumentParser(description='Serve range queries over the data written by process_data.py.')
+parser.add_argument('--host', default='127.0.0.1',
+                    help='Address to listen on')
+parser.add_argument('--port', type=int, default=DEFAULT_PORT,
+                    help='Port to listen on')
+parser.add_argument('--cache-mb', type=int, default=64,
+                    help='Most memory to use for caching months of data')
+parser.add_argument('--response-cache-mb', type=int, default=16,
+                    help='Most memory to use for caching encoded responses')
+parser.add_argument('--quiet', action='store_true',
+                    help="Don't log each request")
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    data_dir = os.path.join('..', 'data')
+    service = AggregatedDataService(
+        get_luftdaten_aggregated_data_dir(data_dir),
+        cache_bytes=args.cache_mb * 1024 ** 2
+    )
+    server = create_server(
+        service,
+        args.host,
+        args.port,
+        quiet=args.quiet,
+        response_cache_bytes=args.response_cache_mb * 1024 ** 2
+    )
+    print("Serving on http://{}:{}/sensors/<code>/24_hour_means".format(
+        *server.server_address[:2]
+    ))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -112,7 +112,7 @@ fi
 # Process latest data
 cd $script_dir
 $python_exe download_data.py
-$python_exe process_data.py
+$python_exe process_data.py --incremental
 
 # Update the server
 data_files="$root_dir/data/luftdaten/aggregated/*"